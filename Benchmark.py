@@ -0,0 +1,843 @@
+import argparse  # Importing the argparse module for parsing command-line arguments
+import asyncio  # Importing the asyncio module for driving engine clients and servers in one loop
+import contextlib  # Importing the contextlib module for silencing client/server output
+import heapq  # Importing the heapq module for delivering datagrams in time order over a simulated link
+import io  # Importing the io module for the output sink used while silencing
+import itertools  # Importing the itertools module for numbering datagrams on a simulated link
+import multiprocessing  # Importing the multiprocessing module for running clients and server workers on separate cores
+import os  # Importing the os module for generating random data
+import pickle  # Importing the pickle module to measure the old serialization path
+import socket  # Importing the socket module for the send path benchmark
+import tempfile  # Importing the tempfile module for the qlog files of the tracing benchmark
+import threading  # Importing the threading module for running the server next to the client
+import time  # Importing the time module for timing benchmark runs
+import tracemalloc  # Importing the tracemalloc module for counting bytes copied on the send path
+import Packets  # Importing the Packets module which contains various QUIC-related classes
+import Cache  # Importing the Cache module for the shared response cache
+import Scheduler  # Importing the Scheduler module for the stream scheduling policies
+import Sources  # Importing the Sources module for lazily produced stream data
+import Resumption  # Importing the Resumption module for resumption tokens
+import Engine  # Importing the Engine module for the asyncio client and server
+from Proxy import LossyProxy  # Importing the LossyProxy class for transfers over an impaired path
+import Trace  # Importing the Trace module for measuring the cost of tracing
+from Connection import QUICConnection, QUICClientConnection  # Importing the connection state machines for sans-IO benchmarks
+from Client import QUICClient  # Importing the QUICClient class from the Client module
+from Server import QUICServer, QUICWorkerPool  # Importing the server classes from the Server module
+
+benchmarkPort = 9888  # Port used by benchmarks that run a loopback transfer
+
+def _timed(function, iterations):
+    """
+    Run a function repeatedly and return the average time per call.
+
+    Args:
+        function (callable): Function to call with no arguments.
+        iterations (int): Number of calls to time.
+
+    Returns:
+        float: Average seconds per call.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations
+
+def bench_codec(iterations=20000, streams=4, chunk_size=1000):
+    """
+    Compare the binary wire format with the old pickle path on one data packet.
+
+    Both paths are timed end to end: encode() and pickle.dumps() each
+    return a new bytes object, and decoding starts from bytes.
+
+    Args:
+        iterations (int): Number of encode/decode calls to time.
+        streams (int): Number of stream frames in the packet.
+        chunk_size (int): Stream data bytes per frame.
+
+    Returns:
+        dict: Per-packet encode/decode time in microseconds and encoded size for each path.
+    """
+    frames = [Packets.QUICStreamPayload(i, 123456, chunk_size, 0, os.urandom(chunk_size)) for i in range(streams)]
+    packet = Packets.QUICPacket(0, Packets.generate_random_hex(), 4242, frames)
+
+    pickled = pickle.dumps(packet)
+    encoded = packet.encode()
+    results = {
+        'pickle': {
+            'encode_us': _timed(lambda: pickle.dumps(packet), iterations) * 1e6,
+            'decode_us': _timed(lambda: pickle.loads(pickled), iterations) * 1e6,
+            'size': len(pickled),
+        },
+        'wire': {
+            'encode_us': _timed(packet.encode, iterations) * 1e6,
+            'decode_us': _timed(lambda: Packets.QUICPacket.decode(encoded), iterations) * 1e6,
+            'size': len(encoded),
+        },
+    }
+
+    print(f"Codec benchmark: {streams} frames x {chunk_size} bytes, {iterations} iterations")
+    for name, result in results.items():
+        print(f"{name:>6}: encode {result['encode_us']:.2f} us, decode {result['decode_us']:.2f} us, {result['size']} bytes")
+    return results
+
+def run_transfer(streams, port=benchmarkPort, **server_options):
+    """
+    Run one loopback transfer with the server in a background thread.
+
+    Args:
+        streams (int): Number of streams the client requests.
+        port (int): Port the server listens on.
+        **server_options: Extra keyword arguments for QUICServer.
+
+    Returns:
+        tuple: Total bytes received and seconds taken by the client.
+    """
+    server = QUICServer(port=port, **server_options)
+    client = QUICClient()
+    with contextlib.redirect_stdout(io.StringIO()):
+        def serve():
+            server.accept()
+            server.handle_client()
+        server_thread = threading.Thread(target=serve, daemon=True)
+        server_thread.start()
+        time.sleep(0.2)  # Wait for the server to bind
+        start = time.perf_counter()
+        client.connect('127.0.0.1', port)
+        client.run(streams)
+        elapsed = time.perf_counter() - start
+        server_thread.join()
+    server.close()
+    client.close()
+    return sum(stream['packetReceived'] for stream in client.streams), elapsed
+
+def bench_window(windows=(1, 2, 4, 8, 16, 32), streams=2):
+    """
+    Measure loopback throughput for a range of send window sizes.
+
+    Args:
+        windows (tuple): Send window sizes (packets in flight) to try.
+        streams (int): Number of streams per transfer.
+
+    Returns:
+        dict: Throughput in MB/s keyed by window size.
+    """
+    results = {}
+    print(f"Window benchmark: {streams} streams per transfer")
+    for window in windows:
+        received, elapsed = run_transfer(streams, window=window)
+        results[window] = received / elapsed / (1024 * 1024)
+        print(f"window {window:>3}: {results[window]:.2f} MB/s")
+    return results
+
+def bench_load(client_counts=(1, 4, 16), streams=1, port=benchmarkPort + 1):
+    """
+    Measure aggregate throughput of one server process serving many concurrent clients.
+
+    Args:
+        client_counts (tuple): Numbers of concurrent clients to try.
+        streams (int): Number of streams each client requests.
+        port (int): Port the server listens on.
+
+    Returns:
+        dict: Aggregate throughput in MB/s keyed by client count.
+    """
+    results = {}
+    print(f"Load benchmark: {streams} streams per client")
+    for count in client_counts:
+        server = QUICServer(port=port)
+        clients = [QUICClient() for _ in range(count)]
+        def run_client(client):
+            client.connect('127.0.0.1', port)
+            client.run(streams)
+        with contextlib.redirect_stdout(io.StringIO()):
+            server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+            server_thread.start()
+            time.sleep(0.2)  # Wait for the server to bind
+            client_threads = [threading.Thread(target=run_client, args=(client,)) for client in clients]
+            start = time.perf_counter()
+            for thread in client_threads:
+                thread.start()
+            for thread in client_threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            server.shutdown()
+            server_thread.join()
+        server.close()
+        received = sum(stream['packetReceived'] for client in clients for stream in client.streams)
+        for client in clients:
+            client.close()
+        results[count] = received / elapsed / (1024 * 1024)
+        print(f"{count:>3} clients: {results[count]:.2f} MB/s aggregate")
+    return results
+
+def _allocated_per_call(function, arguments):
+    """
+    Measure the memory a function allocates per call, transient allocations included.
+
+    Args:
+        function (callable): Function to call with each argument.
+        arguments (iterable): Arguments to call it with, one call each.
+
+    Returns:
+        float: Average bytes allocated per call.
+    """
+    allocated = 0
+    calls = 0
+    tracemalloc.start()
+    for argument in arguments:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        function(argument)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+        calls += 1
+    tracemalloc.stop()
+    return allocated / calls
+
+def bench_copies(stream_size=4 * 1024 * 1024, chunk_size=1200):
+    """
+    Compare bytes copied per payload byte sent on the old slicing path and the memoryview path.
+
+    The old path slices each chunk out of the stream (a copy), encodes the
+    packet into a new buffer (a second copy) and turns it into bytes (a
+    third). The zero-copy path slices a memoryview and hands the header and
+    payload buffers to sendmsg. Copies are the memory a packet allocates
+    beyond what an empty packet allocates, measured with tracemalloc, so
+    per-packet object overhead cancels out.
+
+    Args:
+        stream_size (int): Bytes of stream data to send.
+        chunk_size (int): Stream data bytes per packet.
+
+    Returns:
+        dict: Bytes copied per payload byte, per-packet overhead and packets per second for each path.
+    """
+    data = os.urandom(stream_size)
+    view = memoryview(data)
+    cid = Packets.generate_random_hex()
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    address = receiver.getsockname()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.setblocking(False)
+
+    def packet(offset, chunk):
+        return Packets.QUICPacket(0, cid, offset, [Packets.QUICStreamPayload(0, offset + len(chunk), len(chunk), 0, chunk)])
+
+    def send_copied(offset, size):
+        chunk = data[offset:offset + size]
+        sender.sendto(packet(offset, chunk).encode(), address)
+
+    def send_zero_copy(offset, size):
+        chunk = view[offset:offset + size]
+        sender.sendmsg(packet(offset, chunk).encode_buffers(), (), 0, address)
+
+    offsets = range(0, stream_size - chunk_size, chunk_size)
+    results = {}
+    print(f"Copy benchmark: {stream_size} bytes in {chunk_size}-byte chunks")
+    for name, send in [('copied', send_copied), ('zero_copy', send_zero_copy)]:
+        def send_chunk(offset, size=chunk_size):
+            try:
+                send(offset, size)
+            except BlockingIOError:
+                pass  # Nobody reads the receiver; a full buffer is fine
+        overhead = _allocated_per_call(lambda offset: send_chunk(offset, 0), offsets)
+        with_payload = _allocated_per_call(send_chunk, offsets)
+        elapsed = _timed(lambda: [send_chunk(offset) for offset in offsets], 1)
+        results[name] = {
+            'copied_per_byte': max(with_payload - overhead, 0) / chunk_size,
+            'overhead_bytes': overhead,
+            'pps': len(offsets) / elapsed,
+        }
+        print(f"{name:>9}: {results[name]['copied_per_byte']:.2f} bytes copied per byte sent, "
+              f"{overhead:.0f} bytes of objects per packet, {results[name]['pps']:.0f} packets/s")
+    sender.close()
+    receiver.close()
+    return results
+
+def bench_batch_io(rounds=2000, burst=32, datagram_size=1200):
+    """
+    Compare loopback packets per second with one system call per datagram and with UDP GSO/GRO.
+
+    Each round sends a burst of equal-sized datagrams and then reads the
+    receiver dry, so no datagram is dropped for lack of socket buffer.
+    Sending and receiving are timed separately. The batched mode is skipped
+    if the kernel supports neither GSO nor GRO.
+
+    Args:
+        rounds (int): Number of bursts to send.
+        burst (int): Datagrams per burst.
+        datagram_size (int): Bytes per datagram.
+
+    Returns:
+        dict: Send and receive packets per second and the share of datagrams received, for each mode that ran.
+    """
+    payload = os.urandom(datagram_size)
+    results = {}
+    print(f"Batch I/O benchmark: {rounds} bursts of {burst} x {datagram_size}-byte datagrams")
+    for name in ('per_datagram', 'gso_gro'):
+        receiver = Packets.QUICSocket()
+        receiver.create_socket()
+        receiver.bind(('127.0.0.1', 0))
+        receiver.get_sockfd().setblocking(False)
+        sender = Packets.QUICSocket()
+        sender.create_socket()
+        if name == 'gso_gro' and not (sender.enable_batch_io() and receiver.enable_batch_io()):
+            print(f"{name:>12}: not supported by this kernel")
+            sender.close()
+            receiver.close()
+            continue
+        address = receiver.get_sockfd().getsockname()
+        datagrams = [([payload], address)] * burst
+        send_time = receive_time = 0.0
+        received = 0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            sender.sendmsg_batch(datagrams)
+            send_time += time.perf_counter() - start
+            start = time.perf_counter()
+            while True:
+                try:
+                    view, _, segment_size = receiver.recvfrom_segments()
+                except BlockingIOError:
+                    break
+                received += -(-len(view) // segment_size)
+                receiver.release(view)
+            receive_time += time.perf_counter() - start
+        sent = rounds * burst
+        results[name] = {'send_pps': sent / send_time, 'receive_pps': received / receive_time, 'delivered': received / sent}
+        print(f"{name:>12}: send {results[name]['send_pps']:.0f} packets/s, receive {results[name]['receive_pps']:.0f} packets/s, "
+              f"{results[name]['delivered']:.0%} delivered")
+        sender.close()
+        receiver.close()
+    return results
+
+def _run_client_process(port, streams):
+    """
+    Run one client transfer in a worker process with its output silenced.
+
+    Args:
+        port (int): Port the server listens on.
+        streams (int): Number of streams to request.
+
+    Returns:
+        int: Bytes received.
+    """
+    client = QUICClient()
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.connect('127.0.0.1', port)
+        client.run(streams)
+    client.close()
+    return sum(stream['packetReceived'] for stream in client.streams)
+
+def bench_workers(worker_counts=(1, 2, 4), clients=8, streams=1, port=benchmarkPort + 2):
+    """
+    Measure aggregate throughput of a QUICWorkerPool against its number of worker processes.
+
+    Clients run in their own processes so they do not share one core; the
+    sweep only scales while there are spare cores for both sides.
+
+    Args:
+        worker_counts (tuple): Numbers of server worker processes to try.
+        clients (int): Number of concurrent client processes.
+        streams (int): Number of streams each client requests.
+        port (int): Port the workers share.
+
+    Returns:
+        dict: Aggregate throughput in MB/s keyed by worker count.
+    """
+    results = {}
+    print(f"Workers benchmark: {clients} client processes, {streams} streams each, {multiprocessing.cpu_count()} CPUs")
+    for count in worker_counts:
+        pool = QUICWorkerPool('127.0.0.1', port, count)
+        with contextlib.redirect_stdout(io.StringIO()):
+            pool.start()
+        time.sleep(0.5)  # Wait for every worker to bind
+        try:
+            with multiprocessing.Pool(clients) as client_pool:
+                start = time.perf_counter()
+                received = sum(client_pool.starmap(_run_client_process, [(port, streams)] * clients))
+                elapsed = time.perf_counter() - start
+        finally:
+            pool.stop()
+        results[count] = received / elapsed / (1024 * 1024)
+        print(f"{count:>3} workers: {results[count]:.2f} MB/s aggregate")
+    return results
+
+def bench_sources(sizes=(1024 * 1024, 5 * 1024 * 1024, 20 * 1024 * 1024), streams=4):
+    """
+    Compare time to first packet and peak memory with stream data made up front and produced lazily.
+
+    A server connection is driven without sockets: the request arrives,
+    every stream gets its data and packets are built until the first one is
+    sent. The eager path makes each stream's data with os.urandom before
+    writing it, like the old generate_random_data; the lazy path hands each
+    stream a Sources.RandomSource.
+
+    Args:
+        sizes (tuple): Bytes per stream to try.
+        streams (int): Number of streams.
+
+    Returns:
+        dict: Time to first packet in milliseconds and peak traced memory in MB, keyed by path and size.
+    """
+    results = {}
+    print(f"Sources benchmark: {streams} streams")
+    request = Packets.QUICPacket(0, '00', 1, [Packets.QUICStreamPayload(i, 8, 8, 0, b'Request0') for i in range(streams)])
+    for name in ('eager', 'lazy'):
+        for size in sizes:
+            sent = []
+            connection = QUICConnection('00', ('127.0.0.1', 1), lambda buffers, address: sent.append(time.perf_counter()),
+                                        pacing=False, on_request=lambda connection, stream_ids: None)
+            with contextlib.redirect_stdout(io.StringIO()):
+                connection.handle_request(request, 0.0)
+            tracemalloc.start()
+            start = time.perf_counter()
+            for stream_id in range(streams):
+                if name == 'eager':
+                    connection.write(stream_id, os.urandom(size), end_stream=True)
+                else:
+                    connection.set_source(stream_id, Sources.RandomSource(size))
+            connection.send_pending(start)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[(name, size)] = {'first_packet_ms': (sent[0] - start) * 1e3, 'peak_mb': peak / (1024 * 1024)}
+            print(f"{name:>5} {size // 1024:>6} KB/stream: first packet after {results[(name, size)]['first_packet_ms']:.2f} ms, "
+                  f"peak {results[(name, size)]['peak_mb']:.1f} MB")
+    return results
+
+def bench_cache(requests=20, streams=4):
+    """
+    Compare producing each request's response data with and without the shared response cache.
+
+    Server connections are driven without sockets: each one receives the
+    same request for several streams and its stream sources are read to the
+    end, as the sender would. Without a cache every request makes its 1-5 MB
+    of random data again; with one, only the first does.
+
+    Args:
+        requests (int): Connections making the same request.
+        streams (int): Streams per request.
+
+    Returns:
+        dict: Production rate in MB/s keyed by path, and the cache counters.
+    """
+    results = {}
+    print(f"Cache benchmark: {requests} requests of {streams} streams")
+    request = Packets.QUICPacket(0, '00', 1, [Packets.QUICStreamPayload(i, 8, 8, 0, f'Request{i}'.encode()) for i in range(streams)])
+    for name in ('uncached', 'cached'):
+        cache = Cache.ResponseCache() if name == 'cached' else None
+        produced = 0
+        start = time.perf_counter()
+        for index in range(requests):
+            connection = QUICConnection(f'{index:02x}', ('127.0.0.1', 1), lambda buffers, address: None, pacing=False, cache=cache)
+            with contextlib.redirect_stdout(io.StringIO()):
+                connection.handle_request(request, 0.0)
+            for stream in connection.streams:
+                produced += sum(len(chunk) for chunk in stream['source'])
+        elapsed = time.perf_counter() - start
+        results[name] = produced / elapsed / (1024 * 1024)
+        print(f"{name:>8}: {results[name]:.0f} MB/s of response data" + ("" if cache is None else f", {cache.stats()}"))
+        if cache is not None:
+            results['stats'] = cache.stats()
+    return results
+
+def bench_schedulers(streams=4, stream_size=1024 * 1024, link_mbps=100):
+    """
+    Compare per-stream completion times under each stream scheduling policy.
+
+    A server connection is driven without sockets and with the windows wide
+    open, so the packetizer alone decides the order of the packets; a
+    stream completes when the packet carrying its final frame has crossed
+    a link of the given rate. Stream i gets weight i + 1 under weighted-fair
+    and urgency i under priority scheduling.
+
+    Args:
+        streams (int): Number of streams, all of the same size.
+        stream_size (int): Bytes per stream.
+        link_mbps (float): Link rate in Mbit/s used to turn bytes sent into time.
+
+    Returns:
+        dict: Completion time of every stream in milliseconds, keyed by policy.
+    """
+    results = {}
+    print(f"Scheduler benchmark: {streams} streams of {stream_size // 1024} KB over {link_mbps} Mbit/s")
+    request = Packets.QUICPacket(0, '00', 1, [Packets.QUICStreamPayload(i, 8, 8, 0, b'Request0') for i in range(streams)])
+    for policy in Scheduler.SCHEDULERS:
+        sent = [0]
+        finished = {}
+        def send(buffers, address):
+            sent[0] += sum(len(buffer) for buffer in buffers)
+        connection = QUICConnection('00', ('127.0.0.1', 1), send, window=10 ** 6, pacing=False,
+                                    on_request=lambda connection, stream_ids: None, scheduler=policy)
+        connection.congestion.cwnd = float('inf')
+        with contextlib.redirect_stdout(io.StringIO()):
+            connection.handle_request(request, 0.0)
+        for stream_id in range(streams):
+            connection.set_priority(stream_id, weight=stream_id + 1, urgency=stream_id)
+            connection.write(stream_id, bytes(stream_size), end_stream=True)
+        while connection.has_data():
+            frames = connection.next_frames(0.0)
+            connection.send_frames(frames, 0.0)
+            for frame in frames:
+                if isinstance(frame, Packets.QUICStreamPayload) and frame.finished:
+                    finished[frame.stream_id] = sent[0] * 8 / (link_mbps * 1e6) * 1e3
+        results[policy] = [finished[stream_id] for stream_id in range(streams)]
+        print(f"{policy:>13}: " + ", ".join(f"stream {stream_id} {time_ms:.0f} ms" for stream_id, time_ms in enumerate(results[policy])))
+    return results
+
+def _linked_transfer(stream_size, **server_options):
+    """
+    Send one stream from a server connection to a client connection wired together in memory.
+
+    There is no loss, and each round of datagrams takes a millisecond.
+
+    Args:
+        stream_size (int): Bytes to transfer.
+        **server_options: Passed to QUICConnection.
+
+    Returns:
+        dict: Server CPU seconds, data packets and their bytes on the wire, and ACKs sent by the client.
+    """
+    to_server, to_client = [], []
+    counts = {'server_cpu': 0.0, 'packets': 0, 'wire_bytes': 0, 'acks': 0}
+    def server_send(buffers, address):
+        datagram = Packets.decode_datagram(b''.join(buffers))
+        if isinstance(datagram, Packets.QUICPacket):
+            counts['packets'] += 1
+            counts['wire_bytes'] += sum(len(buffer) for buffer in buffers)
+        to_client.append(datagram)
+    def client_send(buffers, address):
+        datagram = Packets.decode_datagram(b''.join(buffers))
+        counts['acks'] += isinstance(datagram, Packets.QUICAck)
+        to_server.append(datagram)
+    server = QUICConnection('00', ('127.0.0.1', 1), server_send, pacing=False, on_request=lambda connection, stream_ids: None,
+                            **{'pmtud': False, **server_options})
+    client = QUICClientConnection('00', ('127.0.0.1', 2), client_send, None)
+    now = 0.0
+    def pump():
+        nonlocal now
+        while to_server or to_client or client.acks.ack_at is not None:
+            if not (to_server or to_client):
+                now = max(now, client.acks.ack_at)
+                client.handle_timer(now)
+            now += 0.001
+            start = time.process_time()
+            while to_server:
+                server.datagram_received(to_server.pop(0), ('127.0.0.1', 2), now)
+            server.send_pending(now)
+            counts['server_cpu'] += time.process_time() - start
+            while to_client:
+                client.datagram_received(to_client.pop(0), now)
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.connect(now)
+        pump()
+        client.request(1, now)
+        pump()
+        server.set_source(0, Sources.RandomSource(stream_size, seed=1))
+        server.send_pending(now)
+        pump()
+    if not client.complete:
+        raise RuntimeError("In-memory transfer did not complete")
+    return counts
+
+def bench_acks(stream_size=16 * 1024 * 1024, thresholds=(1, None)):
+    """
+    Compare ACK traffic and sender CPU time with an ACK per packet and with delayed ACKs.
+
+    With a fixed threshold of 1 the client acknowledges every packet; with
+    None the server raises the threshold as its window grows.
+
+    Args:
+        stream_size (int): Bytes to transfer.
+        thresholds (tuple): ACK thresholds to request; None lets the server choose.
+
+    Returns:
+        dict: ACKs per data packet and server CPU seconds, keyed by threshold.
+    """
+    results = {}
+    print(f"ACK benchmark: {stream_size // (1024 * 1024)} MB in memory")
+    for threshold in thresholds:
+        counts = _linked_transfer(stream_size, ack_threshold=threshold)
+        name = 'auto' if threshold is None else str(threshold)
+        results[name] = {'acks_per_packet': counts['acks'] / counts['packets'], 'server_cpu': counts['server_cpu']}
+        print(f"threshold {name:>4}: {counts['acks']} ACKs for {counts['packets']} packets "
+              f"({results[name]['acks_per_packet']:.3f} per packet), server CPU {counts['server_cpu']:.2f} s")
+    return results
+
+def bench_tracing(stream_size=8 * 1024 * 1024, repeat=3):
+    """
+    Compare server CPU time of an in-memory transfer without a tracer, with one in memory and with one writing a qlog file.
+
+    Args:
+        stream_size (int): Bytes to transfer.
+        repeat (int): Transfers per setting; the fastest counts.
+
+    Returns:
+        dict: Server CPU seconds and events recorded, keyed by setting.
+    """
+    results = {}
+    print(f"Tracing benchmark: {stream_size // (1024 * 1024)} MB in memory")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('off', 'ring buffer', 'qlog file'):
+            times = []
+            for attempt in range(repeat):
+                tracer = {'off': None, 'ring buffer': Trace.Tracer(),
+                          'qlog file': Trace.Tracer(os.path.join(directory, f"{attempt}.qlog"))}[name]
+                times.append(_linked_transfer(stream_size, tracer=tracer)['server_cpu'])
+                if tracer is not None:
+                    tracer.close()
+            events = 0 if tracer is None else tracer.stats()['recorded']
+            results[name] = {'server_cpu': min(times), 'events': events}
+            print(f"{name:>11}: server CPU {min(times):.3f} s, {events} events")
+    return results
+
+def bench_headers(stream_size=4 * 1024 * 1024, datagram_sizes=(256, 576, 1200)):
+    """
+    Compare goodput with long and short packet headers at several datagram sizes.
+
+    Goodput is the share of the bytes on the wire that is stream data.
+
+    Args:
+        stream_size (int): Bytes to transfer.
+        datagram_sizes (tuple): Datagram sizes to fill packets to.
+
+    Returns:
+        dict: Goodput share and header bytes per packet, keyed by datagram size and header form.
+    """
+    results = {}
+    print(f"Header benchmark: {stream_size // (1024 * 1024)} MB in memory")
+    for size in datagram_sizes:
+        for short in (False, True):
+            counts = _linked_transfer(stream_size, max_datagram_size=size, short_headers=short)
+            name = f"{size}/{'short' if short else 'long'}"
+            results[name] = {'goodput': stream_size / counts['wire_bytes'], 'packets': counts['packets']}
+            print(f"{size:>5} bytes, {'short' if short else 'long':>5} headers: {counts['packets']} packets, "
+                  f"goodput {100 * results[name]['goodput']:.2f}% of the wire")
+    return results
+
+def _delayed_fetch(tokens, token, delay, response_size):
+    """
+    Fetch one response over an in-memory link with a fixed one-way delay, requesting as early as the client may.
+
+    Args:
+        tokens (Resumption.ResumptionTokens): The server's token issuer.
+        token (bytes): Token to present, or None for a full handshake.
+        delay (float): One-way delay of the link in seconds.
+        response_size (int): Bytes of the response.
+
+    Returns:
+        tuple: Seconds from the Client Hello to the first response byte, and the token the server issued.
+    """
+    link = []  # (delivery time, sequence, to_client, datagram), earliest first
+    sequence = itertools.count()  # Keeps datagrams due at the same time in the order they were sent
+    first_byte = []
+    now = 0.0
+    def deliver(to_client, buffers):
+        heapq.heappush(link, (now + delay, next(sequence), to_client, Packets.decode_datagram(b''.join(buffers))))
+    def on_data(stream_id, data, finished):
+        if not first_byte:
+            first_byte.append(now)
+    server = QUICConnection('00', ('127.0.0.1', 2), lambda buffers, address: deliver(True, buffers), pacing=False, pmtud=False,
+                            tokens=tokens, on_request=lambda connection, stream_ids: connection.write(0, bytes(response_size), end_stream=True))
+    client = QUICClientConnection('00', ('127.0.0.1', 1), lambda buffers, address: deliver(False, buffers), on_data, token=token)
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.connect(now)
+        if client.early_data:
+            client.request(1, now)
+        while link and not first_byte:
+            now, _, to_client, datagram = heapq.heappop(link)
+            if to_client:
+                client.datagram_received(datagram, now)
+                if client.connected and client.request_packet is None:
+                    client.request(1, now)
+            else:
+                server.datagram_received(datagram, ('127.0.0.1', 2), now)
+                server.send_pending(now)
+    return first_byte[0], client.token
+
+def bench_resumption(delays=(0.001, 0.01, 0.05), response_size=1024):
+    """
+    Compare the time to the first response byte of a full handshake and of a resumed 0-RTT connection.
+
+    Each connection fetches one small response over an in-memory link; a
+    resumed one presents the token the previous connection was issued and
+    sends its request with the Client Hello.
+
+    Args:
+        delays (tuple): One-way link delays to try, in seconds.
+        response_size (int): Bytes of the response.
+
+    Returns:
+        dict: Milliseconds to the first response byte, keyed by one-way delay in ms and mode.
+    """
+    results = {}
+    print(f"Resumption benchmark: {response_size} byte responses")
+    tokens = Resumption.ResumptionTokens()
+    for delay in delays:
+        full, token = _delayed_fetch(tokens, None, delay, response_size)
+        resumed, _ = _delayed_fetch(tokens, token, delay, response_size)
+        results[(delay * 1e3, 'full')] = full * 1e3
+        results[(delay * 1e3, 'resumed')] = resumed * 1e3
+        print(f"{delay * 1e3:>5.0f} ms one way: first byte after {full * 1e3:.0f} ms with a full handshake, "
+              f"{resumed * 1e3:.0f} ms resumed")
+    return results
+
+async def _request_rate(mode, requests, response_size, port):
+    """
+    Serve small requests over loopback and time them.
+
+    Args:
+        mode (str): 'per-connection' opens a connection for every request, 'persistent' sends them
+            one after another on one connection, and 'pipelined' sends them all at once on one connection.
+        requests (int): Requests to send.
+        response_size (int): Bytes of each response.
+        port (int): Port the server listens on.
+
+    Returns:
+        float: Seconds taken.
+    """
+    async def respond(connection, writers):
+        for writer in writers:
+            writer.write(bytes(response_size))
+            writer.write_eof()
+    server = await Engine.serve('127.0.0.1', port, respond)
+    start = time.perf_counter()
+    if mode == 'per-connection':
+        for _ in range(requests):
+            client = await Engine.connect('127.0.0.1', port)
+            await client.request(1)[0].read()
+            client.close()
+            client.quic_socket.close()
+    else:
+        client = await Engine.connect('127.0.0.1', port, persistent=True)
+        if mode == 'persistent':
+            for _ in range(requests):
+                await client.request(1)[0].read()
+        else:
+            readers = [client.request(1)[0] for _ in range(requests)]
+            await asyncio.gather(*(reader.read() for reader in readers))
+        client.close()
+        client.quic_socket.close()
+    elapsed = time.perf_counter() - start
+    server.close()
+    server.quic_socket.close()
+    return elapsed
+
+def bench_requests(requests=200, response_size=1024, port=benchmarkPort + 3):
+    """
+    Compare requests per second with a new connection for every request and with one persistent connection.
+
+    Every new connection pays a handshake round trip and the setup of its
+    socket and engine before its request can go out.
+
+    Args:
+        requests (int): Requests per mode.
+        response_size (int): Bytes of each response.
+        port (int): Port the server listens on.
+
+    Returns:
+        dict: Requests per second keyed by mode.
+    """
+    results = {}
+    print(f"Request rate benchmark: {requests} requests for {response_size} bytes each")
+    for mode in ('per-connection', 'persistent', 'pipelined'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = asyncio.run(_request_rate(mode, requests, response_size, port))
+        results[mode] = requests / elapsed
+        print(f"{mode:>14}: {results[mode]:.0f} requests/s")
+    return results
+
+IMPAIRMENTS = {
+    'clean': {},
+    'loss 1%': {'loss_rate': 0.01},
+    'bursts 1%': {'burst_loss': (0.002, 0.2)},
+    'delay 20ms': {'delay': 0.01, 'jitter': 0.002},
+    'reorder 2%': {'delay': 0.002, 'reorder_rate': 0.02, 'duplicate_rate': 0.01},
+    'cap 50Mbit': {'bandwidth': 50e6 / 8},
+}  # Profiles compared by bench_impairments; delays are one way, so 'delay 20ms' is the round trip
+
+async def _impaired_transfer(stream_size, streams, port):
+    """
+    Transfer streams from an engine server through the proxy listening on port + 1.
+
+    Args:
+        stream_size (int): Bytes of each stream.
+        streams (int): Streams to request.
+        port (int): Port the server listens on.
+
+    Returns:
+        float: Seconds from the first request until every stream was read.
+    """
+    async def respond(connection, writers):
+        for writer in writers:
+            writer.write(bytes(stream_size))
+            writer.write_eof()
+    server = await Engine.serve('127.0.0.1', port, respond)
+    start = time.perf_counter()
+    client = await Engine.connect('127.0.0.1', port + 1)
+    await asyncio.gather(*(reader.read() for reader in client.request(streams)))
+    elapsed = time.perf_counter() - start
+    await client.wait_complete()
+    client.close()
+    client.quic_socket.close()
+    server.close()
+    server.quic_socket.close()
+    return elapsed
+
+def bench_impairments(stream_size=2 * 1024 * 1024, streams=2, seed=1, port=benchmarkPort + 4):
+    """
+    Measure throughput and completion time of a transfer through the proxy under each impairment profile.
+
+    Every profile is seeded, so runs of the same tree see the same losses
+    and reordering and differences come from recovery and congestion control.
+
+    Args:
+        stream_size (int): Bytes of each stream.
+        streams (int): Streams per transfer.
+        seed (int): Seed for the proxy's impairment decisions.
+        port (int): Port the server listens on; the proxy listens on the next one.
+
+    Returns:
+        dict: Throughput in Mbit/s, completion time in seconds and datagrams dropped, keyed by profile.
+    """
+    results = {}
+    print(f"Impairment benchmark: {streams} streams of {stream_size} bytes through the proxy")
+    for name, impairments in IMPAIRMENTS.items():
+        proxy = LossyProxy(('127.0.0.1', port + 1), ('127.0.0.1', port), seed=seed, **impairments)
+        proxy.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed = asyncio.run(_impaired_transfer(stream_size, streams, port))
+        finally:
+            proxy.stop()
+        results[name] = {'throughput_mbps': streams * stream_size * 8 / elapsed / 1e6, 'completion': elapsed, 'dropped': proxy.dropped}
+        print(f"{name:>12}: {results[name]['throughput_mbps']:7.1f} Mbit/s, {elapsed:.2f} s, {proxy.dropped} datagrams dropped")
+    return results
+
+BENCHMARKS = {
+    'codec': bench_codec,
+    'window': bench_window,
+    'load': bench_load,
+    'copies': bench_copies,
+    'batch': bench_batch_io,
+    'workers': bench_workers,
+    'sources': bench_sources,
+    'cache': bench_cache,
+    'schedulers': bench_schedulers,
+    'acks': bench_acks,
+    'headers': bench_headers,
+    'resumption': bench_resumption,
+    'requests': bench_requests,
+    'impairments': bench_impairments,
+    'tracing': bench_tracing,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QUIC microbenchmarks")
+    parser.add_argument('names', nargs='*', help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark {name}")
+    for name in args.names or list(BENCHMARKS):
+        BENCHMARKS[name]()
@@ -0,0 +1,223 @@
+from collections import OrderedDict  # Importing OrderedDict from collections for least-recently-used ordering
+from typing import Final  # Importing Final from typing for defining constants
+
+# Defining constants
+defaultCacheSize: Final = 64 * 1024 * 1024  # Bytes of responses a server keeps by default
+
+class CacheEntry:
+    def __init__(self, key, producer):
+        """
+        Initialize a cached response, filled a chunk at a time by its producer.
+
+        Args:
+            key (hashable): Request the response answers.
+            producer (iterator): Source of the response's chunks, or None once it has run dry.
+        """
+        self.key = key
+        self.producer = producer
+        self.chunks = []  # Chunks still held, shared by every reader
+        self.start = 0  # Index in the response of chunks[0]; earlier chunks were dropped
+        self.size = 0  # Bytes held in chunks
+        self.readers = []  # CachedSources still reading the entry
+
+    @property
+    def complete(self):
+        """
+        Return whether the producer has run dry.
+
+        Returns:
+            bool: True once every chunk of the response is in chunks.
+        """
+        return self.producer is None
+
+class CachedSource:
+    def __init__(self, cache, entry):
+        """
+        Initialize a chunk source that reads a cached response.
+
+        Readers of an entry that is still being produced share its producer:
+        whichever reader runs out of chunks first pulls the next one and
+        leaves it in the entry for the others. A reader leaves the entry at
+        the end of the response or when it is closed.
+
+        Args:
+            cache (ResponseCache): Cache the entry belongs to.
+            entry (CacheEntry): Response to read.
+        """
+        self.cache = cache
+        self.entry = entry
+        self.index = entry.start  # Index in the response of the next chunk to hand out
+        entry.readers.append(self)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Hand out the next chunk of the response.
+
+        Returns:
+            bytes: The next chunk.
+
+        Raises:
+            StopIteration: At the end of the response.
+        """
+        entry = self.entry
+        if self.index == entry.start + len(entry.chunks):
+            if not entry.complete:
+                self.cache.produce(entry)
+            if self.index == entry.start + len(entry.chunks):
+                self.close()
+                raise StopIteration
+        chunk = entry.chunks[self.index - entry.start]
+        self.index += 1
+        self.cache.trim(entry)
+        return chunk
+
+    def close(self):
+        """
+        Stop reading, letting the cache drop the chunks only this reader still needed.
+        """
+        if self in self.entry.readers:
+            self.entry.readers.remove(self)
+            self.cache.trim(self.entry)
+
+class ResponseCache:
+    def __init__(self, capacity=defaultCacheSize):
+        """
+        Initialize a response cache shared by every connection of a server.
+
+        Responses are keyed by the request that produced them and evicted
+        least recently used first once their bytes exceed capacity. A request
+        for a response still being produced joins it instead of starting a
+        second producer. An evicted response stays readable by the streams
+        already reading it, but keeps only the chunks one of them has not
+        read yet, so with a single reader its chunks pass straight through.
+        A response whose source reports a size larger than capacity is never
+        put in the table.
+
+        Args:
+            capacity (int): Byte budget of the cached responses.
+        """
+        if capacity < 0:
+            raise ValueError("Cache capacity cannot be negative")
+        self.capacity = capacity
+        self.entries = OrderedDict()  # Key -> CacheEntry, least recently used first
+        self.size = 0  # Bytes held by the entries in the table
+        self.hits = 0  # Requests answered from a complete response
+        self.coalesced = 0  # Requests that joined a response still being produced
+        self.misses = 0  # Requests that started a producer
+        self.evictions = 0  # Responses dropped to stay within capacity
+
+    def source(self, key, make_source):
+        """
+        Return a chunk source for a response, producing it only if it is not cached.
+
+        Args:
+            key (hashable): Request content, e.g. the request name.
+            make_source (callable): Called without arguments on a miss; returns the chunk source of the response.
+
+        Returns:
+            CachedSource: Source for QUICConnection.set_source() or QUICStreamWriter.write_source().
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            producer = iter(make_source())
+            entry = CacheEntry(key, producer)
+            if getattr(producer, 'size', 0) <= self.capacity:
+                self.entries[key] = entry
+        else:
+            if entry.complete:
+                self.hits += 1
+            else:
+                self.coalesced += 1
+            self.entries.move_to_end(key)
+        return CachedSource(self, entry)
+
+    def produce(self, entry):
+        """
+        Pull the next non-empty chunk of an entry from its producer.
+
+        Args:
+            entry (CacheEntry): Entry a reader has run out of chunks of.
+        """
+        try:
+            for chunk in entry.producer:
+                if not isinstance(chunk, bytes):
+                    chunk = bytes(chunk)
+                if chunk:
+                    entry.chunks.append(chunk)
+                    entry.size += len(chunk)
+                    if self.entries.get(entry.key) is entry:
+                        self.size += len(chunk)
+                        self.evict(entry)
+                    return
+        except BaseException:
+            self.discard(entry)  # A failed response is not cached
+            raise
+        entry.producer = None
+
+    def evict(self, growing):
+        """
+        Drop least recently used responses until the cache is within capacity.
+
+        Args:
+            growing (CacheEntry): Entry that just grew; it is dropped last, and only if it alone exceeds capacity.
+        """
+        while self.size > self.capacity:
+            for entry in self.entries.values():
+                if entry is not growing:
+                    break
+            else:
+                entry = growing
+            self.discard(entry)
+            self.evictions += 1
+
+    def discard(self, entry):
+        """
+        Remove an entry from the table if it is still there.
+
+        Args:
+            entry (CacheEntry): Entry to remove.
+        """
+        if self.entries.get(entry.key) is entry:
+            del self.entries[entry.key]
+            self.size -= entry.size
+            self.trim(entry)
+
+    def trim(self, entry):
+        """
+        Drop the chunks of an entry outside the table that every reader has passed.
+
+        Once no reader is left the producer is closed, if it can be, and
+        the entry holds nothing.
+
+        Args:
+            entry (CacheEntry): Entry a reader advanced in or left.
+        """
+        if self.entries.get(entry.key) is entry:
+            return  # Future requests read the response from its first chunk
+        if entry.readers:
+            passed = min(reader.index for reader in entry.readers) - entry.start
+        else:
+            passed = len(entry.chunks)
+            if entry.producer is not None:
+                close = getattr(entry.producer, 'close', None)
+                entry.producer = None
+                if close is not None:
+                    close()
+        if passed > 0:
+            entry.size -= sum(len(chunk) for chunk in entry.chunks[:passed])
+            del entry.chunks[:passed]
+            entry.start += passed
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: hits, coalesced, misses, evictions, entries and bytes.
+        """
+        return {'hits': self.hits, 'coalesced': self.coalesced, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.entries), 'bytes': self.size}
@@ -1,165 +1,263 @@
-from pydoc import cli
-import socket
+import argparse
+import asyncio
+import logging
+import os
 from typing import Final
 import Packets
-import math
-import time
+import Engine
+import Trace
+import Metrics
 
 bufferSize:Final = 1024 * 1024 * 2
 portNumber:Final = 8888
+logger = logging.getLogger(__name__)
 class QUICClient:
-    def __init__(self):
+    def __init__(self, batch_io=False, qlog=None):
         """
         Initialize a QUICClient object.
+
+        A blocking wrapper around Engine.QUICClientProtocol: the client owns
+        a private event loop and runs it only inside connect() and run().
+
+        Args:
+            batch_io (bool): Whether to use UDP GSO/GRO where the kernel supports them, see Packets.QUICSocket.enable_batch_io().
+            qlog (str, optional): File to write a qlog trace of the connection to, see Trace.Tracer.
         """
         self.socket = Packets.QUICSocket()# Create a QUIC socket
         self.streams = [] # List to store active streams
         self.timeTaken = [] # List to store time taken to receive the file
+        self.loop = asyncio.new_event_loop()
+        self.protocol = None
+        self.batch_io = batch_io
+        self.token = None  # Resumption token the server issued, for connect() next time
+        self.tracer = Trace.Tracer(qlog, 'client') if qlog is not None else None
+        self.metrics = None  # Metrics.ConnectionMetrics of the connection, once a request was sent
 
     def create_socket(self):
         """
         Create the client socket.
         """
-        print("Creating socket...\n")
+        logger.info("Creating socket...")
         self.socket.create_socket()
+        if self.batch_io:
+            self.socket.enable_batch_io()
 
-    def connect(self, host, port):
+    def connect(self, host, port, token=None, persistent=False):
         """
         Connect to the server.
 
         Args:
             host (str): The server's hostname or IP address.
             port (int): The server's port number.
+            token (bytes, optional): Resumption token from an earlier connection to the server, see self.token. With it connect() returns once the Client Hello is sent, and run() sends the request
+                in the same flight instead of a round trip later.
+            persistent (bool): Whether to keep the connection open for more requests, see fetch(). It stays open until close().
         """
 
-        print("Connecting to server...\n")
+        logger.info("Connecting to %s:%d...", host, port)
         
         self.create_socket()# Create the client socket
         self.socket.set_address((host, port))# Set the server address
         dest_id = Packets.generate_random_hex() # Generate a random destination ID
         self.socket.set_dest_cid(dest_id) # Set the destination connection ID
-        qlh = Packets.QUICLongHeader(Packets.LONG_HEADER_FLAG,dest_id, '', 1)# Create a QUIC long header
-        self.send_packet(qlh) # Send the QUIC long header packet
-        print(f"Sent Client Hello\n")
-
-         # Receive response from server
-        print("Waiting for Server response...\n")
-        #(self.socket.get_sockfd()).settimeout(5)
-        data, _ = self.socket.recvfrom(1024)# Receive data from the server
-        data = Packets.QUICLongHeader.decode(data)# Decode the received data
-        self.socket.set_src_cid(data.dest_cid) # Set the source connection ID
-        print(f"Received Server Hello\n")
-        
+        self.protocol = self.loop.run_until_complete(Engine.create_client_endpoint(self.socket, token=token, persistent=persistent,
+                                                                                   tracer=self.tracer))
 
-        # Send ack to server
-        qlh = Packets.QUICLongHeader(Packets.LONG_HEADER_FLAG, dest_id, data.dest_cid, 2)
+        # Send the Client Hello, again with a doubled timeout each time the Server Hello does not arrive
+        logger.info("Waiting for Server response...")
+        try:
+            self.loop.run_until_complete(self.protocol.connect())
+        except ConnectionError as e:
+            self.close()
+            raise RuntimeError(str(e))
+        if self.protocol.connection.connected:
+            self.socket.set_src_cid(self.protocol.connection.src_cid) # Set the source connection ID
 
     def send_packet(self, packet):
         self.socket.sendto(packet.encode(), self.socket.get_address())
 
-    def receive_packet(self):
-        data, _ = self.socket.recvfrom(bufferSize)  # Adjust buffer size accordingly
-        decoded_header = Packets.QUICPacket.decode(data)
-        return decoded_header
-
-    def handle_response(self):
-    
-        print("Receiving files...\n")
-        # start a timer to calculate the time taken to receive the file
-        start = time.time()
-        while True:
-            packet = self.receive_packet()
-            if not self.streams: 
-                for frame in packet.protected_payload:
-                    self.streams.append({'id': frame.stream_id,'chunkSize': frame.length , 'packetReceived': 0})
-                    self.streams[frame.stream_id]['packetReceived'] += frame.length 
-            else:
-                for frame in packet.protected_payload:
-                    self.streams[frame.stream_id]['packetReceived'] += frame.length
-            
-            # send ACK
-            ack_packet = Packets.QUICAck(packet.packet_number, 0)
-            self.send_packet(ack_packet)
-
-
-            self.timeTaken = [0.0] * len(self.streams)
-            for frame in packet.protected_payload:    
-                if frame.finished == 1:
-                    self.timeTaken[frame.stream_id] = time.time() - start
-                    
-
-            
-
-            if all(frame.finished == 1 for frame in packet.protected_payload):
-                print("All files received.\n")
-                break
-
-            
+    async def consume(self, readers):
+        """
+        Read every stream to its end, discarding the data.
+
+        Args:
+            readers (list): asyncio.StreamReaders of the streams.
+        """
+        async def drain(reader):
+            while await reader.read(bufferSize):
+                pass
+        await asyncio.gather(*(drain(reader) for reader in readers))
+
+    def handle_response(self, readers):
+        """
+        Receive stream data until every requested stream is complete.
+
+        The engine acknowledges every packet, puts frames back in order and
+        sends the request again if no data arrives in time.
+
+        Args:
+            readers (list): asyncio.StreamReaders of the requested streams.
+
+        Returns:
+            bool: True if every stream arrived, False if the server stopped sending.
+        """
+        logger.info("Receiving files...")
+        try:
+            self.loop.run_until_complete(self.consume(readers))
+        except ConnectionError as e:
+            logger.error("%s", e)
+            return False
+        finally:
+            self.streams = self.protocol.connection.streams
+            self.timeTaken = self.protocol.connection.timeTaken
+            self.token = self.protocol.connection.token
+            self.metrics = self.protocol.connection.metrics
+        return True
+
     # Simulate processing response
     # In a real-world scenario, you would handle stream data here
-    def run(self):
+    def run(self, streamNumber=None, names=None, output_dir=None):
         """
         Run the client to simulate file transfers through multiple streams.
-        """
 
-        # Simulate initiating file transfers through multiple streams
-        offset = 0
-        frames = []
+        Args:
+            streamNumber (int, optional): Number of streams to request. Asked for interactively when omitted,
+                unless names are given.
+            names (list, optional): Paths to fetch, one per stream, from a server started with a root directory.
+            output_dir (str, optional): Directory to save the streams in, each under its requested file name.
+
+        Returns:
+            bool: True if every stream arrived, False if the server stopped sending.
+        """
+        if streamNumber is None and names:
+            streamNumber = len(names)
 
         #Ask user how many streams they want to simulate
-        try:
-            streamNumber = int(input("Enter the number of streams you want to simulate: "))
-        except KeyboardInterrupt:
-            print("Simulation interrupted by user.")
-            self.socket.close()
-            exit(0)
-
-        for stream_id in range(0, streamNumber):  # Simulate 3 file transfers
-            file_data = (f"Request{stream_id}").encode('utf-8')  # Placeholder request 
-            frame = Packets.QUICStreamPayload(stream_id, offset + len(file_data), len(file_data),0, file_data)
-            frames.append(frame)
-            
-        # Send packet
-        packet = Packets.QUICPacket(0, self.socket.get_dest_cid(), 1, frames)
-        print(f"Sending Request to {self.socket.get_address()}\n")
-        self.send_packet(packet)
-
-        # Handle response
-        self.handle_response()
+        if streamNumber is None:
+            try:
+                streamNumber = int(input("Enter the number of streams you want to simulate: "))
+            except KeyboardInterrupt:
+                print("Simulation interrupted by user.")
+                self.close()
+                exit(0)
+
+        # Send the request and handle the response
+        if not self.fetch(streamNumber, names, output_dir):
+            return False
         self.printStatistics()
+        return True
+
+    def fetch(self, streamNumber, names=None, output_dir=None):
+        """
+        Send one request on the open connection and receive its streams.
+
+        On a persistent connection (see connect()) this may be called any
+        number of times; each request opens new streams without another
+        handshake.
+
+        Args:
+            streamNumber (int): Number of streams to request.
+            names (list, optional): Paths to fetch, one per stream.
+            output_dir (str, optional): Directory to save the streams in, each under its requested file name.
+
+        Returns:
+            bool: True if every stream arrived, False if the server stopped sending.
+        """
+        outputs = None
+        if output_dir is not None:
+            first = self.protocol.connection.next_stream_id
+            requested = list(names or []) + [f"Request{first + i}" for i in range(len(names or []), streamNumber)]
+            outputs = [os.path.join(output_dir, os.path.basename(name) or f"stream{first + i}") for i, name in enumerate(requested)]
+        readers = self.protocol.request(streamNumber, names, outputs)
+        return self.handle_response(readers)
+
+    def close(self):
+        """
+        Stop the engine, finish the qlog trace and close the socket and the event loop.
+        """
+        if self.protocol is not None:
+            self.protocol.close()
+            self.protocol = None
+            self.loop.run_until_complete(asyncio.sleep(0))  # Let the transport finish closing
+        if self.tracer is not None:
+            self.tracer.close()
+        self.socket.close()
+        self.loop.close()
+
+    def prometheus(self):
+        """
+        Render the connection's metrics in the Prometheus text format.
+
+        Returns:
+            str: The exposition, see Engine.QUICClientProtocol.prometheus(); empty without a connection.
+        """
+        return '' if self.protocol is None else self.protocol.prometheus()
 
     def printStatistics (self):
+        """
+        Print what each stream and the connection received, from the connection's metrics.
+
+        Bytes count every stream byte once and packets are the datagrams
+        that carried the stream's data, so both are exact. Rates are taken
+        over each stream's own time from request to last byte, and for the
+        connection from its first request to its last completed stream.
+        """
         print("Printing statistics...\n")
+        metrics = self.metrics.snapshot()
 
         # part A: number of bytes received in each stream
         print("Number of bytes received in each stream:")
-        for stream in self.streams:
-            print(f"Stream {stream['id']} received {stream['packetReceived']} bytes")
+        for stream_id, stream in metrics['streams'].items():
+            print(f"Stream {stream_id} received {stream['bytes']} bytes")
         print("---------------------------------------------------------------")
         # part B: number of packets received in each stream
         print("Number of packets received in each stream:")
-        for stream in self.streams:
-            print(f"Stream {stream['id']} received {math.ceil(stream['packetReceived'] / stream['chunkSize'])} packets")
+        for stream_id, stream in metrics['streams'].items():
+            print(f"Stream {stream_id} received {stream['packets']} packets ({stream['duplicate']} bytes received twice)")
         print("---------------------------------------------------------------")
 
-        # part C: bandwidth of each stream in bytes per second (b/s) and packets per second (pps)
+        # part C: goodput of each stream in bytes per second (B/s) and packets per second (pps)
         print("Bandwidth of each stream:")
-
-        for stream in self.streams:
-            print(f"Stream {stream['id']} bandwidth: {round (stream['packetReceived'] / self.timeTaken[stream['id']],2)} B/s, { math.ceil(stream['packetReceived'] / stream['chunkSize'] / self.timeTaken[stream['id']])} packets per second")
+        for stream_id, stream in metrics['streams'].items():
+            if stream['elapsed'] > 0:
+                print(f"Stream {stream_id} bandwidth: {round(stream['bytes'] / stream['elapsed'], 2)} B/s, "
+                      f"{round(stream['packets'] / stream['elapsed'], 2)} packets per second")
         print("---------------------------------------------------------------")
-        # part D: total bandwidth in bytes per second (B/s)
-        total = sum([stream['packetReceived'] for stream in self.streams])
-        print(f"Total bandwidth: {round(total / max(self.timeTaken),2)} B/s")
-        
+        # part D: total goodput in bytes per second (B/s), and bytes on the wire
+        print(f"Total bandwidth: {round(metrics['goodput'] / 8, 2)} B/s over {round(metrics['elapsed'], 3)} s")
+        print(f"Total bytes received: {metrics['stream_bytes_received']} of stream data, {metrics['bytes_received']} on the wire")
+
         print("---------------------------------------------------------------")
-        # part E: total number of packets received
-        total_packets = sum([math.ceil(stream['packetReceived'] / stream['chunkSize']) for stream in self.streams])
-        print(f"Total packets received: {total_packets} packets per second")
+        # part E: total number of packets received, and round-trip times
+        print(f"Total packets received: {metrics['packets_received']} packets, {metrics['packets_sent']} sent")
+        if metrics['rtt']:
+            print("RTT: " + ", ".join(f"p{round(fraction * 100)} {metrics['rtt'][fraction] * 1e3:.2f} ms" for fraction in Metrics.PERCENTILES))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QUIC client")
+    parser.add_argument('paths', nargs='*', help="Files to fetch, one stream each; random data is requested when omitted")
+    parser.add_argument('--output', help="Directory to save the received streams in")
+    parser.add_argument('--requests', type=int, default=1, help="Requests to send one after another on the same connection")
+    parser.add_argument('--streams', type=int, help="Streams to request when no paths are given; asked for interactively when omitted")
+    parser.add_argument('--host', default='127.0.0.1', help="Server address")
+    parser.add_argument('--port', type=int, default=portNumber, help="Server port")
+    parser.add_argument('--qlog', help="File to write a qlog trace of the connection to")
+    parser.add_argument('--metrics', help="File to write the connection's metrics to in the Prometheus text format")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help="Least severe messages to print")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(message)s')
     print("QUIC client started\n")
-    client = QUICClient()
-    client.connect('127.0.0.1', portNumber)
-    client.run()
-    client.socket.close()
+    client = QUICClient(qlog=args.qlog)
+    client.connect(args.host, args.port, persistent=args.requests > 1)
+    received = client.run(args.streams, names=args.paths or None, output_dir=args.output)
+    streamNumber = len(client.streams)  # Later requests ask for as many streams as the first
+    for _ in range(args.requests - 1):
+        if not received:
+            break
+        received = client.fetch(streamNumber, args.paths or None, args.output)
+        if received:
+            client.printStatistics()
+    if args.metrics:
+        with open(args.metrics, 'w') as file:
+            file.write(client.prometheus())
+    client.close()
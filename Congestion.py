@@ -0,0 +1,280 @@
+import math  # Importing the math module for the CUBIC window curve
+from typing import Final  # Importing Final from typing for defining constants
+import Recovery  # Importing the Recovery module for the timer granularity
+
+# Congestion control constants (RFC 9002, section 7 and RFC 9438)
+maxDatagramSize: Final = 1500  # Bytes counted as one segment when growing or shrinking the window
+initialWindowPackets: Final = 10  # Initial congestion window in segments
+minimumWindowPackets: Final = 2  # Smallest congestion window in segments
+lossReductionFactor: Final = 0.5  # NewReno window multiplier on loss
+cubicC: Final = 0.4  # CUBIC scaling constant
+cubicBeta: Final = 0.7  # CUBIC window multiplier on loss
+pacingGain: Final = 1.25  # Pacing rate as a multiple of cwnd / smoothed RTT
+pacingBurstPackets: Final = 10  # Segments the pacer lets out back to back
+
+class CongestionController:
+    name = 'base'
+
+    def __init__(self, max_datagram_size=maxDatagramSize):
+        """
+        Initialize a CongestionController in slow start.
+
+        Args:
+            max_datagram_size (int): Bytes counted as one segment.
+        """
+        self.max_datagram_size = max_datagram_size
+        self.cwnd = initialWindowPackets * max_datagram_size
+        self.ssthresh = math.inf
+        self.recovery_start_time = None  # When the latest recovery period started
+        self.recovering = False  # True until a packet sent after recovery_start_time is acknowledged
+
+    @property
+    def minimum_window(self):
+        """
+        Return the smallest congestion window in bytes.
+
+        Returns:
+            int: Minimum window in bytes.
+        """
+        return minimumWindowPackets * self.max_datagram_size
+
+    @property
+    def state(self):
+        """
+        Return the controller state for metrics.
+
+        Returns:
+            str: 'recovery', 'slow_start' or 'congestion_avoidance'.
+        """
+        if self.recovering:
+            return 'recovery'
+        if self.cwnd < self.ssthresh:
+            return 'slow_start'
+        return 'congestion_avoidance'
+
+    def can_send(self, bytes_in_flight):
+        """
+        Check whether the window allows another packet.
+
+        Args:
+            bytes_in_flight (int): Bytes sent but not yet acknowledged or declared lost.
+
+        Returns:
+            bool: True if another packet may be sent.
+        """
+        return bytes_in_flight < self.cwnd
+
+    def in_recovery(self, time_sent):
+        """
+        Check whether a packet was sent before the current recovery period started.
+
+        Args:
+            time_sent (float): Monotonic time the packet was sent at.
+
+        Returns:
+            bool: True if the packet belongs to the recovery period.
+        """
+        return self.recovery_start_time is not None and time_sent <= self.recovery_start_time
+
+    def on_packets_acked(self, packets, now, rtt):
+        """
+        Grow the window for newly acknowledged packets.
+
+        Args:
+            packets (list): Recovery.SentPackets that were acknowledged.
+            now (float): Current monotonic time.
+            rtt (Recovery.RttEstimator): RTT estimates for the path.
+        """
+        for packet in packets:
+            if self.in_recovery(packet.time_sent):
+                continue  # Packets sent before the loss do not grow the window
+            self.recovering = False
+            if self.cwnd < self.ssthresh:
+                self.cwnd += packet.size  # Slow start
+            else:
+                self.on_congestion_avoidance_ack(packet, now, rtt)
+
+    def on_packets_lost(self, packets, now):
+        """
+        Shrink the window once per round trip when packets are lost.
+
+        Args:
+            packets (list): Recovery.SentPackets declared lost.
+            now (float): Current monotonic time.
+        """
+        if not packets:
+            return
+        latest = max(packet.time_sent for packet in packets)
+        if self.in_recovery(latest):
+            return  # Already reacted to losses from this flight
+        self.recovery_start_time = now
+        self.recovering = True
+        self.on_congestion_event(now)
+
+    def on_congestion_avoidance_ack(self, packet, now, rtt):
+        """
+        Grow the window for one acknowledged packet outside slow start.
+
+        Args:
+            packet (Recovery.SentPacket): The acknowledged packet.
+            now (float): Current monotonic time.
+            rtt (Recovery.RttEstimator): RTT estimates for the path.
+        """
+        raise NotImplementedError
+
+    def on_congestion_event(self, now):
+        """
+        Reduce the window after a loss.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        raise NotImplementedError
+
+class NewReno(CongestionController):
+    name = 'newreno'
+
+    def on_congestion_avoidance_ack(self, packet, now, rtt):
+        """
+        Grow the window by about one segment per round trip.
+        """
+        self.cwnd += self.max_datagram_size * packet.size / self.cwnd
+
+    def on_congestion_event(self, now):
+        """
+        Halve the window.
+        """
+        self.ssthresh = self.cwnd * lossReductionFactor
+        self.cwnd = max(self.ssthresh, self.minimum_window)
+
+class Cubic(CongestionController):
+    name = 'cubic'
+
+    def __init__(self, max_datagram_size=maxDatagramSize):
+        """
+        Initialize a Cubic controller in slow start.
+
+        Args:
+            max_datagram_size (int): Bytes counted as one segment.
+        """
+        super().__init__(max_datagram_size)
+        self.w_max = 0.0  # Window (in segments) before the last reduction
+        self.k = 0.0  # Seconds the cubic curve takes to climb back to w_max
+        self.epoch_start = None  # When the current congestion avoidance epoch started
+        self.w_est = 0.0  # Reno-friendly window estimate in segments
+
+    def on_congestion_avoidance_ack(self, packet, now, rtt):
+        """
+        Grow the window along the cubic curve, never slower than Reno would.
+        """
+        segment = self.max_datagram_size
+        cwnd = self.cwnd / segment
+        if self.epoch_start is None:
+            # First congestion avoidance ack without a preceding loss
+            self.epoch_start = now
+            self.w_max = cwnd
+            self.k = 0.0
+            self.w_est = cwnd
+
+        alpha = 3 * (1 - cubicBeta) / (1 + cubicBeta)
+        self.w_est += alpha * packet.size / self.cwnd
+        t = now - self.epoch_start + rtt.smoothed_rtt
+        target = min(max(cubicC * (t - self.k) ** 3 + self.w_max, cwnd), 1.5 * cwnd)
+        if self.w_est > target:
+            target = self.w_est  # Reno-friendly region
+        self.cwnd += (target - cwnd) / cwnd * packet.size
+
+    def on_congestion_event(self, now):
+        """
+        Cut the window by cubicBeta and restart the cubic curve from it.
+        """
+        segment = self.max_datagram_size
+        cwnd = self.cwnd / segment
+        # Fast convergence: release bandwidth sooner when the window keeps shrinking
+        self.w_max = cwnd * (1 + cubicBeta) / 2 if cwnd < self.w_max else cwnd
+        self.ssthresh = max(self.cwnd * cubicBeta, self.minimum_window)
+        self.cwnd = self.ssthresh
+        self.k = (self.w_max * (1 - cubicBeta) / cubicC) ** (1 / 3)
+        self.epoch_start = now
+        self.w_est = self.cwnd / segment
+
+CONGESTION_CONTROLLERS = {
+    NewReno.name: NewReno,
+    Cubic.name: Cubic,
+}
+
+def create_controller(name, max_datagram_size=maxDatagramSize):
+    """
+    Create a congestion controller by name.
+
+    Args:
+        name (str): One of the keys of CONGESTION_CONTROLLERS.
+        max_datagram_size (int): Bytes counted as one segment.
+
+    Returns:
+        CongestionController: The new controller.
+    """
+    if name not in CONGESTION_CONTROLLERS:
+        raise ValueError(f"Unknown congestion controller {name}, expected one of {', '.join(CONGESTION_CONTROLLERS)}")
+    return CONGESTION_CONTROLLERS[name](max_datagram_size)
+
+class Pacer:
+    def __init__(self, max_datagram_size=maxDatagramSize):
+        """
+        Initialize a token bucket Pacer that starts with a full burst.
+
+        Args:
+            max_datagram_size (int): Bytes counted as one segment.
+        """
+        self.max_datagram_size = max_datagram_size
+        self.capacity = pacingBurstPackets * max_datagram_size
+        self.tokens = self.capacity
+        self.rate = None  # Bytes per second, None until the first RTT sample
+        self.last_update = None
+
+    def update_rate(self, cwnd, smoothed_rtt):
+        """
+        Spread one congestion window across one smoothed RTT.
+
+        Args:
+            cwnd (float): Congestion window in bytes.
+            smoothed_rtt (float): Smoothed RTT in seconds.
+        """
+        self.rate = pacingGain * cwnd / max(smoothed_rtt, Recovery.timerGranularity)
+
+    def refill(self, now):
+        """
+        Add the tokens earned since the last update.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        if self.rate is not None and self.last_update is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_update) * self.rate)
+        self.last_update = now
+
+    def next_send_time(self, now):
+        """
+        Return when the next packet may be sent.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            float: now if a packet may go out immediately, otherwise the time enough tokens will be available.
+        """
+        self.refill(now)
+        if self.rate is None or self.tokens >= self.max_datagram_size:
+            return now
+        return now + (self.max_datagram_size - self.tokens) / self.rate
+
+    def on_packet_sent(self, size, now):
+        """
+        Spend tokens for a packet that was sent.
+
+        Args:
+            size (int): Packet size in bytes.
+            now (float): Current monotonic time.
+        """
+        self.refill(now)
+        self.tokens = max(self.tokens - size, 0)
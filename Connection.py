@@ -0,0 +1,1442 @@
+import logging  # Importing the logging module for leveled connection messages
+import random  # Importing the random module for random number generation
+from collections import deque  # Importing deque for the retransmission queue
+from typing import Final  # Importing Final from typing for defining constants
+import Packets  # Importing the Packets module which contains various QUIC-related classes
+import Recovery  # Importing the Recovery module for RTT estimation and loss detection
+import Congestion  # Importing the Congestion module for congestion control and pacing
+import Sources  # Importing the Sources module for lazily produced stream data
+import Reassembly  # Importing the Reassembly module for putting received stream data back in order
+import Scheduler  # Importing the Scheduler module for choosing which stream fills the next packet
+import PathMtu  # Importing the PathMtu module for finding the largest datagram the path carries
+import Trace  # Importing the Trace module for describing traced frames
+import Metrics  # Importing the Metrics module for the connection's counters
+
+# Defining constants
+oneMB: Final = 1024 * 1024  # Size of 1 MB in bytes
+fiveMB: Final = 5 * oneMB  # Size of 5 MB in bytes
+maxUdpPayload: Final = PathMtu.maxPlpmtu  # Largest UDP payload a data packet is filled up to; path MTU discovery searches up to it
+minFrameRoom: Final = 16  # A packet with less room left than this is sent as it is rather than given another frame
+defaultWindow: Final = 256  # Default cap on packets in flight; the congestion window usually binds first
+idleTimeout: Final = 3  # Seconds without an answer after which the peer is considered gone
+handshakeTimeout: Final = 0.5  # Seconds to wait for the Server Hello before sending the Client Hello again
+maxAttempts: Final = 5  # Times the Client Hello or the request is sent before giving up
+initialStreamWindow: Final = 256 * 1024  # Bytes of a stream the client lets the server send ahead of what it has consumed
+initialConnectionWindow: Final = 1024 * 1024  # Bytes of all streams together the client lets the server send ahead
+maxStreamWindow: Final = 16 * oneMB  # Largest a stream window grows to by auto-tuning
+maxConnectionWindow: Final = 24 * oneMB  # Largest the connection window grows to by auto-tuning
+windowTuneRtts: Final = 2  # A window used up in fewer round trips than this is doubled
+maxAckThreshold: Final = 10  # Most packets the client is asked to receive per ACK
+acksPerWindow: Final = 4  # ACKs asked for per congestion window, so the window keeps being clocked out
+keepAliveTimeout: Final = 30  # Seconds a persistent connection with every request answered waits for the next one
+logger = logging.getLogger(__name__)
+
+class QUICConnection:
+    def __init__(self, cid, address, send, window=defaultWindow, congestion_control='newreno', pacing=True, on_request=None, dest_cid=None, cache=None,
+                 scheduler='round-robin', max_datagram_size=maxUdpPayload, pmtud=True, ack_threshold=None,
+                 short_headers=True, tokens=None, tracer=None):
+        """
+        Initialize the server-side state of one client connection.
+
+        The connection does no I/O of its own: datagrams are handed to it
+        already decoded, and it sends through the send callable, so any
+        socket loop can drive it.
+
+        Args:
+            cid (str): Connection ID the client opened the connection with; the server's table key.
+            address (tuple): Client address the connection was opened from.
+            send (callable): Called with (buffers, address) to send one datagram gathered from a list of buffers.
+            window (int): Maximum number of unacknowledged packets in flight.
+            congestion_control (str): Congestion controller name, see Congestion.CONGESTION_CONTROLLERS.
+            pacing (bool): Whether to pace packets across the RTT instead of sending window-sized bursts.
+            on_request (callable, optional): Called with (connection, stream_ids) when a request arrives, with the
+                streams it opens; it answers through write() or set_source(). Defaults to sending 1-5 MB of random
+                data on every stream.
+            dest_cid (str, optional): Connection ID issued to the client in the Server Hello. The client
+                addresses every later packet with it. Defaults to a random one.
+            cache (Cache.ResponseCache, optional): Response cache shared with the server's other connections;
+                the default random data is kept in it, keyed by request, and reused by later requests.
+            scheduler (str): Stream scheduling policy, see Scheduler.SCHEDULERS.
+            max_datagram_size (int): Largest UDP payload of a data packet. With pmtud, packets start at
+                PathMtu.basePlpmtu bytes and grow as probes show the path carries more; without it
+                every packet is filled to this size.
+            pmtud (bool): Whether to discover the path MTU with padded probe packets, see PathMtu.PathMtuDiscovery.
+            ack_threshold (int, optional): Packets per ACK to ask the client for with an ACK_FREQUENCY frame.
+                Defaults to a quarter of the packets the windows allow in flight, between 1 and maxAckThreshold.
+            short_headers (bool): Whether data packets carry a short header, see Packets.QUICShortHeaderPacket.
+                Only used when dest_cid is Packets.SHORT_CID_LENGTH bytes long.
+            tokens (Resumption.ResumptionTokens, optional): Issuer of resumption tokens shared with the server's
+                other connections. With it the Server Hello carries a token, and a client that presents a valid
+                one may send its request before the handshake completes. Without it every request waits for the handshake.
+            tracer (Trace.Tracer, optional): Records packets sent, received, acknowledged and lost, congestion and
+                RTT updates and stream state changes, with the connection ID as group. Without it nothing is recorded.
+        """
+        if window < 1:
+            raise ValueError("Send window must allow at least one packet in flight")
+        self.cid = cid
+        self.dest_cid = dest_cid or Packets.generate_random_hex()  # Connection ID issued to the client, used in both directions after the handshake
+        self.short_headers = short_headers and len(self.dest_cid) == 2 * Packets.SHORT_CID_LENGTH
+        self.address = address
+        self.send = send
+        self.window = window
+        self.on_request = on_request
+        self.cache = cache
+        self.scheduler = Scheduler.create_scheduler(scheduler)  # Streams with data to send, in the order they get packet space
+        self.fixed_datagram_size = max_datagram_size
+        self.pmtu = PathMtu.PathMtuDiscovery(max_datagram_size) if pmtud else None
+        self.streams = []  # List to store active streams; a persistent connection drops the finished ones at its next request
+        self.stream_index = {}  # Stream ID -> entry of self.streams
+        self.opened = Reassembly.IntervalSet()  # IDs of every stream a request opened, so retransmitted requests open nothing
+        self.unfinished = {}  # Stream ID -> entry of self.streams, for streams whose final frame is not sent yet
+        self.blocked_streams = {}  # Stream ID -> entry of self.streams, for streams out of credit
+        self.recovery = Recovery.LossDetection()  # Tracks packets in flight, RTT and losses
+        self.congestion = Congestion.create_controller(congestion_control)  # Limits bytes in flight to the path capacity
+        self.pacer = Congestion.Pacer() if pacing else None  # Spreads the window across the RTT
+        self.retransmissions = deque()  # Frames from lost packets waiting to be sent again
+        self.control_frames = []  # Frames to send with the next packet of new data
+        self.ack_threshold = ack_threshold
+        self.requested_ack_threshold = Recovery.ackElicitingThreshold  # What the client acknowledges at until asked otherwise
+        self.ack_frequency_sequence = 0
+        self.pace_until = None  # When the pacer lets the next packet out, if it is holding one back
+        self.next_packet_number = 0
+        self.largest_received = None  # Largest packet number of the client's packets; short headers are expanded from it
+        self.server_hello = None  # Encoded Server Hello, resent if the Client Hello is retransmitted
+        self.tokens = tokens
+        self.early_data = False  # Whether the Client Hello's token let the request come before the handshake completes
+        self.request_received = False
+        self.keep_alive = False  # Whether the client asked to keep the connection open for more requests
+        self.stream_limit = None  # Streams the client opens in all, once it has said it sends no more requests
+        self.max_data = Packets.MAX_VARINT  # Connection credit from the client's MAX_DATA; unlimited until it sends one
+        self.data_sent = 0  # New stream bytes sent on all streams, counted against max_data
+        self.data_blocked = False  # Whether a stream has data the connection credit does not cover
+        self.blocked_signal_at = None  # When to tell the client again that sending is blocked, if nothing is in flight
+        self.closed = False
+        self.last_activity = None  # Last time the client was heard from, or a flight was started
+        self.timer = None  # Deadline the owning server last scheduled for this connection
+        self.tracer = tracer
+        self.metrics = Metrics.ConnectionMetrics()  # Packets, bytes, losses, RTT and goodput, readable while the connection runs
+
+    def datagram_received(self, datagram, address, now, size=None):
+        """
+        Process one decoded datagram from the client.
+
+        Args:
+            datagram (object): Decoded QUICLongHeader, QUICPacket or QUICAck.
+            address (tuple): Address the datagram came from; the connection follows it.
+            now (float): Current monotonic time.
+            size (int, optional): Bytes the datagram took on the wire. Defaults to its encoded size.
+        """
+        self.address = address
+        self.last_activity = now
+        self.metrics.on_packet_received(datagram.encoded_size() if size is None else size)
+        if self.tracer is not None:
+            self.trace_received(datagram, now)
+        if isinstance(datagram, Packets.QUICLongHeader):
+            self.handle_hello(datagram, now)
+        elif isinstance(datagram, Packets.QUICPacket):
+            if isinstance(datagram, Packets.QUICShortHeaderPacket):
+                datagram.expand_packet_number(self.largest_received)
+            if self.largest_received is None or datagram.packet_number > self.largest_received:
+                self.largest_received = datagram.packet_number
+            self.handle_keep_alive(datagram.protected_payload)
+            if (any(isinstance(frame, Packets.QUICStreamPayload) for frame in datagram.protected_payload)
+                    and (datagram.dest_conn_id == self.dest_cid or self.accepts_early(datagram))):
+                self.handle_request(datagram, now)
+            else:
+                self.handle_flow_control(datagram.protected_payload)
+        elif isinstance(datagram, Packets.QUICAck):
+            self.handle_ack(datagram, now)
+
+    def trace_received(self, datagram, now):
+        """
+        Record a datagram from the client in the tracer.
+
+        Args:
+            datagram (object): Decoded QUICLongHeader, QUICPacket or QUICAck.
+            now (float): Current monotonic time.
+        """
+        if isinstance(datagram, Packets.QUICLongHeader):
+            data = {'header': {'packet_type': 'initial', 'packet_number': datagram.packet_number}}
+        elif isinstance(datagram, Packets.QUICPacket):
+            data = {'header': {'packet_type': '1RTT', 'packet_number': datagram.packet_number},
+                    'frames': [Trace.frame_summary(frame) for frame in datagram.protected_payload]}
+        else:
+            data = {'header': {'packet_type': '1RTT'}, 'frames': [Trace.ack_summary(datagram)]}
+        self.tracer.record(now, 'transport:packet_received', self.dest_cid, data)
+
+    def handle_hello(self, hello, now):
+        """
+        Answer a Client Hello with a Server Hello, the same one again if the first was lost.
+
+        The Server Hello carries a new resumption token, and says whether
+        the token the client presented lets its request in before the
+        handshake completes.
+
+        Args:
+            hello (Packets.QUICLongHeader): The Client Hello.
+            now (float): Current monotonic time.
+        """
+        if self.server_hello is None:
+            logger.debug("Received Client Hello from %s", self.address)
+            flags = Packets.LONG_HEADER_FLAG
+            token = b''
+            if self.tokens is not None:
+                if hello.flags & Packets.EARLY_DATA_FLAG and self.tokens.validate(hello.token, self.address, now):
+                    self.early_data = True
+                    flags |= Packets.EARLY_DATA_FLAG
+                token = self.tokens.issue(self.address, now)
+            qlh = Packets.QUICLongHeader(flags, self.dest_cid, hello.dest_cid, hello.packet_number, token)
+            self.server_hello = qlh.encode()
+        self.send([self.server_hello], self.address)  # Send server hello to the client
+        self.metrics.on_packet_sent(len(self.server_hello))
+        logger.debug("Sent Server Hello to %s", self.address)
+
+    def accepts_early(self, packet):
+        """
+        Check whether a request sent before the handshake completed may be served.
+
+        Such a request is addressed with the connection ID of the Client
+        Hello rather than the one the Server Hello issued.
+
+        Args:
+            packet (Packets.QUICPacket): The request packet.
+
+        Returns:
+            bool: True if the Client Hello's token was accepted and the request is within the early data limit.
+        """
+        if not self.early_data or packet.dest_conn_id != self.cid:
+            return False
+        size = sum(len(frame.stream_data) for frame in packet.protected_payload if isinstance(frame, Packets.QUICStreamPayload))
+        return size <= self.tokens.max_early_data
+
+    def handle_request(self, packet, now):
+        """
+        Open the requested streams and hand them to the request handler.
+
+        Stream IDs are allocated by the client, so on a persistent
+        connection every request opens new ones; the streams of all
+        requests share the scheduler and their frames are interleaved.
+        Streams a retransmitted request asks for again are not reopened.
+
+        Args:
+            packet (Packets.QUICPacket): The request packet.
+            now (float): Current monotonic time.
+        """
+        first = not self.request_received
+        self.request_received = True
+        stream_ids = []
+        if self.keep_alive and len(self.streams) > len(self.unfinished):
+            # Forget the finished streams, so a persistent connection does not grow with the requests it serves
+            self.streams = list(self.unfinished.values())
+            self.stream_index = dict(self.unfinished)
+        if packet.flags == 0:  # Check if stream exists
+            windows = {frame.stream_id: frame.maximum for frame in packet.protected_payload if isinstance(frame, Packets.QUICMaxStreamData)}
+            for frame in packet.protected_payload:
+                if isinstance(frame, Packets.QUICStreamPayload) and self.opened.add(frame.stream_id, frame.stream_id + 1):
+                    stream = {'id': frame.stream_id, 'request': bytes(frame.stream_data).decode('utf-8', 'replace'),
+                              'pieces': deque(), 'pieceOffset': 0, 'size': 0, 'totalSent': 0, 'fin': False, 'finSent': False,
+                              'source': None, 'weight': Scheduler.defaultWeight, 'urgency': Scheduler.defaultUrgency,
+                              'maxData': windows.get(frame.stream_id, Packets.MAX_VARINT), 'blocked': False}
+                    self.streams.append(stream)
+                    self.stream_index[frame.stream_id] = stream
+                    self.unfinished[frame.stream_id] = stream
+                    stream_ids.append(frame.stream_id)
+                    self.metrics.open_stream(frame.stream_id, now)
+        self.handle_flow_control(packet.protected_payload, initial=first)  # The first request carries the client's initial connection window
+        if not stream_ids:
+            return  # A retransmission of a request already being served
+
+        if first:
+            self.update_ack_frequency()
+        logger.debug("Received request for %d streams from %s", len(stream_ids), self.address)
+        if self.tracer is not None:
+            for stream_id in stream_ids:
+                self.tracer.record(now, 'transport:stream_state_updated', self.dest_cid,
+                                   {'stream_id': stream_id, 'stream_side': 'sending', 'new': 'open'})
+        if self.on_request is None:
+            self.generate_random_data(stream_ids)
+        else:
+            self.on_request(self, stream_ids)
+
+    def handle_keep_alive(self, frames):
+        """
+        Note whether the client wants the connection kept open for more requests.
+
+        A KEEP_ALIVE frame comes with every request of a persistent
+        connection, and a GO_AWAY frame says how many streams the client
+        opened once it has no more requests. A GO_AWAY is final: a
+        KEEP_ALIVE of a retransmitted request arriving after it changes nothing.
+
+        Args:
+            frames (list): Frames of a packet from the client; other frame types are skipped.
+        """
+        for frame in frames:
+            if isinstance(frame, Packets.QUICKeepAlive):
+                self.keep_alive = True
+            elif isinstance(frame, Packets.QUICGoAway):
+                self.keep_alive = True
+                self.stream_limit = frame.stream_count if self.stream_limit is None else min(self.stream_limit, frame.stream_count)
+
+    def handle_flow_control(self, frames, initial=False):
+        """
+        Raise the send credit with the client's MAX_DATA and MAX_STREAM_DATA frames.
+
+        After the initial windows credit only ever grows, so frames that
+        arrive late or twice change nothing. A stream that was waiting for
+        credit rejoins the schedule.
+
+        Args:
+            frames (list): Frames of a packet from the client; other frame types are skipped.
+            initial (bool): Whether the frames came with the first request, whose connection window replaces
+                the unlimited credit of a client that advertises none. The windows of the streams a
+                request opens are applied by handle_request().
+        """
+        for frame in frames:
+            if isinstance(frame, Packets.QUICMaxData):
+                if initial or frame.maximum > self.max_data:
+                    self.max_data = frame.maximum
+                    self.data_blocked = False
+                    self.blocked_signal_at = None
+            elif isinstance(frame, Packets.QUICMaxStreamData):
+                stream = self.stream_index.get(frame.stream_id)
+                if stream is not None and frame.maximum > stream['maxData']:
+                    stream['maxData'] = frame.maximum
+                    self.blocked_signal_at = None
+                    if stream['blocked']:
+                        stream['blocked'] = False
+                        del self.blocked_streams[frame.stream_id]
+                        self.schedule_stream(stream)
+
+    def handle_ack(self, ack, now):
+        """
+        Release acknowledged packets and react to any losses the ACK reveals.
+
+        Args:
+            ack (Packets.QUICAck): The ACK.
+            now (float): Current monotonic time.
+        """
+        ack_delay = min(ack.ack_delay / 1e6, self.recovery.max_ack_delay)  # A peer holding ACKs longer than agreed gets no credit for it
+        largest_acked = self.recovery.largest_acked
+        acked, lost = self.recovery.on_ack_ranges(ack.ranges, ack_delay, now)
+        if self.recovery.largest_acked != largest_acked:
+            self.metrics.on_rtt_sample(self.recovery.rtt.latest_rtt)  # Only a new largest acknowledged packet is a sample
+        if self.tracer is not None and acked:
+            self.tracer.record(now, 'recovery:packets_acked', self.dest_cid, {'packet_numbers': [sent_packet.packet_number for sent_packet in acked]})
+        if self.pmtu is not None:
+            for sent_packet in acked:
+                self.pmtu.on_packet_acked(sent_packet.packet_number, sent_packet.size)
+        self.congestion.on_packets_acked(acked, now, self.recovery.rtt)
+        self.on_packets_lost(lost, now)
+        if self.pacer is not None:
+            self.pacer.update_rate(self.congestion.cwnd, self.recovery.rtt.smoothed_rtt)
+        if self.tracer is not None:
+            self.trace_metrics(now)
+        self.update_ack_frequency()
+
+    def trace_metrics(self, now):
+        """
+        Record the congestion window, bytes in flight and RTT estimates in the tracer.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        rtt = self.recovery.rtt
+        data = {'bytes_in_flight': self.recovery.bytes_in_flight, 'smoothed_rtt': rtt.smoothed_rtt * 1e3,
+                'latest_rtt': rtt.latest_rtt * 1e3, 'min_rtt': rtt.min_rtt * 1e3, 'rtt_variance': rtt.rttvar * 1e3}
+        for name, value in (('congestion_window', self.congestion.cwnd), ('ssthresh', self.congestion.ssthresh)):
+            if value != float('inf'):
+                data[name] = value
+        self.tracer.record(now, 'recovery:metrics_updated', self.dest_cid, data)
+
+    def update_ack_frequency(self):
+        """
+        Ask the client for fewer ACKs as the windows grow, with an ACK_FREQUENCY frame in the next packet.
+
+        Every ACK costs the client a datagram and the server its
+        processing, but the window only moves as ACKs come in: acksPerWindow
+        ACKs per window keep it clocked out smoothly.
+        """
+        threshold = self.ack_threshold
+        if threshold is None:
+            window_packets = int(min(self.window, self.congestion.cwnd // self.max_datagram_size))  # cwnd may be unbounded
+            threshold = max(1, min(maxAckThreshold, window_packets // acksPerWindow))
+        if threshold == self.requested_ack_threshold:
+            return
+        self.requested_ack_threshold = threshold
+        self.control_frames = [frame for frame in self.control_frames if not isinstance(frame, Packets.QUICAckFrequency)]
+        self.control_frames.append(Packets.QUICAckFrequency(self.ack_frequency_sequence, threshold, int(self.recovery.max_ack_delay * 1e6)))
+        self.ack_frequency_sequence += 1
+
+    def write(self, stream_id, data, end_stream=False):
+        """
+        Queue data to be sent on a stream.
+
+        bytes and memoryview data are not copied: frames are slices of it
+        all the way into the socket, so the caller must not change a
+        memoryview's underlying buffer afterwards. Other buffers are copied.
+
+        Args:
+            stream_id (int): Stream to write to.
+            data (bytes | memoryview): Data to append to the stream.
+            end_stream (bool): Whether this is the last data of the stream.
+        """
+        stream = self.stream_index[stream_id]
+        if stream['fin'] or stream['source'] is not None:
+            raise RuntimeError(f"Stream {stream_id} is already finished")
+        if not isinstance(data, (bytes, memoryview)):
+            data = bytes(data)
+        view = memoryview(data).cast('B')
+        if view:
+            stream['pieces'].append(view)
+            stream['size'] += len(view)
+        stream['fin'] = end_stream
+        self.schedule_stream(stream)
+
+    def set_priority(self, stream_id, weight=None, urgency=None):
+        """
+        Set how a stream shares the connection with the others.
+
+        Takes effect the next time the stream joins the schedule, i.e.
+        when it is given data after running dry; set it before writing.
+
+        Args:
+            stream_id (int): Stream to change.
+            weight (int, optional): Share of the stream under weighted-fair scheduling.
+            urgency (int, optional): Priority level under strict-priority scheduling; lower goes first.
+        """
+        stream = self.stream_index[stream_id]
+        if weight is not None:
+            if weight <= 0:
+                raise ValueError("Stream weight must be positive")
+            stream['weight'] = weight
+        if urgency is not None:
+            stream['urgency'] = urgency
+
+    def sendable(self, stream):
+        """
+        Check whether a stream has anything for the next frame: data, a source to pull or its end.
+
+        Args:
+            stream (dict): Entry of self.streams.
+
+        Returns:
+            bool: True if the stream belongs in the schedule.
+        """
+        return (not stream['finSent'] and not stream['blocked']
+                and (stream['totalSent'] < stream['size'] or stream['fin'] or stream['source'] is not None))
+
+    def schedule_stream(self, stream):
+        """
+        Put a stream in the schedule if it has something to send.
+
+        Args:
+            stream (dict): Entry of self.streams.
+        """
+        if self.sendable(stream):
+            self.scheduler.push(stream['id'], stream['weight'], stream['urgency'])
+
+    def request_name(self, stream_id):
+        """
+        Return what the client asked for on a stream.
+
+        Args:
+            stream_id (int): Requested stream.
+
+        Returns:
+            str: The request frame's text, a file path or object key, or Request<id> when the client named nothing.
+        """
+        return self.stream_index[stream_id]['request']
+
+    def set_source(self, stream_id, source):
+        """
+        Send everything a chunk source produces on a stream, then finish it.
+
+        Chunks are pulled as packets are built, one ahead of the chunk being
+        sent so the last data frame can carry the end of the stream. At most
+        two chunks per stream wait unsent, so memory is bounded by the data
+        in flight rather than the stream size.
+
+        Args:
+            stream_id (int): Stream to send on.
+            source (iterable): Yields bytes-like chunks, e.g. Sources.RandomSource, Sources.FileSource or a generator.
+        """
+        stream = self.stream_index[stream_id]
+        if stream['fin'] or stream['source'] is not None:
+            raise RuntimeError(f"Stream {stream_id} is already finished")
+        stream['source'] = iter(source)
+        self.schedule_stream(stream)
+
+    def pull(self, stream):
+        """
+        Take the next non-empty chunk from a stream's source, finishing the stream when the source runs dry.
+
+        Args:
+            stream (dict): Entry of self.streams.
+
+        Returns:
+            bool: True if a chunk was added to the stream's pieces.
+        """
+        for data in stream['source']:
+            if not isinstance(data, (bytes, memoryview)):
+                data = bytes(data)
+            view = memoryview(data).cast('B')
+            if view:
+                stream['pieces'].append(view)
+                stream['size'] += len(view)
+                return True
+        stream['source'] = None
+        stream['fin'] = True
+        return False
+
+    def close(self):
+        """
+        Close the connection, and the sources of the streams it has not finished.
+
+        A source is otherwise only closed when it runs dry, so an aborted
+        transfer would keep its file or shared mapping open.
+        """
+        self.closed = True
+        for stream in self.unfinished.values():
+            source = stream['source']
+            stream['source'] = None
+            if source is not None and hasattr(source, 'close'):
+                source.close()
+
+    def unsent_bytes(self, stream_id):
+        """
+        Return how many written bytes of a stream have not been sent yet.
+
+        Args:
+            stream_id (int): Stream to check.
+
+        Returns:
+            int: Bytes waiting to be sent; 0 for a stream that was finished and dropped.
+        """
+        stream = self.stream_index.get(stream_id)
+        return 0 if stream is None else stream['size'] - stream['totalSent']
+
+    def generate_random_data(self, stream_ids):
+        """
+        Send random data on the streams, produced a chunk at a time as the windows open.
+
+        Args:
+            stream_ids (list): Streams to generate data for.
+        """
+        for stream_id in stream_ids:
+            stream = self.stream_index[stream_id]
+            if self.cache is None:
+                self.set_source(stream['id'], Sources.RandomSource(random.randint(oneMB, fiveMB)))  # 1 MB - 5 MB of random data
+            else:
+                self.set_source(stream['id'], self.cache.source(stream['request'], lambda: Sources.RandomSource(random.randint(oneMB, fiveMB))))
+
+    def build_frames(self, now):
+        """
+        Fill the next packet with frames from the streams the scheduler picks.
+
+        Each frame takes as much of the packet as is left, so a packet is
+        max_datagram_size bytes unless every stream runs out of data first.
+        Streams leave the schedule as soon as their final frame is sent or
+        they have nothing more to send. No frame goes past the stream or
+        connection credit the client granted: a stream out of credit leaves
+        the schedule until a MAX_STREAM_DATA frame raises it, and once the
+        connection credit is used up no stream sends new data.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            list: Waiting control frames and Packets.QUICStreamPayload frames for the next packet, or None if there are none.
+        """
+        frames, self.control_frames = self.control_frames, []
+        room = self.packet_room() - sum(frame.encoded_size() for frame in frames)
+        while room >= minFrameRoom:
+            stream_id = self.scheduler.next()
+            if stream_id is None:
+                break
+            stream = self.stream_index[stream_id]
+            if stream['source'] is not None and len(stream['pieces']) < 2:
+                self.pull(stream)  # Keep the next chunk ready, so the end of the source is known before its last frame
+            credit = min(stream['maxData'] - stream['totalSent'], self.max_data - self.data_sent)
+            if stream['pieces'] and credit <= 0:
+                if stream['totalSent'] >= stream['maxData']:
+                    stream['blocked'] = True
+                    self.blocked_streams[stream_id] = stream
+                    self.scheduler.remove(stream_id)
+                    continue
+                self.data_blocked = True
+                break
+            # Room for the data once the frame header is counted; the offset varint is sized for the largest frame that fits
+            header_size = 1 + Packets.varint_size(stream_id) + Packets.varint_size(stream['totalSent'] + room) + Packets.varint_size(room)
+            if stream['pieces'] and header_size >= room:
+                break
+            # Slice the next chunk out of the written data without copying; a chunk never spans two writes
+            chunk = memoryview(b'')
+            if stream['pieces']:
+                piece = stream['pieces'][0]
+                start = stream['pieceOffset']
+                chunk = piece[start:start + min(room - header_size, credit)]
+                stream['pieceOffset'] = start + len(chunk)
+                if stream['pieceOffset'] == len(piece):
+                    stream['pieces'].popleft()
+                    stream['pieceOffset'] = 0
+            end = stream['totalSent'] + len(chunk)
+            stream['totalSent'] = end
+            self.data_sent += len(chunk)
+            finished = 1 if stream['fin'] and end == stream['size'] else 0
+            stream['finSent'] = bool(finished)
+            self.metrics.on_stream_sent(stream_id, len(chunk), now)
+            if finished:
+                del self.unfinished[stream_id]
+                self.metrics.close_stream(stream_id, now)
+                if self.tracer is not None:
+                    self.tracer.record(now, 'transport:stream_state_updated', self.dest_cid,
+                                       {'stream_id': stream_id, 'stream_side': 'sending', 'new': 'data_sent'})
+            frame = Packets.QUICStreamPayload(stream_id=stream_id, offset=end, finished=finished, length=len(chunk), stream_data=chunk)
+            frames.append(frame)
+            size = frame.encoded_size()
+            room -= size
+            self.scheduler.on_sent(stream_id, size)
+            if not self.sendable(stream):
+                self.scheduler.remove(stream_id)  # Finished, or waiting for the application to write more
+        return frames or None
+
+    @property
+    def max_datagram_size(self):
+        """
+        Return the size data packets are filled up to.
+
+        Returns:
+            int: The discovered path MTU, or the configured size without path MTU discovery.
+        """
+        return self.fixed_datagram_size if self.pmtu is None else self.pmtu.size
+
+    def packet_room(self):
+        """
+        Return how many bytes of frames fit in the next packet.
+
+        Returns:
+            int: max_datagram_size less the packet header.
+        """
+        return self.max_datagram_size - self.header_size()
+
+    def header_size(self):
+        """
+        Return how many bytes the header of the next packet takes.
+
+        Returns:
+            int: Header size of the packet new_packet() would build.
+        """
+        if self.short_headers:
+            return 1 + Packets.SHORT_CID_LENGTH + Packets.packet_number_size(self.next_packet_number, self.recovery.largest_acked)
+        return 2 + Packets.cid_size(self.dest_cid) + Packets.varint_size(self.next_packet_number)
+
+    def fit_frames(self, frames):
+        """
+        Split a list of frames where it outgrows the next packet.
+
+        Frames queued for retransmission were sized for the datagram size
+        of their first transmission, which may since have shrunk.
+
+        Args:
+            frames (list): Frames to send.
+
+        Returns:
+            tuple: Frames that fit in the next packet, and the rest (an empty list if all fit).
+        """
+        room = self.packet_room()
+        for index, frame in enumerate(frames):
+            size = frame.encoded_size()
+            if size <= room:
+                room -= size
+                continue
+            count = room - frame.header_size()
+            if count <= 0:
+                return frames[:index], frames[index:]
+            head, tail = frame.split(count)
+            return frames[:index] + [head], [tail] + frames[index + 1:]
+        return frames, []
+
+    def send_probe(self, size, now):
+        """
+        Send a path MTU probe: a packet padded out to the size being probed.
+
+        The probe carries no stream data, so losing it costs nothing but
+        the probe, and it is not taken as a congestion signal.
+
+        Args:
+            size (int): Datagram size to probe.
+            now (float): Current monotonic time.
+        """
+        packet_number = self.next_packet_number
+        self.send_frames([], now, padding=size - self.header_size())
+        self.pmtu.on_probe_sent(packet_number)
+
+    def new_packet(self, frames):
+        """
+        Build the packet with the next packet number around frames.
+
+        Once the handshake has issued a connection ID of the right length,
+        data packets carry a short header whose packet number is truncated
+        to what the client can reconstruct from the largest one acknowledged.
+
+        Args:
+            frames (list): Frames to put in the packet.
+
+        Returns:
+            Packets.QUICPacket: The packet; not yet sent.
+        """
+        if self.short_headers:
+            return Packets.QUICShortHeaderPacket(self.dest_cid, self.next_packet_number, frames, self.recovery.largest_acked)
+        return Packets.QUICPacket(0, self.dest_cid, self.next_packet_number, frames)
+
+    def send_frames(self, frames, now, padding=0):
+        """
+        Send frames in a new packet under the next packet number and start tracking it.
+
+        Args:
+            frames (list): Frames to put in the packet.
+            now (float): Current monotonic time.
+            padding (int): Zero bytes to add after the frames; not retransmitted if the packet is lost.
+        """
+        if not self.recovery.sent_packets:
+            self.last_activity = now  # A new flight starts the idle clock afresh
+        packet = self.new_packet(frames + [Packets.QUICPadding(padding)] if padding else frames)
+        self.next_packet_number += 1
+        buffers = packet.encode_buffers()
+        size = sum(len(buffer) for buffer in buffers)
+        self.send(buffers, self.address)
+        self.metrics.on_packet_sent(size)
+        if self.tracer is not None:
+            self.tracer.record(now, 'transport:packet_sent', self.dest_cid,
+                               {'header': {'packet_type': '1RTT', 'packet_number': packet.packet_number}, 'raw': {'length': size},
+                                'frames': [Trace.frame_summary(frame) for frame in packet.protected_payload]})
+        self.recovery.on_packet_sent(Recovery.SentPacket(packet.packet_number, now, size, frames))
+        if self.pacer is not None:
+            self.pacer.on_packet_sent(size, now)
+
+    def has_data(self):
+        """
+        Check whether any stream data still has to be sent.
+
+        Returns:
+            bool: True if lost data is waiting, or new data the connection credit allows.
+        """
+        return bool(self.retransmissions) or (len(self.scheduler) > 0 and not self.data_blocked)
+
+    def is_blocked(self):
+        """
+        Check whether stream data is waiting only for the client to grant credit.
+
+        Returns:
+            bool: True if the connection or some stream is out of credit.
+        """
+        return (self.data_blocked and len(self.scheduler) > 0) or bool(self.blocked_streams)
+
+    def blocked_frames(self):
+        """
+        Build the frames telling the client which credit sending is blocked at.
+
+        Returns:
+            list: A Packets.QUICDataBlocked frame if the connection is out of credit, and a
+                Packets.QUICStreamDataBlocked frame for every stream that is.
+        """
+        frames = []
+        if self.data_blocked and len(self.scheduler) > 0:
+            frames.append(Packets.QUICDataBlocked(self.max_data))
+        for stream in self.blocked_streams.values():
+            frames.append(Packets.QUICStreamDataBlocked(stream['id'], stream['maxData']))
+        return frames
+
+    def next_frames(self, now):
+        """
+        Take the frames for the next packet, lost data first.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            list: Frames to send, or None if nothing is waiting.
+        """
+        if self.retransmissions:
+            frames, rest = self.fit_frames(self.retransmissions.popleft())
+            if rest:
+                self.retransmissions.appendleft(rest)
+            self.metrics.on_retransmitted(frames)
+            return frames
+        return self.build_frames(now)
+
+    def window_open(self):
+        """
+        Check whether the send window and the congestion window both allow another packet.
+
+        Returns:
+            bool: True if another packet may be put in flight.
+        """
+        return len(self.recovery.sent_packets) < self.window and self.congestion.can_send(self.recovery.bytes_in_flight)
+
+    def on_packets_lost(self, lost, now):
+        """
+        Queue the frames of lost packets for retransmission and tell the congestion controller.
+
+        Args:
+            lost (list): Recovery.SentPackets declared lost.
+            now (float): Current monotonic time.
+        """
+        self.metrics.on_packets_lost(len(lost))
+        for sent_packet in lost:
+            if self.tracer is not None:
+                self.tracer.record(now, 'recovery:packet_lost', self.dest_cid,
+                                   {'header': {'packet_type': '1RTT', 'packet_number': sent_packet.packet_number}})
+            if self.pmtu is not None:
+                self.pmtu.on_packet_lost(sent_packet.packet_number, sent_packet.size)
+            if sent_packet.frames:
+                self.retransmissions.append(sent_packet.frames)
+        # Lost probes say the path is too small for them, not that it is congested
+        self.congestion.on_packets_lost([sent_packet for sent_packet in lost if sent_packet.frames], now)
+
+    def send_pending(self, now):
+        """
+        Send packets while both windows are open and the pacer allows it.
+
+        Closes the connection once every stream of a served request is
+        finished and acknowledged, unless the client keeps it open for more
+        requests.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        self.pace_until = None
+        while self.window_open() and self.has_data():
+            if self.pacer is not None:
+                pace_until = self.pacer.next_send_time(now)
+                if pace_until > now:
+                    self.pace_until = pace_until
+                    break
+            probe_size = None if self.pmtu is None else self.pmtu.next_probe(now)
+            if probe_size is not None:
+                self.send_probe(probe_size, now)
+                continue
+            frames = self.next_frames(now)
+            if frames is None:
+                break  # Only the credit was left to check
+            self.send_frames(frames, now)
+
+        # Out of credit with nothing in flight: say so, and again every PTO, in case the client's window updates were lost
+        if self.is_blocked() and not self.recovery.sent_packets and not self.has_data():
+            if self.blocked_signal_at is None or now >= self.blocked_signal_at:
+                self.send_frames(self.fit_frames(self.blocked_frames())[0], now)
+                self.blocked_signal_at = now + self.recovery.rtt.pto()
+
+        if not self.request_received or self.closed or self.recovery.sent_packets or self.retransmissions or self.unfinished:
+            return
+        if not self.keep_alive or (self.stream_limit is not None and self.opened.contiguous_end(0) >= self.stream_limit):
+            logger.info("Served %d streams to %s", self.opened.contiguous_end(0), self.address)
+            self.close()
+
+    def get_timer(self):
+        """
+        Return when the connection next needs attention without a datagram arriving.
+
+        Returns:
+            float: Earliest of the loss detection timer, the pacer, the blocked signal and the idle deadline, or None.
+        """
+        if self.closed:
+            return None
+        if not self.request_received:
+            return self.last_activity + idleTimeout  # A handshake that never leads to a request is dropped
+        if not self.recovery.sent_packets:
+            # Nothing in flight: wait for the application, or the client's credit, for as long as it takes
+            deadlines = [t for t in (self.pace_until, self.blocked_signal_at if self.is_blocked() else None) if t is not None]
+            if self.keep_alive and not self.unfinished:
+                deadlines.append(self.last_activity + keepAliveTimeout)  # Every request answered: wait for the next one
+            return min(deadlines) if deadlines else None
+        deadlines = [self.last_activity + idleTimeout, self.recovery.get_timer()]
+        if self.pace_until is not None:
+            deadlines.append(self.pace_until)
+        return min(deadlines)
+
+    def handle_timer(self, now):
+        """
+        Handle an expired timer: give up on a silent client, detect losses or send a probe.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        if not self.request_received:
+            if now - self.last_activity >= idleTimeout:
+                logger.warning("No request from %s, giving up", self.address)
+                self.close()
+            return
+        if self.keep_alive and not self.recovery.sent_packets and not self.unfinished and now - self.last_activity >= keepAliveTimeout:
+            logger.info("No new request from %s, closing the connection", self.address)
+            self.close()
+            return
+        if self.recovery.sent_packets and now - self.last_activity > idleTimeout:
+            logger.warning("%s stopped acknowledging, giving up", self.address)
+            self.close()
+            return
+        timer = self.recovery.get_timer()
+        if timer is None or timer > now:
+            return  # Only the pacer was due; send_pending takes care of it
+        lost, probe = self.recovery.on_timeout(now)
+        self.on_packets_lost(lost, now)
+        if probe:
+            if self.pmtu is not None:
+                self.pmtu.on_probe_timeout(self.recovery.pto_count)  # Nothing getting through may mean the packets are too large
+            # Send one packet even though the window is full so the client answers with an ACK
+            frames = self.next_frames(now)
+            if frames is None:
+                frames = self.fit_frames(next(iter(self.recovery.sent_packets.values())).frames)[0]
+            self.send_frames(frames, now)
+
+class QUICClientConnection:
+    def __init__(self, dest_cid, address, send, on_stream_data=None, stream_window=initialStreamWindow,
+                 connection_window=initialConnectionWindow, token=None, persistent=False, tracer=None):
+        """
+        Initialize the client side of a connection.
+
+        Like QUICConnection it does no I/O of its own: it is handed decoded
+        datagrams and sends through the send callable.
+
+        The server may only send a stream's data up to the window beyond
+        what the application has consumed (see consume()), and all streams
+        together up to the connection window. Windows are advertised with the
+        request and updated with MAX_STREAM_DATA and MAX_DATA frames once half
+        a window has been consumed; a window the application consumes in
+        fewer than windowTuneRtts round trips is doubled, up to
+        maxStreamWindow or maxConnectionWindow.
+
+        Args:
+            dest_cid (str): Connection ID the client opens the connection with, on every Client Hello.
+            address (tuple): Server address.
+            send (callable): Called with (buffers, address) to send one datagram gathered from a list of buffers.
+            on_stream_data (callable, optional): Called with (stream_id, data, finished) as each stream's
+                data becomes available in order; finished is True with the last piece. data is a memoryview
+                valid only during the call. Streams kept in memory are not retained once handed over.
+                With it the application reports consumed data through consume(); without it data
+                counts as consumed once delivered.
+            stream_window (int): Initial receive window of each stream, in bytes.
+            connection_window (int): Initial receive window of the connection, in bytes; raised to
+                cover every stream's window, so a stream left unread never holds back another.
+            token (bytes, optional): Resumption token from an earlier connection to the same server. With it
+                the request may be sent right after the Client Hello, without waiting for the Server Hello
+                (0-RTT); if the server refuses the token, the request is sent again once the Server Hello arrives.
+            persistent (bool): Whether to keep the connection open for more requests, see request() and close().
+                Without it the server closes the connection once the first request is answered.
+            tracer (Trace.Tracer, optional): Records packets received, ACKs sent, RTT samples and stream state changes,
+                with dest_cid as group. Without it nothing is recorded.
+        """
+        self.dest_cid = dest_cid
+        self.src_cid = None  # Connection ID the server issued in the Server Hello; later packets to the server carry it
+        self.address = address
+        self.send = self.counted(send)
+        self.on_stream_data = on_stream_data
+        self.stream_window = stream_window
+        self.connection_window = connection_window
+        self.max_data = 0  # Connection credit advertised to the server
+        self.consumed = 0  # Bytes of all streams the application has consumed
+        self.window_updated_at = None  # When the connection credit was last raised
+        self.rtt = Recovery.RttEstimator()  # Round trip from the Client Hello and the request to their first answers
+        self.hello_sent_at = None
+        self.acks = Recovery.AckTracker()  # Received packet numbers and when to acknowledge them
+        self.next_packet_number = 2  # Window updates follow the request, which is packet 1
+        self.packets_received = 0  # Data packets received from the server, duplicates included
+        self.streams = []  # List to store requested streams
+        self.stream_index = {}  # Stream ID -> entry of self.streams
+        self.incomplete = {}  # Stream ID -> entry of self.streams, for streams still being received
+        self.next_stream_id = 0  # Streams are numbered by the client, in the order they are requested
+        self.timeTaken = []  # Seconds from the request until each stream completed, indexed by stream ID
+        self.token = token  # Token presented in the Client Hello; replaced by the one the Server Hello issues
+        self.early_data = bool(token)  # Whether the request may go out before the Server Hello arrives
+        flags = Packets.LONG_HEADER_FLAG | (Packets.EARLY_DATA_FLAG if self.early_data else 0)
+        self.hello = Packets.QUICLongHeader(flags, dest_cid, '', 1, token or b'').encode()  # Client Hello
+        self.request_frames = None
+        self.request_packet = None
+        self.request_sent_at = None  # When the request last went out, for an RTT sample from its first answer
+        self.persistent = persistent
+        self.pending_requests = []  # Requests after the first that the server has not answered yet
+        self.unanswered = {}  # Stream ID -> entry of self.pending_requests that opened it
+        self.closing = False  # Whether the server was told no more requests follow
+        self.connected = False
+        self.complete = False
+        self.error = None  # Why the connection failed, if it did
+        self.attempts = 0
+        self.retransmit_timeout = handshakeTimeout
+        self.retransmit_at = None  # When the Client Hello or request is sent again
+        self.start_time = None
+        self.last_activity = None
+        self.remaining = 0
+        self.timer = None  # Deadline the owning protocol last scheduled for this connection
+        self.tracer = tracer
+        self.metrics = Metrics.ConnectionMetrics()  # Packets, bytes, RTT and goodput, readable while the connection runs
+
+    def connect(self, now):
+        """
+        Send the Client Hello.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        self.send([self.hello], self.address)  # Send the QUIC long header packet
+        logger.debug("Sent Client Hello to %s", self.address)
+        self.hello_sent_at = now
+        self.attempts = 1
+        self.retransmit_at = now + self.retransmit_timeout
+
+    def request(self, stream_number, now, names=None, outputs=None):
+        """
+        Request data on a number of streams.
+
+        Before the Server Hello this is only allowed with a resumption
+        token: the request then travels in the same flight as the Client
+        Hello, addressed with its connection ID.
+
+        A persistent connection takes any number of requests, each opening
+        new streams numbered on from the last request's, and they are
+        served side by side. A request after the first goes out in a packet
+        of its own and is sent again, with a doubling timeout, until data
+        arrives on one of its streams.
+
+        Args:
+            stream_number (int): Number of streams to request.
+            now (float): Current monotonic time.
+            names (list, optional): What to fetch on each stream, e.g. a file path or object key.
+                Streams without a name get the placeholder Request<id>, answered with random data.
+            outputs (list, optional): File to write each stream into, or None to keep it in memory.
+
+        Returns:
+            list: IDs of the requested streams.
+        """
+        names = list(names or [])
+        outputs = list(outputs or [])
+        if len(names) > stream_number or len(outputs) > stream_number:
+            raise ValueError("More names than requested streams")
+        first = self.request_packet is None
+        if not first and not self.persistent:
+            raise RuntimeError("Only a persistent connection takes more than one request")
+        if self.closing:
+            raise RuntimeError("Connection is closing and takes no more requests")
+        if self.src_cid is None and not (first and self.early_data):
+            raise RuntimeError("Cannot send a request before the Server Hello without a resumption token")
+        # Simulate initiating file transfers through multiple streams
+        offset = 0
+        frames = []
+        stream_ids = list(range(self.next_stream_id, self.next_stream_id + stream_number))
+        self.next_stream_id += stream_number
+        for index, stream_id in enumerate(stream_ids):
+            name = names[index] if index < len(names) else f"Request{stream_id}"  # Placeholder request
+            file_data = name.encode('utf-8')
+            frame = Packets.QUICStreamPayload(stream_id, offset + len(file_data), len(file_data), 0, file_data)
+            frames.append(frame)
+            output = outputs[index] if index < len(outputs) else None
+            reassembler = Reassembly.StreamReassembler(stream_id, self.on_stream_data, output, retain=self.on_stream_data is None)
+            stream = {'id': stream_id, 'chunkSize': None, 'packetReceived': 0, 'size': None, 'complete': False,
+                      'reassembler': reassembler, 'consumed': 0, 'window': self.stream_window, 'maxData': self.stream_window,
+                      'windowUpdatedAt': None, 'requestedAt': now}
+            self.streams.append(stream)
+            self.stream_index[stream_id] = stream
+            self.incomplete[stream_id] = stream
+            self.metrics.open_stream(stream_id, now)
+            frames.append(Packets.QUICMaxStreamData(stream_id, stream['maxData']))
+            if self.tracer is not None:
+                self.tracer.record(now, 'transport:stream_state_updated', self.dest_cid,
+                                   {'stream_id': stream_id, 'stream_side': 'receiving', 'new': 'open'})
+        self.connection_window = max(self.connection_window, len(self.incomplete) * self.stream_window)
+        self.max_data = max(self.max_data, self.consumed + self.connection_window)
+        frames.append(Packets.QUICMaxData(self.max_data))
+        if self.persistent:
+            frames.append(Packets.QUICKeepAlive())
+        self.timeTaken.extend([0.0] * stream_number)
+        self.remaining += stream_number
+        self.complete = self.remaining == 0
+        self.last_activity = now
+        if not first:
+            if stream_ids:
+                self.send_request(frames, stream_ids, now)
+            return stream_ids
+
+        # Send packet
+        self.request_frames = frames
+        self.request_packet = self.encode_request()
+        logger.debug("Sending request for %d streams to %s", stream_number, self.address)
+        self.send([self.request_packet], self.address)
+        self.start_time = now
+        self.request_sent_at = now
+        if self.src_cid is not None:
+            self.attempts = 1
+            self.retransmit_timeout = idleTimeout
+            self.retransmit_at = now + self.retransmit_timeout
+        # Otherwise the Client Hello timer sends the request again with the hello
+        return stream_ids
+
+    def send_request(self, frames, stream_ids, now):
+        """
+        Send a request after the first in a new packet, and keep it for retransmission until it is answered.
+
+        Args:
+            frames (list): Frames of the request.
+            stream_ids (list): Streams it opens.
+            now (float): Current monotonic time.
+        """
+        request = {'packet': self.new_packet(frames).encode(), 'streams': stream_ids, 'sentAt': now, 'attempts': 1,
+                   'timeout': self.rtt.pto()}
+        request['retransmitAt'] = now + request['timeout']
+        self.pending_requests.append(request)
+        for stream_id in stream_ids:
+            self.unanswered[stream_id] = request
+        logger.debug("Sending request for %d streams to %s", len(stream_ids), self.address)
+        self.send([request['packet']], self.address)
+
+    def request_answered(self, stream_id, now):
+        """
+        Stop sending a request again once data arrives on one of its streams.
+
+        Args:
+            stream_id (int): Stream data arrived on.
+            now (float): Current monotonic time.
+        """
+        request = self.unanswered.get(stream_id)
+        if request is None:
+            return
+        if request['attempts'] == 1:
+            self.update_rtt(now - request['sentAt'], now)  # Only an unambiguous round trip is a sample
+        for answered in request['streams']:
+            self.unanswered.pop(answered, None)
+        self.pending_requests.remove(request)
+
+    def close(self, now):
+        """
+        Tell the server of a persistent connection that no more requests follow.
+
+        The server closes the connection once the streams already requested
+        are answered. The GO_AWAY frame is sent once; should it be lost, the
+        server closes the connection after keepAliveTimeout instead.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        if not self.persistent or self.closing or self.src_cid is None or self.error is not None:
+            return
+        self.closing = True
+        self.send(self.new_packet([Packets.QUICGoAway(self.next_stream_id)]).encode_buffers(), self.address)
+
+    def encode_request(self):
+        """
+        Encode the request packet, addressed with the connection ID from the Server Hello once it has arrived.
+
+        Returns:
+            bytes: The encoded request.
+        """
+        return Packets.QUICPacket(0, self.src_cid or self.dest_cid, 1, self.request_frames).encode()
+
+    def counted(self, send):
+        """
+        Wrap the send callable so every datagram is counted in the metrics.
+
+        Args:
+            send (callable): Called with (buffers, address) to send one datagram.
+
+        Returns:
+            callable: The same, counting first.
+        """
+        def send_counted(buffers, address):
+            self.metrics.on_packet_sent(sum(len(buffer) for buffer in buffers))
+            send(buffers, address)
+        return send_counted
+
+    def datagram_received(self, datagram, now, size=None):
+        """
+        Process one decoded datagram from the server.
+
+        Args:
+            datagram (object): Decoded QUICLongHeader or QUICPacket.
+            now (float): Current monotonic time.
+            size (int, optional): Bytes the datagram took on the wire. Defaults to its encoded size.
+        """
+        self.metrics.on_packet_received(datagram.encoded_size() if size is None else size)
+        if isinstance(datagram, Packets.QUICLongHeader):
+            if datagram.token:
+                self.token = datagram.token  # For the next connection to this server
+            if not self.connected:
+                self.src_cid = datagram.dest_cid  # Set the source connection ID
+                self.connected = True
+                self.retransmit_at = None
+                if self.attempts == 1:
+                    self.update_rtt(now - self.hello_sent_at, now)  # Only an unambiguous round trip is a sample
+                logger.debug("Received Server Hello from %s", self.address)
+                if self.request_packet is not None:
+                    self.early_request_answered(datagram.flags & Packets.EARLY_DATA_FLAG, now)
+        elif isinstance(datagram, Packets.QUICPacket) and self.request_packet is not None:
+            if isinstance(datagram, Packets.QUICShortHeaderPacket):
+                datagram.expand_packet_number(self.acks.largest)
+            if not self.connected:
+                # The early request was served but the Server Hello was lost; the data names the connection ID too
+                self.src_cid = datagram.dest_conn_id
+                self.connected = True
+                self.request_packet = self.encode_request()
+            if self.retransmit_at is not None and self.attempts == 1:
+                self.update_rtt(now - self.request_sent_at, now)
+            self.last_activity = now
+            self.retransmit_at = None  # The request got through
+            self.handle_packet(datagram, now)
+
+    def update_rtt(self, latest_rtt, now):
+        """
+        Take an RTT sample, and record the new estimates in the tracer.
+
+        Args:
+            latest_rtt (float): Seconds from a packet being sent to its first answer.
+            now (float): Current monotonic time.
+        """
+        self.rtt.update(latest_rtt)
+        self.metrics.on_rtt_sample(latest_rtt)
+        if self.tracer is not None:
+            self.tracer.record(now, 'recovery:metrics_updated', self.dest_cid,
+                               {'smoothed_rtt': self.rtt.smoothed_rtt * 1e3, 'latest_rtt': latest_rtt * 1e3,
+                                'min_rtt': self.rtt.min_rtt * 1e3, 'rtt_variance': self.rtt.rttvar * 1e3})
+
+    def early_request_answered(self, accepted, now):
+        """
+        Follow up on a request sent with the Client Hello once the Server Hello says what became of it.
+
+        Args:
+            accepted (bool): Whether the server accepted the token, and with it the request.
+            now (float): Current monotonic time.
+        """
+        self.request_packet = self.encode_request()  # Retransmissions go to the issued connection ID
+        self.attempts = 1
+        self.retransmit_timeout = idleTimeout
+        self.retransmit_at = now + self.retransmit_timeout
+        if not accepted:
+            logger.info("Server refused early data, sending the request again")
+            self.send([self.request_packet], self.address)
+            self.request_sent_at = now
+
+    def handle_packet(self, packet, now):
+        """
+        Acknowledge a data packet and take in its stream frames.
+
+        ACKs are held back until enough packets have arrived or the ACK
+        delay runs out, see Recovery.AckTracker, unless the packet came out
+        of order or finished the last stream. Each frame is
+        written at its offset into the stream's buffer, see
+        Reassembly.StreamReassembler; retransmitted bytes are counted once,
+        and a stream is complete once its final frame has been seen and all
+        of its bytes have arrived.
+
+        Args:
+            packet (Packets.QUICPacket): The data packet.
+            now (float): Current monotonic time.
+        """
+        ack_now = self.acks.on_packet_received(packet.packet_number, now)
+        self.packets_received += 1
+        if self.tracer is not None:
+            self.tracer.record(now, 'transport:packet_received', self.dest_cid,
+                               {'header': {'packet_type': '1RTT', 'packet_number': packet.packet_number},
+                                'frames': [Trace.frame_summary(frame) for frame in packet.protected_payload]})
+        blocked = False
+        for frame in packet.protected_payload:
+            if not isinstance(frame, Packets.QUICStreamPayload):
+                if isinstance(frame, Packets.QUICAckFrequency):
+                    self.acks.on_ack_frequency(frame)
+                blocked = blocked or isinstance(frame, (Packets.QUICDataBlocked, Packets.QUICStreamDataBlocked))
+                continue  # Otherwise padding of a path MTU probe
+            stream = self.stream_index.get(frame.stream_id)
+            if stream is None:
+                logger.debug("Ignoring frame for unrequested stream %d", frame.stream_id)
+                continue
+            if stream['complete']:
+                continue
+            if self.unanswered:
+                self.request_answered(frame.stream_id, now)
+            start = frame.offset - frame.length  # Frames carry the offset just past their data
+            if stream['chunkSize'] is None and frame.length:
+                stream['chunkSize'] = frame.length
+            try:
+                received = stream['reassembler'].receive(start, frame.stream_data, frame.offset if frame.finished == 1 else None)
+            except ValueError as e:
+                logger.warning("Invalid frame received: %s", e)
+                continue
+            stream['packetReceived'] += received
+            self.metrics.on_stream_received(frame.stream_id, received, frame.length - received, now)
+            if frame.finished == 1:
+                stream['size'] = frame.offset  # The final frame's offset is the total stream size
+            if stream['reassembler'].finished:
+                self.finish_stream(stream, now)
+            if self.on_stream_data is None:
+                self.consume(stream['id'], stream['reassembler'].delivered - stream['consumed'], now)  # Kept data is consumed data
+        if ack_now or self.complete:
+            self.send_ack(now)
+        if blocked:
+            self.send_window_update(now, resend=True)  # The server is waiting; an earlier update may have been lost
+
+    def send_ack(self, now):
+        """
+        Acknowledge the packets received so far.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        ack = Packets.QUICAck(self.acks.largest, self.acks.ack_delay(now), self.src_cid, self.acks.ranges())
+        self.acks.on_ack_sent()
+        self.send([ack.encode()], self.address)
+        if self.tracer is not None:
+            self.tracer.record(now, 'transport:packet_sent', self.dest_cid, {'header': {'packet_type': '1RTT'}, 'frames': [Trace.ack_summary(ack)]})
+
+    def consume(self, stream_id, count, now):
+        """
+        Record that the application has taken data of a stream, and grant the server more credit if it is due.
+
+        Args:
+            stream_id (int): Stream the data was read from.
+            count (int): Bytes consumed since the last call.
+            now (float): Current monotonic time.
+        """
+        if count <= 0:
+            return
+        self.stream_index[stream_id]['consumed'] += count
+        self.consumed += count
+        self.send_window_update(now)
+
+    def tune_window(self, window, updated_at, maximum, now):
+        """
+        Return a receive window, doubled if the application consumed its last update in under windowTuneRtts round trips.
+
+        A window the reader outruns that fast caps the transfer at a
+        window per round trip; one it does not is left as it is.
+
+        Args:
+            window (int): Current window size.
+            updated_at (float): When credit was last granted with this window, or None.
+            maximum (int): Largest the window may grow to.
+            now (float): Current monotonic time.
+
+        Returns:
+            int: The new window size.
+        """
+        if updated_at is not None and now - updated_at < windowTuneRtts * self.rtt.smoothed_rtt:
+            return min(2 * window, maximum)
+        return window
+
+    def send_window_update(self, now, resend=False):
+        """
+        Send MAX_STREAM_DATA and MAX_DATA frames for the windows that are half used up.
+
+        Args:
+            now (float): Current monotonic time.
+            resend (bool): Whether to also repeat the current credit of every unfinished stream and the connection.
+        """
+        frames = []
+        for stream in self.incomplete.values():
+            if stream['maxData'] - stream['consumed'] <= stream['window'] // 2:
+                stream['window'] = self.tune_window(stream['window'], stream['windowUpdatedAt'], maxStreamWindow, now)
+                self.connection_window = max(self.connection_window, min(stream['window'] * 3 // 2, maxConnectionWindow))
+                stream['maxData'] = stream['consumed'] + stream['window']
+                stream['windowUpdatedAt'] = now
+            elif not resend:
+                continue
+            frames.append(Packets.QUICMaxStreamData(stream['id'], stream['maxData']))
+        if self.max_data - self.consumed <= self.connection_window // 2:
+            self.connection_window = self.tune_window(self.connection_window, self.window_updated_at, maxConnectionWindow, now)
+            self.max_data = self.consumed + self.connection_window
+            self.window_updated_at = now
+            frames.append(Packets.QUICMaxData(self.max_data))
+        elif resend:
+            frames.append(Packets.QUICMaxData(self.max_data))
+        if not frames or self.complete:
+            return
+        self.send(self.new_packet(frames).encode_buffers(), self.address)
+
+    def new_packet(self, frames):
+        """
+        Build the next packet to the server around frames, with a short header if the connection ID allows one.
+
+        Args:
+            frames (list): Frames to put in the packet.
+
+        Returns:
+            Packets.QUICPacket: The packet; not yet sent.
+        """
+        if len(self.src_cid) == 2 * Packets.SHORT_CID_LENGTH:
+            # The server acknowledges nothing, so the packet number is sized from zero
+            packet = Packets.QUICShortHeaderPacket(self.src_cid, self.next_packet_number, frames)
+        else:
+            packet = Packets.QUICPacket(0, self.src_cid, self.next_packet_number, frames)
+        self.next_packet_number += 1
+        return packet
+
+    def finish_stream(self, stream, now):
+        """
+        Mark a stream complete once all of it has been delivered.
+
+        Args:
+            stream (dict): Entry of self.streams.
+            now (float): Current monotonic time.
+        """
+        stream['complete'] = True
+        stream['reassembler'].close()
+        del self.incomplete[stream['id']]
+        self.timeTaken[stream['id']] = now - stream['requestedAt']
+        self.metrics.close_stream(stream['id'], now)
+        self.remaining -= 1
+        if self.tracer is not None:
+            self.tracer.record(now, 'transport:stream_state_updated', self.dest_cid,
+                               {'stream_id': stream['id'], 'stream_side': 'receiving', 'new': 'data_received'})
+        if self.remaining == 0:
+            self.complete = True
+            logger.info("All streams received from %s", self.address)
+
+    def get_timer(self):
+        """
+        Return when the connection next needs attention without a datagram arriving.
+
+        Returns:
+            float: Earliest of the retransmission, delayed ACK and idle deadlines, or None.
+        """
+        if self.error is not None or self.complete:
+            return None
+        deadlines = [t for t in (self.retransmit_at, self.acks.ack_at) if t is not None]
+        deadlines.extend(request['retransmitAt'] for request in self.pending_requests)
+        if self.request_packet is not None:
+            deadlines.append(self.last_activity + idleTimeout)
+        return min(deadlines) if deadlines else None
+
+    def handle_timer(self, now):
+        """
+        Send a delayed ACK, send the Client Hello or a request again, or give up.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        if self.acks.ack_at is not None and now >= self.acks.ack_at:
+            self.send_ack(now)
+        for request in self.pending_requests:
+            if now < request['retransmitAt']:
+                continue
+            if request['attempts'] >= maxAttempts:
+                self.error = "Server did not answer a request, giving up."
+                return
+            request['attempts'] += 1
+            request['timeout'] *= 2
+            request['retransmitAt'] = now + request['timeout']
+            self.send([request['packet']], self.address)
+            self.metrics.on_retransmitted()
+        if self.retransmit_at is not None and now >= self.retransmit_at:
+            if self.attempts >= maxAttempts:
+                self.error = "No Server Hello received." if not self.connected else "Server stopped sending, giving up."
+                return
+            self.attempts += 1
+            self.metrics.on_retransmitted()
+            if not self.connected:
+                # Double the timeout each time the Server Hello does not arrive
+                self.retransmit_timeout *= 2
+                self.send([self.hello], self.address)
+                logger.debug("Sent Client Hello to %s again", self.address)
+                if self.request_packet is not None:
+                    self.send([self.request_packet], self.address)  # The early request was probably lost with it
+            else:
+                # Nothing arrived yet, the request itself was probably lost
+                self.send([self.request_packet], self.address)
+            self.retransmit_at = now + self.retransmit_timeout
+        elif self.request_packet is not None and now - self.last_activity >= idleTimeout:
+            self.error = "Server stopped sending, giving up."
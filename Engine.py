@@ -0,0 +1,859 @@
+import asyncio  # Importing the asyncio module for the event loop and datagram endpoints
+import logging  # Importing the logging module for reporting undecodable datagrams
+import os  # Importing the os module for the paths of worker handoff sockets
+import socket  # Importing the socket module for the Unix sockets between server workers
+import struct  # Importing the struct module for the handoff message header
+from collections import deque  # Importing deque for the queue of datagrams waiting to be sent
+from typing import Final  # Importing Final from typing for defining constants
+import Packets  # Importing the Packets module which contains various QUIC-related classes
+import Metrics  # Importing the Metrics module for endpoint totals and their Prometheus export
+from Connection import QUICConnection, QUICClientConnection, defaultWindow, maxUdpPayload, initialStreamWindow, initialConnectionWindow  # Importing the sans-IO connection state machines
+
+# Defining constants
+writeHighWater: Final = 64 * 1024  # Unsent bytes per stream above which drain() waits
+readBatch: Final = 64  # Most datagrams read per wakeup before other callbacks get a turn
+handoffHeader: Final = struct.Struct('!4sH')  # Client IPv4 address and port in front of a handed-off datagram
+logger = logging.getLogger(__name__)
+
+class QUICProtocol(asyncio.DatagramProtocol):
+    def __init__(self, quic_socket):
+        """
+        Initialize the parts shared by the client and server protocols.
+
+        Datagrams are sent through the QUICSocket the endpoint was created
+        on, so wrappers that replace its sendto (for example to drop packets
+        in tests) keep working under the event loop.
+
+        Args:
+            quic_socket (Packets.QUICSocket): Socket the endpoint runs on.
+        """
+        self.quic_socket = quic_socket
+        self.loop = asyncio.get_running_loop()
+        self.transport = None  # Only used on loops without add_reader
+        self.open = False
+        self.send_queue = deque()  # (datagram, address) pairs waiting for the socket to become writable
+        self.batch = []  # (buffers, address) pairs collected for one GSO send at the end of this loop iteration
+        self.timer_handles = {}  # Connection -> asyncio.TimerHandle of its pending timer
+
+    async def start(self):
+        """
+        Start receiving on the socket.
+
+        Datagrams are read with QUICSocket.recvfrom_pooled() from a loop
+        reader, so they land in a few reused buffers instead of a new bytes
+        object each. Loops without add_reader get a datagram endpoint instead.
+        """
+        sock = self.quic_socket.get_sockfd()
+        sock.setblocking(False)
+        try:
+            self.loop.add_reader(sock, self.read_ready)
+        except NotImplementedError:
+            await self.loop.create_datagram_endpoint(lambda: self, sock=sock)
+        self.open = True
+
+    def connection_made(self, transport):
+        """
+        Keep the transport the event loop created for the socket.
+
+        Args:
+            transport (asyncio.DatagramTransport): The endpoint's transport.
+        """
+        self.transport = transport
+
+    def read_ready(self):
+        """
+        Receive waiting datagrams into pooled buffers and process each one before its buffer is reused.
+        """
+        for _ in range(readBatch):
+            try:
+                view, address, segment_size = self.quic_socket.recvfrom_segments()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.error_received(e)
+                return
+            try:
+                if not view:
+                    self.datagram_received(view, address)  # Empty datagram; rejected by the decoder
+                    continue
+                # With GRO one read may hold several datagrams back to back
+                for start in range(0, len(view), segment_size):
+                    self.datagram_received(view[start:start + segment_size], address)
+            finally:
+                self.quic_socket.release(view)
+
+    def send(self, buffers, address):
+        """
+        Send a datagram gathered from buffers, queueing it if the socket buffer is full.
+
+        On a socket with GSO on, datagrams are collected and sent together
+        by send_batch() once the current callbacks have run.
+
+        Args:
+            buffers (list): Bytes-like objects whose concatenation is the datagram.
+            address (tuple): Address to send it to.
+        """
+        if self.quic_socket.gso and self.transport is None:
+            if not self.batch:
+                self.loop.call_soon(self.send_batch)
+            self.batch.append((buffers, address))
+            return
+        if not self.send_queue:
+            try:
+                self.quic_socket.sendmsg(buffers, address)
+                return
+            except BlockingIOError:
+                pass
+        if self.transport is not None:
+            self.transport.sendto(b''.join(buffers), address)
+            return
+        if not self.send_queue:
+            self.loop.add_writer(self.quic_socket.get_sockfd(), self.write_ready)
+        self.send_queue.append((b''.join(buffers), address))
+
+    def send_batch(self):
+        """
+        Send the collected datagrams with QUICSocket.sendmsg_batch(), queueing what does not fit in the socket buffer.
+        """
+        batch, self.batch = self.batch, []
+        if not self.open:
+            return
+        sent = 0 if self.send_queue else self.quic_socket.sendmsg_batch(batch)
+        if sent == len(batch):
+            return
+        if not self.send_queue:
+            self.loop.add_writer(self.quic_socket.get_sockfd(), self.write_ready)
+        self.send_queue.extend((b''.join(buffers), address) for buffers, address in batch[sent:])
+
+    def write_ready(self):
+        """
+        Send queued datagrams until the socket buffer fills up again.
+        """
+        while self.send_queue:
+            data, address = self.send_queue[0]
+            try:
+                self.quic_socket.sendto(data, address)
+            except BlockingIOError:
+                return
+            self.send_queue.popleft()
+        self.loop.remove_writer(self.quic_socket.get_sockfd())
+
+    def schedule(self, connection):
+        """
+        Arm the loop timer for a connection's next deadline, replacing the previous one.
+
+        Args:
+            connection (QUICConnection | QUICClientConnection): Connection whose state just changed.
+        """
+        deadline = connection.get_timer() if self.open else None
+        if deadline == connection.timer:
+            return
+        handle = self.timer_handles.pop(connection, None)
+        if handle is not None:
+            handle.cancel()
+        connection.timer = deadline
+        if deadline is not None:
+            self.timer_handles[connection] = self.loop.call_at(deadline, self.timer_fired, connection, deadline)
+
+    def timer_fired(self, connection, deadline):
+        """
+        Run a connection's timer and arm the next one.
+
+        Args:
+            connection (QUICConnection | QUICClientConnection): Connection whose timer expired.
+            deadline (float): Deadline the timer was armed for.
+        """
+        self.timer_handles.pop(connection, None)
+        connection.timer = None
+        # The loop may run a timer up to one clock tick early; the connection must see it as due
+        connection.handle_timer(max(self.loop.time(), deadline))
+        self.flush(connection)
+
+    def flush(self, connection):
+        """
+        Send what the connection has ready and re-arm its timer.
+
+        Args:
+            connection (QUICConnection | QUICClientConnection): Connection to service.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Cancel every timer and stop reading and writing the socket.
+
+        The socket itself belongs to the caller and stays open.
+        """
+        for handle in self.timer_handles.values():
+            handle.cancel()
+        self.timer_handles.clear()
+        if not self.open:
+            return
+        if self.batch:
+            self.send_batch()  # Last ACKs of a finished transfer must still go out
+        self.open = False
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+            return
+        sock = self.quic_socket.get_sockfd()
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        self.send_queue.clear()
+        self.batch.clear()
+
+class WorkerHandoff:
+    def __init__(self, directory, worker):
+        """
+        Initialize the Unix datagram socket a server worker receives misrouted datagrams on.
+
+        Workers sharing a port with SO_REUSEPORT each bind one socket in a
+        common directory. A worker that receives a datagram whose connection
+        ID names another worker sends it there, prefixed by the client
+        address, so the owner answers it as if it had arrived directly.
+
+        Args:
+            directory (str): Directory holding one socket per worker.
+            worker (int): Index of this worker.
+        """
+        self.directory = directory
+        self.worker = worker
+        self.sock = None
+        self.forwarded = 0  # Datagrams handed to other workers
+        self.received = 0  # Datagrams other workers handed to us
+
+    def path(self, worker):
+        """
+        Return the path of a worker's handoff socket.
+
+        Args:
+            worker (int): Worker index.
+
+        Returns:
+            str: Socket path.
+        """
+        return os.path.join(self.directory, f"worker-{worker}.sock")
+
+    def open(self):
+        """
+        Bind this worker's handoff socket.
+
+        Returns:
+            socket.socket: The non-blocking socket.
+        """
+        path = self.path(self.worker)
+        if os.path.exists(path):
+            os.unlink(path)  # Left behind by a worker that did not shut down cleanly
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        self.sock.setblocking(False)
+        return self.sock
+
+    def forward(self, worker, data, address):
+        """
+        Hand a datagram to the worker that owns its connection.
+
+        The datagram is dropped if that worker is gone or its socket is
+        full; the client's retransmissions recover it like any loss.
+
+        Args:
+            worker (int): Worker that owns the connection.
+            data (bytes | memoryview): The datagram.
+            address (tuple): Client address it came from.
+        """
+        header = handoffHeader.pack(socket.inet_aton(address[0]), address[1])
+        try:
+            self.sock.sendmsg([header, data], (), 0, self.path(worker))
+            self.forwarded += 1
+        except OSError:
+            pass
+
+    def receive_into(self, buffer):
+        """
+        Receive a handed-off datagram into a buffer.
+
+        Args:
+            buffer (bytearray): Buffer to receive into.
+
+        Returns:
+            tuple: memoryview of the datagram inside buffer and the client address.
+
+        Raises:
+            BlockingIOError: If nothing is waiting.
+        """
+        nbytes = self.sock.recv_into(buffer)
+        host, port = handoffHeader.unpack_from(buffer)
+        self.received += 1
+        return memoryview(buffer)[handoffHeader.size:nbytes], (socket.inet_ntoa(host), port)
+
+    def close(self):
+        """
+        Close and remove this worker's handoff socket.
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path(self.worker))
+            except FileNotFoundError:
+                pass
+
+class QUICServerProtocol(QUICProtocol):
+    def __init__(self, quic_socket, handler=None, window=defaultWindow, congestion_control='newreno', pacing=True, worker=0, handoff=None, cache=None,
+                 scheduler='round-robin', max_datagram_size=maxUdpPayload, pmtud=True, tokens=None, tracer=None):
+        """
+        Initialize the server side of the engine.
+
+        Every datagram is routed by its destination connection ID to the
+        QUICConnection of that client; retransmission, pacing and idle timers
+        are loop timers, so one task serves every client. Connection IDs the
+        server issues name its worker index, so with several worker processes
+        on one port a datagram that reaches the wrong worker is handed to the
+        owner through handoff.
+
+        Args:
+            quic_socket (Packets.QUICSocket): Bound socket the endpoint runs on.
+            handler (coroutine function, optional): Called as handler(connection, writers) for each request,
+                with one QUICStreamWriter per requested stream. Defaults to random data on every stream.
+            window (int): Maximum number of unacknowledged packets in flight per connection.
+            congestion_control (str): Congestion controller name, see Congestion.CONGESTION_CONTROLLERS.
+            pacing (bool): Whether to pace packets across the RTT instead of sending window-sized bursts.
+            worker (int): Index of this worker among the processes sharing the port.
+            handoff (WorkerHandoff, optional): Socket to exchange misrouted datagrams with other workers.
+            cache (Cache.ResponseCache, optional): Response cache shared by every connection, see QUICConnection.
+            scheduler (str): Stream scheduling policy of every connection, see Scheduler.SCHEDULERS.
+            max_datagram_size (int): Largest UDP payload of a data packet, see QUICConnection.
+            pmtud (bool): Whether connections discover the path MTU with probe packets.
+            tokens (Resumption.ResumptionTokens, optional): Resumption token issuer shared by every connection,
+                see QUICConnection. Without it clients always wait for the handshake.
+            tracer (Trace.Tracer, optional): Records the events of every connection, see QUICConnection. The caller closes it.
+        """
+        if window < 1:
+            raise ValueError("Send window must allow at least one packet in flight")
+        super().__init__(quic_socket)
+        self.worker = worker
+        self.handoff = handoff
+        self.routes = {}  # Connection ID issued in the Server Hello -> QUICConnection
+        self.handler = handler
+        self.cache = cache
+        self.scheduler = scheduler
+        self.max_datagram_size = max_datagram_size
+        self.pmtud = pmtud
+        self.tokens = tokens
+        self.tracer = tracer
+        self.window = window
+        self.congestion_control = congestion_control
+        self.pacing = pacing
+        self.connections = {}  # Connection ID -> QUICConnection
+        self.metrics = Metrics.EndpointMetrics('server')  # Totals of every connection, closed ones included
+        self.accepted = asyncio.Queue()  # New connections waiting for accept()
+        self.closed_waiters = {}  # Connection ID -> futures resolved when the connection closes
+        self.drain_waiters = {}  # Connection ID -> (stream ID, future) pairs waiting in drain()
+        self.handler_tasks = set()  # Running request handlers, kept referenced until they finish
+        self.stopped = None  # Future serve_forever() waits on
+
+    async def start(self):
+        """
+        Start receiving on the socket and, with several workers, on the handoff socket.
+        """
+        await super().start()
+        if self.handoff is not None:
+            self.loop.add_reader(self.handoff.open(), self.handoff_ready)
+
+    def handoff_ready(self):
+        """
+        Process datagrams other workers handed over, each before its buffer is reused.
+        """
+        for _ in range(readBatch):
+            buffer = self.quic_socket.pool.acquire()
+            try:
+                view, address = self.handoff.receive_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                self.quic_socket.pool.release(buffer)
+                return
+            try:
+                self.datagram_received(view, address, handed_off=True)
+            finally:
+                view.release()
+                self.quic_socket.pool.release(buffer)
+
+    def datagram_received(self, data, address, handed_off=False):
+        """
+        Route a datagram to its connection, opening a new one for a Client Hello.
+
+        Args:
+            data (bytes | memoryview): The received datagram, valid only during the call.
+            address (tuple): Address it came from.
+            handed_off (bool): Whether another worker already forwarded it here.
+        """
+        try:
+            datagram = Packets.decode_datagram(data)
+        except ValueError as e:
+            logger.warning("Invalid packet received from %s: %s", address, e)
+            return
+        if isinstance(datagram, Packets.QUICLongHeader):
+            connection = self.connections.get(datagram.dest_cid)
+        else:
+            cid = datagram.dest_conn_id
+            connection = self.routes.get(cid) or self.connections.get(cid)
+            if connection is None:
+                owner = Packets.cid_worker(cid)
+                if self.handoff is not None and not handed_off and owner is not None and owner != self.worker:
+                    self.handoff.forward(owner, data, address)
+                return  # Otherwise a late packet for a connection that is already gone
+        if connection is None:
+            on_request = None if self.handler is None else self.start_handler
+            dest_cid = Packets.generate_cid(self.worker)
+            while dest_cid in self.routes:
+                dest_cid = Packets.generate_cid(self.worker)
+            connection = QUICConnection(datagram.dest_cid, address, self.send, self.window, self.congestion_control, self.pacing,
+                                        on_request, dest_cid, self.cache, self.scheduler, self.max_datagram_size,
+                                        self.pmtud, tokens=self.tokens, tracer=self.tracer)
+            self.connections[connection.cid] = connection
+            self.routes[dest_cid] = connection
+            self.metrics.connections_opened += 1
+            self.accepted.put_nowait(connection)
+        connection.datagram_received(datagram, address, self.loop.time(), len(data))
+        self.flush(connection)
+
+    def start_handler(self, connection, stream_ids):
+        """
+        Run the request handler for a connection as a task.
+
+        Args:
+            connection (QUICConnection): Connection whose request arrived.
+            stream_ids (list): Requested stream IDs.
+        """
+        writers = [QUICStreamWriter(self, connection, stream_id) for stream_id in stream_ids]
+        task = self.loop.create_task(self.handler(connection, writers))
+        self.handler_tasks.add(task)
+        task.add_done_callback(self.handler_tasks.discard)
+
+    def flush(self, connection):
+        """
+        Send what the connection has ready, wake drained writers and re-arm its timer.
+
+        A closed connection leaves the table and fails anything still waiting on it.
+
+        Args:
+            connection (QUICConnection): Connection to service.
+        """
+        connection.send_pending(self.loop.time())
+        waiters = self.drain_waiters.get(connection.cid, [])
+        for stream_id, future in list(waiters):
+            if connection.closed or connection.unsent_bytes(stream_id) <= writeHighWater:
+                waiters.remove((stream_id, future))
+                if not future.done():
+                    if connection.closed and connection.unsent_bytes(stream_id):
+                        future.set_exception(ConnectionError(f"Connection {connection.cid} closed"))
+                    else:
+                        future.set_result(None)
+        if not connection.closed:
+            self.schedule(connection)
+            return
+        handle = self.timer_handles.pop(connection, None)
+        if handle is not None:
+            handle.cancel()
+        if self.connections.pop(connection.cid, None) is not None:
+            self.metrics.retire(connection.metrics)
+        self.routes.pop(connection.dest_cid, None)
+        self.drain_waiters.pop(connection.cid, None)
+        for future in self.closed_waiters.pop(connection.cid, []):
+            if not future.done():
+                future.set_result(None)
+
+    def prometheus(self):
+        """
+        Render the server's metrics in the Prometheus text format, see Metrics.EndpointMetrics.
+
+        Returns:
+            str: Totals of every connection, and the metrics of each open one.
+        """
+        return self.metrics.prometheus({cid: connection.metrics for cid, connection in self.connections.items()}, self.loop.time())
+
+    async def accept(self):
+        """
+        Wait for the next new connection.
+
+        Returns:
+            QUICConnection: The new connection.
+        """
+        return await self.accepted.get()
+
+    async def wait_closed(self, connection):
+        """
+        Wait until a connection has been served and closed.
+
+        Args:
+            connection (QUICConnection): Connection to wait for.
+        """
+        if connection.closed:
+            return
+        future = self.loop.create_future()
+        self.closed_waiters.setdefault(connection.cid, []).append(future)
+        await future
+
+    async def wait_drained(self, connection, stream_id):
+        """
+        Wait until a stream's unsent data is at or below writeHighWater.
+
+        Args:
+            connection (QUICConnection): Connection the stream belongs to.
+            stream_id (int): Stream to wait for.
+
+        Raises:
+            ConnectionError: If the connection closes before the data is sent.
+        """
+        if connection.unsent_bytes(stream_id) <= writeHighWater:
+            return
+        if connection.closed:
+            raise ConnectionError(f"Connection {connection.cid} closed")
+        future = self.loop.create_future()
+        self.drain_waiters.setdefault(connection.cid, []).append((stream_id, future))
+        await future
+
+    async def serve_forever(self):
+        """
+        Serve every client until shutdown() is called.
+        """
+        self.stopped = self.loop.create_future()
+        await self.stopped
+
+    def shutdown(self):
+        """
+        Make serve_forever() return.
+        """
+        if self.stopped is not None and not self.stopped.done():
+            self.stopped.set_result(None)
+
+    def close(self):
+        """
+        Stop serving and close the handoff socket.
+        """
+        if self.handoff is not None and self.handoff.sock is not None:
+            self.loop.remove_reader(self.handoff.sock)
+            self.handoff.close()
+        super().close()
+
+class QUICStreamWriter:
+    def __init__(self, protocol, connection, stream_id):
+        """
+        Initialize a writer for one stream of a server connection.
+
+        Args:
+            protocol (QUICServerProtocol): Protocol that owns the connection.
+            connection (QUICConnection): Connection the stream belongs to.
+            stream_id (int): Stream to write to.
+        """
+        self.protocol = protocol
+        self.connection = connection
+        self.stream_id = stream_id
+        self.name = connection.request_name(stream_id)  # What the client asked for, a file path or object key
+
+    def write(self, data):
+        """
+        Queue data on the stream and send what the windows allow right away.
+
+        Args:
+            data (bytes): Data to send.
+        """
+        self.connection.write(self.stream_id, data)
+        self.protocol.flush(self.connection)
+
+    def write_source(self, source):
+        """
+        Send everything a chunk source produces, then finish the stream.
+
+        Chunks are pulled as the windows open, so nothing needs to be
+        awaited and the data never has to be in memory all at once.
+
+        Args:
+            source (iterable): Yields bytes-like chunks, see QUICConnection.set_source().
+        """
+        self.connection.set_source(self.stream_id, source)
+        self.protocol.flush(self.connection)
+
+    def write_eof(self):
+        """
+        Finish the stream once the queued data has been sent.
+        """
+        self.connection.write(self.stream_id, b'', end_stream=True)
+        self.protocol.flush(self.connection)
+
+    async def drain(self):
+        """
+        Wait until the stream's unsent data has fallen to writeHighWater.
+        """
+        await self.protocol.wait_drained(self.connection, self.stream_id)
+
+class QUICStreamReader(asyncio.StreamReader):
+    def __init__(self, protocol, stream_id):
+        """
+        Initialize a reader for one stream of a client connection.
+
+        Data taken out of the reader is reported to the connection as
+        consumed, which is what opens the stream's flow control window: a
+        stream nobody reads stops once the server has filled its window.
+
+        Args:
+            protocol (QUICClientProtocol): Protocol that owns the connection.
+            stream_id (int): Stream the reader is fed from.
+        """
+        super().__init__(loop=protocol.loop)
+        self.protocol = protocol
+        self.stream_id = stream_id
+        self.fed = 0  # Bytes fed into the reader
+        self.reported = 0  # Bytes reported to the connection as consumed
+
+    def feed_data(self, data):
+        self.fed += len(data)
+        super().feed_data(data)
+
+    def _maybe_resume_transport(self):
+        # Called by every read method once it has taken data out of the buffer
+        super()._maybe_resume_transport()
+        consumed = self.fed - len(self._buffer)
+        if consumed > self.reported:
+            self.protocol.stream_consumed(self.stream_id, consumed - self.reported)
+            self.reported = consumed
+
+class QUICClientProtocol(QUICProtocol):
+    def __init__(self, quic_socket, stream_window=initialStreamWindow, connection_window=initialConnectionWindow, token=None,
+                 persistent=False, tracer=None):
+        """
+        Initialize the client side of the engine.
+
+        Args:
+            quic_socket (Packets.QUICSocket): Socket with the server address and connection ID set.
+            stream_window (int): Initial receive window of each stream, see QUICClientConnection.
+            connection_window (int): Initial receive window of the connection, see QUICClientConnection.
+            token (bytes, optional): Resumption token from an earlier connection, see QUICClientConnection.
+            persistent (bool): Whether the connection takes more than one request, see QUICClientConnection.
+            tracer (Trace.Tracer, optional): Records the connection's events, see QUICClientConnection. The caller closes it.
+        """
+        super().__init__(quic_socket)
+        self.connection = QUICClientConnection(quic_socket.get_dest_cid(), quic_socket.get_address(), self.send, self.stream_data,
+                                               stream_window, connection_window, token, persistent, tracer)
+        self.readers = {}  # Stream ID -> QUICStreamReader, until the stream's end is fed
+        self.connected = self.loop.create_future()
+        self.completed = self.loop.create_future()
+
+    def datagram_received(self, data, address):
+        """
+        Hand a datagram from the server to the connection.
+
+        Args:
+            data (bytes | memoryview): The received datagram, valid only during the call.
+            address (tuple): Address it came from.
+        """
+        try:
+            datagram = Packets.decode_datagram(data)
+        except ValueError as e:
+            logger.warning("Invalid packet received from %s: %s", address, e)
+            return
+        self.connection.datagram_received(datagram, self.loop.time(), len(data))
+        self.flush(self.connection)
+
+    def stream_data(self, stream_id, data, finished):
+        """
+        Pass in-order stream data to the stream's reader.
+
+        Args:
+            stream_id (int): Stream the data belongs to.
+            data (memoryview): Next piece of the stream, valid only during the call.
+            finished (bool): Whether this is the end of the stream.
+        """
+        reader = self.readers[stream_id]
+        if data:
+            reader.feed_data(data)
+        if finished:
+            reader.feed_eof()
+            del self.readers[stream_id]
+
+    def stream_consumed(self, stream_id, count):
+        """
+        Pass data the application read from a stream on to the connection, which may grant the server more credit.
+
+        Args:
+            stream_id (int): Stream that was read.
+            count (int): Bytes read since the last report.
+        """
+        if not self.open:
+            return
+        self.connection.consume(stream_id, count, self.loop.time())
+        self.flush(self.connection)
+
+    def flush(self, connection):
+        """
+        Resolve the handshake and completion futures, fail everything on error and re-arm the timer.
+
+        Args:
+            connection (QUICClientConnection): The client connection.
+        """
+        if connection.error is not None:
+            error = ConnectionError(connection.error)
+            for future in (self.connected, self.completed):
+                if not future.done():
+                    future.set_exception(error)
+            for reader in self.readers.values():
+                reader.set_exception(error)
+        else:
+            if connection.connected and not self.connected.done():
+                self.connected.set_result(None)
+            if connection.complete and not self.completed.done():
+                self.completed.set_result(None)
+        self.schedule(connection)
+
+    async def connect(self):
+        """
+        Perform the handshake.
+
+        With a resumption token this returns as soon as the Client Hello is
+        sent, so the request can follow it in the same flight; a failed
+        handshake then fails the stream readers instead.
+
+        Raises:
+            ConnectionError: If no Server Hello arrives after maxAttempts Client Hellos.
+        """
+        self.connection.connect(self.loop.time())
+        self.schedule(self.connection)
+        if not self.connection.early_data:
+            await self.connected
+
+    def request(self, stream_number, names=None, outputs=None):
+        """
+        Request data on a number of streams.
+
+        On a persistent connection this may be called again at any time,
+        also while earlier requests are still arriving.
+
+        Args:
+            stream_number (int): Number of streams to request.
+            names (list, optional): File path or object key to fetch on each stream.
+            outputs (list, optional): File to also write each stream into as it arrives, or None.
+
+        Returns:
+            list: One QUICStreamReader per stream; reading one fails with ConnectionError if the server goes away.
+                The server only sends a stream's window ahead of what has been read from its reader.
+
+        Raises:
+            ConnectionError: If the connection has already failed.
+        """
+        if self.connection.error is not None:
+            raise ConnectionError(self.connection.error)
+        first = self.connection.next_stream_id
+        readers = [QUICStreamReader(self, stream_id) for stream_id in range(first, first + stream_number)]
+        self.readers.update((reader.stream_id, reader) for reader in readers)
+        self.connection.request(stream_number, self.loop.time(), names, outputs)
+        if self.completed.done() and stream_number:
+            self.completed = self.loop.create_future()  # Complete again once these streams are in too
+        self.flush(self.connection)
+        return readers
+
+    async def wait_complete(self):
+        """
+        Wait until every requested stream has been received.
+        """
+        await self.completed
+
+    def prometheus(self):
+        """
+        Render the connection's metrics in the Prometheus text format, see Metrics.EndpointMetrics.
+
+        Returns:
+            str: The exposition.
+        """
+        endpoint = Metrics.EndpointMetrics('client')
+        endpoint.connections_opened = 1
+        return endpoint.prometheus({self.connection.dest_cid: self.connection.metrics}, self.loop.time())
+
+    def close(self):
+        """
+        Tell the server of a persistent connection that no more requests follow, then stop the engine.
+        """
+        if self.open:
+            self.connection.close(self.loop.time())
+        super().close()
+
+async def create_server_endpoint(quic_socket, handler=None, **options):
+    """
+    Run a server protocol on an existing, bound QUICSocket.
+
+    Args:
+        quic_socket (Packets.QUICSocket): Bound socket to serve on.
+        handler (coroutine function, optional): Request handler, see QUICServerProtocol.
+        **options: window, congestion_control and pacing for every connection, worker and handoff.
+
+    Returns:
+        QUICServerProtocol: The running protocol.
+    """
+    protocol = QUICServerProtocol(quic_socket, handler, **options)
+    await protocol.start()
+    return protocol
+
+async def create_client_endpoint(quic_socket, **options):
+    """
+    Run a client protocol on an existing QUICSocket.
+
+    Args:
+        quic_socket (Packets.QUICSocket): Socket with the server address and connection ID set.
+        **options: stream_window, connection_window, token, persistent and tracer, see QUICClientProtocol.
+
+    Returns:
+        QUICClientProtocol: The running protocol, not yet connected.
+    """
+    protocol = QUICClientProtocol(quic_socket, **options)
+    await protocol.start()
+    return protocol
+
+async def serve(host, port, handler=None, batch_io=False, reuse_port=False, **options):
+    """
+    Create a socket bound to host and port and serve on it.
+
+    Args:
+        host (str): Host address to bind.
+        port (int): Port number to bind.
+        handler (coroutine function, optional): Request handler, see QUICServerProtocol.
+        batch_io (bool): Whether to use UDP GSO/GRO where the kernel supports them, see QUICSocket.enable_batch_io().
+        reuse_port (bool): Whether to share the port with other worker processes through SO_REUSEPORT.
+        **options: window, congestion_control and pacing for every connection, worker and handoff.
+
+    Returns:
+        QUICServerProtocol: The running protocol.
+    """
+    quic_socket = Packets.QUICSocket()
+    quic_socket.create_socket(reuse_port)
+    quic_socket.bind((host, port))
+    if batch_io:
+        quic_socket.enable_batch_io()
+    return await create_server_endpoint(quic_socket, handler, **options)
+
+async def connect(host, port, batch_io=False, **options):
+    """
+    Open a connection to a server.
+
+    Args:
+        host (str): The server's hostname or IP address.
+        port (int): The server's port number.
+        batch_io (bool): Whether to use UDP GSO/GRO where the kernel supports them, see QUICSocket.enable_batch_io().
+        **options: stream_window, connection_window, token, persistent and tracer, see QUICClientProtocol.
+
+    Returns:
+        QUICClientProtocol: The connected protocol; with a token, one whose Client Hello is on its way.
+
+    Raises:
+        ConnectionError: If the handshake fails.
+    """
+    quic_socket = Packets.QUICSocket()
+    quic_socket.create_socket()
+    quic_socket.set_address((host, port))
+    quic_socket.set_dest_cid(Packets.generate_random_hex())
+    if batch_io:
+        quic_socket.enable_batch_io()
+    protocol = await create_client_endpoint(quic_socket, **options)
+    try:
+        await protocol.connect()
+    except ConnectionError:
+        protocol.close()
+        raise
+    return protocol
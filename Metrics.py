@@ -0,0 +1,392 @@
+import asyncio  # Importing the asyncio module for serving the Prometheus endpoint on the engine's loop
+from collections import deque  # Importing deque for the recent RTT samples and completed streams
+from typing import Final  # Importing Final from typing for defining constants
+import Packets  # Importing the Packets module for recognising stream frames
+
+# Defining constants
+rttSamples: Final = 1024  # Most recent RTT samples kept for percentiles
+timelineInterval: Final = 0.1  # Seconds of each throughput-over-time bucket
+streamHistory: Final = 256  # Completed streams a connection keeps metrics for; older ones only count in the totals
+PERCENTILES = (0.5, 0.9, 0.99)  # RTT percentiles reported
+COUNTERS = {
+    'packets_sent': "Datagrams sent",
+    'packets_received': "Datagrams received",
+    'bytes_sent': "Bytes sent on the wire, headers included",
+    'bytes_received': "Bytes received on the wire, headers included",
+    'stream_bytes_sent': "Stream bytes sent for the first time",
+    'stream_bytes_received': "Stream bytes received for the first time",
+    'duplicate_bytes_received': "Stream bytes received again after they had already arrived",
+    'packets_lost': "Packets declared lost",
+    'packets_retransmitted': "Packets resending data of lost packets",
+    'bytes_retransmitted': "Stream bytes sent again after being lost",
+}  # Counters of every connection, with the help text of their Prometheus series
+
+def percentile(ordered, fraction):
+    """
+    Return the nearest-rank percentile of sorted values.
+
+    Args:
+        ordered (list): Values in ascending order, at least one.
+        fraction (float): Percentile as a fraction, e.g. 0.99.
+
+    Returns:
+        float: The smallest value at or above the given fraction of the values.
+    """
+    return ordered[max(0, min(len(ordered) - 1, int(fraction * len(ordered) + 0.999999) - 1))]
+
+class ConnectionMetrics:
+    def __init__(self, interval=timelineInterval, rtt_samples=rttSamples, stream_history=streamHistory):
+        """
+        Initialize the counters of one connection endpoint.
+
+        The connection updates them as it sends and receives, so they can
+        be read at any time while it runs. Sizes are bytes on the wire:
+        datagrams as encoded, headers included. Stream bytes count each
+        byte of a stream once; bytes resent after a loss, or received again,
+        are counted separately. Throughput over time is the stream data sent
+        or received in each interval seconds since the first stream opened.
+
+        Args:
+            interval (float): Seconds of each throughput-over-time bucket.
+            rtt_samples (int): Most recent RTT samples kept for percentiles.
+            stream_history (int): Completed streams kept; older ones only count in the connection totals.
+        """
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.interval = interval
+        self.rtt = deque(maxlen=rtt_samples)  # Recent RTT samples in seconds
+        self.rtt_count = 0  # RTT samples taken, including those no longer kept
+        self.rtt_sum = 0.0
+        self.started_at = None  # When the first stream was opened
+        self.finished_at = None  # When the last stream completed, while every stream is complete
+        self.timeline = {}  # Bucket index -> stream bytes sent or received in it
+        self.streams = {}  # Stream ID -> per-stream metrics
+        self.open_streams = 0
+        self.completed = deque()  # IDs of completed streams still in self.streams, oldest first
+        self.stream_history = stream_history
+
+    def open_stream(self, stream_id, now):
+        """
+        Start the metrics of a stream.
+
+        Args:
+            stream_id (int): The stream.
+            now (float): When it was opened.
+        """
+        if self.started_at is None:
+            self.started_at = now
+        self.streams[stream_id] = {'bytes': 0, 'packets': 0, 'retransmitted': 0, 'duplicate': 0, 'started': now,
+                                   'completed': None, 'timeline': {}}
+        self.open_streams += 1
+        self.finished_at = None
+
+    def close_stream(self, stream_id, now):
+        """
+        Record that a stream has been sent or received in full.
+
+        Args:
+            stream_id (int): The stream.
+            now (float): When its last byte was sent or received.
+        """
+        stream = self.streams.get(stream_id)
+        if stream is None or stream['completed'] is not None:
+            return
+        stream['completed'] = now
+        self.open_streams -= 1
+        if self.open_streams == 0:
+            self.finished_at = now
+        self.completed.append(stream_id)
+        if len(self.completed) > self.stream_history:
+            del self.streams[self.completed.popleft()]
+
+    def on_packet_sent(self, size):
+        """
+        Count a datagram sent.
+
+        Args:
+            size (int): Its size on the wire.
+        """
+        self.packets_sent += 1
+        self.bytes_sent += size
+
+    def on_packet_received(self, size):
+        """
+        Count a datagram received.
+
+        Args:
+            size (int): Its size on the wire.
+        """
+        self.packets_received += 1
+        self.bytes_received += size
+
+    def add_to_timeline(self, stream, count, now):
+        """
+        Add stream bytes to the throughput-over-time buckets of the connection and the stream.
+
+        Args:
+            stream (dict): Per-stream metrics.
+            count (int): Bytes sent or received.
+            now (float): When.
+        """
+        bucket = int((now - self.started_at) / self.interval)
+        self.timeline[bucket] = self.timeline.get(bucket, 0) + count
+        stream['timeline'][bucket] = stream['timeline'].get(bucket, 0) + count
+
+    def on_stream_sent(self, stream_id, count, now):
+        """
+        Count new data of a stream sent in a packet.
+
+        Args:
+            stream_id (int): The stream.
+            count (int): Bytes of the stream sent for the first time.
+            now (float): When.
+        """
+        self.stream_bytes_sent += count
+        stream = self.streams.get(stream_id)
+        if stream is not None:
+            stream['bytes'] += count
+            stream['packets'] += 1
+            self.add_to_timeline(stream, count, now)
+
+    def on_stream_received(self, stream_id, count, duplicate, now):
+        """
+        Count data of a stream received in a packet.
+
+        Args:
+            stream_id (int): The stream.
+            count (int): Bytes that had not arrived before.
+            duplicate (int): Bytes that had.
+            now (float): When.
+        """
+        self.stream_bytes_received += count
+        self.duplicate_bytes_received += duplicate
+        stream = self.streams.get(stream_id)
+        if stream is not None:
+            stream['bytes'] += count
+            stream['duplicate'] += duplicate
+            stream['packets'] += 1
+            if count:
+                self.add_to_timeline(stream, count, now)
+
+    def on_retransmitted(self, frames=()):
+        """
+        Count a packet that resends lost data.
+
+        Args:
+            frames (list): Frames it resends; the stream frames' bytes are counted per stream.
+        """
+        self.packets_retransmitted += 1
+        for frame in frames:
+            if not isinstance(frame, Packets.QUICStreamPayload):
+                continue
+            self.bytes_retransmitted += frame.length
+            stream = self.streams.get(frame.stream_id)
+            if stream is not None:
+                stream['retransmitted'] += frame.length
+                stream['packets'] += 1
+
+    def on_packets_lost(self, count):
+        """
+        Count packets declared lost.
+
+        Args:
+            count (int): Packets lost.
+        """
+        self.packets_lost += count
+
+    def on_rtt_sample(self, rtt):
+        """
+        Take an RTT sample.
+
+        Args:
+            rtt (float): Seconds from a packet being sent to its acknowledgement.
+        """
+        self.rtt.append(rtt)
+        self.rtt_count += 1
+        self.rtt_sum += rtt
+
+    def rtt_percentiles(self):
+        """
+        Return percentiles of the recent RTT samples.
+
+        Returns:
+            dict: Seconds keyed by percentile fraction, plus 'min' and 'max'; empty without samples.
+        """
+        if not self.rtt:
+            return {}
+        ordered = sorted(self.rtt)
+        result = {fraction: percentile(ordered, fraction) for fraction in PERCENTILES}
+        result['min'] = ordered[0]
+        result['max'] = ordered[-1]
+        return result
+
+    def throughput(self, timeline):
+        """
+        Turn throughput buckets into a series with empty intervals filled in.
+
+        Args:
+            timeline (dict): Bucket index -> bytes.
+
+        Returns:
+            list: (seconds since the first stream opened, bits per second) per interval.
+        """
+        if not timeline:
+            return []
+        return [(index * self.interval, timeline.get(index, 0) * 8 / self.interval) for index in range(min(timeline), max(timeline) + 1)]
+
+    def elapsed(self, started, completed, now):
+        """
+        Return how long a transfer has taken.
+
+        Args:
+            started (float): When it started, or None.
+            completed (float): When it completed, or None if it is still running.
+            now (float, optional): Current time, for one still running.
+
+        Returns:
+            float: Seconds, 0 if it has not started or now is unknown.
+        """
+        end = completed if completed is not None else now
+        if started is None or end is None:
+            return 0.0
+        return end - started
+
+    def snapshot(self, now=None):
+        """
+        Return every metric of the connection and its streams.
+
+        Args:
+            now (float, optional): Current monotonic time, for the goodput of transfers still running.
+
+        Returns:
+            dict: The counters, 'rtt' percentiles, 'goodput' in bits per second over 'elapsed' seconds,
+                'throughput' over time and 'streams' with the same per stream.
+        """
+        result = {name: getattr(self, name) for name in COUNTERS}
+        result['rtt'] = self.rtt_percentiles()
+        result['rtt_samples'] = self.rtt_count
+        result['elapsed'] = self.elapsed(self.started_at, self.finished_at, now)
+        delivered = self.stream_bytes_sent + self.stream_bytes_received
+        result['goodput'] = delivered * 8 / result['elapsed'] if result['elapsed'] > 0 else 0.0
+        result['throughput'] = self.throughput(self.timeline)
+        result['streams'] = {}
+        for stream_id, stream in self.streams.items():
+            elapsed = self.elapsed(stream['started'], stream['completed'], now)
+            result['streams'][stream_id] = {'bytes': stream['bytes'], 'packets': stream['packets'], 'retransmitted': stream['retransmitted'],
+                                            'duplicate': stream['duplicate'], 'complete': stream['completed'] is not None,
+                                            'elapsed': elapsed, 'goodput': stream['bytes'] * 8 / elapsed if elapsed > 0 else 0.0,
+                                            'throughput': self.throughput(stream['timeline'])}
+        return result
+
+class EndpointMetrics:
+    def __init__(self, role):
+        """
+        Initialize the totals of a server or client endpoint, which outlive its connections.
+
+        Prometheus counters must never go down, so the counters of a
+        connection that closes are added here before it is forgotten.
+
+        Args:
+            role (str): 'server' or 'client', the role label of every series.
+        """
+        self.role = role
+        self.totals = {name: 0 for name in COUNTERS}  # Counters of closed connections
+        self.connections_opened = 0
+        self.connections_closed = 0
+
+    def retire(self, metrics):
+        """
+        Add the counters of a closed connection to the totals.
+
+        Args:
+            metrics (ConnectionMetrics): The closed connection's metrics.
+        """
+        for name in COUNTERS:
+            self.totals[name] += getattr(metrics, name)
+        self.connections_closed += 1
+
+    def prometheus(self, connections, now=None):
+        """
+        Render the endpoint and its open connections in the Prometheus text exposition format.
+
+        Args:
+            connections (dict): Connection ID -> ConnectionMetrics of the open connections.
+            now (float, optional): Current monotonic time, for the goodput of transfers still running.
+
+        Returns:
+            str: The exposition, one line per sample.
+        """
+        role = f'role="{self.role}"'
+        lines = [
+            "# HELP quic_connections_opened_total Connections opened",
+            "# TYPE quic_connections_opened_total counter",
+            f"quic_connections_opened_total{{{role}}} {self.connections_opened}",
+            "# HELP quic_connections_open Connections currently open",
+            "# TYPE quic_connections_open gauge",
+            f"quic_connections_open{{{role}}} {len(connections)}",
+        ]
+        snapshots = {cid: metrics.snapshot(now) for cid, metrics in connections.items()}
+        for name, help_text in COUNTERS.items():
+            lines.append(f"# HELP quic_{name}_total {help_text}, by every connection")
+            lines.append(f"# TYPE quic_{name}_total counter")
+            total = self.totals[name] + sum(snapshot[name] for snapshot in snapshots.values())
+            lines.append(f"quic_{name}_total{{{role}}} {total}")
+        for name, help_text in COUNTERS.items():
+            # Separate families, so summing one never counts a connection twice
+            lines.append(f"# HELP quic_connection_{name}_total {help_text}, by each open connection")
+            lines.append(f"# TYPE quic_connection_{name}_total counter")
+            for cid, snapshot in snapshots.items():
+                lines.append(f'quic_connection_{name}_total{{{role},connection="{cid}"}} {snapshot[name]}')
+        lines.append("# HELP quic_rtt_seconds Round-trip time of the recent samples")
+        lines.append("# TYPE quic_rtt_seconds summary")
+        for cid, metrics in connections.items():
+            labels = f'{role},connection="{cid}"'
+            for fraction, value in snapshots[cid]['rtt'].items():
+                if fraction in PERCENTILES:
+                    lines.append(f'quic_rtt_seconds{{{labels},quantile="{fraction}"}} {value}')
+            lines.append(f"quic_rtt_seconds_count{{{labels}}} {metrics.rtt_count}")
+            lines.append(f"quic_rtt_seconds_sum{{{labels}}} {metrics.rtt_sum}")
+        lines.append("# HELP quic_goodput_bits_per_second Stream bits delivered per second since the first stream opened")
+        lines.append("# TYPE quic_goodput_bits_per_second gauge")
+        for cid, snapshot in snapshots.items():
+            lines.append(f'quic_goodput_bits_per_second{{{role},connection="{cid}"}} {snapshot["goodput"]}')
+        for name, key, kind, help_text in (('stream_bytes', 'bytes', 'gauge', "Bytes of the stream sent or received"),
+                                           ('stream_packets', 'packets', 'gauge', "Packets carrying data of the stream"),
+                                           ('stream_retransmitted_bytes', 'retransmitted', 'gauge', "Bytes of the stream sent again"),
+                                           ('stream_goodput_bits_per_second', 'goodput', 'gauge', "Bits of the stream per second")):
+            lines.append(f"# HELP quic_{name} {help_text}")
+            lines.append(f"# TYPE quic_{name} {kind}")
+            for cid, snapshot in snapshots.items():
+                for stream_id, stream in snapshot['streams'].items():
+                    lines.append(f'quic_{name}{{{role},connection="{cid}",stream="{stream_id}"}} {stream[key]}')
+        return "\n".join(lines) + "\n"
+
+async def serve_prometheus(host, port, render):
+    """
+    Serve a Prometheus scrape endpoint on the running event loop.
+
+    Every HTTP request, whatever its path, is answered with the current
+    exposition. The endpoint runs on the engine's loop, so render reads
+    the connections between their events.
+
+    Args:
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        render (callable): Returns the exposition text.
+
+    Returns:
+        asyncio.Server: The listening server; close it to stop.
+    """
+    async def respond(reader, writer):
+        try:
+            while (await reader.readline()).strip():
+                pass  # Request line and headers; the answer is the same for all
+            body = render().encode('utf-8')
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         + f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(respond, host, port)
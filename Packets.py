@@ -1,12 +1,357 @@
+import errno  # Importing the errno module for telling GSO rejections from other send errors
+import functools  # Importing the functools module for caching encoded connection IDs
 import random  # Importing the random module for generating random numbers
 import socket  # Importing the socket module for creating and managing network connections
 import struct  # Importing the struct module for working with C-style data structures
-import pickle  # Importing the pickle module for serializing and deserializing Python objects
 import sys  # Importing the sys module for system-specific parameters and functions
 
 # Constants for QUIC packet flags
 LONG_HEADER_FLAG = 1  # Long header flag for QUIC packets
 SHORT_HEADER_FLAG = 0  # Short header flag for QUIC packets
+EARLY_DATA_FLAG = 0x02  # Set on a Client Hello whose request follows in the same flight, and on a Server Hello that accepts it
+
+# Wire type tags: the first byte of every datagram says which object follows
+HELLO_PACKET_TYPE = 0xC0  # QUICLongHeader (handshake packets)
+DATA_PACKET_TYPE = 0xC1  # QUICPacket carrying a list of frames
+ACK_PACKET_TYPE = 0xC2  # QUICAck
+SHORT_PACKET_TYPE = 0x40  # QUICShortHeaderPacket; the low two bits hold the packet number length minus one
+PACKET_NUMBER_LENGTH_MASK = 0x03  # Bits of a short header type byte that hold the packet number length
+
+# Frame type tags inside a QUICPacket payload
+PADDING_FRAME_TYPE = 0x00  # QUICPadding; a run of zero bytes
+STREAM_FRAME_TYPE = 0x08  # QUICStreamPayload
+STREAM_FIN_BIT = 0x01  # Set on a stream frame type when the frame finishes its stream
+MAX_DATA_FRAME_TYPE = 0x10  # QUICMaxData; connection-wide receive credit
+MAX_STREAM_DATA_FRAME_TYPE = 0x11  # QUICMaxStreamData; receive credit of one stream
+DATA_BLOCKED_FRAME_TYPE = 0x14  # QUICDataBlocked; the sender ran out of connection credit
+STREAM_DATA_BLOCKED_FRAME_TYPE = 0x15  # QUICStreamDataBlocked; the sender ran out of a stream's credit
+ACK_FREQUENCY_FRAME_TYPE = 0xAF  # QUICAckFrequency; how often the receiver should acknowledge
+KEEP_ALIVE_FRAME_TYPE = 0x1F  # QUICKeepAlive; more requests follow on this connection (not assigned by RFC 9000)
+GO_AWAY_FRAME_TYPE = 0x20  # QUICGoAway; no requests follow past the streams already opened (not assigned by RFC 9000)
+
+MAX_VARINT = 2**62 - 1  # Largest value a variable-length integer can carry
+MAX_CID_LENGTH = 20  # Longest connection ID (in bytes) allowed on the wire
+MAX_WORKERS = 256  # Server worker indexes that fit in the first byte of a connection ID
+SHORT_CID_LENGTH = 8  # Bytes of the connection ID in a short header; every ID the server issues has this length, so none is sent
+MAX_PACKET_NUMBER_LENGTH = 4  # Most bytes a truncated packet number takes
+MAX_TOKEN_LENGTH = 255  # Longest resumption token a hello may carry
+
+# Receive buffer pool
+RECEIVE_BUFFER_SIZE = 65535  # Bytes per pooled receive buffer; holds the largest datagram a peer may send
+BUFFER_POOL_SIZE = 16  # Free buffers a pool keeps for reuse
+
+# Linux UDP segmentation offload (GSO) and receive coalescing (GRO)
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)  # Socket option level of UDP
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)  # Segment size a sendmsg() is split into (GSO)
+UDP_GRO = getattr(socket, 'UDP_GRO', 104)  # Deliver coalesced datagrams with their segment size (GRO)
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)  # Socket option choosing how IPv4 fragmentation is handled
+IP_PMTUDISC_PROBE = getattr(socket, 'IP_PMTUDISC_PROBE', 3)  # Set Don't Fragment and ignore the cached path MTU
+MAX_GSO_SEGMENTS = 64  # Most datagrams the kernel accepts in one GSO send
+GSO_SEGMENT_LIMIT = 1472  # Largest datagram sent with GSO by default: a 1500-byte Ethernet MTU minus IPv4 and UDP headers
+GSO_REJECTED = (errno.EINVAL, errno.EOPNOTSUPP, errno.EIO)  # Errors meaning the kernel or device cannot segment
+MAX_GSO_BYTES = 65000  # Most bytes in one GSO send; stays below the 64 KB UDP payload limit
+MAX_IOV = 1024  # Most buffers one sendmsg() may gather from
+_GSO_SIZE = struct.Struct('=H')  # UDP_SEGMENT ancillary data: segment size in native byte order
+_GRO_SIZE = struct.Struct('=i')  # UDP_GRO ancillary data: segment size in native byte order
+
+# Precompiled structs for the 2, 4 and 8 byte varint forms
+_UINT16 = struct.Struct('!H')
+_UINT32 = struct.Struct('!I')
+_UINT64 = struct.Struct('!Q')
+_SMALL_VARINTS = tuple(bytes((value,)) for value in range(0x40))  # Encoded 1-byte varints, the common case
+_STREAM_TYPE = bytes((STREAM_FRAME_TYPE,))
+_STREAM_FIN_TYPE = bytes((STREAM_FRAME_TYPE | STREAM_FIN_BIT,))
+_ACK_TYPE = bytes((ACK_PACKET_TYPE,))
+
+def varint_size(value):
+    """
+    Return the number of bytes needed to encode a variable-length integer.
+
+    Args:
+        value (int): Non-negative integer to encode.
+
+    Returns:
+        int: 1, 2, 4 or 8.
+    """
+    if value < 0:
+        raise ValueError(f"Varint cannot encode negative value {value}")
+    if value < 0x40:
+        return 1
+    if value < 0x4000:
+        return 2
+    if value < 0x40000000:
+        return 4
+    if value <= MAX_VARINT:
+        return 8
+    raise ValueError(f"Varint value {value} is too large")
+
+def encode_varint(buf, offset, value):
+    """
+    Write a variable-length integer into a buffer.
+
+    The two most significant bits of the first byte give the encoded length
+    (1, 2, 4 or 8 bytes), the remaining bits hold the value in network order.
+
+    Args:
+        buf (bytearray | memoryview): Writable buffer.
+        offset (int): Position to write at.
+        value (int): Non-negative integer to encode.
+
+    Returns:
+        int: Position just after the encoded integer.
+    """
+    if 0 <= value < 0x40:
+        buf[offset] = value
+        return offset + 1
+    if 0x40 <= value < 0x4000:
+        _UINT16.pack_into(buf, offset, value | 0x4000)
+        return offset + 2
+    if 0x4000 <= value < 0x40000000:
+        _UINT32.pack_into(buf, offset, value | 0x80000000)
+        return offset + 4
+    varint_size(value)  # Raises for negative or oversized values
+    _UINT64.pack_into(buf, offset, value | 0xC000000000000000)
+    return offset + 8
+
+def varint_bytes(value):
+    """
+    Return the encoding of a variable-length integer as bytes.
+
+    Faster than encode_varint when the result is joined with other pieces
+    rather than written into an existing buffer.
+
+    Args:
+        value (int): Non-negative integer to encode.
+
+    Returns:
+        bytes: Encoded integer.
+    """
+    if 0 <= value < 0x40:
+        return _SMALL_VARINTS[value]
+    if 0x40 <= value < 0x4000:
+        return _UINT16.pack(value | 0x4000)
+    if 0x4000 <= value < 0x40000000:
+        return _UINT32.pack(value | 0x80000000)
+    varint_size(value)  # Raises for negative or oversized values
+    return _UINT64.pack(value | 0xC000000000000000)
+
+def decode_varint(buf, offset):
+    """
+    Read a variable-length integer from a buffer.
+
+    Args:
+        buf (bytes | bytearray | memoryview): Buffer to read from.
+        offset (int): Position to read at.
+
+    Returns:
+        tuple: Decoded value and the position just after it.
+    """
+    first = buf[offset]
+    if first < 0x40:
+        return first, offset + 1
+    if first < 0x80:
+        return _UINT16.unpack_from(buf, offset)[0] & 0x3FFF, offset + 2
+    if first < 0xC0:
+        return _UINT32.unpack_from(buf, offset)[0] & 0x3FFFFFFF, offset + 4
+    return _UINT64.unpack_from(buf, offset)[0] & MAX_VARINT, offset + 8
+
+def cid_size(cid):
+    """
+    Return the number of bytes a connection ID takes on the wire, length byte included.
+
+    Args:
+        cid (str): Hexadecimal connection ID.
+
+    Returns:
+        int: Encoded size in bytes.
+    """
+    return 1 + len(cid) // 2
+
+@functools.lru_cache(maxsize=4096)
+def cid_bytes(cid):
+    """
+    Return a hexadecimal connection ID as its wire form: a length byte followed by its raw bytes.
+
+    A connection puts the same ID on every packet, so the conversion is
+    cached instead of parsing the hex string each time.
+
+    Args:
+        cid (str): Hexadecimal connection ID (may be empty).
+
+    Returns:
+        bytes: Encoded connection ID.
+    """
+    raw = bytes.fromhex(cid)
+    if len(raw) > MAX_CID_LENGTH:
+        raise ValueError(f"Connection ID {cid} is longer than {MAX_CID_LENGTH} bytes")
+    return bytes((len(raw),)) + raw
+
+def encode_cid(buf, offset, cid):
+    """
+    Write a hexadecimal connection ID as a length byte followed by its raw bytes.
+
+    Args:
+        buf (bytearray | memoryview): Writable buffer.
+        offset (int): Position to write at.
+        cid (str): Hexadecimal connection ID (may be empty).
+
+    Returns:
+        int: Position just after the encoded connection ID.
+    """
+    encoded = cid_bytes(cid)
+    end = offset + len(encoded)
+    buf[offset:end] = encoded
+    return end
+
+def decode_cid(buf, offset):
+    """
+    Read a connection ID written by encode_cid.
+
+    Args:
+        buf (bytes | bytearray | memoryview): Buffer to read from.
+        offset (int): Position to read at.
+
+    Returns:
+        tuple: Hexadecimal connection ID and the position just after it.
+    """
+    length = buf[offset]
+    end = offset + 1 + length
+    if length > MAX_CID_LENGTH or end > len(buf):
+        raise ValueError("Truncated or oversized connection ID")
+    return buf[offset + 1:end].hex(), end
+
+def packet_number_size(packet_number, largest_acked):
+    """
+    Return how many bytes a packet number needs so the peer can reconstruct it.
+
+    The truncated number must cover twice the distance to the largest
+    packet number the peer has acknowledged (RFC 9000, section 17.1), so
+    the receiver is never more than half a window away from the right value.
+
+    Args:
+        packet_number (int): Full packet number to send.
+        largest_acked (int): Largest packet number the peer acknowledged, or None if none yet.
+
+    Returns:
+        int: 1 to 4.
+    """
+    unacked = packet_number + 1 if largest_acked is None else packet_number - largest_acked
+    length = 1
+    while unacked * 2 >= 1 << (8 * length):
+        length += 1
+        if length > MAX_PACKET_NUMBER_LENGTH:
+            raise ValueError(f"Packet number {packet_number} is too far ahead of the largest acknowledged {largest_acked}")
+    return length
+
+def decode_packet_number(truncated, length, largest):
+    """
+    Reconstruct a full packet number from its truncated form (RFC 9000, appendix A.3).
+
+    The result is the value with those low bytes closest to the packet
+    number after the largest one received so far.
+
+    Args:
+        truncated (int): Packet number bytes as received.
+        length (int): Number of bytes received.
+        largest (int): Largest packet number received so far, or None if none yet.
+
+    Returns:
+        int: Full packet number.
+    """
+    expected = 0 if largest is None else largest + 1
+    window = 1 << (8 * length)
+    half_window = window // 2
+    candidate = (expected & ~(window - 1)) | truncated
+    if candidate <= expected - half_window and candidate < (1 << 62) - window:
+        return candidate + window
+    if candidate > expected + half_window and candidate >= window:
+        return candidate - window
+    return candidate
+
+def decode_frame(buf, offset):
+    """
+    Decode the frame starting at offset, dispatching on its type byte.
+
+    Args:
+        buf (memoryview): Buffer to read from.
+        offset (int): Position of the frame type byte.
+
+    Returns:
+        tuple: Decoded frame and the position just after it.
+    """
+    frame_type = buf[offset]
+    if frame_type & ~STREAM_FIN_BIT == STREAM_FRAME_TYPE:
+        return QUICStreamPayload.decode_from(buf, offset)
+    if frame_type == PADDING_FRAME_TYPE:
+        return QUICPadding.decode_from(buf, offset)
+    if frame_type in CONTROL_FRAMES:
+        return CONTROL_FRAMES[frame_type].decode_from(buf, offset)
+    raise ValueError(f"Unknown frame type {frame_type:#x}")
+
+def decode_frames(buf, offset):
+    """
+    Decode the frames that run from offset to the end of buf.
+
+    Args:
+        buf (memoryview): Buffer holding the packet payload.
+        offset (int): Position of the first frame.
+
+    Returns:
+        tuple: List of decoded frames and the position just after them.
+    """
+    frames = []
+    end = len(buf)
+    while offset < end:
+        if buf[offset] & ~STREAM_FIN_BIT == STREAM_FRAME_TYPE:
+            frame, offset = QUICStreamPayload.decode_from(buf, offset)  # The common frame type; skip the dispatch
+        else:
+            frame, offset = decode_frame(buf, offset)
+        frames.append(frame)
+    return frames, offset
+
+def decode_datagram(data):
+    """
+    Decode a received datagram into the object its type byte announces.
+
+    Args:
+        data (bytes | bytearray | memoryview): Received datagram.
+
+    Returns:
+        QUICLongHeader | QUICPacket | QUICShortHeaderPacket | QUICAck: Decoded object.
+    """
+    view = memoryview(data)
+    if not view:
+        raise ValueError("Empty datagram")
+    packet_type = view[0]
+    if packet_type & ~PACKET_NUMBER_LENGTH_MASK == SHORT_PACKET_TYPE:
+        return _decode_whole(QUICShortHeaderPacket, view)
+    if packet_type == DATA_PACKET_TYPE:
+        return _decode_whole(QUICPacket, view)
+    if packet_type == ACK_PACKET_TYPE:
+        return _decode_whole(QUICAck, view)
+    if packet_type == HELLO_PACKET_TYPE:
+        return _decode_whole(QUICLongHeader, view)
+    raise ValueError(f"Unknown packet type {packet_type:#x}")
+
+def _decode_whole(cls, data):
+    """
+    Decode one object that must span the whole of data.
+
+    Args:
+        cls (type): Class providing decode_from.
+        data (bytes | bytearray | memoryview): Encoded object.
+
+    Returns:
+        object: Decoded object.
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    try:
+        decoded, end = cls.decode_from(view, 0)
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"Truncated {cls.__name__}: {e}") from e
+    if end != len(view):
+        raise ValueError(f"{len(view) - end} trailing bytes after {cls.__name__}")
+    return decoded
 
 def generate_random_hex():
     """
@@ -20,6 +365,37 @@ def generate_random_hex():
     hex_string = hex_string.zfill(16)  # Ensure the hex string is 16 characters long (8 bytes)
     return hex_string
 
+def generate_cid(worker):
+    """
+    Generate a random 16-character hexadecimal connection ID that names the server worker owning it.
+
+    The first byte is the worker index, so a packet that reaches the wrong
+    worker process can be handed to the right one.
+
+    Args:
+        worker (int): Worker index, 0 to MAX_WORKERS - 1.
+
+    Returns:
+        str: The connection ID.
+    """
+    if not 0 <= worker < MAX_WORKERS:
+        raise ValueError(f"Worker index {worker} does not fit in a connection ID")
+    return f"{worker:02x}{random.getrandbits(56):014x}"
+
+def cid_worker(cid):
+    """
+    Return the worker index a connection ID from generate_cid() names.
+
+    Args:
+        cid (str): Hexadecimal connection ID.
+
+    Returns:
+        int: Worker index, or None if the ID is too short to carry one.
+    """
+    if len(cid) < 2:
+        return None
+    return int(cid[:2], 16)
+
 class QUICPacket:
     def __init__(self, flags, dest_conn_id, packet_number, protected_payload: list):
         """
@@ -36,27 +412,124 @@ class QUICPacket:
         self.packet_number = packet_number
         self.protected_payload = protected_payload
 
+    def encoded_size(self):
+        """
+        Calculate the number of bytes the packet takes on the wire.
+
+        Returns:
+            int: Encoded size in bytes.
+        """
+        size = self.header_size()
+        for frame in self.protected_payload:
+            size += frame.encoded_size()
+        return size
+
+    def header_size(self):
+        """
+        Calculate the number of bytes the packet header takes, before the first frame.
+
+        Returns:
+            int: Header size in bytes.
+        """
+        return 2 + cid_size(self.dest_conn_id) + varint_size(self.packet_number)
+
+    def header_bytes(self):
+        """
+        Encode the packet header.
+
+        Returns:
+            bytes: Type byte, flags byte, connection ID and varint packet number.
+        """
+        return bytes((DATA_PACKET_TYPE, self.flags)) + cid_bytes(self.dest_conn_id) + varint_bytes(self.packet_number)
+
+    def encode_into(self, buf, offset=0):
+        """
+        Encode the QUICPacket object into a caller-supplied buffer.
+
+        Layout: type byte, flags byte, connection ID, varint packet number,
+        then each frame back to back until the end of the datagram.
+
+        Args:
+            buf (bytearray | memoryview): Writable buffer with at least encoded_size() bytes free.
+            offset (int): Position to start writing at.
+
+        Returns:
+            int: Position just after the encoded packet.
+        """
+        header = self.header_bytes()
+        buf[offset:offset + len(header)] = header
+        offset += len(header)
+        for frame in self.protected_payload:
+            offset = frame.encode_into(buf, offset)
+        return offset
+
     def encode(self):
         """
-        Encode the QUICPacket object using pickle.
+        Encode the QUICPacket object into its wire format.
 
         Returns:
             bytes: Encoded QUICPacket object.
         """
-        return pickle.dumps(self)
-    
+        return b''.join(self.encode_buffers())
+
+    def encode_buffers(self):
+        """
+        Encode the QUICPacket object as a list of buffers for scatter-gather sending.
+
+        Only the packet and frame headers are built, as small bytes
+        objects; stream data is passed through as the frames' own buffers,
+        so it is never copied on its way to the socket.
+
+        Returns:
+            list: Buffers whose concatenation is the encoded packet.
+        """
+        header = self.header_bytes()
+        buffers = []
+        for frame in self.protected_payload:
+            header += frame.header_bytes()
+            if frame.stream_data:
+                buffers.append(header)
+                buffers.append(frame.stream_data)
+                header = b''
+        if header:
+            buffers.append(header)
+        return buffers
+
+    @classmethod
+    def decode_from(cls, buf, offset=0):
+        """
+        Decode a QUICPacket object that runs from offset to the end of buf.
+
+        Stream data in the decoded frames are memoryview slices of buf, so
+        nothing is copied out of the receive buffer.
+
+        Args:
+            buf (memoryview): Buffer holding the encoded packet.
+            offset (int): Position of the packet type byte.
+
+        Returns:
+            tuple: Decoded QUICPacket object and the position just after it.
+        """
+        if buf[offset] != DATA_PACKET_TYPE:
+            raise ValueError(f"Not a data packet (type {buf[offset]:#x})")
+        flags = buf[offset + 1]
+        dest_conn_id, offset = decode_cid(buf, offset + 2)
+        packet_number, offset = decode_varint(buf, offset)
+        frames, offset = decode_frames(buf, offset)
+        return cls(flags, dest_conn_id, packet_number, frames), offset
+
     @classmethod
     def decode(cls, data):
         """
-        Decode a QUICPacket object from bytes using pickle.
+        Decode a QUICPacket object from its wire format.
 
         Args:
-            data (bytes): Encoded QUICPacket object.
+            data (bytes | bytearray | memoryview): Encoded QUICPacket object.
 
         Returns:
             QUICPacket: Decoded QUICPacket object.
         """
-        return pickle.loads(data)
+        return _decode_whole(cls, data)
 
     def __str__(self):
         """
@@ -74,17 +547,99 @@ class QUICPacket:
     
     def size_in_bytes(self):
         """
-        Calculate the size of the QUICPacket object in bytes.
+        Calculate the size of the packet on the wire, the same as encoded_size().
+
+        Returns:
+            int: Encoded size in bytes.
+        """
+        return self.encoded_size()
+
+class QUICShortHeaderPacket(QUICPacket):
+    def __init__(self, dest_conn_id, packet_number, protected_payload: list, largest_acked=None, packet_number_length=None):
+        """
+        Initialize a data packet with a short header, sent once the handshake has settled the connection ID.
+
+        The header is a type byte holding the packet number length, the
+        connection ID's SHORT_CID_LENGTH bytes with no length byte, and the
+        low 1-4 bytes of the packet number: enough for the receiver to
+        reconstruct it with decode_packet_number(). A decoded packet holds
+        the truncated number until the receiver calls expand_packet_number().
+
+        Args:
+            dest_conn_id (str): Destination connection ID, SHORT_CID_LENGTH bytes in hexadecimal.
+            packet_number (int): Full packet number when sending; truncated when decoded.
+            protected_payload (list): List of frames.
+            largest_acked (int, optional): Largest packet number the peer acknowledged; sizes the truncated number.
+            packet_number_length (int, optional): Bytes of the truncated packet number. Defaults to the fewest
+                that reach from largest_acked.
+        """
+        super().__init__(SHORT_HEADER_FLAG, dest_conn_id, packet_number, protected_payload)
+        self.packet_number_length = packet_number_length or packet_number_size(packet_number, largest_acked)
+        self.truncated = False  # Whether packet_number still holds only the bytes received
+
+    def header_size(self):
+        """
+        Calculate the number of bytes the short header takes.
+
+        Returns:
+            int: Header size in bytes.
+        """
+        return 1 + SHORT_CID_LENGTH + self.packet_number_length
+
+    def header_bytes(self):
+        """
+        Encode the short header.
 
         Returns:
-            int: Size of the QUICPacket object in bytes.
+            bytes: Type byte, connection ID and truncated packet number.
+        """
+        raw = cid_bytes(self.dest_conn_id)
+        if len(raw) != SHORT_CID_LENGTH + 1:
+            raise ValueError(f"Connection ID {self.dest_conn_id} is not {SHORT_CID_LENGTH} bytes long")
+        length = self.packet_number_length
+        truncated = self.packet_number & ((1 << (8 * length)) - 1)
+        return bytes((SHORT_PACKET_TYPE | (length - 1),)) + raw[1:] + truncated.to_bytes(length, 'big')
+
+    @classmethod
+    def decode_from(cls, buf, offset=0):
         """
-        flags_size = sys.getsizeof(self.flags)
-        dest_conn_id_size = sys.getsizeof(self.dest_conn_id)
-        packet_number_size = sys.getsizeof(self.packet_number)
-        payload_size = sys.getsizeof(self.protected_payload)
-        total_size = flags_size + dest_conn_id_size + packet_number_size + payload_size
-        return total_size
+        Decode a short header packet that runs from offset to the end of buf.
+
+        Args:
+            buf (memoryview): Buffer holding the encoded packet.
+            offset (int): Position of the type byte.
+
+        Returns:
+            tuple: Decoded QUICShortHeaderPacket, with its packet number truncated, and the position just after it.
+        """
+        if buf[offset] & ~PACKET_NUMBER_LENGTH_MASK != SHORT_PACKET_TYPE:
+            raise ValueError(f"Not a short header packet (type {buf[offset]:#x})")
+        length = (buf[offset] & PACKET_NUMBER_LENGTH_MASK) + 1
+        offset += 1
+        end = offset + SHORT_CID_LENGTH + length
+        if end > len(buf):
+            raise ValueError("Truncated short header")
+        dest_conn_id = buf[offset:offset + SHORT_CID_LENGTH].hex()
+        truncated = int.from_bytes(buf[offset + SHORT_CID_LENGTH:end], 'big')
+        frames, offset = decode_frames(buf, end)
+        packet = cls(dest_conn_id, truncated, frames, packet_number_length=length)
+        packet.truncated = True
+        return packet, offset
+
+    def expand_packet_number(self, largest):
+        """
+        Replace a received truncated packet number with the full one.
+
+        Args:
+            largest (int): Largest packet number received on the connection so far, or None.
+
+        Returns:
+            int: The full packet number.
+        """
+        if self.truncated:
+            self.packet_number = decode_packet_number(self.packet_number, self.packet_number_length, largest)
+            self.truncated = False
+        return self.packet_number
 
 class QUICStreamPayload:
     def __init__(self, stream_id, offset, length, finished, stream_data):
@@ -104,27 +659,152 @@ class QUICStreamPayload:
         self.length = length
         self.stream_data = stream_data
 
+    def encoded_size(self):
+        """
+        Calculate the number of bytes the frame takes on the wire.
+
+        Returns:
+            int: Encoded size in bytes.
+        """
+        return self.header_size() + len(self.stream_data)
+
+    def header_size(self):
+        """
+        Calculate the number of bytes the frame takes on the wire before its stream data.
+
+        Returns:
+            int: Header size in bytes.
+        """
+        return 1 + varint_size(self.stream_id) + varint_size(self.offset) + varint_size(len(self.stream_data))
+
+    def split(self, count):
+        """
+        Split the frame in two after its first count bytes of data.
+
+        Args:
+            count (int): Bytes of data for the first frame; between 1 and length - 1.
+
+        Returns:
+            tuple: The first frame, without the finished flag, and the frame with the rest of the data.
+        """
+        start = self.offset - self.length  # The offset is just past the frame's data
+        head = QUICStreamPayload(self.stream_id, start + count, count, 0, self.stream_data[:count])
+        tail = QUICStreamPayload(self.stream_id, self.offset, self.length - count, self.finished, self.stream_data[count:])
+        return head, tail
+
+    def header_bytes(self):
+        """
+        Encode everything of the frame except its stream data as bytes.
+
+        Returns:
+            bytes: Encoded frame header.
+        """
+        frame_type = _STREAM_FIN_TYPE if self.finished else _STREAM_TYPE
+        return frame_type + varint_bytes(self.stream_id) + varint_bytes(self.offset) + varint_bytes(len(self.stream_data))
+
+    def encode_header_into(self, buf, offset=0):
+        """
+        Encode everything of the frame except its stream data into a caller-supplied buffer.
+
+        Args:
+            buf (bytearray | memoryview): Writable buffer with at least header_size() bytes free.
+            offset (int): Position to start writing at.
+
+        Returns:
+            int: Position just after the header, where the stream data belongs.
+        """
+        buf[offset] = STREAM_FRAME_TYPE | STREAM_FIN_BIT if self.finished else STREAM_FRAME_TYPE
+        offset = encode_varint(buf, offset + 1, self.stream_id)
+        offset = encode_varint(buf, offset, self.offset)
+        return encode_varint(buf, offset, len(self.stream_data))
+
+    def encode_into(self, buf, offset=0):
+        """
+        Encode the QUICStreamPayload object into a caller-supplied buffer.
+
+        Layout: type byte (FIN bit set when finished), varint stream ID,
+        varint offset, varint length prefix, then the stream data.
+
+        Args:
+            buf (bytearray | memoryview): Writable buffer with at least encoded_size() bytes free.
+            offset (int): Position to start writing at.
+
+        Returns:
+            int: Position just after the encoded frame.
+        """
+        data = self.stream_data
+        offset = self.encode_header_into(buf, offset)
+        end = offset + len(data)
+        buf[offset:end] = data
+        return end
+
     def encode(self):
         """
-        Encode the QUICStreamPayload object using pickle.
+        Encode the QUICStreamPayload object into its wire format.
 
         Returns:
             bytes: Encoded QUICStreamPayload object.
         """
-        return pickle.dumps(self)
+        return b''.join((self.header_bytes(), self.stream_data))
+
+    @classmethod
+    def decode_from(cls, buf, offset=0):
+        """
+        Decode a QUICStreamPayload object starting at offset.
+
+        Args:
+            buf (memoryview): Buffer holding the encoded frame.
+            offset (int): Position of the frame type byte.
+
+        Returns:
+            tuple: Decoded QUICStreamPayload object (its stream data is a slice of buf) and the position just after it.
+        """
+        finished = buf[offset] & STREAM_FIN_BIT
+        # Stream IDs and lengths are 1- or 2-byte varints in practice: read those inline
+        stream_id = buf[offset + 1]
+        if stream_id < 0x40:
+            offset += 2
+        else:
+            stream_id, offset = decode_varint(buf, offset + 1)
+        stream_offset, offset = decode_varint(buf, offset)
+        length = buf[offset]
+        if length < 0x40:
+            offset += 1
+        elif length < 0x80:
+            length = (length & 0x3F) << 8 | buf[offset + 1]
+            offset += 2
+        else:
+            length, offset = decode_varint(buf, offset)
+        end = offset + length
+        if end > len(buf):
+            raise ValueError("Stream frame length runs past the end of the packet")
+        return cls(stream_id, stream_offset, length, finished, buf[offset:end]), end
 
     @classmethod
     def decode(cls, data):
         """
-        Decode a QUICStreamPayload object from bytes using pickle.
+        Decode a QUICStreamPayload object from its wire format.
 
         Args:
-            data (bytes): Encoded QUICStreamPayload object.
+            data (bytes | bytearray | memoryview): Encoded QUICStreamPayload object.
 
         Returns:
             QUICStreamPayload: Decoded QUICStreamPayload object.
         """
-        return pickle.loads(data) 
+        return _decode_whole(cls, data)
+
+    def __eq__(self, other):
+        """
+        Compare two stream frames field by field.
+
+        Returns:
+            bool: True if both frames carry the same stream, offset, flag and data.
+        """
+        if not isinstance(other, QUICStreamPayload):
+            return NotImplemented
+        return (self.stream_id == other.stream_id and self.offset == other.offset and self.length == other.length
+                and self.finished == other.finished and self.stream_data == other.stream_data)
+
     
     def __str__(self):
         """
@@ -135,8 +815,275 @@ class QUICStreamPayload:
         """
         return f"Stream ID: {self.stream_id} Offset: {self.offset} Finished: {self.finished} Length: {self.length}"
 
+class QUICPadding:
+    def __init__(self, length):
+        """
+        Initialize a QUICPadding frame, zero bytes that make a packet larger.
+
+        Path MTU probes are data packets filled out with padding to the size
+        being probed.
+
+        Args:
+            length (int): Number of padding bytes, at least 1.
+        """
+        if length < 1:
+            raise ValueError("Padding must be at least one byte")
+        self.length = length
+        self.stream_data = b''  # Padding carries no stream data; lets encode_buffers treat every frame alike
+
+    def encoded_size(self):
+        """
+        Calculate the number of bytes the frame takes on the wire.
+
+        Returns:
+            int: Encoded size in bytes.
+        """
+        return self.length
+
+    def header_bytes(self):
+        """
+        Encode the frame as bytes.
+
+        Returns:
+            bytes: length zero bytes.
+        """
+        return bytes(self.length)
+
+    def encode_into(self, buf, offset=0):
+        """
+        Encode the QUICPadding object into a caller-supplied buffer.
+
+        Args:
+            buf (bytearray | memoryview): Writable buffer with at least length bytes free.
+            offset (int): Position to start writing at.
+
+        Returns:
+            int: Position just after the padding.
+        """
+        end = offset + self.length
+        buf[offset:end] = bytes(self.length)
+        return end
+
+    @classmethod
+    def decode_from(cls, buf, offset=0):
+        """
+        Decode the run of padding bytes starting at offset.
+
+        Args:
+            buf (memoryview): Buffer holding the encoded frame.
+            offset (int): Position of the first padding byte.
+
+        Returns:
+            tuple: Decoded QUICPadding object and the position just after the run.
+        """
+        rest = bytes(buf[offset:])
+        length = len(rest) - len(rest.lstrip(b'\x00'))
+        return cls(length), offset + length
+
+    def __eq__(self, other):
+        """
+        Compare two padding frames by length.
+
+        Returns:
+            bool: True if both frames are the same number of bytes.
+        """
+        if not isinstance(other, QUICPadding):
+            return NotImplemented
+        return self.length == other.length
+
+class QUICControlFrame:
+    FRAME_TYPE = None  # Type byte of the frame on the wire
+    FIELDS = ()  # Attributes encoded after the type byte, each as a varint, in order
+
+    stream_data = b''  # Control frames carry no stream data; lets encode_buffers treat every frame alike
+
+    def encoded_size(self):
+        """
+        Calculate the number of bytes the frame takes on the wire.
+
+        Returns:
+            int: Encoded size in bytes.
+        """
+        return 1 + sum(varint_size(getattr(self, name)) for name in self.FIELDS)
+
+    def header_size(self):
+        """
+        Calculate the number of bytes the frame takes on the wire; all of it is header.
+
+        Returns:
+            int: Encoded size in bytes.
+        """
+        return self.encoded_size()
+
+    def header_bytes(self):
+        """
+        Encode the frame as bytes.
+
+        Returns:
+            bytes: Type byte followed by the fields as varints.
+        """
+        return bytes((self.FRAME_TYPE,)) + b''.join(varint_bytes(getattr(self, name)) for name in self.FIELDS)
+
+    def encode_into(self, buf, offset=0):
+        """
+        Encode the frame into a caller-supplied buffer.
+
+        Args:
+            buf (bytearray | memoryview): Writable buffer with at least encoded_size() bytes free.
+            offset (int): Position to start writing at.
+
+        Returns:
+            int: Position just after the encoded frame.
+        """
+        buf[offset] = self.FRAME_TYPE
+        offset += 1
+        for name in self.FIELDS:
+            offset = encode_varint(buf, offset, getattr(self, name))
+        return offset
+
+    @classmethod
+    def decode_from(cls, buf, offset=0):
+        """
+        Decode a frame of this class starting at offset.
+
+        Args:
+            buf (memoryview): Buffer holding the encoded frame.
+            offset (int): Position of the frame type byte.
+
+        Returns:
+            tuple: Decoded frame and the position just after it.
+        """
+        if buf[offset] != cls.FRAME_TYPE:
+            raise ValueError(f"Not a {cls.__name__} frame (type {buf[offset]:#x})")
+        offset += 1
+        values = []
+        for _ in cls.FIELDS:
+            value, offset = decode_varint(buf, offset)
+            values.append(value)
+        return cls(*values), offset
+
+    def __eq__(self, other):
+        """
+        Compare two control frames field by field.
+
+        Returns:
+            bool: True if both frames are of the same type and carry the same values.
+        """
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    def __str__(self):
+        """
+        Return a string representation of the frame.
+
+        Returns:
+            str: Frame class and field values.
+        """
+        return f"{type(self).__name__} " + " ".join(f"{name}: {getattr(self, name)}" for name in self.FIELDS)
+
+class QUICMaxData(QUICControlFrame):
+    FRAME_TYPE = MAX_DATA_FRAME_TYPE
+    FIELDS = ('maximum', )
+
+    def __init__(self, maximum):
+        """
+        Initialize a QUICMaxData frame, the receiver's credit for the whole connection.
+
+        Args:
+            maximum (int): Total stream bytes, summed over every stream, the sender may send.
+        """
+        self.maximum = maximum
+
+class QUICMaxStreamData(QUICControlFrame):
+    FRAME_TYPE = MAX_STREAM_DATA_FRAME_TYPE
+    FIELDS = ('stream_id', 'maximum')
+
+    def __init__(self, stream_id, maximum):
+        """
+        Initialize a QUICMaxStreamData frame, the receiver's credit for one stream.
+
+        Args:
+            stream_id (int): Stream the credit is for.
+            maximum (int): Stream offset the sender may send up to.
+        """
+        self.stream_id = stream_id
+        self.maximum = maximum
+
+class QUICDataBlocked(QUICControlFrame):
+    FRAME_TYPE = DATA_BLOCKED_FRAME_TYPE
+    FIELDS = ('limit', )
+
+    def __init__(self, limit):
+        """
+        Initialize a QUICDataBlocked frame: the sender has data but no connection credit left.
+
+        Args:
+            limit (int): Connection credit the sender is blocked at.
+        """
+        self.limit = limit
+
+class QUICStreamDataBlocked(QUICControlFrame):
+    FRAME_TYPE = STREAM_DATA_BLOCKED_FRAME_TYPE
+    FIELDS = ('stream_id', 'limit')
+
+    def __init__(self, stream_id, limit):
+        """
+        Initialize a QUICStreamDataBlocked frame: the sender has data for a stream but no credit for it.
+
+        Args:
+            stream_id (int): Blocked stream.
+            limit (int): Stream credit the sender is blocked at.
+        """
+        self.stream_id = stream_id
+        self.limit = limit
+
+class QUICAckFrequency(QUICControlFrame):
+    FRAME_TYPE = ACK_FREQUENCY_FRAME_TYPE
+    FIELDS = ('sequence', 'threshold', 'max_ack_delay', 'reorder_threshold')
+
+    def __init__(self, sequence, threshold, max_ack_delay, reorder_threshold=1):
+        """
+        Initialize a QUICAckFrequency frame, the sender's request for how often to be acknowledged.
+
+        Args:
+            sequence (int): Increases with every request; a receiver ignores requests older than the last one it applied.
+            threshold (int): Packets to receive before sending an ACK.
+            max_ack_delay (int): Longest to hold back an ACK, in microseconds.
+            reorder_threshold (int): How far past a missing packet the receiver gets before acknowledging
+                at once; 0 never acknowledges early for reordering.
+        """
+        self.sequence = sequence
+        self.threshold = threshold
+        self.max_ack_delay = max_ack_delay
+        self.reorder_threshold = reorder_threshold
+
+class QUICKeepAlive(QUICControlFrame):
+    FRAME_TYPE = KEEP_ALIVE_FRAME_TYPE
+
+    def __init__(self):
+        """
+        Initialize a QUICKeepAlive frame, sent with a request: the connection stays open for more requests once it is answered.
+        """
+
+class QUICGoAway(QUICControlFrame):
+    FRAME_TYPE = GO_AWAY_FRAME_TYPE
+    FIELDS = ('stream_count', )
+
+    def __init__(self, stream_count):
+        """
+        Initialize a QUICGoAway frame: the client opens no more streams, and the connection closes once they are answered.
+
+        Args:
+            stream_count (int): Streams the client opened; their IDs are 0 to stream_count - 1.
+        """
+        self.stream_count = stream_count
+
+CONTROL_FRAMES = {cls.FRAME_TYPE: cls for cls in (QUICMaxData, QUICMaxStreamData, QUICDataBlocked, QUICStreamDataBlocked, QUICAckFrequency,
+                                                  QUICKeepAlive, QUICGoAway)}
+
 class QUICLongHeader:
-    def __init__(self, flags, dest_conn_id, src_conn_id, packet_number):
+    def __init__(self, flags, dest_conn_id, src_conn_id, packet_number, token=b''):
         """
         Initialize a QUICLongHeader object.
 
@@ -145,33 +1092,144 @@ class QUICLongHeader:
             dest_conn_id (str): Destination connection ID.
             src_conn_id (str): Source connection ID.
             packet_number (int): Packet number.
+            token (bytes): Resumption token: issued by the server in a Server Hello,
+                presented by a returning client in its Client Hello. Empty if none.
         """
         self.flags = flags
         self.dest_cid = dest_conn_id
         self.src_cid = src_conn_id
         self.packet_number = packet_number
+        self.token = bytes(token)
+
+    def encoded_size(self):
+        """
+        Calculate the number of bytes the header takes on the wire.
+
+        Returns:
+            int: Encoded size in bytes.
+        """
+        return 2 + cid_size(self.dest_cid) + cid_size(self.src_cid) + varint_size(self.packet_number) + 1 + len(self.token)
+
+    def encode_into(self, buf, offset=0):
+        """
+        Encode the QUICLongHeader object into a caller-supplied buffer.
+
+        Layout: type byte, flags byte, destination and source connection IDs,
+        varint packet number, then the token behind a length byte.
+
+        Args:
+            buf (bytearray | memoryview): Writable buffer with at least encoded_size() bytes free.
+            offset (int): Position to start writing at.
+
+        Returns:
+            int: Position just after the encoded header.
+        """
+        buf[offset] = HELLO_PACKET_TYPE
+        buf[offset + 1] = self.flags
+        offset = encode_cid(buf, offset + 2, self.dest_cid)
+        offset = encode_cid(buf, offset, self.src_cid)
+        offset = encode_varint(buf, offset, self.packet_number)
+        buf[offset:offset + 1 + len(self.token)] = self.token_bytes()
+        return offset + 1 + len(self.token)
+
+    def token_bytes(self):
+        """
+        Return the token as its wire form: a length byte followed by the token.
+
+        Returns:
+            bytes: Encoded token.
+        """
+        if len(self.token) > MAX_TOKEN_LENGTH:
+            raise ValueError(f"Token of {len(self.token)} bytes is longer than {MAX_TOKEN_LENGTH}")
+        return bytes((len(self.token),)) + self.token
 
     def encode(self):
         """
-        Encode the QUICLongHeader object using pickle.
+        Encode the QUICLongHeader object into its wire format.
 
         Returns:
             bytes: Encoded QUICLongHeader object.
         """
-        return pickle.dumps(self)
+        return (bytes((HELLO_PACKET_TYPE, self.flags)) + cid_bytes(self.dest_cid) + cid_bytes(self.src_cid) + varint_bytes(self.packet_number)
+                + self.token_bytes())
+
+    @classmethod
+    def decode_from(cls, buf, offset=0):
+        """
+        Decode a QUICLongHeader object starting at offset.
+
+        Args:
+            buf (memoryview): Buffer holding the encoded header.
+            offset (int): Position of the packet type byte.
+
+        Returns:
+            tuple: Decoded QUICLongHeader object and the position just after it.
+        """
+        if buf[offset] != HELLO_PACKET_TYPE:
+            raise ValueError(f"Not a long header packet (type {buf[offset]:#x})")
+        flags = buf[offset + 1]
+        dest_cid, offset = decode_cid(buf, offset + 2)
+        src_cid, offset = decode_cid(buf, offset)
+        packet_number, offset = decode_varint(buf, offset)
+        length = buf[offset]
+        end = offset + 1 + length
+        if end > len(buf):
+            raise ValueError("Truncated token")
+        return cls(flags, dest_cid, src_cid, packet_number, buf[offset + 1:end]), end
 
     @classmethod
     def decode(cls, data):
         """
-        Decode a QUICLongHeader object from bytes using pickle.
+        Decode a QUICLongHeader object from its wire format.
 
         Args:
-            data (bytes): Encoded QUICLongHeader object.
+            data (bytes | bytearray | memoryview): Encoded QUICLongHeader object.
 
         Returns:
             QUICLongHeader: Decoded QUICLongHeader object.
         """
-        return pickle.loads(data)
+        return _decode_whole(cls, data)
+
+class BufferPool:
+    def __init__(self, buffer_size=RECEIVE_BUFFER_SIZE, capacity=BUFFER_POOL_SIZE):
+        """
+        Initialize a BufferPool of reusable receive buffers.
+
+        Buffers are created on demand and kept for reuse when released, so a
+        steady stream of datagrams is received without allocating.
+
+        Args:
+            buffer_size (int): Size of each buffer in bytes.
+            capacity (int): Most free buffers kept; extra released buffers are dropped.
+        """
+        self.buffer_size = buffer_size
+        self.capacity = capacity
+        self.free = []
+        self.allocations = 0  # Buffers created because none was free
+        self.reuses = 0  # Buffers handed out again from the free list
+
+    def acquire(self):
+        """
+        Take a buffer from the pool, creating one if none is free.
+
+        Returns:
+            bytearray: Buffer of buffer_size bytes.
+        """
+        if self.free:
+            self.reuses += 1
+            return self.free.pop()
+        self.allocations += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer):
+        """
+        Give a buffer back to the pool.
+
+        Args:
+            buffer (bytearray): Buffer obtained from acquire().
+        """
+        if len(self.free) < self.capacity:
+            self.free.append(buffer)
 
 class QUICSocket:
     def __init__(self):
@@ -182,17 +1240,62 @@ class QUICSocket:
         self.__dest_cid = None
         self.__src_cid = None
         self.__sockfd = None
+        self.pool = BufferPool()  # Receive buffers reused by recvfrom_pooled()
+        self.gso = False  # Whether sendmsg_batch() hands runs of datagrams to the kernel as one GSO send
+        self.gso_segment_limit = GSO_SEGMENT_LIMIT  # Datagrams above the path MTU are never segmented; they go out one by one
+        self.gro = False  # Whether the kernel may coalesce received datagrams, see recvfrom_segments()
 
-    def create_socket(self):
+    def create_socket(self, reuse_port=False):
         """
         Create a UDP socket and set necessary socket options.
+
+        Args:
+            reuse_port (bool): Whether to set SO_REUSEPORT, so several server processes can bind
+                the same port and the kernel spreads clients across them.
         """
         self.__sockfd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         if self.__sockfd is None:
             raise RuntimeError("Socket creation failed.")
         self.__sockfd.settimeout(3)
         self.__sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        # self.__sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise RuntimeError("SO_REUSEPORT is not available on this platform.")
+            self.__sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if sys.platform.startswith('linux'):
+            # Set Don't Fragment without letting the kernel's path MTU cache limit sends: datagrams larger
+            # than the path are dropped instead of fragmented, which path MTU discovery relies on
+            try:
+                self.__sockfd.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_PROBE)
+            except OSError:
+                pass
+
+    def enable_batch_io(self):
+        """
+        Turn on Linux UDP GSO for sending and GRO for receiving where the kernel supports them.
+
+        Each option is probed with setsockopt and left off if it is
+        rejected, so the socket keeps working one datagram per call on
+        other kernels and platforms.
+
+        Returns:
+            bool: True if GSO or GRO was turned on.
+        """
+        if not self.__sockfd:
+            raise RuntimeError("Socket not initialized. Call create_socket() first.")
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            self.__sockfd.setsockopt(SOL_UDP, UDP_SEGMENT, 0)  # 0 leaves sends unsegmented unless a message asks
+            self.gso = True
+        except OSError:
+            self.gso = False
+        try:
+            self.__sockfd.setsockopt(SOL_UDP, UDP_GRO, 1)
+            self.gro = True
+        except OSError:
+            self.gro = False
+        return self.gso or self.gro
 
     def bind(self, address):
         """
@@ -229,6 +1332,116 @@ class QUICSocket:
             self.__sockfd.close()
             exit(0)
 
+    def sendmsg(self, buffers, address):
+        """
+        Send one datagram gathered from several buffers without joining them first.
+
+        Falls back to joining the buffers and calling sendto() on platforms
+        without sendmsg. A datagram larger than the path MTU the kernel
+        knows of is dropped, as a router would drop it, so path MTU
+        discovery sees an oversized probe as lost.
+
+        Args:
+            buffers (list): Bytes-like objects whose concatenation is the datagram.
+            address (tuple): Address to send the datagram to.
+        """
+        if not self.__sockfd:
+            raise RuntimeError("Socket not initialized. Call create_socket() first.")
+        if not hasattr(self.__sockfd, 'sendmsg'):
+            self.sendto(b''.join(buffers), address)
+            return
+        try:
+            self.__sockfd.sendmsg(buffers, (), 0, address)
+        except OSError as e:
+            if e.errno != errno.EMSGSIZE:
+                raise
+        except (KeyboardInterrupt, socket.timeout) as e:
+            print(e)
+            print("Exiting...")
+            self.__sockfd.close()
+            exit(0)
+
+    def sendmsg_batch(self, datagrams):
+        """
+        Send several datagrams with as few system calls as possible.
+
+        With GSO on, consecutive datagrams to the same address that have
+        the same size (the last of a run may be shorter) go out in one
+        sendmsg() whose UDP_SEGMENT ancillary data tells the kernel where to
+        split them. Datagrams larger than gso_segment_limit are sent alone.
+        If the kernel rejects a segmented send as unsupported (EINVAL,
+        EOPNOTSUPP or EIO), GSO is turned off and every datagram is sent
+        with its own sendmsg(); after any other error only that run is sent
+        one by one, so a transient failure such as ENOBUFS keeps GSO on.
+
+        Args:
+            datagrams (list): (buffers, address) pairs, buffers being the list of bytes-like objects of one datagram.
+
+        Returns:
+            int: Number of datagrams sent; fewer than given if the socket buffer filled up.
+        """
+        if not self.__sockfd:
+            raise RuntimeError("Socket not initialized. Call create_socket() first.")
+        sent = 0
+        while sent < len(datagrams):
+            count = self.__gso_run(datagrams, sent) if self.gso else 1
+            if count > 1:
+                buffers, address = datagrams[sent]
+                size = sum(len(buffer) for buffer in buffers)
+                gathered = [buffer for buffers, _ in datagrams[sent:sent + count] for buffer in buffers]
+                try:
+                    self.__sockfd.sendmsg(gathered, [(SOL_UDP, UDP_SEGMENT, _GSO_SIZE.pack(size))], 0, address)
+                except BlockingIOError:
+                    return sent
+                except OSError as e:
+                    if e.errno in GSO_REJECTED:
+                        self.gso = False  # No segmentation offload on this path; send one by one from now on
+                    for datagram in datagrams[sent:sent + count]:
+                        try:
+                            self.sendmsg(*datagram)
+                        except BlockingIOError:
+                            return sent
+                        sent += 1
+                    continue
+            else:
+                try:
+                    self.sendmsg(*datagrams[sent])
+                except BlockingIOError:
+                    return sent
+            sent += count
+        return sent
+
+    def __gso_run(self, datagrams, start):
+        """
+        Count how many datagrams from start can share one GSO send.
+
+        Args:
+            datagrams (list): (buffers, address) pairs.
+            start (int): Index of the first datagram of the run.
+
+        Returns:
+            int: Length of the run, at least 1.
+        """
+        buffers, address = datagrams[start]
+        size = sum(len(buffer) for buffer in buffers)
+        if size > self.gso_segment_limit:
+            return 1
+        total = size
+        iov = len(buffers)
+        count = 1
+        while start + count < len(datagrams) and count < MAX_GSO_SEGMENTS:
+            buffers, next_address = datagrams[start + count]
+            next_size = sum(len(buffer) for buffer in buffers)
+            if (next_address != address or next_size > size or total + next_size > MAX_GSO_BYTES
+                    or iov + len(buffers) > MAX_IOV):
+                break
+            total += next_size
+            iov += len(buffers)
+            count += 1
+            if next_size < size:
+                break  # Only the last segment may be shorter
+        return count
+
     def recvfrom(self, bufsize):
         """
         Receive data from the socket.
@@ -238,17 +1451,89 @@ class QUICSocket:
 
         Returns:
             tuple: Received data and address of the sender.
+
+        Raises:
+            socket.timeout: If nothing arrives before the socket timeout, so callers can retransmit.
         """
         if not self.__sockfd:
             raise RuntimeError("Socket not initialized. Call create_socket() first.")
         try:
             return self.__sockfd.recvfrom(bufsize)
-        except (KeyboardInterrupt, socket.timeout) as e:
+        except KeyboardInterrupt as e:
             print(e)
             print("Exiting...")
             self.__sockfd.close()
             exit(0)
 
+    def recvfrom_pooled(self):
+        """
+        Receive one datagram into a buffer from the pool.
+
+        The returned memoryview, and any object decoded from it, is only
+        valid until release() is called with it; copy whatever must outlive
+        the datagram.
+
+        Returns:
+            tuple: memoryview of the received bytes and address of the sender.
+
+        Raises:
+            socket.timeout: If nothing arrives before the socket timeout.
+            BlockingIOError: If the socket is non-blocking and nothing is waiting.
+        """
+        if not self.__sockfd:
+            raise RuntimeError("Socket not initialized. Call create_socket() first.")
+        buffer = self.pool.acquire()
+        try:
+            nbytes, address = self.__sockfd.recvfrom_into(buffer)
+        except BaseException:
+            self.pool.release(buffer)
+            raise
+        return memoryview(buffer)[:nbytes], address
+
+    def recvfrom_segments(self):
+        """
+        Receive into a buffer from the pool what may be several datagrams coalesced by GRO.
+
+        Without GRO this is recvfrom_pooled() with a segment size equal to
+        the datagram length. The returned view is released with release()
+        like one from recvfrom_pooled().
+
+        Returns:
+            tuple: memoryview of the received bytes, address of the sender and the size every
+                datagram in it has (the last may be shorter).
+
+        Raises:
+            socket.timeout: If nothing arrives before the socket timeout.
+            BlockingIOError: If the socket is non-blocking and nothing is waiting.
+        """
+        if not self.gro:
+            view, address = self.recvfrom_pooled()
+            return view, address, len(view)
+        if not self.__sockfd:
+            raise RuntimeError("Socket not initialized. Call create_socket() first.")
+        buffer = self.pool.acquire()
+        try:
+            nbytes, ancillary, _, address = self.__sockfd.recvmsg_into([buffer], socket.CMSG_SPACE(_GRO_SIZE.size))
+        except BaseException:
+            self.pool.release(buffer)
+            raise
+        segment_size = nbytes
+        for level, kind, data in ancillary:
+            if level == SOL_UDP and kind == UDP_GRO and len(data) >= _GRO_SIZE.size:
+                segment_size = _GRO_SIZE.unpack_from(data)[0]
+        return memoryview(buffer)[:nbytes], address, segment_size or nbytes
+
+    def release(self, view):
+        """
+        Return the buffer behind a view from recvfrom_pooled() to the pool.
+
+        Args:
+            view (memoryview): View returned by recvfrom_pooled().
+        """
+        buffer = view.obj
+        view.release()
+        self.pool.release(buffer)
+
     # Setters
     def set_address(self, address):
         """
@@ -317,43 +1602,137 @@ class QUICSocket:
         return self.__sockfd
 
 class QUICAck:
-    def __init__(self, ack_number, ack_delay):
+    def __init__(self, ack_number, ack_delay, dest_conn_id='', ranges=None):
         """
         Initialize a QUICAck object.
 
         Args:
-            ack_number (int): Acknowledgement number.
-            ack_delay (int): Acknowledgement delay.
+            ack_number (int): Largest acknowledged packet number.
+            ack_delay (int): Time between receiving ack_number and sending the ACK, in microseconds.
+            dest_conn_id (str): Destination connection ID, used by the server to find the connection.
+            ranges (list, optional): Acknowledged (smallest, largest) packet number ranges, largest first, the
+                first one ending at ack_number. Defaults to ack_number alone.
         """
         self.ack_number = ack_number
         self.ack_delay = ack_delay
+        self.dest_conn_id = dest_conn_id
+        self.ranges = [(ack_number, ack_number)] if ranges is None else ranges
+        if self.ranges[0][1] != ack_number:
+            raise ValueError("The first ACK range must end at the largest acknowledged packet")
+
+    def range_fields(self):
+        """
+        Return the ranges as the varints that encode them.
+
+        The first range is given by its length below ack_number; every
+        further range by the gap below the previous one (missing packets
+        minus one) and its own length, as in QUIC ACK frames.
+
+        Returns:
+            list: Additional range count, first range length, then a gap and a length per additional range.
+        """
+        fields = [len(self.ranges) - 1, self.ranges[0][1] - self.ranges[0][0]]
+        previous = self.ranges[0][0]
+        for smallest, largest in self.ranges[1:]:
+            if largest > previous - 2:
+                raise ValueError("ACK ranges must be descending and separated by missing packets")
+            fields.append(previous - largest - 2)
+            fields.append(largest - smallest)
+            previous = smallest
+        return fields
+
+    def encoded_size(self):
+        """
+        Calculate the number of bytes the ACK takes on the wire.
+
+        Returns:
+            int: Encoded size in bytes.
+        """
+        return (1 + cid_size(self.dest_conn_id) + varint_size(self.ack_number) + varint_size(self.ack_delay)
+                + sum(varint_size(field) for field in self.range_fields()))
+
+    def encode_into(self, buf, offset=0):
+        """
+        Encode the QUICAck object into a caller-supplied buffer.
+
+        Layout: type byte, connection ID, varint largest acknowledged packet number, varint ACK delay,
+        varint additional range count, varint first range length, then a varint gap and length per additional range.
+
+        Args:
+            buf (bytearray | memoryview): Writable buffer with at least encoded_size() bytes free.
+            offset (int): Position to start writing at.
+
+        Returns:
+            int: Position just after the encoded ACK.
+        """
+        buf[offset] = ACK_PACKET_TYPE
+        offset = encode_cid(buf, offset + 1, self.dest_conn_id)
+        offset = encode_varint(buf, offset, self.ack_number)
+        offset = encode_varint(buf, offset, self.ack_delay)
+        for field in self.range_fields():
+            offset = encode_varint(buf, offset, field)
+        return offset
 
     def encode(self):
         """
-        Encode the QUICAck object using pickle.
+        Encode the QUICAck object into its wire format.
 
         Returns:
             bytes: Encoded QUICAck object.
         """
         try:
-            return pickle.dumps(self)
-        except pickle.PickleError as e:
-            print(f"Error encoding QUICPacket: {e}")
+            return (_ACK_TYPE + cid_bytes(self.dest_conn_id) + varint_bytes(self.ack_number) + varint_bytes(self.ack_delay)
+                    + b''.join(varint_bytes(field) for field in self.range_fields()))
+        except ValueError as e:
+            print(f"Error encoding QUICAck: {e}")
             return None
 
+    @classmethod
+    def decode_from(cls, buf, offset=0):
+        """
+        Decode a QUICAck object starting at offset.
+
+        Args:
+            buf (memoryview): Buffer holding the encoded ACK.
+            offset (int): Position of the packet type byte.
+
+        Returns:
+            tuple: Decoded QUICAck object and the position just after it.
+        """
+        if buf[offset] != ACK_PACKET_TYPE:
+            raise ValueError(f"Not an ACK packet (type {buf[offset]:#x})")
+        dest_conn_id, offset = decode_cid(buf, offset + 1)
+        ack_number, offset = decode_varint(buf, offset)
+        ack_delay, offset = decode_varint(buf, offset)
+        count, offset = decode_varint(buf, offset)
+        length, offset = decode_varint(buf, offset)
+        smallest = ack_number - length
+        if smallest < 0:
+            raise ValueError("ACK range below packet number 0")
+        ranges = [(smallest, ack_number)]
+        for _ in range(count):
+            gap, offset = decode_varint(buf, offset)
+            length, offset = decode_varint(buf, offset)
+            largest = smallest - gap - 2
+            smallest = largest - length
+            if smallest < 0:
+                raise ValueError("ACK range below packet number 0")
+            ranges.append((smallest, largest))
+        return cls(ack_number, ack_delay, dest_conn_id, ranges), offset
+
     @classmethod
     def decode(cls, data):
         """
-        Decode a QUICAck object from bytes using pickle.
+        Decode a QUICAck object from its wire format.
 
         Args:
-            data (bytes): Encoded QUICAck object.
+            data (bytes | bytearray | memoryview): Encoded QUICAck object.
 
         Returns:
-            QUICAck: Decoded QUICAck object.
+            QUICAck: Decoded QUICAck object, or None if the data is not a valid ACK.
         """
         try:
-            return pickle.loads(data)
-        except pickle.UnpicklingError as e:
-            print(f"Error decoding QUICPacket: {e}")
+            return _decode_whole(cls, data)
+        except ValueError as e:
+            print(f"Error decoding QUICAck: {e}")
             return None
@@ -0,0 +1,147 @@
+from typing import Final  # Importing Final from typing for defining constants
+
+# Packetization layer path MTU discovery constants (RFC 8899, section 5.1)
+basePlpmtu: Final = 1200  # Datagram size every path is assumed to carry; QUIC's minimum
+maxPlpmtu: Final = 1472  # Largest datagram searched for by default: a 1500-byte Ethernet MTU minus IPv4 and UDP headers
+searchGranularity: Final = 8  # The search stops once the largest working and smallest failing sizes are this close
+maxProbes: Final = 3  # Lost probes of one size before the size is taken to be too large
+blackHoleLosses: Final = 6  # Lost packets above the base size in a row, none acknowledged in between, that raise a black hole suspicion
+blackHoleTimeouts: Final = 2  # Probe timeouts in a row at a size above the base that mean a black hole
+raiseInterval: Final = 600.0  # Seconds after a search settles before searching for a larger size again
+
+class PathMtuDiscovery:
+    def __init__(self, max_size=maxPlpmtu, base_size=basePlpmtu):
+        """
+        Initialize datagram size discovery for one path.
+
+        Data is sent at the largest size confirmed so far, starting from
+        base_size. Padded probe packets binary-search the range up to
+        max_size: an acknowledged probe raises the size, and a size whose
+        probe is lost maxProbes times bounds the search from above. If
+        full-size packets keep being lost, the current size is probed in
+        turn; should that fail too, or should nothing be acknowledged at all
+        (a black hole, e.g. after a route change), the size falls back to
+        base_size and the search starts over.
+
+        Args:
+            max_size (int): Largest datagram size to search for.
+            base_size (int): Datagram size used until a probe confirms a larger one.
+        """
+        if max_size < base_size:
+            raise ValueError("Largest datagram size cannot be below the base size")
+        self.base_size = base_size
+        self.max_size = max_size
+        self.size = base_size  # Largest datagram size known to get through; what the packetizer fills
+        self.low = base_size  # Largest size confirmed
+        self.high = max_size  # Largest size not yet ruled out
+        self.searching = max_size > base_size
+        self.probe_size = None  # Size being probed
+        self.probe_number = None  # Packet number of the probe in flight
+        self.probe_losses = 0  # Probes of probe_size lost so far
+        self.search_again_at = None  # When to search above a settled size again
+        self.full_size_losses = 0  # Packets above the base size lost since one was last acknowledged
+        self.confirming = False  # Whether the current size is being probed because packets of that size went missing
+        self.black_holes = 0  # Times the size fell back to the base
+
+    def next_probe(self, now):
+        """
+        Return the size of the probe to send now, if one is due.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            int: Datagram size to probe, or None if no probe should be sent.
+        """
+        if self.probe_number is not None:
+            return None  # One probe in flight at a time
+        if self.confirming:
+            self.probe_size = self.size
+            return self.probe_size
+        if not self.searching:
+            if self.search_again_at is None or now < self.search_again_at or self.size >= self.max_size:
+                return None
+            self.searching = True
+            self.low, self.high = self.size, self.max_size
+        if self.high - self.low < searchGranularity:
+            self.searching = False
+            self.search_again_at = now + raiseInterval
+            return None
+        if self.probe_size is None:
+            self.probe_size = (self.low + self.high + 1) // 2
+        return self.probe_size
+
+    def on_probe_sent(self, packet_number):
+        """
+        Remember the probe that was just sent.
+
+        Args:
+            packet_number (int): Packet number of the probe.
+        """
+        self.probe_number = packet_number
+
+    def on_packet_acked(self, packet_number, size):
+        """
+        Raise the size when a probe is acknowledged, and clear the black hole count.
+
+        Args:
+            packet_number (int): Acknowledged packet.
+            size (int): Its size in bytes.
+        """
+        if size > self.base_size:
+            self.full_size_losses = 0
+        if packet_number == self.probe_number:
+            self.size = self.low = max(self.low, self.probe_size)
+            self.probe_number = self.probe_size = None
+            self.probe_losses = 0
+            self.confirming = False  # The losses were congestion or reordering, not the size
+
+    def on_packet_lost(self, packet_number, size):
+        """
+        Narrow the search when a probe is lost, and fall back if full-size packets keep being lost.
+
+        Args:
+            packet_number (int): Lost packet.
+            size (int): Its size in bytes.
+        """
+        if packet_number == self.probe_number:
+            self.probe_number = None
+            self.probe_losses += 1
+            if self.probe_losses >= maxProbes:
+                if self.confirming:
+                    self.fall_back()
+                    return
+                self.high = self.probe_size - 1
+                self.probe_size = None
+                self.probe_losses = 0
+            return
+        if self.base_size < size <= self.size and not self.confirming:  # Packets sent before a fall back say nothing about the current size
+            self.full_size_losses += 1
+            if self.full_size_losses >= blackHoleLosses:
+                # Check the current size with probes before giving it up; a search probe in flight is forgotten
+                self.confirming = True
+                self.probe_number = self.probe_size = None
+                self.probe_losses = 0
+
+    def on_probe_timeout(self, pto_count):
+        """
+        Fall back when probe timeouts pile up while data is sent above the base size.
+
+        Args:
+            pto_count (int): Probe timeouts in a row without an ACK.
+        """
+        if pto_count >= blackHoleTimeouts and self.size > self.base_size:
+            self.fall_back()
+
+    def fall_back(self):
+        """
+        Go back to the base size and search again below the size that stopped working.
+        """
+        self.high = self.size - 1
+        self.size = self.low = self.base_size
+        self.probe_number = self.probe_size = None
+        self.probe_losses = 0
+        self.full_size_losses = 0
+        self.confirming = False
+        self.searching = self.high > self.low
+        self.black_holes += 1
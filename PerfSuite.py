@@ -0,0 +1,383 @@
+import argparse  # Importing the argparse module for parsing command-line arguments
+import asyncio  # Importing the asyncio module for driving the engine client and server
+import contextlib  # Importing the contextlib module for silencing client/server output
+import itertools  # Importing the itertools module for building the sweep grid
+import json  # Importing the json module for writing and reading result files
+import multiprocessing  # Importing the multiprocessing module for running every point, server and client in a fresh process
+import os  # Importing the os module for opening the null device
+import platform  # Importing the platform module for recording where results were measured
+import queue  # Importing the queue module for the timeout of a transfer that never reports back
+import resource  # Importing the resource module for CPU time and peak RSS of a process
+import statistics  # Importing the statistics module for medians over repeated runs
+import subprocess  # Importing the subprocess module for recording the commit results were measured at
+import sys  # Importing the sys module for the exit status of a comparison
+import time  # Importing the time module for timing transfers
+from typing import Final  # Importing Final from typing for defining constants
+import Engine  # Importing the Engine module for the asyncio client and server
+import Sources  # Importing the Sources module for the response data
+from Connection import defaultWindow, maxUdpPayload  # Importing the connection defaults the sweep starts from
+
+# Defining constants
+perfPort: Final = 9900  # Port the server of a measured transfer listens on
+readSize: Final = 256 * 1024  # Bytes a client reads from a stream at a time
+defaultTolerance: Final = 0.10  # Relative change in a metric that counts as a regression
+pointTimeout: Final = 120  # Seconds a single transfer may take before it is reported as failed
+MODES: Final = ('in-process', 'subprocess')  # Where the clients run relative to the server
+LOWER_IS_WORSE: Final = ('throughput_mib_per_s', )  # Metrics that regress when they fall
+HIGHER_IS_WORSE: Final = ('completion_p50', 'completion_max', 'cpu_seconds', 'peak_rss_mb')  # Metrics that regress when they rise
+
+# The tracked suite: small enough to run on every commit, wide enough to cover each swept parameter
+SUITE: Final = (
+    {'streams': 1, 'object_size': 4 * 1024 * 1024, 'window': defaultWindow, 'datagram_size': maxUdpPayload, 'clients': 1, 'mode': 'in-process'},
+    {'streams': 8, 'object_size': 512 * 1024, 'window': defaultWindow, 'datagram_size': maxUdpPayload, 'clients': 1, 'mode': 'in-process'},
+    {'streams': 1, 'object_size': 4 * 1024 * 1024, 'window': 16, 'datagram_size': maxUdpPayload, 'clients': 1, 'mode': 'in-process'},
+    {'streams': 1, 'object_size': 4 * 1024 * 1024, 'window': defaultWindow, 'datagram_size': 1200, 'clients': 1, 'mode': 'in-process'},
+    {'streams': 1, 'object_size': 64 * 1024, 'window': defaultWindow, 'datagram_size': maxUdpPayload, 'clients': 8, 'mode': 'in-process'},
+    {'streams': 2, 'object_size': 2 * 1024 * 1024, 'window': defaultWindow, 'datagram_size': maxUdpPayload, 'clients': 2, 'mode': 'subprocess'},
+)
+PARAMETERS: Final = ('streams', 'object_size', 'window', 'datagram_size', 'clients', 'mode')  # Keys that identify a point
+
+def sized_handler(object_size):
+    """
+    Make a request handler that answers every stream with object_size bytes.
+
+    The data is seeded by stream ID, so every run sends the same bytes.
+
+    Args:
+        object_size (int): Bytes per stream.
+
+    Returns:
+        coroutine function: Handler for Engine.serve().
+    """
+    async def handler(connection, writers):
+        for writer in writers:
+            writer.write_source(Sources.RandomSource(object_size, seed=writer.stream_id))
+    return handler
+
+def process_usage():
+    """
+    Return the CPU time and peak resident memory of the calling process.
+
+    Returns:
+        tuple: CPU seconds (user plus system) and peak RSS in MB.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    peak = usage.ru_maxrss / 1024  # Kilobytes on Linux
+    if sys.platform == 'darwin':
+        peak /= 1024  # Bytes on macOS
+    return usage.ru_utime + usage.ru_stime, peak
+
+async def start_server(point, port):
+    """
+    Serve the responses of a point on a port.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        port (int): Port to listen on.
+
+    Returns:
+        Engine.QUICServerProtocol: The running server.
+    """
+    return await Engine.serve('127.0.0.1', port, sized_handler(point['object_size']), window=point['window'],
+                              max_datagram_size=point['datagram_size'], pmtud=False)
+
+async def fetch(point, port):
+    """
+    Open one connection, request the point's streams and read them to the end.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        port (int): Port the server listens on.
+
+    Returns:
+        dict: Bytes received, start and end times, and seconds from the request to each stream's end.
+    """
+    start = time.monotonic()  # Comparable across processes on one machine
+    client = await Engine.connect('127.0.0.1', port)
+    try:
+        requested = time.monotonic()
+        async def read(reader):
+            size = 0
+            while True:
+                data = await reader.read(readSize)
+                if not data:
+                    return size, time.monotonic() - requested
+                size += len(data)
+        streams = await asyncio.gather(*(read(reader) for reader in client.request(point['streams'])))
+        packets = client.connection.packets_received
+    finally:
+        client.close()
+        client.quic_socket.close()
+    return {'bytes': sum(size for size, _ in streams), 'start': start, 'end': time.monotonic(),
+            'completion': [elapsed for _, elapsed in streams], 'packets': packets}
+
+async def transfer_in_process(point, port):
+    """
+    Run the server and every client of a point on one event loop.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        port (int): Port the server listens on.
+
+    Returns:
+        list: The result of fetch() for every client.
+    """
+    server = await start_server(point, port)
+    try:
+        return await asyncio.gather(*(fetch(point, port) for _ in range(point['clients'])))
+    finally:
+        server.close()
+        server.quic_socket.close()
+
+def run_in_process(point, port, results):
+    """
+    Measure a point with the server and its clients in this process; the target of a fresh process.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        port (int): Port the server listens on.
+        results (multiprocessing.Queue): Receives the client results and this process's usage.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        clients = asyncio.run(transfer_in_process(point, port))
+    results.put({'clients': clients, 'usage': [process_usage()]})
+
+def run_server(point, port, ready, stop, results):
+    """
+    Serve a point until told to stop, then report this process's usage; the target of a server process.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        port (int): Port to listen on.
+        ready (multiprocessing.Event): Set once the server listens.
+        stop (multiprocessing.Event): Set when the clients are done.
+        results (multiprocessing.Queue): Receives ('server', usage).
+    """
+    async def serve():
+        server = await start_server(point, port)
+        ready.set()
+        await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+        server.close()
+        server.quic_socket.close()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(serve())
+    results.put(('server', process_usage()))
+
+def run_client(point, port, results):
+    """
+    Run one client of a point and report its result and usage; the target of a client process.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        port (int): Port the server listens on.
+        results (multiprocessing.Queue): Receives ('client', result, usage).
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = asyncio.run(fetch(point, port))
+    results.put(('client', result, process_usage()))
+
+def run_subprocesses(point, port, results):
+    """
+    Measure a point with the server and each client in a process of its own.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        port (int): Port the server listens on.
+        results (multiprocessing.Queue): Receives the client results and the usage of every process.
+    """
+    reports = multiprocessing.Queue()
+    ready, stop = multiprocessing.Event(), multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server, args=(point, port, ready, stop, reports))
+    server.start()
+    if not ready.wait(pointTimeout):
+        server.terminate()
+        raise RuntimeError("Server process did not start")
+    clients = [multiprocessing.Process(target=run_client, args=(point, port, reports)) for _ in range(point['clients'])]
+    for process in clients:
+        process.start()
+    collected = {'clients': [], 'usage': []}
+    for _ in clients:
+        _, result, usage = reports.get(timeout=pointTimeout)
+        collected['clients'].append(result)
+        collected['usage'].append(usage)
+    stop.set()
+    collected['usage'].append(reports.get(timeout=pointTimeout)[1])
+    for process in clients + [server]:
+        process.join()
+    results.put(collected)
+
+def measure(point, port=perfPort):
+    """
+    Run one transfer of a point in a fresh process and summarise it.
+
+    A fresh process per transfer keeps one point's memory and warm caches
+    out of the next point's peak RSS and CPU time.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        port (int): Port the server listens on.
+
+    Returns:
+        dict: Throughput in MiB/s over the whole transfer, per-stream completion seconds with their median
+            and maximum, bytes and packets received, CPU seconds of every process involved, and the
+            largest peak RSS among them in MB.
+    """
+    if point['mode'] not in MODES:
+        raise ValueError(f"Unknown mode {point['mode']}, expected one of {', '.join(MODES)}")
+    results = multiprocessing.Queue()
+    target = run_in_process if point['mode'] == 'in-process' else run_subprocesses
+    process = multiprocessing.Process(target=target, args=(point, port, results))
+    process.start()
+    try:
+        collected = results.get(timeout=pointTimeout)
+    except queue.Empty:
+        process.terminate()
+        raise RuntimeError(f"Transfer of {point} did not finish")
+    process.join()
+    clients = collected['clients']
+    received = sum(client['bytes'] for client in clients)
+    elapsed = max(client['end'] for client in clients) - min(client['start'] for client in clients)
+    completion = [seconds for client in clients for seconds in client['completion']]
+    return {'throughput_mib_per_s': received / elapsed / (1024 * 1024), 'completion': completion,
+            'completion_p50': statistics.median(completion), 'completion_max': max(completion),
+            'bytes': received, 'packets': sum(client['packets'] for client in clients),
+            'cpu_seconds': sum(cpu for cpu, _ in collected['usage']), 'peak_rss_mb': max(rss for _, rss in collected['usage'])}
+
+def run_point(point, repeat=1, port=perfPort):
+    """
+    Measure a point repeat times and keep the median of each metric.
+
+    Args:
+        point (dict): Parameters of the point, see PARAMETERS.
+        repeat (int): Transfers to run.
+        port (int): Port the server listens on.
+
+    Returns:
+        dict: The point's parameters, the median metrics, the per-stream completion times of the
+            transfer with the median throughput, and the number of samples.
+    """
+    samples = [measure(point, port) for _ in range(repeat)]
+    typical = sorted(samples, key=lambda sample: sample['throughput_mib_per_s'])[len(samples) // 2]
+    result = dict(point)
+    for metric in LOWER_IS_WORSE + HIGHER_IS_WORSE + ('bytes', 'packets'):
+        result[metric] = statistics.median(sample[metric] for sample in samples)
+    result['completion'] = typical['completion']
+    result['samples'] = repeat
+    return result
+
+def sweep(streams, object_sizes, windows, datagram_sizes, clients, modes):
+    """
+    Build every combination of the swept parameters.
+
+    Returns:
+        list: Points, see PARAMETERS.
+    """
+    return [dict(zip(PARAMETERS, values)) for values in itertools.product(streams, object_sizes, windows, datagram_sizes, clients, modes)]
+
+def environment():
+    """
+    Describe where results are measured, so result files from different commits and machines can be told apart.
+
+    Returns:
+        dict: Commit, Python version, platform, CPU count and time of the run.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def point_key(result):
+    """
+    Return the parameters that identify a result's point.
+
+    Returns:
+        tuple: Values of PARAMETERS.
+    """
+    return tuple(result[name] for name in PARAMETERS)
+
+def compare(baseline, current, tolerance=defaultTolerance):
+    """
+    Find the metrics of a run that got worse than a baseline run by more than a tolerance.
+
+    Points present in only one of the runs are skipped.
+
+    Args:
+        baseline (dict): Earlier result file contents.
+        current (dict): Later result file contents.
+        tolerance (float): Relative change allowed.
+
+    Returns:
+        list: One description per regressed metric.
+    """
+    earlier = {point_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        before = earlier.get(point_key(result))
+        if before is None:
+            continue
+        for metric in LOWER_IS_WORSE + HIGHER_IS_WORSE:
+            old, new = before[metric], result[metric]
+            if old <= 0:
+                continue
+            change = (new - old) / old
+            if (metric in LOWER_IS_WORSE and change < -tolerance) or (metric in HIGHER_IS_WORSE and change > tolerance):
+                name = ', '.join(f"{key}={value}" for key, value in zip(PARAMETERS, point_key(result)))
+                regressions.append(f"{name}: {metric} {old:.3f} -> {new:.3f} ({change:+.0%})")
+    return regressions
+
+def print_result(result):
+    """
+    Print one line summarising a result.
+
+    Args:
+        result (dict): Result of run_point().
+    """
+    print(f"{result['mode']:>10} {result['clients']:>2} clients x {result['streams']:>2} streams x {result['object_size'] // 1024:>5} KB, "
+          f"window {result['window']:>3}, datagrams {result['datagram_size']:>4}: {result['throughput_mib_per_s']:7.2f} MiB/s, "
+          f"median stream {result['completion_p50'] * 1e3:6.0f} ms, cpu {result['cpu_seconds']:.2f} s, "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loopback performance suite; runs the tracked suite unless a sweep is given")
+    parser.add_argument('--streams', type=int, nargs='+', help="Streams per client to sweep")
+    parser.add_argument('--object-size', type=int, nargs='+', help="Bytes per stream to sweep")
+    parser.add_argument('--window', type=int, nargs='+', help="Send windows (packets in flight) to sweep")
+    parser.add_argument('--datagram-size', type=int, nargs='+', help="Datagram sizes to sweep")
+    parser.add_argument('--clients', type=int, nargs='+', help="Concurrent clients to sweep")
+    parser.add_argument('--mode', nargs='+', choices=MODES, help="Run clients in the server process or in processes of their own")
+    parser.add_argument('--repeat', type=int, default=3, help="Transfers per point; the median is kept")
+    parser.add_argument('--port', type=int, default=perfPort, help="Port the server listens on")
+    parser.add_argument('--output', help="File to write the results to as JSON")
+    parser.add_argument('--baseline', help="Result file to compare this run against; exits with 1 on a regression")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="Compare two result files without running anything")
+    parser.add_argument('--tolerance', type=float, default=defaultTolerance, help="Relative change that counts as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as baseline_file, open(args.compare[1]) as current_file:
+            regressions = compare(json.load(baseline_file), json.load(current_file), args.tolerance)
+    else:
+        swept = [args.streams, args.object_size, args.window, args.datagram_size, args.clients, args.mode]
+        if any(swept):
+            defaults = [[1], [4 * 1024 * 1024], [defaultWindow], [maxUdpPayload], [1], ['in-process']]
+            points = sweep(*(values or default for values, default in zip(swept, defaults)))
+        else:
+            points = [dict(point) for point in SUITE]
+        run = {'environment': environment(), 'results': []}
+        for point in points:
+            result = run_point(point, args.repeat, args.port)
+            print_result(result)
+            run['results'].append(result)
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(run, output, indent=2)
+        regressions = []
+        if args.baseline:
+            with open(args.baseline) as baseline_file:
+                regressions = compare(json.load(baseline_file), run, args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    sys.exit(1 if regressions else 0)
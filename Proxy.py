@@ -0,0 +1,319 @@
+import argparse  # Importing the argparse module for parsing command-line arguments
+import heapq  # Importing the heapq module for releasing delayed datagrams in time order
+import itertools  # Importing the itertools module for numbering scheduled datagrams
+import random  # Importing the random module for seeded impairment decisions
+import selectors  # Importing the selectors module for waiting on several sockets at once
+import socket  # Importing the socket module for network communication
+import threading  # Importing the threading module for running the proxy in the background
+import time  # Importing the time module for scheduling delayed datagrams
+from typing import Final  # Importing Final from typing for defining constants
+
+datagramSize: Final = 65535  # Largest datagram the proxy forwards
+defaultQueueSize: Final = 64 * 1024  # Bytes the bandwidth cap queues before dropping new datagrams
+defaultBurstSize: Final = 16 * 1024  # Bytes the bandwidth cap lets through at once after being idle
+defaultReorderDelay: Final = 0.01  # Seconds a reordered datagram is held back beyond the others
+pollInterval: Final = 0.1  # Longest the proxy waits for a datagram before checking whether it was stopped
+
+class GilbertElliottLoss:
+    def __init__(self, enter_bad, leave_bad, good_loss=0.0, bad_loss=1.0):
+        """
+        Initialize a two-state loss model that loses datagrams in bursts.
+
+        The link is either good or bad, and moves between the states with a
+        fixed probability per datagram; each state loses datagrams at its
+        own rate. Bursts last 1 / leave_bad datagrams on average, and the
+        long-run loss rate is
+        (leave_bad * good_loss + enter_bad * bad_loss) / (enter_bad + leave_bad).
+
+        Args:
+            enter_bad (float): Probability of moving from the good to the bad state, per datagram.
+            leave_bad (float): Probability of moving from the bad to the good state, per datagram.
+            good_loss (float): Loss probability in the good state.
+            bad_loss (float): Loss probability in the bad state.
+        """
+        if not 0 < leave_bad <= 1 or not 0 <= enter_bad <= 1:
+            raise ValueError("leave_bad must be in (0, 1] and enter_bad in [0, 1]")
+        self.enter_bad = enter_bad
+        self.leave_bad = leave_bad
+        self.good_loss = good_loss
+        self.bad_loss = bad_loss
+        self.bad = False
+
+    def lose(self, rng):
+        """
+        Move the state on by one datagram and decide whether that datagram is lost.
+
+        Args:
+            rng (random.Random): Source of the decisions.
+
+        Returns:
+            bool: True to drop the datagram.
+        """
+        if rng.random() < (self.leave_bad if self.bad else self.enter_bad):
+            self.bad = not self.bad
+        return rng.random() < (self.bad_loss if self.bad else self.good_loss)
+
+    def mean_loss(self):
+        """
+        Return the long-run fraction of datagrams lost.
+
+        Returns:
+            float: Loss rate.
+        """
+        if self.enter_bad == 0:
+            return self.good_loss
+        return (self.leave_bad * self.good_loss + self.enter_bad * self.bad_loss) / (self.enter_bad + self.leave_bad)
+
+class LinkImpairment:
+    def __init__(self, loss_rate=0.0, burst_loss=None, delay=0.0, jitter=0.0, reorder_rate=0.0, reorder_delay=defaultReorderDelay,
+                 duplicate_rate=0.0, bandwidth=None, queue_size=defaultQueueSize, burst_size=defaultBurstSize, seed=None):
+        """
+        Initialize the impairments of one direction of a link.
+
+        The link does no I/O: it is told the size and arrival time of each
+        datagram and answers when copies of it leave, so it can be driven
+        by the proxy or by a simulation. A datagram is, in order:
+        - lost at random, or in bursts with burst_loss,
+        - queued behind the bandwidth cap, a token bucket that lets
+          burst_size bytes through at once and then bandwidth bytes per
+          second; a datagram that finds queue_size bytes waiting is dropped,
+        - delayed by delay plus up to jitter either way; jitter alone never
+          reorders, a datagram leaves no earlier than the one before it,
+        - held back reorder_delay longer with probability reorder_rate, so
+          datagrams behind it overtake it,
+        - sent twice with probability duplicate_rate.
+        Every decision comes from one random.Random, so a seeded link makes
+        the same decisions for the same datagrams.
+
+        Args:
+            loss_rate (float): Probability of losing each datagram; with burst_loss, the loss rate of the good state.
+            burst_loss (tuple, optional): (enter_bad, leave_bad) or (enter_bad, leave_bad, bad_loss) for a
+                GilbertElliottLoss that loses datagrams in bursts.
+            delay (float): One-way delay in seconds.
+            jitter (float): Largest random change to the delay, either way, in seconds.
+            reorder_rate (float): Probability of holding a datagram back so later ones overtake it.
+            reorder_delay (float): Seconds a reordered datagram is held back.
+            duplicate_rate (float): Probability of sending a datagram twice.
+            bandwidth (float, optional): Bytes per second the link carries; unlimited without it.
+            queue_size (int): Bytes the bandwidth cap holds before dropping new datagrams.
+            burst_size (int): Bytes the bandwidth cap lets through at once after being idle.
+            seed (int, optional): Seed for the random decisions, for reproducible runs.
+        """
+        if bandwidth is not None and bandwidth <= 0:
+            raise ValueError("Bandwidth must be positive")
+        self.random = random.Random(seed)
+        self.loss = None if burst_loss is None else GilbertElliottLoss(burst_loss[0], burst_loss[1], loss_rate, *burst_loss[2:])
+        self.loss_rate = loss_rate
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder_rate = reorder_rate
+        self.reorder_delay = reorder_delay
+        self.duplicate_rate = duplicate_rate
+        self.bandwidth = bandwidth
+        self.queue_size = queue_size
+        self.burst_size = burst_size
+        self.free_at = None  # When the bucket would have sent everything so far with no burst allowance
+        self.last_departure = 0.0  # When the last datagram not held back for reordering leaves
+        self.stats = {'received': 0, 'forwarded': 0, 'lost': 0, 'overflowed': 0, 'reordered': 0, 'duplicated': 0}
+
+    def process(self, size, now):
+        """
+        Decide what becomes of a datagram entering the link.
+
+        Args:
+            size (int): Datagram size in bytes.
+            now (float): When it arrived.
+
+        Returns:
+            list: Times at which a copy of it leaves the link, earliest first; empty if it is dropped.
+        """
+        self.stats['received'] += 1
+        lost = self.loss.lose(self.random) if self.loss is not None else self.random.random() < self.loss_rate
+        if lost:
+            self.stats['lost'] += 1
+            return []
+        departure = now
+        if self.bandwidth is not None:
+            free_at = (now if self.free_at is None else max(now, self.free_at)) + size / self.bandwidth
+            departure = max(now, free_at - self.burst_size / self.bandwidth)  # The bucket's tokens go out as a burst
+            if (departure - now) * self.bandwidth > self.queue_size:
+                self.stats['overflowed'] += 1
+                return []
+            self.free_at = free_at
+        departure += max(0.0, self.delay + self.random.uniform(-self.jitter, self.jitter) if self.jitter else self.delay)
+        if self.reorder_rate and self.random.random() < self.reorder_rate:
+            self.stats['reordered'] += 1
+            departure = max(departure, self.last_departure) + self.reorder_delay
+        else:
+            departure = self.last_departure = max(departure, self.last_departure)
+        copies = [departure]
+        if self.duplicate_rate and self.random.random() < self.duplicate_rate:
+            self.stats['duplicated'] += 1
+            copies.append(departure)
+        self.stats['forwarded'] += len(copies)
+        return copies
+
+class LossyProxy:
+    def __init__(self, listen_address, server_address, loss_rate=0.0, seed=None, **impairments):
+        """
+        Initialize a LossyProxy that forwards UDP datagrams between clients and a server and impairs them.
+
+        Each client address gets its own upstream socket, so the server sees
+        one distinct address per client. Both directions get a LinkImpairment
+        with the same settings, seeded apart from each other.
+
+        Args:
+            listen_address (tuple): Address clients send to.
+            server_address (tuple): Address of the real server.
+            loss_rate (float): Probability of dropping each datagram, in either direction.
+            seed (int, optional): Seed for the impairment decisions, for reproducible runs.
+            **impairments: burst_loss, delay, jitter, reorder_rate, reorder_delay, duplicate_rate, bandwidth,
+                queue_size and burst_size, see LinkImpairment.
+        """
+        self.listen_address = listen_address
+        self.server_address = server_address
+        self.upstream_link = LinkImpairment(loss_rate, seed=None if seed is None else 2 * seed, **impairments)  # Client to server
+        self.downstream_link = LinkImpairment(loss_rate, seed=None if seed is None else 2 * seed + 1, **impairments)  # Server to client
+        self.selector = selectors.DefaultSelector()
+        self.listen_socket = None
+        self.upstream = {}  # Client address -> socket connected towards the server
+        self.scheduled = []  # (departure time, sequence, socket, datagram, address) waiting to leave, earliest first
+        self.sequence = itertools.count()  # Keeps datagrams leaving at the same time in the order they were scheduled
+        self.running = False
+        self.thread = None
+
+    @property
+    def forwarded(self):
+        """
+        Return how many datagrams were sent on, duplicates included.
+
+        Returns:
+            int: Count over both directions.
+        """
+        return self.upstream_link.stats['forwarded'] + self.downstream_link.stats['forwarded']
+
+    @property
+    def dropped(self):
+        """
+        Return how many datagrams were lost or found the bandwidth queue full.
+
+        Returns:
+            int: Count over both directions.
+        """
+        return sum(link.stats['lost'] + link.stats['overflowed'] for link in (self.upstream_link, self.downstream_link))
+
+    def stats(self):
+        """
+        Return the impairment counters of each direction.
+
+        Returns:
+            dict: 'upstream' and 'downstream' counters, see LinkImpairment.stats.
+        """
+        return {'upstream': dict(self.upstream_link.stats), 'downstream': dict(self.downstream_link.stats)}
+
+    def start(self):
+        """
+        Bind the listening socket and start forwarding in a background thread.
+        """
+        self.listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listen_socket.bind(self.listen_address)
+        self.listen_address = self.listen_socket.getsockname()
+        self.selector.register(self.listen_socket, selectors.EVENT_READ, None)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop forwarding and close every socket.
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        for sock in [self.listen_socket, *self.upstream.values()]:
+            if sock is not None:
+                sock.close()
+        self.selector.close()
+
+    def forward(self, data, link, sock, address, now):
+        """
+        Pass a datagram through a direction's impairments and schedule the copies that survive.
+
+        Args:
+            data (bytes): Datagram to forward.
+            link (LinkImpairment): Impairments of the direction it travels.
+            sock (socket.socket): Socket to send it from.
+            address (tuple): Address to send it to.
+            now (float): When it arrived.
+        """
+        for departure in link.process(len(data), now):
+            heapq.heappush(self.scheduled, (departure, next(self.sequence), sock, data, address))
+
+    def send_due(self, now):
+        """
+        Send every scheduled datagram whose time has come.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        while self.scheduled and self.scheduled[0][0] <= now:
+            _, _, sock, data, address = heapq.heappop(self.scheduled)
+            try:
+                sock.sendto(data, address)
+            except OSError:
+                pass  # A datagram the kernel refuses is one more lost on the link
+
+    def run(self):
+        """
+        Forward datagrams until stop() is called.
+        """
+        while self.running:
+            now = time.monotonic()
+            timeout = pollInterval if not self.scheduled else min(pollInterval, max(0.0, self.scheduled[0][0] - now))
+            for key, _ in self.selector.select(timeout=timeout):
+                data, address = key.fileobj.recvfrom(datagramSize)
+                now = time.monotonic()
+                if key.data is None:
+                    # From a client: relay through that client's upstream socket
+                    upstream = self.upstream.get(address)
+                    if upstream is None:
+                        upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                        upstream.bind(('127.0.0.1', 0))
+                        self.upstream[address] = upstream
+                        self.selector.register(upstream, selectors.EVENT_READ, address)
+                    self.forward(data, self.upstream_link, upstream, self.server_address, now)
+                else:
+                    # From the server: relay back to the client this socket belongs to
+                    self.forward(data, self.downstream_link, self.listen_socket, key.data, now)
+            self.send_due(time.monotonic())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UDP proxy that impairs datagrams with loss, delay, reordering, duplication and a bandwidth cap")
+    parser.add_argument('--listen-port', type=int, default=9999, help="Port clients connect to")
+    parser.add_argument('--server-port', type=int, default=8888, help="Port of the real server")
+    parser.add_argument('--loss', type=float, default=0.01, help="Drop probability per datagram; the good state's with --burst")
+    parser.add_argument('--burst', type=float, nargs='+', metavar='P', help="Gilbert-Elliott bursts: ENTER_BAD LEAVE_BAD [BAD_LOSS]")
+    parser.add_argument('--delay', type=float, default=0.0, help="One-way delay in milliseconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Largest change to the delay either way, in milliseconds")
+    parser.add_argument('--reorder', type=float, default=0.0, help="Probability of holding a datagram back so later ones overtake it")
+    parser.add_argument('--reorder-delay', type=float, default=defaultReorderDelay * 1e3, help="Milliseconds a reordered datagram is held back")
+    parser.add_argument('--duplicate', type=float, default=0.0, help="Probability of sending a datagram twice")
+    parser.add_argument('--bandwidth', type=float, default=None, help="Bandwidth cap in Mbit/s per direction")
+    parser.add_argument('--queue', type=int, default=defaultQueueSize, help="Bytes queued behind the bandwidth cap")
+    parser.add_argument('--burst-size', type=int, default=defaultBurstSize, help="Bytes the bandwidth cap lets through at once")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible impairments")
+    args = parser.parse_args()
+    if args.burst is not None and len(args.burst) not in (2, 3):
+        parser.error("--burst takes ENTER_BAD LEAVE_BAD and an optional BAD_LOSS")
+    proxy = LossyProxy(('127.0.0.1', args.listen_port), ('127.0.0.1', args.server_port), args.loss, args.seed,
+                       burst_loss=None if args.burst is None else tuple(args.burst), delay=args.delay / 1e3, jitter=args.jitter / 1e3,
+                       reorder_rate=args.reorder, reorder_delay=args.reorder_delay / 1e3, duplicate_rate=args.duplicate,
+                       bandwidth=None if args.bandwidth is None else args.bandwidth * 1e6 / 8, queue_size=args.queue,
+                       burst_size=args.burst_size)
+    proxy.start()
+    print(f"Proxy forwarding {proxy.listen_address} -> {proxy.server_address} with {args.loss:.1%} loss")
+    try:
+        proxy.thread.join()
+    except KeyboardInterrupt:
+        proxy.stop()
@@ -0,0 +1,290 @@
+import bisect  # Importing the bisect module for searching the sorted intervals
+import mmap  # Importing the mmap module for writing streams straight into output files
+import os  # Importing the os module for sizing output files
+from typing import Final  # Importing Final from typing for defining constants
+
+# Defining constants
+initialCapacity: Final = 64 * 1024  # Bytes a stream buffer starts with when the stream size is not known yet
+initialFileCapacity: Final = 1024 * 1024  # Bytes an output file is first extended to when the stream size is not known yet
+
+class IntervalSet:
+    def __init__(self):
+        """
+        Initialize an empty set of half-open byte ranges.
+
+        Ranges are kept sorted and merged, so a stream received in order,
+        or with its holes filled, is a single range however many frames it
+        took.
+        """
+        self.starts = []  # Start of each range, ascending
+        self.ends = []  # End (exclusive) of each range
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def add(self, start, end):
+        """
+        Add a range to the set.
+
+        Args:
+            start (int): First byte of the range.
+            end (int): Byte just past the range.
+
+        Returns:
+            list: (start, end) pieces of the range that were not in the set yet, in order.
+        """
+        if start >= end:
+            return []
+        # Ranges that overlap or touch [start, end) are merged into one
+        first = bisect.bisect_left(self.ends, start)
+        last = bisect.bisect_right(self.starts, end)
+        new = []
+        position = start
+        for index in range(first, last):
+            if self.starts[index] > position:
+                new.append((position, min(self.starts[index], end)))
+            position = max(position, self.ends[index])
+        if position < end:
+            new.append((position, end))
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+        return new
+
+    def contiguous_end(self, start=0):
+        """
+        Return where the data that runs on without a hole from start ends.
+
+        Args:
+            start (int): Offset to measure from.
+
+        Returns:
+            int: End of the range holding start, or start itself if it is missing.
+        """
+        index = bisect.bisect_right(self.starts, start) - 1
+        if index >= 0 and self.ends[index] >= start:
+            return self.ends[index]
+        return start
+
+    def gaps(self, end):
+        """
+        Return the ranges missing before an offset.
+
+        Args:
+            end (int): Offset to look up to, e.g. the stream size.
+
+        Returns:
+            list: (start, end) of every hole, in order.
+        """
+        holes = []
+        position = 0
+        for range_start, range_end in self:
+            if range_start >= end:
+                break
+            if range_start > position:
+                holes.append((position, range_start))
+            position = max(position, range_end)
+        if position < end:
+            holes.append((position, end))
+        return holes
+
+class StreamReassembler:
+    def __init__(self, stream_id, on_data=None, path=None, retain=True):
+        """
+        Initialize the reassembly of one received stream.
+
+        Frame data is written once, at its offset, into the stream's buffer:
+        a bytearray, or an output file mapped into memory and grown as the
+        stream does. Bytes already received are never written again, so
+        duplicates cost nothing and nothing waits in a second structure for
+        the holes before it to fill. Once a prefix of the stream is
+        contiguous it is handed to on_data.
+
+        Args:
+            stream_id (int): Stream being reassembled.
+            on_data (callable, optional): Called with (stream_id, data, finished) as data becomes contiguous.
+                data is a memoryview valid only during the call; finished is True with the last piece.
+            path (str, optional): Output file to write the stream into. Defaults to an in-memory buffer.
+            retain (bool): Whether an in-memory buffer keeps delivered data. Without it only the data
+                waiting behind a hole is held, for consumers that keep what on_data hands them.
+        """
+        self.stream_id = stream_id
+        self.on_data = on_data
+        self.path = path
+        self.retain = retain or path is not None
+        self.received = IntervalSet()  # Byte ranges of the stream written so far
+        self.size = None  # Total stream size, known once the final frame arrives
+        self.delivered = 0  # Bytes handed to on_data
+        self.base = 0  # Stream offset of the first byte in the buffer; delivered data may have been dropped
+        self.unique = 0  # Bytes received, duplicates counted once
+        self.duplicates = 0  # Bytes received again
+        self.finished = False  # Whether the end of the stream has been delivered
+        self.file = None
+        self.map = None
+        self.buffer = bytearray() if path is None else None
+
+    def receive(self, start, data, final_size=None):
+        """
+        Take in one frame of the stream.
+
+        Args:
+            start (int): Stream offset of the frame's first byte.
+            data (bytes | memoryview): The frame's data; copied into the buffer before returning.
+            final_size (int, optional): Total stream size, set by the frame that ends the stream.
+
+        Returns:
+            int: Number of bytes the frame added.
+
+        Raises:
+            ValueError: If the frame contradicts the stream size.
+        """
+        end = start + len(data)
+        if final_size is not None:
+            if self.size is not None and final_size != self.size:
+                raise ValueError(f"Stream {self.stream_id} final size changed from {self.size} to {final_size}")
+            if final_size < self.highest():
+                raise ValueError(f"Stream {self.stream_id} ends at {final_size} but has data up to {self.highest()}")
+            self.size = final_size
+        if self.size is not None and end > self.size:
+            raise ValueError(f"Stream {self.stream_id} data runs past its final size {self.size}")
+        added = 0
+        for piece_start, piece_end in self.received.add(max(start, self.base), end):
+            self.reserve(piece_end)
+            self.write(piece_start, data[piece_start - start:piece_end - start])
+            added += piece_end - piece_start
+        self.unique += added
+        self.duplicates += len(data) - added
+        self.deliver()
+        return added
+
+    def highest(self):
+        """
+        Return the offset just past the furthest data received.
+
+        Returns:
+            int: End of the last received range, or 0.
+        """
+        return self.received.ends[-1] if len(self.received) else 0
+
+    def reserve(self, end):
+        """
+        Make room in the buffer for data up to a stream offset.
+
+        The buffer grows geometrically, up to the stream size once it is known.
+
+        Args:
+            end (int): Stream offset the buffer must reach.
+        """
+        if self.path is None:
+            capacity = len(self.buffer)
+        else:
+            capacity = 0 if self.map is None else len(self.map)
+        needed = end - self.base
+        if needed <= capacity:
+            return
+        target = max(needed, 2 * capacity, initialCapacity if self.path is None else initialFileCapacity)
+        if self.size is not None:
+            target = max(needed, min(target, self.size - self.base))
+        if self.path is None:
+            self.buffer.extend(bytes(target - capacity))
+        elif self.map is None:
+            if self.file is None:
+                self.file = open(self.path, 'w+b')
+            os.ftruncate(self.file.fileno(), target)
+            self.map = mmap.mmap(self.file.fileno(), target)
+        else:
+            self.map.resize(target)  # Also extends the file
+
+    def write(self, start, data):
+        """
+        Copy data into the buffer at its stream offset.
+
+        Args:
+            start (int): Stream offset of the data.
+            data (bytes | memoryview): Data to write.
+        """
+        position = start - self.base
+        target = self.buffer if self.path is None else self.map
+        target[position:position + len(data)] = data
+
+    def deliver(self):
+        """
+        Hand newly contiguous data to on_data, and signal the end once the whole stream is in.
+        """
+        if self.finished:
+            return
+        end = self.received.contiguous_end(self.delivered)
+        if end > self.delivered:
+            finished = end == self.size
+            if self.on_data is not None:
+                target = self.buffer if self.path is None else self.map
+                with memoryview(target) as view, view[self.delivered - self.base:end - self.base] as data:
+                    self.on_data(self.stream_id, data, finished)
+            self.delivered = end
+            self.finished = finished
+            if not self.retain:
+                del self.buffer[:self.delivered - self.base]  # Cheap: bytearray drops its head without moving the rest
+                self.base = self.delivered
+        if not self.finished and self.delivered == self.size:
+            # The final frame carried no data, or the stream is empty: signal the end on its own
+            self.finished = True
+            if self.on_data is not None:
+                self.on_data(self.stream_id, memoryview(b''), True)
+        if self.finished:
+            self.trim()
+
+    def trim(self):
+        """
+        Cut the buffer, or the output file, down to the stream size.
+        """
+        length = self.size - self.base
+        if self.path is None:
+            del self.buffer[length:]
+        elif self.map is not None and len(self.map) != length:
+            if length:
+                self.map.resize(length)
+            else:
+                self.map.close()
+                self.map = None
+                os.ftruncate(self.file.fileno(), 0)
+        elif self.file is None:
+            self.file = open(self.path, 'w+b')  # An empty stream still leaves its (empty) output file
+
+    def gaps(self):
+        """
+        Return the byte ranges still missing.
+
+        Returns:
+            list: (start, end) of every hole before the furthest data received, or before the end of the stream once its size is known.
+        """
+        return self.received.gaps(self.highest() if self.size is None else self.size)
+
+    @property
+    def data(self):
+        """
+        Return the retained stream data.
+
+        Returns:
+            memoryview: The buffer, up to the data received so far.
+        """
+        target = self.buffer if self.path is None else self.map
+        if target is None:
+            return memoryview(b'')
+        return memoryview(target)[:self.highest() - self.base]
+
+    def close(self):
+        """
+        Flush and close the output file, if the stream has one.
+        """
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
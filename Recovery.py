@@ -0,0 +1,337 @@
+from typing import Final  # Importing Final from typing for defining constants
+import Reassembly  # Importing the Reassembly module for the set of received packet number ranges
+
+# Loss detection constants (RFC 9002, section 6 and appendix A.2)
+packetThreshold: Final = 3  # Packets acknowledged after a packet before it is declared lost
+timeThreshold: Final = 9 / 8  # Multiple of the RTT after which an unacknowledged packet is declared lost
+timerGranularity: Final = 0.001  # Smallest timer period in seconds
+initialRtt: Final = 0.333  # RTT assumed before the first sample, in seconds
+maxAckDelay: Final = 0.025  # Longest the peer is expected to hold back an ACK, in seconds
+
+# Acknowledgement constants (RFC 9000, section 13.2)
+ackElicitingThreshold: Final = 2  # Packets received before an ACK is sent, unless the sender asks otherwise
+reorderThreshold: Final = 1  # Packets past a missing one after which it is acknowledged at once
+maxAckRanges: Final = 32  # Most packet number ranges an ACK reports; older ones are forgotten
+
+class RttEstimator:
+    def __init__(self):
+        """
+        Initialize an RttEstimator with no samples.
+        """
+        self.latest_rtt = 0.0
+        self.min_rtt = 0.0
+        self.smoothed_rtt = initialRtt
+        self.rttvar = initialRtt / 2
+        self.has_sample = False
+
+    def update(self, latest_rtt, ack_delay=0.0):
+        """
+        Fold a new RTT sample into the smoothed RTT and RTT variance.
+
+        Args:
+            latest_rtt (float): Time between sending a packet and receiving its ACK, in seconds.
+            ack_delay (float): Time the peer reports holding the ACK back, in seconds.
+        """
+        self.latest_rtt = latest_rtt
+        if not self.has_sample:
+            self.has_sample = True
+            self.min_rtt = latest_rtt
+            self.smoothed_rtt = latest_rtt
+            self.rttvar = latest_rtt / 2
+            return
+
+        self.min_rtt = min(self.min_rtt, latest_rtt)
+        # Only subtract the ACK delay when that does not push the sample below min_rtt
+        adjusted_rtt = latest_rtt
+        if latest_rtt >= self.min_rtt + ack_delay:
+            adjusted_rtt = latest_rtt - ack_delay
+        self.rttvar = 3 / 4 * self.rttvar + 1 / 4 * abs(self.smoothed_rtt - adjusted_rtt)
+        self.smoothed_rtt = 7 / 8 * self.smoothed_rtt + 1 / 8 * adjusted_rtt
+
+    def pto(self, max_ack_delay=maxAckDelay):
+        """
+        Calculate the probe timeout period.
+
+        Args:
+            max_ack_delay (float): Longest the peer may delay an ACK, in seconds.
+
+        Returns:
+            float: Probe timeout in seconds, before any backoff.
+        """
+        return self.smoothed_rtt + max(4 * self.rttvar, timerGranularity) + max_ack_delay
+
+class SentPacket:
+    def __init__(self, packet_number, time_sent, size, frames):
+        """
+        Initialize a SentPacket record.
+
+        Args:
+            packet_number (int): Packet number the packet was sent with.
+            time_sent (float): Monotonic time the packet was sent at.
+            size (int): Encoded size of the packet in bytes.
+            frames (list): Frames carried by the packet, kept for retransmission.
+        """
+        self.packet_number = packet_number
+        self.time_sent = time_sent
+        self.size = size
+        self.frames = frames
+
+class LossDetection:
+    def __init__(self, max_ack_delay=maxAckDelay):
+        """
+        Initialize a LossDetection object for one connection.
+
+        Args:
+            max_ack_delay (float): Longest the peer may delay an ACK, in seconds.
+        """
+        self.rtt = RttEstimator()
+        self.max_ack_delay = max_ack_delay
+        self.sent_packets = {}  # Packet number -> SentPacket, in sending order
+        self.largest_acked = None
+        self.loss_time = None  # When the earliest packet still within the time threshold will be declared lost
+        self.pto_count = 0
+        self.time_of_last_sent = None
+        self.bytes_in_flight = 0
+
+    def on_packet_sent(self, sent_packet):
+        """
+        Start tracking a packet that has just been sent.
+
+        Args:
+            sent_packet (SentPacket): The packet that was sent.
+        """
+        self.sent_packets[sent_packet.packet_number] = sent_packet
+        self.time_of_last_sent = sent_packet.time_sent
+        self.bytes_in_flight += sent_packet.size
+
+    def on_ack_received(self, packet_numbers, ack_delay, now):
+        """
+        Process the packet numbers acknowledged by an ACK.
+
+        Args:
+            packet_numbers (iterable): Packet numbers the ACK covers.
+            ack_delay (float): ACK delay reported by the peer, in seconds.
+            now (float): Current monotonic time.
+
+        Returns:
+            tuple: Newly acknowledged SentPackets and SentPackets declared lost.
+        """
+        acked = []
+        for packet_number in packet_numbers:
+            sent_packet = self.sent_packets.pop(packet_number, None)
+            if sent_packet is not None:
+                self.bytes_in_flight -= sent_packet.size
+                acked.append(sent_packet)
+        if not acked:
+            return acked, []
+
+        largest = max(acked, key=lambda packet: packet.packet_number)
+        if self.largest_acked is None or largest.packet_number > self.largest_acked:
+            self.largest_acked = largest.packet_number
+            # Only the largest newly acknowledged packet gives an RTT sample
+            self.rtt.update(now - largest.time_sent, ack_delay)
+
+        self.pto_count = 0
+        return acked, self.detect_lost_packets(now)
+
+    def on_ack_ranges(self, ranges, ack_delay, now):
+        """
+        Process the packet number ranges acknowledged by an ACK.
+
+        A range is walked packet by packet when it is short, and the
+        packets in flight are checked against it when it is long, so an ACK
+        repeating old ranges costs no more than the packets still tracked.
+
+        Args:
+            ranges (list): Acknowledged (smallest, largest) packet number ranges, largest first.
+            ack_delay (float): ACK delay reported by the peer, in seconds.
+            now (float): Current monotonic time.
+
+        Returns:
+            tuple: Newly acknowledged SentPackets and SentPackets declared lost.
+        """
+        packet_numbers = []
+        for smallest, largest in reversed(ranges):
+            if largest - smallest < len(self.sent_packets):
+                packet_numbers.extend(number for number in range(smallest, largest + 1) if number in self.sent_packets)
+            else:
+                packet_numbers.extend(number for number in self.sent_packets if smallest <= number <= largest)
+        return self.on_ack_received(packet_numbers, ack_delay, now)
+
+    def detect_lost_packets(self, now):
+        """
+        Declare lost every packet that is too far behind the largest acknowledged one.
+
+        A packet is lost once packetThreshold later packets have been
+        acknowledged, or once it was sent more than timeThreshold RTTs before
+        now. Packets that are behind but not yet lost arm the loss timer.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            list: SentPackets declared lost, removed from tracking.
+        """
+        self.loss_time = None
+        if self.largest_acked is None:
+            return []
+
+        loss_delay = max(timeThreshold * max(self.rtt.latest_rtt, self.rtt.smoothed_rtt), timerGranularity)
+        lost_send_time = now - loss_delay
+        lost = []
+        for packet_number, sent_packet in self.sent_packets.items():
+            if packet_number > self.largest_acked:
+                break
+            if sent_packet.time_sent <= lost_send_time or self.largest_acked - packet_number >= packetThreshold:
+                lost.append(sent_packet)
+            else:
+                # Later packets were sent later and are closer to largest_acked, so none of them is lost either
+                self.loss_time = sent_packet.time_sent + loss_delay
+                break
+        for sent_packet in lost:
+            del self.sent_packets[sent_packet.packet_number]
+            self.bytes_in_flight -= sent_packet.size
+        return lost
+
+    def get_timer(self):
+        """
+        Return when the loss detection timer should fire.
+
+        Returns:
+            float: Monotonic deadline, or None when nothing is in flight.
+        """
+        if self.loss_time is not None:
+            return self.loss_time
+        if not self.sent_packets:
+            return None
+        return self.time_of_last_sent + self.rtt.pto(self.max_ack_delay) * (2 ** self.pto_count)
+
+    def on_timeout(self, now):
+        """
+        Handle the loss detection timer firing.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            tuple: SentPackets declared lost, and whether a probe packet should be sent.
+        """
+        if self.loss_time is not None:
+            return self.detect_lost_packets(now), False
+        # Probe timeout: nothing was declared lost, ask the peer for an ACK instead
+        self.pto_count += 1
+        return [], bool(self.sent_packets)
+
+class AckTracker:
+    def __init__(self, threshold=ackElicitingThreshold, max_ack_delay=maxAckDelay, reorder_threshold=reorderThreshold):
+        """
+        Initialize the receiver's record of packet numbers to acknowledge.
+
+        Instead of an ACK per packet, an ACK goes out once threshold
+        packets have arrived since the last one, or max_ack_delay after the
+        first of them, whichever comes first. A packet that arrives out of
+        order, or a gap reorder_threshold packets old, is acknowledged at
+        once so the sender detects the loss quickly. Every ACK reports the
+        newest maxAckRanges ranges of received packet numbers, so a lost ACK
+        is made up for by the next one.
+
+        Args:
+            threshold (int): Packets to receive before acknowledging.
+            max_ack_delay (float): Longest to hold back an ACK, in seconds.
+            reorder_threshold (int): See QUICAckFrequency; 0 never acknowledges early for reordering.
+        """
+        self.threshold = threshold
+        self.max_ack_delay = max_ack_delay
+        self.reorder_threshold = reorder_threshold
+        self.sequence = -1  # Sequence number of the last ACK_FREQUENCY request applied
+        self.received = Reassembly.IntervalSet()  # Received packet numbers, as half-open ranges
+        self.largest_time = None  # When the largest packet number arrived
+        self.unacked = 0  # Packets received since the last ACK
+        self.ack_at = None  # When the ACK held back is due
+        self.reported_gap = None  # Missing packet number already acknowledged early
+        self.acks_sent = 0
+
+    @property
+    def largest(self):
+        """
+        Return the largest packet number received.
+
+        Returns:
+            int: Largest packet number, or None before the first packet.
+        """
+        return self.received.ends[-1] - 1 if len(self.received) else None
+
+    def on_packet_received(self, packet_number, now):
+        """
+        Record a received packet.
+
+        Args:
+            packet_number (int): Its packet number.
+            now (float): Current monotonic time.
+
+        Returns:
+            bool: True if an ACK should be sent right away.
+        """
+        largest = self.largest
+        if not self.received.add(packet_number, packet_number + 1):
+            return False  # A duplicate; the next ACK covers it anyway
+        if len(self.received) > maxAckRanges:
+            del self.received.starts[0]
+            del self.received.ends[0]
+        if largest is None or packet_number > largest:
+            self.largest_time = now
+        self.unacked += 1
+        if self.ack_at is None:
+            self.ack_at = now + self.max_ack_delay
+        if self.reorder_threshold:
+            if largest is not None and packet_number < largest:
+                return True  # Fills a hole: tell the sender before it retransmits
+            if len(self.received) > 1:
+                gap = self.received.starts[-1] - 1  # Newest missing packet
+                if gap != self.reported_gap and self.largest - gap >= self.reorder_threshold:
+                    self.reported_gap = gap
+                    return True
+        return self.unacked >= self.threshold
+
+    def on_ack_frequency(self, frame):
+        """
+        Apply the sender's ACK_FREQUENCY request unless a newer one was already applied.
+
+        Args:
+            frame (Packets.QUICAckFrequency): The request.
+        """
+        if frame.sequence <= self.sequence:
+            return
+        self.sequence = frame.sequence
+        self.threshold = max(1, frame.threshold)
+        self.max_ack_delay = frame.max_ack_delay / 1e6
+        self.reorder_threshold = frame.reorder_threshold
+
+    def ranges(self):
+        """
+        Return the received packet number ranges, newest first.
+
+        Returns:
+            list: (smallest, largest) pairs for QUICAck.
+        """
+        return [(start, end - 1) for start, end in reversed(list(self.received))]
+
+    def ack_delay(self, now):
+        """
+        Return how long the largest packet has waited for its ACK.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            int: ACK delay in microseconds.
+        """
+        return max(0, int((now - self.largest_time) * 1e6))
+
+    def on_ack_sent(self):
+        """
+        Start counting towards the next ACK.
+        """
+        self.unacked = 0
+        self.ack_at = None
+        self.acks_sent += 1
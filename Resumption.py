@@ -0,0 +1,122 @@
+import hashlib  # Importing the hashlib module for the digest behind token authentication
+import heapq  # Importing the heapq module for forgetting used tokens once they expire
+import hmac  # Importing the hmac module for authenticating tokens with the server secret
+import ipaddress  # Importing the ipaddress module for binding tokens to the client address
+import os  # Importing the os module for generating secrets and token nonces
+import struct  # Importing the struct module for packing the token fields
+from typing import Final  # Importing Final from typing for defining constants
+
+# Defining constants
+tokenLifetime: Final = 3600.0  # Seconds a resumption token can be used for after it was issued
+maxEarlyData: Final = 16 * 1024  # Most bytes of request stream data accepted before the handshake completes
+secretSize: Final = 32  # Bytes of the key tokens are authenticated with
+nonceSize: Final = 8  # Random bytes that make every token unique
+tagSize: Final = 16  # Bytes of the authentication tag kept in a token
+_TOKEN_HEADER = struct.Struct('!d8s')  # Issue time and nonce, in front of the tag
+
+class ResumptionTokens:
+    def __init__(self, secret=None, lifetime=tokenLifetime, max_early_data=maxEarlyData):
+        """
+        Initialize the issuer and checker of the resumption tokens a server hands out.
+
+        A token rides in the Server Hello. A client that comes back with it
+        may send its request in the same flight as its Client Hello (0-RTT),
+        saving the round trip of the handshake. Early requests can be
+        replayed by anyone who captured them, so a token is only good:
+        - from the IP address it was issued to,
+        - until lifetime seconds after it was issued,
+        - once: a token that was already used is refused,
+        - for up to max_early_data bytes of request data.
+        Requests only fetch data, so a replay that slips through, e.g. to
+        another worker process of the same server, at worst sends the same
+        response again. A refused token only costs the round trip: the
+        client sends the request again after the Server Hello.
+
+        Args:
+            secret (bytes, optional): Key tokens are authenticated with; share it between the worker
+                processes of one server so any of them accepts another's tokens. Defaults to a random one.
+            lifetime (float): Seconds a token stays valid.
+            max_early_data (int): Most bytes of request stream data accepted in 0-RTT.
+        """
+        self.secret = secret if secret is not None else os.urandom(secretSize)
+        self.lifetime = lifetime
+        self.max_early_data = max_early_data
+        self.used = set()  # Nonces of tokens already used and not yet expired
+        self.expiry = []  # (expiry time, nonce) of the used tokens, earliest first
+        self.accepted = 0
+        self.rejected = 0
+
+    def tag(self, issued, nonce, address):
+        """
+        Compute the authentication tag of a token.
+
+        Args:
+            issued (float): When the token was issued.
+            nonce (bytes): The token's random nonce.
+            address (tuple): Client address the token is bound to; only the host counts.
+
+        Returns:
+            bytes: tagSize bytes.
+        """
+        host = ipaddress.ip_address(address[0]).packed
+        return hmac.new(self.secret, _TOKEN_HEADER.pack(issued, nonce) + host, hashlib.sha256).digest()[:tagSize]
+
+    def issue(self, address, now):
+        """
+        Create a token for a client to present when it comes back.
+
+        Args:
+            address (tuple): Address of the client.
+            now (float): Current monotonic time.
+
+        Returns:
+            bytes: The token.
+        """
+        nonce = os.urandom(nonceSize)
+        return _TOKEN_HEADER.pack(now, nonce) + self.tag(now, nonce, address)
+
+    def validate(self, token, address, now):
+        """
+        Check a token presented with a Client Hello, and use it up.
+
+        Args:
+            token (bytes): The presented token.
+            address (tuple): Address the Client Hello came from.
+            now (float): Current monotonic time.
+
+        Returns:
+            bool: True if the client may send early data.
+        """
+        self.forget_expired(now)
+        valid = False
+        if len(token) == _TOKEN_HEADER.size + tagSize:
+            issued, nonce = _TOKEN_HEADER.unpack_from(token)
+            valid = (hmac.compare_digest(token[_TOKEN_HEADER.size:], self.tag(issued, nonce, address))
+                     and issued <= now < issued + self.lifetime and nonce not in self.used)
+            if valid:
+                self.used.add(nonce)
+                heapq.heappush(self.expiry, (issued + self.lifetime, nonce))
+        if valid:
+            self.accepted += 1
+        else:
+            self.rejected += 1
+        return valid
+
+    def forget_expired(self, now):
+        """
+        Drop the used tokens that have expired; their own lifetime check refuses them from now on.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        while self.expiry and self.expiry[0][0] <= now:
+            self.used.discard(heapq.heappop(self.expiry)[1])
+
+    def stats(self):
+        """
+        Return how many tokens were accepted and refused.
+
+        Returns:
+            dict: Counts of accepted and rejected tokens, and used tokens still remembered.
+        """
+        return {'accepted': self.accepted, 'rejected': self.rejected, 'remembered': len(self.used)}
@@ -0,0 +1,239 @@
+import heapq  # Importing the heapq module for picking the stream with the earliest virtual finish time
+from collections import OrderedDict  # Importing OrderedDict from collections for rotating through streams
+from typing import Final  # Importing Final from typing for defining constants
+
+# Defining constants
+defaultWeight: Final = 1  # Share of a stream under weighted-fair scheduling
+defaultUrgency: Final = 3  # Priority level of a stream under strict-priority scheduling; lower goes first
+
+class RoundRobinScheduler:
+    def __init__(self):
+        """
+        Initialize a scheduler that takes turns between the streams with data to send.
+
+        Each stream gets one frame per turn, as large as the packet allows,
+        then moves to the back of the queue.
+        """
+        self.queue = OrderedDict()  # Stream ID -> None, in turn order
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __contains__(self, stream_id):
+        return stream_id in self.queue
+
+    def push(self, stream_id, weight=defaultWeight, urgency=defaultUrgency):
+        """
+        Add a stream that has data to send; a stream already scheduled keeps its place.
+
+        Args:
+            stream_id (int): Stream to add.
+            weight (int): Unused by this policy.
+            urgency (int): Unused by this policy.
+        """
+        if stream_id not in self.queue:
+            self.queue[stream_id] = None
+
+    def remove(self, stream_id):
+        """
+        Take a stream out of the schedule, e.g. because it finished or ran out of data.
+
+        Args:
+            stream_id (int): Stream to remove.
+        """
+        self.queue.pop(stream_id, None)
+
+    def next(self):
+        """
+        Return the stream whose turn it is.
+
+        Returns:
+            int: Stream ID, or None if no stream has data to send.
+        """
+        return next(iter(self.queue), None)
+
+    def on_sent(self, stream_id, size):
+        """
+        Account for a frame sent from a stream.
+
+        Args:
+            stream_id (int): Stream the frame came from.
+            size (int): Bytes the frame took in its packet.
+        """
+        if stream_id in self.queue:
+            self.queue.move_to_end(stream_id)
+
+class WeightedFairScheduler:
+    def __init__(self):
+        """
+        Initialize a scheduler that shares bytes between streams in proportion to their weights.
+
+        Each stream has a virtual time that advances by the bytes it sends
+        divided by its weight, and the stream furthest behind goes next. A
+        stream that comes back after running dry starts at the current
+        virtual time, so idle time earns it no burst.
+        """
+        self.active = {}  # Stream ID -> [virtual time, weight]
+        self.heap = []  # (virtual time, sequence, stream ID); entries of removed or moved streams are skipped
+        self.sequence = 0  # Breaks virtual time ties in the order streams were pushed
+        self.clock = 0.0  # Virtual time of the last stream picked
+
+    def __len__(self):
+        return len(self.active)
+
+    def __contains__(self, stream_id):
+        return stream_id in self.active
+
+    def push(self, stream_id, weight=defaultWeight, urgency=defaultUrgency):
+        """
+        Add a stream that has data to send; a stream already scheduled keeps its place.
+
+        Args:
+            stream_id (int): Stream to add.
+            weight (int): Share of the stream relative to the others; must be positive.
+            urgency (int): Unused by this policy.
+        """
+        if weight <= 0:
+            raise ValueError("Stream weight must be positive")
+        if stream_id in self.active:
+            return
+        self.active[stream_id] = [self.clock, weight]
+        self.enqueue(stream_id)
+
+    def enqueue(self, stream_id):
+        """
+        Put a stream on the heap at its current virtual time.
+
+        Args:
+            stream_id (int): Scheduled stream.
+        """
+        heapq.heappush(self.heap, (self.active[stream_id][0], self.sequence, stream_id))
+        self.sequence += 1
+
+    def remove(self, stream_id):
+        """
+        Take a stream out of the schedule, e.g. because it finished or ran out of data.
+
+        Args:
+            stream_id (int): Stream to remove.
+        """
+        self.active.pop(stream_id, None)
+
+    def next(self):
+        """
+        Return the stream with the earliest virtual time.
+
+        Returns:
+            int: Stream ID, or None if no stream has data to send.
+        """
+        while self.heap:
+            virtual, sequence, stream_id = self.heap[0]
+            state = self.active.get(stream_id)
+            if state is not None and state[0] == virtual:
+                self.clock = virtual
+                return stream_id
+            heapq.heappop(self.heap)  # Stale entry
+        return None
+
+    def on_sent(self, stream_id, size):
+        """
+        Advance a stream's virtual time by the bytes it sent over its weight.
+
+        Args:
+            stream_id (int): Stream the frame came from.
+            size (int): Bytes the frame took in its packet.
+        """
+        state = self.active.get(stream_id)
+        if state is None:
+            return
+        state[0] += size / state[1]
+        self.enqueue(stream_id)
+
+class PriorityScheduler:
+    def __init__(self):
+        """
+        Initialize a scheduler that always serves the most urgent streams first.
+
+        Streams of a lower urgency value send before any stream of a higher
+        one gets a byte; streams of the same urgency take turns.
+        """
+        self.levels = {}  # Urgency -> RoundRobinScheduler of the streams at that urgency
+        self.urgency = {}  # Stream ID -> its urgency
+
+    def __len__(self):
+        return len(self.urgency)
+
+    def __contains__(self, stream_id):
+        return stream_id in self.urgency
+
+    def push(self, stream_id, weight=defaultWeight, urgency=defaultUrgency):
+        """
+        Add a stream that has data to send; a stream already scheduled keeps its place.
+
+        Args:
+            stream_id (int): Stream to add.
+            weight (int): Unused by this policy.
+            urgency (int): Priority level; lower values are served first.
+        """
+        if stream_id in self.urgency:
+            return
+        self.urgency[stream_id] = urgency
+        self.levels.setdefault(urgency, RoundRobinScheduler()).push(stream_id)
+
+    def remove(self, stream_id):
+        """
+        Take a stream out of the schedule, e.g. because it finished or ran out of data.
+
+        Args:
+            stream_id (int): Stream to remove.
+        """
+        urgency = self.urgency.pop(stream_id, None)
+        if urgency is None:
+            return
+        level = self.levels[urgency]
+        level.remove(stream_id)
+        if not level:
+            del self.levels[urgency]
+
+    def next(self):
+        """
+        Return the stream whose turn it is at the most urgent level.
+
+        Returns:
+            int: Stream ID, or None if no stream has data to send.
+        """
+        if not self.levels:
+            return None
+        return self.levels[min(self.levels)].next()
+
+    def on_sent(self, stream_id, size):
+        """
+        Account for a frame sent from a stream.
+
+        Args:
+            stream_id (int): Stream the frame came from.
+            size (int): Bytes the frame took in its packet.
+        """
+        urgency = self.urgency.get(stream_id)
+        if urgency is not None:
+            self.levels[urgency].on_sent(stream_id, size)
+
+SCHEDULERS = {
+    'round-robin': RoundRobinScheduler,
+    'weighted-fair': WeightedFairScheduler,
+    'priority': PriorityScheduler,
+}
+
+def create_scheduler(name):
+    """
+    Create a stream scheduler by name.
+
+    Args:
+        name (str): One of the keys of SCHEDULERS.
+
+    Returns:
+        RoundRobinScheduler | WeightedFairScheduler | PriorityScheduler: The new scheduler.
+    """
+    if name not in SCHEDULERS:
+        raise ValueError(f"Unknown stream scheduler {name}, expected one of {', '.join(SCHEDULERS)}")
+    return SCHEDULERS[name]()
@@ -1,57 +1,240 @@
-import socket  # Importing the socket module for network communication
-import sys  # Importing the sys module for system-specific parameters and functions
+import argparse  # Importing the argparse module for parsing command-line arguments
+import asyncio  # Importing the asyncio module for running the event loop engine
+import logging  # Importing the logging module for leveled server messages
+import multiprocessing  # Importing the multiprocessing module for running one server worker per core
+import os  # Importing the os module for resolving requested files
+import random  # Importing the random module for sizing the placeholder responses
+import re  # Importing the re module for recognising placeholder requests
+import shutil  # Importing the shutil module for removing the handoff socket directory
+import signal  # Importing the signal module for closing a terminated worker cleanly
+import tempfile  # Importing the tempfile module for creating the handoff socket directory
 from typing import Final  # Importing Final from typing for defining constants
 import Packets  # Importing the Packets module which contains various QUIC-related classes
-import os  # Importing the os module for generating random data
-import random  # Importing the random module for random number generation
-import math  # Importing the math module for mathematical operations
+import Engine  # Importing the Engine module for the asyncio server protocol
+import Sources  # Importing the Sources module for serving files and random data
+import Cache  # Importing the Cache module for reusing responses across connections
+import Scheduler  # Importing the Scheduler module for the stream scheduling policies
+import Resumption  # Importing the Resumption module for issuing and checking resumption tokens
+import Congestion  # Importing the Congestion module for the congestion controller names
+import Trace  # Importing the Trace module for qlog traces of the server's connections
+import Metrics  # Importing the Metrics module for the Prometheus scrape endpoint
+from Connection import oneMB, fiveMB, maxUdpPayload, defaultWindow  # Importing the per-connection constants
 
 # Defining constants
 portNumber: Final = 8888  # Port number for the server
-oneMB: Final = 1024 * 1024  # Size of 1 MB in bytes
-fiveMB: Final = 5 * oneMB  # Size of 5 MB in bytes
-minNumberOfBytes: Final = 1000  # Minimum number of bytes for a chunk
-maxNumberOfBytes: Final = 2000  # Maximum number of bytes for a chunk
+placeholderRequest: Final = re.compile(r'Request\d+')  # Request name of a client that named nothing
+logger = logging.getLogger(__name__)
+
+def resolve_file(root, name):
+    """
+    Find the file a request names under a served directory.
+
+    Args:
+        root (str): Directory being served.
+        name (str): Requested path, relative to root.
+
+    Returns:
+        str: Real path of the file, or None if it does not exist or lies outside root.
+    """
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, name.lstrip('/')))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+def file_handler(root, cache=None):
+    """
+    Make a request handler that serves files from a directory.
+
+    Each stream's request names a path under root; the file is sent
+    straight out of a shared memory mapping, see Sources.MmapSource. A
+    placeholder request (Request<id>) gets random data as before, and a
+    missing file or a path escaping root gets an empty stream.
+
+    Args:
+        root (str): Directory to serve.
+        cache (Cache.ResponseCache, optional): Cache for the random responses. Files are not copied
+            into it: their mappings are already shared between streams.
+
+    Returns:
+        coroutine function: Handler for Engine.QUICServerProtocol.
+    """
+    async def handler(connection, writers):
+        for writer in writers:
+            if placeholderRequest.fullmatch(writer.name):
+                make_source = lambda: Sources.RandomSource(random.randint(oneMB, fiveMB))  # 1 MB - 5 MB of random data
+                writer.write_source(make_source() if cache is None else cache.source(writer.name, make_source))
+                continue
+            path = resolve_file(root, writer.name)
+            if path is None:
+                logger.warning("Not serving %r on stream %d", writer.name, writer.stream_id)
+                writer.write_eof()
+            else:
+                writer.write_source(Sources.MmapSource(path))
+    return handler
 
 class QUICServer:
-    def __init__(self, host='127.0.0.1', port=portNumber):
+    def __init__(self, host='127.0.0.1', port=portNumber, window=defaultWindow, congestion_control='newreno', pacing=True, batch_io=False, worker=0, handoff_dir=None, root=None, cache_size=Cache.defaultCacheSize,
+                 scheduler='round-robin', max_datagram_size=maxUdpPayload, pmtud=True, resumption=True, resumption_secret=None, qlog=None,
+                 metrics_port=None):
         """
         Initialize a QUICServer object.
 
+        A blocking wrapper around Engine.QUICServerProtocol: the server owns
+        a private event loop and runs it only inside its own methods, so it
+        can be driven from a plain thread. One socket carries every client,
+        each datagram being routed by its destination connection ID to the
+        QUICConnection holding that client's state.
+
         Args:
             host (str): Host address of the server.
             port (int): Port number of the server.
+            window (int): Maximum number of unacknowledged packets in flight per connection.
+            congestion_control (str): Congestion controller name, see Congestion.CONGESTION_CONTROLLERS.
+            pacing (bool): Whether to pace packets across the RTT instead of sending window-sized bursts.
+            batch_io (bool): Whether to use UDP GSO/GRO where the kernel supports them, see Packets.QUICSocket.enable_batch_io().
+            worker (int): Index of this worker among the processes sharing the port, see QUICWorkerPool.
+            handoff_dir (str, optional): Directory of the workers' handoff sockets. When set, the port is
+                shared with SO_REUSEPORT and datagrams for other workers' connections are handed to them.
+            root (str, optional): Directory whose files clients may request by path, see file_handler().
+                Without it every stream gets random data.
+            cache_size (int): Byte budget of the response cache shared by the server's connections; 0 disables it.
+            scheduler (str): Stream scheduling policy, see Scheduler.SCHEDULERS.
+            max_datagram_size (int): Largest UDP payload of a data packet, see Connection.QUICConnection.
+            pmtud (bool): Whether to discover the path MTU with probe packets instead of always filling max_datagram_size.
+            resumption (bool): Whether to issue resumption tokens that let returning clients send their request
+                with the Client Hello, see Resumption.ResumptionTokens.
+            resumption_secret (bytes, optional): Key the tokens are authenticated with. Defaults to a random one;
+                QUICWorkerPool gives all its workers the same.
+            qlog (str, optional): File to write a qlog trace of every connection to, see Trace.Tracer. A worker
+                sharing the port writes its own file, with its index before the extension.
+            metrics_port (int, optional): Port to serve the connections' metrics on in the Prometheus text format,
+                over HTTP on host. A worker sharing the server port serves on metrics_port plus its index.
         """
+        if window < 1:
+            raise ValueError("Send window must allow at least one packet in flight")
         self.host = host
         self.port = port
+        self.window = window
+        self.congestion_control = congestion_control
+        self.pacing = pacing
+        self.batch_io = batch_io
+        self.worker = worker
+        self.handoff_dir = handoff_dir
+        self.root = root
+        self.scheduler = scheduler
+        self.max_datagram_size = max_datagram_size
+        self.pmtud = pmtud
+        self.cache = Cache.ResponseCache(cache_size) if cache_size else None
+        self.tokens = Resumption.ResumptionTokens(resumption_secret) if resumption else None
+        if qlog is not None and handoff_dir is not None:
+            base, extension = os.path.splitext(qlog)
+            qlog = f"{base}-{worker}{extension}"
+        self.tracer = Trace.Tracer(qlog, 'server') if qlog is not None else None
+        self.metrics_port = None if metrics_port is None else metrics_port + (worker if handoff_dir is not None else 0)
+        self.metrics_server = None
         self.socket = Packets.QUICSocket()
-        self.streams = []  # List to store active streams
-        self.i = 0
+        self.socket_ready = False
+        self.loop = asyncio.new_event_loop()
+        self.protocol = None
+
+    @property
+    def connections(self):
+        """
+        Return the open connections.
+
+        Returns:
+            dict: Connection ID -> QUICConnection.
+        """
+        return {} if self.protocol is None else self.protocol.connections
+
+    def prometheus(self):
+        """
+        Render the metrics of every connection in the Prometheus text format.
+
+        Returns:
+            str: The exposition, see Engine.QUICServerProtocol.prometheus(); empty before the socket is created.
+        """
+        return '' if self.protocol is None else self.protocol.prometheus()
 
     def create_socket(self):
         """
-        Create and bind the server socket.
+        Create and bind the server socket and start the engine on it.
         """
-        print("Creating socket...\n")
-        self.socket.create_socket()
+        logger.info("Creating socket on %s:%d", self.host, self.port)
+        self.socket.create_socket(reuse_port=self.handoff_dir is not None)
         self.socket.bind((self.host, self.port))
+        if self.batch_io:
+            self.socket.enable_batch_io()
+        options = {'window': self.window, 'congestion_control': self.congestion_control, 'pacing': self.pacing, 'worker': self.worker,
+                   'cache': self.cache, 'scheduler': self.scheduler, 'max_datagram_size': self.max_datagram_size,
+                   'pmtud': self.pmtud, 'tokens': self.tokens, 'tracer': self.tracer}
+        if self.handoff_dir is not None:
+            options['handoff'] = Engine.WorkerHandoff(self.handoff_dir, self.worker)
+        handler = None if self.root is None else file_handler(self.root, self.cache)
+        self.protocol = self.loop.run_until_complete(Engine.create_server_endpoint(self.socket, handler, **options))
+        if self.metrics_port is not None:
+            self.metrics_server = self.loop.run_until_complete(Metrics.serve_prometheus(self.host, self.metrics_port, self.protocol.prometheus))
+        self.socket_ready = True
 
     def accept(self):
         """
-        Accept a connection from a client and perform the initial handshake.
-        """
-        self.create_socket()
-        print("Accepting connection...\n")
-        data, address = self.socket.recvfrom(1024)  # Receive data from a client
-        self.socket.set_address(address)
-        data = Packets.QUICLongHeader.decode(data)  # Decode the received data
-        self.socket.set_src_cid(data.dest_cid)
-        dest_conn_id = Packets.generate_random_hex()
-        self.socket.set_dest_cid(dest_conn_id)
-        print(f"Received Client Hello from {address}")
-        qlh = Packets.QUICLongHeader(Packets.LONG_HEADER_FLAG, dest_conn_id, data.dest_cid, data.packet_number)
-        self.socket.sendto(qlh.encode(), address)  # Send server hello to the client
-        print(f"Sent Server Hello to {address}")
+        Wait for a new client connection and perform the initial handshake.
+
+        Returns:
+            QUICConnection: The new connection.
+        """
+        if not self.socket_ready:
+            self.create_socket()
+        logger.info("Accepting connection...")
+        return self.loop.run_until_complete(self.protocol.accept())
+
+    def handle_client(self, connection=None):
+        """
+        Serve a client connection until its request has been answered.
+
+        A persistent connection is served until the client says it sends no
+        more requests, or stays quiet for Connection.keepAliveTimeout.
+        Other connections keep being served while this one runs.
+
+        Args:
+            connection (QUICConnection, optional): Connection to wait for; defaults to the only open one.
+        """
+        if connection is None:
+            connection = next(iter(self.connections.values()))
+        self.loop.run_until_complete(self.protocol.wait_closed(connection))
+
+    def serve_forever(self):
+        """
+        Serve every client until shutdown() is called.
+        """
+        if not self.socket_ready:
+            self.create_socket()
+        self.loop.run_until_complete(self.protocol.serve_forever())
+
+    def shutdown(self):
+        """
+        Make serve_forever return. Safe to call from another thread.
+        """
+        if self.protocol is not None:
+            self.loop.call_soon_threadsafe(self.protocol.shutdown)
+
+    def close(self):
+        """
+        Stop the engine and the metrics endpoint, finish the qlog trace and close the socket and the event loop.
+        """
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.loop.run_until_complete(self.metrics_server.wait_closed())
+            self.metrics_server = None
+        if self.protocol is not None:
+            self.protocol.close()
+            self.protocol = None
+            self.loop.run_until_complete(asyncio.sleep(0))  # Let the transport finish closing
+        if self.tracer is not None:
+            self.tracer.close()
+        self.socket.close()
+        self.loop.close()
 
     def send_packet(self, packet, address):
         """
@@ -63,110 +246,120 @@ class QUICServer:
         """
         self.socket.sendto(packet.encode(), address)
 
-    def receive_packet(self):
-        """
-        Receive a packet from the client.
+def run_worker(worker, handoff_dir, host, port, options):
+    """
+    Serve as one worker of a QUICWorkerPool until the process is stopped.
 
-        Returns:
-            Packets.QUICPacket: The received packet.
-        """
-        data, _ = self.socket.recvfrom(1024)  # Adjust buffer size accordingly
-        decoded_header = Packets.QUICPacket.decode(data)
-        if not isinstance(decoded_header, Packets.QUICPacket):
-            print("Invalid packet received. Exiting...")
-            self.socket.close()
-            exit(1)
-        return decoded_header
-    
-    def receive_ack(self):
+    Args:
+        worker (int): Index of this worker.
+        handoff_dir (str): Directory of the workers' handoff sockets.
+        host (str): Host address to serve on.
+        port (int): Port shared by every worker.
+        options (dict): Extra keyword arguments for QUICServer.
+    """
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # stop() terminates workers; close the server all the same
+    server = QUICServer(host, port, worker=worker, handoff_dir=handoff_dir, **options)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+class QUICWorkerPool:
+    def __init__(self, host='127.0.0.1', port=portNumber, workers=None, **options):
         """
-        Receive an ACK packet from the client.
+        Initialize a pool of server worker processes sharing one port.
 
-        Returns:
-            Packets.QUICAck: The received ACK packet.
-        """
-        data, _ = self.socket.recvfrom(1024)
-        decoded_header = Packets.QUICAck.decode(data)
-        if not isinstance(decoded_header, Packets.QUICAck):
-            print("Invalid ACK packet received. Exiting...")
-            self.socket.close()
-            exit(1)
-        return decoded_header
-
-    def handle_client(self):
-        """
-        Handle the client connection and process data streams.
-        """
-        self.socket.get_sockfd().settimeout(None)
-        packet = self.receive_packet()
-        self.socket.get_sockfd().settimeout(3)
-        if packet.flags == 0:  # Check if stream exists
-            for frame in packet.protected_payload:
-                if frame.stream_id not in self.streams:
-                    self.streams.append({'id': frame.stream_id, 'data': b'', 'totalSent': 0})
-        
-        streamNumber = len(packet.protected_payload)
-        print(f"Received request for {streamNumber} streams\n")
-        self.generate_random_data(streamNumber)
-        self.send_data(streamNumber)
-    
-    def generate_random_data(self, stream_number):
-        """
-        Generate random data for the streams.
+        Every worker binds the port with SO_REUSEPORT, so the kernel spreads
+        clients across them and each runs its own event loop on its own core.
+        Connection IDs name the worker that issued them; a datagram the
+        kernel steers to another worker (for example after a client changes
+        address) is handed to the owner over a Unix socket.
 
         Args:
-            stream_number (int): Number of streams to generate data for.
+            host (str): Host address of the server.
+            port (int): Port number shared by the workers.
+            workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            **options: Extra keyword arguments for every QUICServer (window, congestion_control, pacing, batch_io, root, cache_size,
+                scheduler, max_datagram_size, pmtud, resumption, resumption_secret, qlog, metrics_port). Unless given, one resumption
+                secret is made for all workers, so a token from one worker is accepted by the others.
+        """
+        workers = workers or multiprocessing.cpu_count()
+        if not 1 <= workers <= Packets.MAX_WORKERS:
+            raise ValueError(f"Worker count must be between 1 and {Packets.MAX_WORKERS}")
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.options = options
+        self.options.setdefault('resumption_secret', os.urandom(Resumption.secretSize))
+        self.handoff_dir = None
+        self.processes = []
+
+    def start(self):
+        """
+        Start the worker processes.
         """
-        for i in range(stream_number):
-            data = os.urandom(random.randint(oneMB, fiveMB))  # Generate 1 MB - 5 MB of random data
-            self.streams[i]['data'] = data
+        self.handoff_dir = tempfile.mkdtemp(prefix='quic-workers-')
+        for worker in range(self.workers):
+            process = multiprocessing.Process(target=run_worker, args=(worker, self.handoff_dir, self.host, self.port, self.options), daemon=True)
+            process.start()
+            self.processes.append(process)
 
-    def send_data(self, streamNumber):
+    def join(self):
+        """
+        Wait for every worker process to exit.
         """
-        Divide data into chunks and send it via streams.
+        for process in self.processes:
+            process.join()
 
-        Args:
-            streamNumber (int): Number of streams to send data to.
-        """
-        print("Sending files...\n")
-        for i in range(streamNumber):
-            r = random.randint(minNumberOfBytes, maxNumberOfBytes)  # Generate random chunk size between 1000 and 2000 bytes
-            self.streams[i]['chunkSize'] = r
-
-        max_packets = -sys.maxsize - 1
-        for stream in self.streams:
-            max = math.ceil(len(stream['data']) / stream['chunkSize'])
-            if max > max_packets:
-                max_packets = max
-            
-        for i in range(max_packets):
-            frames = []
-            for j in range(streamNumber):
-                offset = self.streams[j]['chunkSize'] * i
-                if offset + self.streams[j]['chunkSize'] >= len(self.streams[j]['data']):
-                    remaining = len(self.streams[j]['data']) - offset
-                else:
-                    remaining = self.streams[j]['chunkSize']
-
-                data = self.streams[j]['data'][offset:offset + remaining]
-                self.streams[j]['totalSent'] += len(data)
-                totalSent = self.streams[j]['totalSent']
-                if offset + remaining >= len(self.streams[j]['data']):
-                    finished = 1
-                else:
-                    finished = 0
-                streamPayload = Packets.QUICStreamPayload(stream_id=j, offset=totalSent, finished=finished, length=len(data), stream_data=data)
-                frames.append(streamPayload)
-            packet = Packets.QUICPacket(0, self.socket.get_dest_cid(), i, frames)
-            
-            self.send_packet(packet, self.socket.get_address())
-            self.receive_ack()  # Receive ACK for the packet
-            
-        print("Files sent.\n")
+    def stop(self):
+        """
+        Stop every worker process and remove the handoff sockets.
+        """
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        self.join()
+        self.processes = []
+        if self.handoff_dir is not None:
+            shutil.rmtree(self.handoff_dir, ignore_errors=True)
+            self.handoff_dir = None
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QUIC server")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to serve on")
+    parser.add_argument('--port', type=int, default=portNumber, help="Port to serve on")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes sharing the port (0 for one per CPU)")
+    parser.add_argument('--root', help="Directory whose files clients may request by path")
+    parser.add_argument('--scheduler', default='round-robin', choices=list(Scheduler.SCHEDULERS), help="How streams share each connection")
+    parser.add_argument('--cache-size', type=int, default=Cache.defaultCacheSize, help="Byte budget of the response cache (0 to disable)")
+    parser.add_argument('--window', type=int, default=defaultWindow, help="Most packets in flight per connection")
+    parser.add_argument('--congestion-control', default='newreno', choices=list(Congestion.CONGESTION_CONTROLLERS), help="Congestion controller of every connection")
+    parser.add_argument('--max-datagram-size', type=int, default=maxUdpPayload, help="Largest UDP payload of a data packet")
+    parser.add_argument('--no-pmtud', action='store_true', help="Fill every packet to --max-datagram-size instead of discovering the path MTU")
+    parser.add_argument('--qlog', help="File to write a qlog trace of every connection to")
+    parser.add_argument('--metrics-port', type=int, help="Port to serve Prometheus metrics on over HTTP")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help="Least severe messages to print")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    options = {'root': args.root, 'cache_size': args.cache_size, 'scheduler': args.scheduler, 'window': args.window,
+               'congestion_control': args.congestion_control, 'max_datagram_size': args.max_datagram_size, 'pmtud': not args.no_pmtud,
+               'qlog': args.qlog, 'metrics_port': args.metrics_port}
     print("Server Running")
-    server = QUICServer()  # Create a QUIC server instance
-    server.accept()  # Accept a connection from the client
-    server.handle_client()  # Handle the client
-    server.socket.close()  # Close the socket
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # Exit through close() on SIGTERM too, finishing the qlog file
+    if args.workers == 1:
+        server = QUICServer(args.host, args.port, **options)  # Create a QUIC server instance
+        try:
+            server.serve_forever()  # Serve clients until interrupted
+        except KeyboardInterrupt:
+            print("Exiting...")
+        server.close()  # Close the socket and the event loop
+    else:
+        pool = QUICWorkerPool(args.host, args.port, args.workers or None, **options)
+        pool.start()
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            print("Exiting...")
+        pool.stop()
@@ -0,0 +1,210 @@
+import mmap  # Importing the mmap module for serving files from the page cache
+import os  # Importing the os module for unseeded random data and file metadata
+import random  # Importing the random module for seeded random data
+from typing import Final  # Importing Final from typing for defining constants
+
+# Defining constants
+sourceChunkSize: Final = 64 * 1024  # Bytes a source produces per pull; a few packets' worth
+mappedChunkSize: Final = 1024 * 1024  # Bytes an MmapSource hands out per pull; views cost nothing until sent
+
+mappings = {}  # (path, inode, modification time, size) -> MappedFile shared by every source reading that file
+
+class RandomSource:
+    def __init__(self, size, seed=None, chunk_size=sourceChunkSize):
+        """
+        Initialize a source of random stream data produced a chunk at a time.
+
+        Nothing is generated up front: each chunk is made when the sender
+        pulls it, so memory stays bounded by the data in flight and the first
+        byte goes out as soon as the window opens, whatever the size.
+
+        Args:
+            size (int): Total number of bytes to produce.
+            seed (int, optional): Seed for reproducible data; os.urandom is used without one.
+            chunk_size (int): Bytes per chunk.
+        """
+        if size < 0:
+            raise ValueError("Source size cannot be negative")
+        self.size = size
+        self.chunk_size = chunk_size
+        self.random = None if seed is None else random.Random(seed)
+        self.produced = 0  # Bytes handed out so far
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Produce the next chunk.
+
+        Returns:
+            bytes: Up to chunk_size random bytes.
+
+        Raises:
+            StopIteration: Once size bytes have been produced.
+        """
+        count = min(self.chunk_size, self.size - self.produced)
+        if count <= 0:
+            raise StopIteration
+        self.produced += count
+        return os.urandom(count) if self.random is None else self.random.randbytes(count)
+
+class FileSource:
+    def __init__(self, path, chunk_size=sourceChunkSize):
+        """
+        Initialize a source that reads a file a chunk at a time.
+
+        The file is opened on the first pull and closed at its end, so a
+        source that is never sent holds no file descriptor.
+
+        Args:
+            path (str): File to send.
+            chunk_size (int): Bytes per chunk.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        self.file = None
+        self.done = False
+        self.produced = 0  # Bytes handed out so far
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Read the next chunk.
+
+        Returns:
+            bytes: Up to chunk_size bytes of the file.
+
+        Raises:
+            StopIteration: At the end of the file.
+        """
+        if self.done:
+            raise StopIteration
+        if self.file is None:
+            self.file = open(self.path, 'rb')
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.done = True
+            self.close()
+            raise StopIteration
+        self.produced += len(chunk)
+        return chunk
+
+    def close(self):
+        """
+        Close the file if it is open.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class MappedFile:
+    def __init__(self, path, key=None):
+        """
+        Initialize a read-only memory mapping of a whole file.
+
+        Args:
+            path (str): File to map; must not be empty.
+            key (tuple, optional): Key of the mapping in mappings.
+        """
+        self.path = path
+        self.key = key
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.users = 0  # Sources currently reading the mapping
+
+def open_mapping(path):
+    """
+    Return the shared mapping of a file, mapping it if no source uses it yet.
+
+    Mappings are keyed by the file's identity and modification time, so a
+    replaced or rewritten file gets a new mapping.
+
+    Args:
+        path (str): File to map.
+
+    Returns:
+        MappedFile: The mapping, with its user count raised by one.
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    mapped = mappings.get(key)
+    if mapped is None:
+        mapped = mappings[key] = MappedFile(path, key)
+    mapped.users += 1
+    return mapped
+
+def release_mapping(mapped):
+    """
+    Give up one use of a shared mapping, forgetting it once nobody uses it.
+
+    The mapping itself is unmapped when the last view of it (possibly still
+    held by a packet waiting to be acknowledged) is gone.
+
+    Args:
+        mapped (MappedFile): Mapping from open_mapping().
+    """
+    mapped.users -= 1
+    if mapped.users == 0 and mappings.get(mapped.key) is mapped:
+        del mappings[mapped.key]
+
+class MmapSource:
+    def __init__(self, path, chunk_size=mappedChunkSize):
+        """
+        Initialize a source that serves a file as memoryview slices of a shared memory mapping.
+
+        The data is never read() into Python buffers: frames are slices of
+        the page cache all the way into sendmsg(), and every connection
+        sending the same file at once shares one mapping.
+
+        Args:
+            path (str): File to send.
+            chunk_size (int): Bytes per chunk.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        self.mapped = None
+        self.done = False
+        self.produced = 0  # Bytes handed out so far
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Hand out the next slice of the file.
+
+        Returns:
+            memoryview: Up to chunk_size bytes of the mapped file.
+
+        Raises:
+            StopIteration: At the end of the file.
+        """
+        if self.done:
+            raise StopIteration
+        if self.produced >= self.size:
+            self.close()
+            raise StopIteration
+        if self.mapped is None:
+            self.mapped = open_mapping(self.path)
+        chunk = self.mapped.view[self.produced:self.produced + self.chunk_size]
+        if not chunk:  # The file shrank after the source was made
+            self.close()
+            raise StopIteration
+        self.produced += len(chunk)
+        return chunk
+
+    def close(self):
+        """
+        Stop reading and release the mapping.
+        """
+        self.done = True
+        if self.mapped is not None:
+            release_mapping(self.mapped)
+            self.mapped = None
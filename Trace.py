@@ -0,0 +1,239 @@
+import json  # Importing the json module for writing qlog files
+import threading  # Importing the threading module for flushing events off the connection's thread
+import time  # Importing the time module for the trace's wall-clock reference time
+from typing import Final  # Importing Final from typing for defining constants
+import Packets  # Importing the Packets module for naming the frames of traced packets
+
+# Defining constants
+defaultCapacity: Final = 65536  # Events the ring buffer holds; older unflushed events are overwritten
+flushInterval: Final = 0.2  # Seconds between flushes of the ring buffer to the qlog file
+qlogVersion: Final = "0.3"  # qlog schema the traces follow
+FRAME_NAMES = {
+    Packets.QUICMaxData: 'max_data',
+    Packets.QUICMaxStreamData: 'max_stream_data',
+    Packets.QUICDataBlocked: 'data_blocked',
+    Packets.QUICStreamDataBlocked: 'stream_data_blocked',
+    Packets.QUICAckFrequency: 'ack_frequency',
+    Packets.QUICKeepAlive: 'keep_alive',
+    Packets.QUICGoAway: 'go_away',
+}  # qlog frame_type of each control frame
+
+def frame_summary(frame):
+    """
+    Describe a frame as a qlog frame object.
+
+    Args:
+        frame (object): A stream, padding or control frame.
+
+    Returns:
+        dict: The frame's type and fields.
+    """
+    if isinstance(frame, Packets.QUICStreamPayload):
+        return {'frame_type': 'stream', 'stream_id': frame.stream_id, 'offset': frame.offset - frame.length,
+                'length': frame.length, 'fin': frame.finished == 1}
+    if isinstance(frame, Packets.QUICPadding):
+        return {'frame_type': 'padding', 'length': frame.length}
+    summary = {'frame_type': FRAME_NAMES.get(type(frame), type(frame).__name__)}
+    for name in getattr(frame, 'FIELDS', ()):
+        summary[name] = getattr(frame, name)
+    return summary
+
+def ack_summary(ack):
+    """
+    Describe an ACK as a qlog ack frame.
+
+    Args:
+        ack (Packets.QUICAck): The ACK.
+
+    Returns:
+        dict: The acknowledged ranges, smallest first, and the ACK delay in milliseconds.
+    """
+    return {'frame_type': 'ack', 'ack_delay': ack.ack_delay / 1e3, 'acked_ranges': [[smallest, largest] for smallest, largest in reversed(ack.ranges)]}
+
+class Tracer:
+    def __init__(self, path=None, vantage_point='server', capacity=defaultCapacity, flush_interval=flushInterval, title=None):
+        """
+        Initialize an event tracer that records connection events into a ring buffer.
+
+        Connections take an optional tracer and call record() from their
+        hot paths only when they have one, so tracing that is off costs a
+        None check. Recording stores a tuple in a preallocated slot; turning
+        events into qlog JSON and writing them happens on a background
+        thread. If that thread falls more than capacity events behind, the
+        oldest unwritten events are overwritten and counted in dropped.
+
+        Events are written as one qlog trace whose events carry the
+        connection ID as group_id, so one tracer serves every connection of
+        a server. Without a path the tracer only keeps the last capacity
+        events in memory, like a flight recorder, for events() or dump().
+
+        Args:
+            path (str, optional): qlog file to write; it is valid JSON once close() has returned.
+            vantage_point (str): 'server' or 'client'.
+            capacity (int): Events the ring buffer holds.
+            flush_interval (float): Seconds between flushes to the file.
+            title (str, optional): Title of the qlog file.
+        """
+        if capacity < 1:
+            raise ValueError("The ring buffer must hold at least one event")
+        self.path = path
+        self.vantage_point = vantage_point
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.title = title or f"{vantage_point} trace"
+        self.buffer = [None] * capacity  # (time, name, group ID, data) tuples; slot count % capacity holds the next one
+        self.count = 0  # Events recorded so far
+        self.flushed = 0  # Events written or dropped so far
+        self.dropped = 0  # Events overwritten before they were written
+        self.reference = None  # Monotonic time of the first event; event times are relative to it
+        self.reference_wall = None  # Wall-clock time of the first event, in milliseconds since the epoch
+        self.file = None
+        self.written = 0  # Events in the file
+        self.lock = threading.Lock()  # Serialises flushes from the background thread and from flush()/close()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread = None
+        if path is not None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def record(self, now, name, group_id, data):
+        """
+        Record an event. Called from connection hot paths, so it only stores the event.
+
+        Args:
+            now (float): Monotonic time of the event.
+            name (str): qlog event name, e.g. 'transport:packet_sent'.
+            group_id (str): Connection ID the event belongs to.
+            data (dict): Event data; not copied, so it must not be changed afterwards.
+        """
+        if self.reference is None:
+            self.reference = now
+            self.reference_wall = time.time() * 1e3
+        self.buffer[self.count % self.capacity] = (now, name, group_id, data)
+        self.count += 1
+
+    def take(self):
+        """
+        Take the events recorded since the last call out of the ring buffer.
+
+        record() may run on another thread meanwhile, so slots it could
+        have overwritten while they were copied are counted as dropped
+        instead of being returned.
+
+        Returns:
+            list: (time, name, group ID, data) tuples, oldest first.
+        """
+        end = self.count
+        start = max(self.flushed, end - self.capacity)
+        events = [self.buffer[index % self.capacity] for index in range(start, end)]
+        overwritten = self.count - self.capacity - start  # Slots record() reused while they were copied
+        if overwritten > 0:
+            events = events[overwritten:]
+            start += overwritten
+        self.dropped += start - self.flushed
+        self.flushed = end
+        return events
+
+    def qlog_event(self, event):
+        """
+        Turn a recorded event into a qlog event object.
+
+        Args:
+            event (tuple): (time, name, group ID, data) as recorded.
+
+        Returns:
+            dict: The qlog event, with its time in milliseconds since the first event.
+        """
+        now, name, group_id, data = event
+        return {'time': round((now - self.reference) * 1e3, 3), 'name': name, 'group_id': group_id, 'data': data}
+
+    def header(self):
+        """
+        Return the qlog file's top-level fields and trace description.
+
+        Returns:
+            dict: The qlog file object with an empty event list.
+        """
+        return {'qlog_version': qlogVersion, 'qlog_format': 'JSON', 'title': self.title,
+                'traces': [{'vantage_point': {'type': self.vantage_point},
+                            'common_fields': {'time_format': 'relative', 'reference_time': self.reference_wall},
+                            'events': []}]}
+
+    def events(self):
+        """
+        Return the events still in the ring buffer, for a tracer without a file.
+
+        Returns:
+            list: qlog event objects, oldest first.
+        """
+        start = max(self.flushed, self.count - self.capacity)
+        return [self.qlog_event(self.buffer[index % self.capacity]) for index in range(start, self.count)]
+
+    def dump(self, path):
+        """
+        Write the events still in the ring buffer to a qlog file.
+
+        Args:
+            path (str): File to write.
+        """
+        document = self.header()
+        document['traces'][0]['events'] = self.events()
+        with open(path, 'w') as file:
+            json.dump(document, file)
+
+    def flush(self):
+        """
+        Write the events recorded so far to the qlog file.
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            events = self.take()
+            if not events:
+                return
+            if self.file is None:
+                # Everything up to the event list now, the closing brackets in close()
+                opening = json.dumps(self.header())
+                self.file = open(self.path, 'w')
+                self.file.write(opening[:opening.rindex('[]') + 1])
+            for event in events:
+                self.file.write(('\n' if self.written == 0 else ',\n') + json.dumps(self.qlog_event(event)))
+                self.written += 1
+            self.file.flush()
+
+    def run(self):
+        """
+        Flush the ring buffer every flush_interval until close() is called.
+        """
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        """
+        Write the remaining events and finish the qlog file.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None:
+            self.wakeup.set()
+            self.thread.join()
+        self.flush()
+        with self.lock:
+            if self.path is not None and self.file is None:
+                self.dump(self.path)  # Nothing was recorded: an empty trace
+            elif self.file is not None:
+                self.file.write('\n]}]}')
+                self.file.close()
+                self.file = None
+
+    def stats(self):
+        """
+        Return how many events were recorded, written and dropped.
+
+        Returns:
+            dict: Counts of recorded, written and dropped events.
+        """
+        return {'recorded': self.count, 'written': self.written, 'dropped': self.dropped}
@@ -1,9 +1,28 @@
 import unittest  # Importing the unittest module for creating unit tests
 from Packets import *  # Importing all classes and functions from the Packets module
 from Client import QUICClient  # Importing the QUICClient class from the Client module
-from Server import QUICServer  # Importing the QUICServer class from the Server module
+from Server import QUICServer, QUICWorkerPool, file_handler  # Importing the server classes and the file handler from the Server module
+import Recovery  # Importing the Recovery module for loss detection tests
+import Congestion  # Importing the Congestion module for congestion control tests
+import Sources  # Importing the Sources module for lazily produced stream data
+import Cache  # Importing the Cache module for the shared response cache
+import Reassembly  # Importing the Reassembly module for client-side stream reassembly
+import Scheduler  # Importing the Scheduler module for the stream scheduling policies
+import PathMtu  # Importing the PathMtu module for path MTU discovery
+import Resumption  # Importing the Resumption module for resumption tokens
+import heapq  # Importing the heapq module for delivering datagrams in time order over a simulated link
+from Proxy import LossyProxy, LinkImpairment, GilbertElliottLoss  # Importing the proxy and its impairment models for transfers over an impaired path
+import Engine  # Importing the Engine module for the asyncio stream API
+import Connection  # Importing the Connection module for its timer constants
+import PerfSuite  # Importing the PerfSuite module for the loopback performance harness
+import Trace  # Importing the Trace module for event tracing
+import Metrics  # Importing the Metrics module for connection metrics
+import asyncio  # Importing the asyncio module for running engine tests
 import threading  # Importing the threading module for creating separate threads
 import time  # Importing the time module for time-related functions
+import os  # Importing the os module for generating random payloads
+import tempfile  # Importing the tempfile module for the worker handoff socket directory
+import json  # Importing the json module for reading qlog files
 
 class TestQUICPacket(unittest.TestCase):
     def test_packet_encoding_decoding(self):
@@ -14,7 +33,7 @@ class TestQUICPacket(unittest.TestCase):
         flags = 1
         dest_conn_id = "1234567890abcdef"
         packet_number = 1
-        payload = [{'stream_id': 0, 'offset': 0, 'finished': 0, 'length': 10, 'stream_data': b'hello'}]
+        payload = [QUICStreamPayload(0, 0, 5, 0, b'hello')]
         quic_packet = QUICPacket(flags, dest_conn_id, packet_number, payload)
 
         # Encode the packet
@@ -29,6 +48,14 @@ class TestQUICPacket(unittest.TestCase):
         self.assertEqual(quic_packet.packet_number, decoded_packet.packet_number)
         self.assertEqual(quic_packet.protected_payload, decoded_packet.protected_payload)
 
+    def test_size_in_bytes_counts_wire_bytes(self):
+        """
+        Test that a packet's size is the length of its encoding, for long and short headers.
+        """
+        payload = [QUICStreamPayload(3, 1205, 1200, 1, os.urandom(1200)), QUICMaxData(1 << 20)]
+        for packet in (QUICPacket(0, "1234567890abcdef", 70000, payload), QUICShortHeaderPacket("1234567890abcdef", 70000, payload, 69990)):
+            self.assertEqual(packet.size_in_bytes(), len(packet.encode()))
+
 class TestQUICLongHeader(unittest.TestCase):
     def test_long_header_encoding_decoding(self):
         """
@@ -82,6 +109,55 @@ class TestQUICSocket(unittest.TestCase):
         # Close the socket
         quic_socket.close()
 
+    def test_pooled_receive(self):
+        """
+        Test that datagrams are received into reused pool buffers of full datagram size.
+        """
+        receiver = QUICSocket()
+        receiver.create_socket()
+        receiver.bind(('127.0.0.1', 0))
+        sender = QUICSocket()
+        sender.create_socket()
+        address = receiver.get_sockfd().getsockname()
+
+        large = os.urandom(5000)  # Larger than the old 1024-byte server receive buffer
+        for payload in [b'first', large, b'third']:
+            sender.sendto(payload, address)
+            view, _ = receiver.recvfrom_pooled()
+            self.assertEqual(view, payload)
+            receiver.release(view)
+        self.assertEqual(receiver.pool.allocations, 1)
+        self.assertEqual(receiver.pool.reuses, 2)
+
+        sender.close()
+        receiver.close()
+
+    def test_batch_send_and_receive(self):
+        """
+        Test that datagrams sent in GSO batches arrive intact and are split again after GRO.
+        """
+        receiver = QUICSocket()
+        receiver.create_socket()
+        receiver.bind(('127.0.0.1', 0))
+        sender = QUICSocket()
+        sender.create_socket()
+        if not (sender.enable_batch_io() and receiver.enable_batch_io()):
+            self.skipTest("Kernel supports neither UDP GSO nor GRO")
+        address = receiver.get_sockfd().getsockname()
+
+        # A run of equal sizes ending in a shorter one, then sizes that cannot share a send
+        payloads = [os.urandom(1200) for _ in range(10)] + [os.urandom(300), os.urandom(1500), os.urandom(40)]
+        self.assertEqual(sender.sendmsg_batch([([payload[:100], payload[100:]], address) for payload in payloads]), len(payloads))
+        received = []
+        while len(received) < len(payloads):
+            view, _, segment_size = receiver.recvfrom_segments()
+            received.extend(bytes(view[start:start + segment_size]) for start in range(0, len(view), segment_size))
+            receiver.release(view)
+        self.assertEqual(received, payloads)
+
+        sender.close()
+        receiver.close()
+
 class TestQUICStreamPayload(unittest.TestCase):
     def test_stream_payload_handling(self):
         """
@@ -90,7 +166,7 @@ class TestQUICStreamPayload(unittest.TestCase):
         # Create a sample stream payload
         stream_id = 0
         offset = 0
-        length = 10
+        length = 5
         finished = 0
         stream_data = b'hello'
         stream_payload = QUICStreamPayload(stream_id, offset, length, finished, stream_data)
@@ -108,13 +184,1757 @@ class TestQUICStreamPayload(unittest.TestCase):
         self.assertEqual(stream_payload.finished, decoded_payload.finished)
         self.assertEqual(stream_payload.stream_data, decoded_payload.stream_data)
 
+class TestWireFormat(unittest.TestCase):
+    def test_varint_round_trip(self):
+        """
+        Test that variable-length integers round-trip at every size boundary.
+        """
+        for value, size in [(0, 1), (63, 1), (64, 2), (16383, 2), (16384, 4), (2**30 - 1, 4), (2**30, 8), (MAX_VARINT, 8)]:
+            buf = bytearray(8)
+            end = encode_varint(buf, 0, value)
+            self.assertEqual(end, size)
+            self.assertEqual(varint_size(value), size)
+            self.assertEqual(decode_varint(buf, 0), (value, size))
+
+        # Values outside the varint range are rejected
+        with self.assertRaises(ValueError):
+            varint_size(MAX_VARINT + 1)
+        with self.assertRaises(ValueError):
+            varint_size(-1)
+
+    def test_encode_into_caller_buffer(self):
+        """
+        Test that encode_into writes at the given offset and matches encode().
+        """
+        frames = [QUICStreamPayload(3, 70000, 4, 1, b'data'), QUICStreamPayload(900, 0, 0, 0, b'')]
+        packet = QUICPacket(0, generate_random_hex(), 123456, frames)
+
+        buf = bytearray(10 + packet.encoded_size())
+        end = packet.encode_into(buf, 10)
+
+        # The encoded packet fills exactly encoded_size() bytes after the offset
+        self.assertEqual(end, 10 + packet.encoded_size())
+        self.assertEqual(bytes(buf[10:end]), packet.encode())
+
+    def test_decode_is_zero_copy(self):
+        """
+        Test that decoded stream data is a view into the received buffer.
+        """
+        packet = QUICPacket(0, "1234567890abcdef", 7, [QUICStreamPayload(1, 10, 5, 0, b'hello')])
+        received = bytearray(packet.encode())
+
+        decoded = QUICPacket.decode(received)
+        self.assertIsInstance(decoded.protected_payload[0].stream_data, memoryview)
+
+        # Changing the receive buffer is visible through the decoded frame
+        received[-1] = ord('!')
+        self.assertEqual(bytes(decoded.protected_payload[0].stream_data), b'hell!')
+
+    def test_decode_datagram_dispatch(self):
+        """
+        Test that decode_datagram returns the object announced by the type byte.
+        """
+        self.assertIsInstance(decode_datagram(QUICLongHeader(1, "ab", "", 1).encode()), QUICLongHeader)
+        self.assertIsInstance(decode_datagram(QUICPacket(0, "ab", 1, []).encode()), QUICPacket)
+        ack = decode_datagram(QUICAck(2**40, 25).encode())
+        self.assertEqual((ack.ack_number, ack.ack_delay), (2**40, 25))
+
+    def test_malformed_input(self):
+        """
+        Test that truncated or unknown datagrams are rejected instead of executed.
+        """
+        encoded = QUICPacket(0, "1234567890abcdef", 1, [QUICStreamPayload(0, 0, 5, 1, b'hello')]).encode()
+        with self.assertRaises(ValueError):
+            QUICPacket.decode(encoded[:-1])
+        with self.assertRaises(ValueError):
+            decode_datagram(b'\x80\x04pickle')
+        with self.assertRaises(ValueError):
+            QUICLongHeader.decode(encoded)
+        self.assertIsNone(QUICAck.decode(b''))
+
+    def test_short_header_packet(self):
+        """
+        Test that short headers truncate the packet number to what the receiver can reconstruct.
+        """
+        # Examples from RFC 9000, sections 17.1 and A.3
+        self.assertEqual(packet_number_size(0xac5c02, 0xabe8b3), 2)
+        self.assertEqual(packet_number_size(0xace8fe, 0xabe8b3), 3)
+        self.assertEqual(decode_packet_number(0x9b32, 2, 0xa82f30ea), 0xa82f9b32)
+        self.assertEqual(decode_packet_number(0x01, 1, 0xff), 0x101)  # Wraps forward
+        self.assertEqual(decode_packet_number(0xfe, 1, 0x101), 0xfe)  # A late packet from before the wrap
+
+        frames = [QUICStreamPayload(0, 5, 5, 1, b'hello')]
+        packet = QUICShortHeaderPacket("1234567890abcdef", 300, frames, largest_acked=290)
+        encoded = packet.encode()
+        self.assertEqual(len(encoded), packet.encoded_size())
+        self.assertEqual(len(encoded), 1 + SHORT_CID_LENGTH + 1 + frames[0].encoded_size())
+        self.assertLess(len(encoded), QUICPacket(0, "1234567890abcdef", 300, frames).encoded_size())
+        decoded = decode_datagram(encoded)
+        self.assertIsInstance(decoded, QUICShortHeaderPacket)
+        self.assertEqual((decoded.dest_conn_id, decoded.packet_number), ("1234567890abcdef", 300 & 0xff))
+        self.assertEqual(decoded.expand_packet_number(299), 300)
+        self.assertEqual(decoded.protected_payload, frames)
+        with self.assertRaises(ValueError):
+            QUICShortHeaderPacket("ab", 1, []).encode()  # Connection ID of the wrong length
+        with self.assertRaises(ValueError):
+            decode_datagram(encoded[:5])
+
+def serve_one(server, accepted):
+    """
+    Accept one connection, record it in accepted and serve it.
+
+    Args:
+        server (QUICServer): Server to run.
+        accepted (list): Receives the accepted connection.
+    """
+    connection = server.accept()
+    accepted.append(connection)
+    server.handle_client(connection)
+
+class TestRecovery(unittest.TestCase):
+    def send(self, recovery, packet_number, time_sent):
+        """
+        Record a 1000-byte packet as sent.
+        """
+        recovery.on_packet_sent(Recovery.SentPacket(packet_number, time_sent, 1000, [packet_number]))
+
+    def test_rtt_estimation(self):
+        """
+        Test that the first sample sets the estimate and later ones are smoothed.
+        """
+        rtt = Recovery.RttEstimator()
+        rtt.update(0.100)
+        self.assertAlmostEqual(rtt.smoothed_rtt, 0.100)
+        self.assertAlmostEqual(rtt.rttvar, 0.050)
+
+        # The ACK delay is subtracted from samples above min_rtt
+        rtt.update(0.140, ack_delay=0.020)
+        self.assertAlmostEqual(rtt.min_rtt, 0.100)
+        self.assertAlmostEqual(rtt.smoothed_rtt, 7 / 8 * 0.100 + 1 / 8 * 0.120)
+        self.assertAlmostEqual(rtt.rttvar, 3 / 4 * 0.050 + 1 / 4 * 0.020)
+
+    def test_packet_threshold_loss(self):
+        """
+        Test that a packet is lost once three later packets are acknowledged.
+        """
+        recovery = Recovery.LossDetection()
+        for packet_number in range(5):
+            self.send(recovery, packet_number, 0.0)
+
+        acked, lost = recovery.on_ack_received([1, 2], 0, 0.010)
+        self.assertEqual([packet.packet_number for packet in acked], [1, 2])
+        self.assertEqual(lost, [])
+
+        _, lost = recovery.on_ack_received([3], 0, 0.011)
+        self.assertEqual([packet.packet_number for packet in lost], [0])
+        self.assertEqual(recovery.bytes_in_flight, 1000)
+
+    def test_time_threshold_loss(self):
+        """
+        Test that a packet behind the largest acknowledged one is lost after 9/8 RTT.
+        """
+        recovery = Recovery.LossDetection()
+        self.send(recovery, 0, 0.0)
+        self.send(recovery, 1, 0.001)
+        _, lost = recovery.on_ack_received([1], 0, 0.101)
+        self.assertEqual(lost, [])
+
+        # The loss timer is armed for packet 0 and fires one time threshold after it was sent
+        timer = recovery.get_timer()
+        self.assertAlmostEqual(timer, Recovery.timeThreshold * 0.100)
+        lost, probe = recovery.on_timeout(timer)
+        self.assertEqual([packet.packet_number for packet in lost], [0])
+        self.assertFalse(probe)
+
+    def test_probe_timeout_backoff(self):
+        """
+        Test that the probe timeout fires without an ACK and doubles each time.
+        """
+        recovery = Recovery.LossDetection()
+        self.send(recovery, 0, 0.0)
+        first = recovery.get_timer()
+        self.assertAlmostEqual(first, recovery.rtt.pto())
+
+        lost, probe = recovery.on_timeout(first)
+        self.assertEqual(lost, [])
+        self.assertTrue(probe)
+        self.assertAlmostEqual(recovery.get_timer(), 2 * first)
+
+class LossySocket(QUICSocket):
+    def __init__(self, should_drop):
+        """
+        Initialize a QUICSocket that silently drops chosen outgoing datagrams.
+
+        Args:
+            should_drop (callable): Called with each decoded outgoing datagram, returns True to drop it.
+        """
+        super().__init__()
+        self.should_drop = should_drop
+        self.dropped = 0
+
+    def sendto(self, data, address):
+        """
+        Send data unless should_drop selects it.
+        """
+        if self.should_drop(decode_datagram(data)):
+            self.dropped += 1
+            return
+        super().sendto(data, address)
+
+    def sendmsg(self, buffers, address):
+        """
+        Send the gathered buffers unless should_drop selects the datagram.
+        """
+        if self.should_drop(decode_datagram(b''.join(buffers))):
+            self.dropped += 1
+            return
+        super().sendmsg(buffers, address)
+
+class TestLossRecovery(unittest.TestCase):
+    def test_transfer_survives_loss(self):
+        """
+        Test that lost data packets, a lost tail and lost ACKs are recovered without a timeout.
+        """
+        dropped_packets = {5, 6, 7, 40}
+        dropped_acks = []  # ACKs are held back for a few packets, so the first two at or past packet 20 are dropped
+        first_transmission = set()
+        tail_dropped = []
+
+        def drop_data(packet):
+            # Drop the first transmission of chosen packets and of the first packet that finishes a stream
+            if not isinstance(packet, QUICPacket):
+                return False
+            finishes = any(isinstance(frame, QUICStreamPayload) and frame.finished and frame.length for frame in packet.protected_payload)
+            if finishes and not tail_dropped:
+                tail_dropped.append(packet.packet_number)
+                return True
+            if packet.packet_number in dropped_packets and packet.packet_number not in first_transmission:
+                first_transmission.add(packet.packet_number)
+                return True
+            return False
+
+        server = QUICServer(port=8890)
+        server.socket = LossySocket(drop_data)
+        accepted = []
+        server_thread = threading.Thread(target=serve_one, args=(server, accepted), daemon=True)
+        server_thread.start()
+        time.sleep(0.5)  # Wait for the server to start
+
+        client = QUICClient()
+        def drop_ack(packet):
+            if isinstance(packet, QUICAck) and packet.ack_number >= 20 and len(dropped_acks) < 2:
+                dropped_acks.append(packet.ack_number)
+                return True
+            return False
+
+        client.socket = LossySocket(drop_ack)
+        client.connect('127.0.0.1', 8890)
+        start = time.time()
+        client.run(2)
+        elapsed = time.time() - start
+        server_thread.join(timeout=10)
+
+        # Every stream arrived in full, without waiting for a socket timeout
+        for stream, sent in zip(client.streams, accepted[0].streams):
+            self.assertTrue(stream['complete'])
+            self.assertEqual(stream['packetReceived'], sent['size'])
+        self.assertEqual(server.socket.dropped, len(dropped_packets) + 1)
+        self.assertEqual(client.socket.dropped, len(dropped_acks))
+        self.assertLess(elapsed, 3)
+
+        server.close()
+        client.close()
+
+class TestCongestionControl(unittest.TestCase):
+    def packets(self, count, time_sent=0.0, size=Congestion.maxDatagramSize):
+        """
+        Build full-sized sent packets.
+        """
+        return [Recovery.SentPacket(i, time_sent, size, []) for i in range(count)]
+
+    def test_slow_start_and_loss(self):
+        """
+        Test that NewReno doubles per round trip in slow start and halves once per loss period.
+        """
+        controller = Congestion.create_controller('newreno')
+        initial = controller.cwnd
+        controller.on_packets_acked(self.packets(10), 0.1, Recovery.RttEstimator())
+        self.assertEqual(controller.cwnd, 2 * initial)
+        self.assertEqual(controller.state, 'slow_start')
+
+        controller.on_packets_lost(self.packets(1, time_sent=0.05), 0.2)
+        self.assertEqual(controller.cwnd, initial)
+        self.assertEqual(controller.ssthresh, initial)
+        self.assertEqual(controller.state, 'recovery')
+
+        # A second loss from the same flight does not reduce the window again
+        controller.on_packets_lost(self.packets(1, time_sent=0.15), 0.25)
+        self.assertEqual(controller.cwnd, initial)
+
+        # An ACK for a packet sent after the loss ends recovery and grows the window linearly
+        controller.on_packets_acked(self.packets(1, time_sent=0.3), 0.4, Recovery.RttEstimator())
+        self.assertEqual(controller.state, 'congestion_avoidance')
+        self.assertAlmostEqual(controller.cwnd, initial + Congestion.maxDatagramSize ** 2 / initial)
+
+    def test_cubic_reduction_and_growth(self):
+        """
+        Test that CUBIC cuts the window by beta and climbs back towards w_max over K seconds.
+        """
+        controller = Congestion.create_controller('cubic')
+        controller.cwnd = 100 * Congestion.maxDatagramSize
+        controller.on_packets_lost(self.packets(1), 1.0)
+        self.assertAlmostEqual(controller.cwnd, 70 * Congestion.maxDatagramSize)
+        self.assertAlmostEqual(controller.k, (100 * (1 - Congestion.cubicBeta) / Congestion.cubicC) ** (1 / 3))
+
+        rtt = Recovery.RttEstimator()
+        rtt.update(0.05)
+        now = 1.0
+        while now < 1.0 + controller.k:
+            now += 0.05
+            controller.on_packets_acked(self.packets(int(controller.cwnd / Congestion.maxDatagramSize), time_sent=now - 0.05), now, rtt)
+        self.assertGreater(controller.cwnd, 95 * Congestion.maxDatagramSize)
+        self.assertLess(controller.cwnd, 115 * Congestion.maxDatagramSize)
+
+    def test_unknown_controller(self):
+        """
+        Test that an unknown controller name is rejected.
+        """
+        with self.assertRaises(ValueError):
+            Congestion.create_controller('bbr')
+
+    def test_pacer_spreads_bursts(self):
+        """
+        Test that the pacer allows a burst, then one packet per size / rate seconds.
+        """
+        pacer = Congestion.Pacer(1000)
+        pacer.update_rate(cwnd=12500, smoothed_rtt=0.1)  # 1.25 * 12500 / 0.1 = 156250 bytes/s
+        now = 0.0
+        for _ in range(Congestion.pacingBurstPackets):
+            self.assertEqual(pacer.next_send_time(now), now)
+            pacer.on_packet_sent(1000, now)
+        self.assertAlmostEqual(pacer.next_send_time(now), 1000 / 156250)
+
+    def test_transfer_through_lossy_proxy(self):
+        """
+        Test complete transfers through a seeded lossy proxy with each congestion controller.
+        """
+        for port, name in [(8892, 'newreno'), (8894, 'cubic')]:
+            with self.subTest(congestion_control=name):
+                server = QUICServer(port=port, congestion_control=name)
+                accepted = []
+                server_thread = threading.Thread(target=serve_one, args=(server, accepted), daemon=True)
+                server_thread.start()
+                proxy = LossyProxy(('127.0.0.1', port + 1), ('127.0.0.1', port), loss_rate=0.02, seed=7)
+                proxy.start()
+                time.sleep(0.5)  # Wait for the server to start
+
+                client = QUICClient()
+                client.connect('127.0.0.1', port + 1)
+                client.run(2)
+
+                for stream, sent in zip(client.streams, accepted[0].streams):
+                    self.assertTrue(stream['complete'])
+                    self.assertEqual(stream['packetReceived'], sent['size'])
+                self.assertGreater(proxy.dropped, 0)
+                self.assertLess(accepted[0].congestion.ssthresh, float('inf'))
+
+                client.close()
+                server_thread.join(timeout=10)
+                server.close()
+                proxy.stop()
+
+class TestImpairments(unittest.TestCase):
+    def test_gilbert_elliott_bursts(self):
+        """
+        Test that burst loss reaches its long-run rate in runs longer than independent loss of the same rate.
+        """
+        def losses(link):
+            return [not link.process(1200, index * 0.001) for index in range(20000)]
+
+        def mean_run(lost):
+            runs = [len(run) for run in ''.join('x' if drop else ' ' for drop in lost).split()]
+            return sum(runs) / len(runs)
+
+        burst_loss = GilbertElliottLoss(0.01, 0.25)
+        bursty = losses(LinkImpairment(burst_loss=(0.01, 0.25), seed=1))
+        independent = losses(LinkImpairment(loss_rate=burst_loss.mean_loss(), seed=1))
+        self.assertAlmostEqual(sum(bursty) / len(bursty), burst_loss.mean_loss(), delta=0.015)
+        self.assertGreater(mean_run(bursty), 3)
+        self.assertLess(mean_run(independent), 1.5)
+        # The same seed makes the same decisions
+        self.assertEqual(bursty, losses(LinkImpairment(burst_loss=(0.01, 0.25), seed=1)))
+
+    def test_bandwidth_cap(self):
+        """
+        Test that the token bucket lets a burst through at once, then paces to the bandwidth and drops on a full queue.
+        """
+        link = LinkImpairment(bandwidth=100000, burst_size=5000, queue_size=10000)
+        departures = [link.process(1000, 0.0) for _ in range(20)]
+        self.assertEqual(departures[:5], [[0.0]] * 5)
+        for index in range(5, 15):
+            self.assertAlmostEqual(departures[index][0], (index - 4) * 0.01)
+        self.assertEqual(departures[15:], [[]] * 5)
+        self.assertEqual(link.stats['overflowed'], 5)
+        # After a quiet second the whole burst is available again
+        self.assertEqual(link.process(1000, 1.0), [1.0])
+
+    def test_delay_jitter_reorder_duplicate(self):
+        """
+        Test that jitter keeps datagrams in order, reordering lets later ones overtake, and duplicates leave together.
+        """
+        jittered = LinkImpairment(delay=0.05, jitter=0.02, seed=3)
+        departures = [jittered.process(1200, index * 0.001)[0] for index in range(1000)]
+        self.assertEqual(departures, sorted(departures))
+        self.assertTrue(all(index * 0.001 + 0.03 <= departure for index, departure in enumerate(departures)))
+
+        reordering = LinkImpairment(reorder_rate=0.1, reorder_delay=0.005, duplicate_rate=0.1, seed=3)
+        copies = [reordering.process(1200, index * 0.001) for index in range(1000)]
+        departures = [times[0] for times in copies]
+        self.assertNotEqual(departures, sorted(departures))
+        self.assertAlmostEqual(reordering.stats['reordered'] / 1000, 0.1, delta=0.03)
+        self.assertEqual(sum(len(times) == 2 for times in copies), reordering.stats['duplicated'])
+        self.assertEqual(reordering.stats['forwarded'], 1000 + reordering.stats['duplicated'])
+
+    def test_transfer_through_impaired_proxy(self):
+        """
+        Test that engine streams arrive intact through delay, jitter, reordering, duplication and burst loss.
+        """
+        payloads = [os.urandom(150000), os.urandom(40000)]
+
+        async def handler(connection, writers):
+            for writer, payload in zip(writers, payloads):
+                writer.write(payload)
+                writer.write_eof()
+
+        async def transfer():
+            server = await Engine.serve('127.0.0.1', 8909, handler)
+            client = await Engine.connect('127.0.0.1', 8910)
+            readers = client.request(len(payloads))
+            received = [await reader.read() for reader in readers]
+            await client.wait_complete()
+            client.close()
+            server.close()
+            return received
+
+        proxy = LossyProxy(('127.0.0.1', 8910), ('127.0.0.1', 8909), loss_rate=0.005, seed=11, burst_loss=(0.01, 0.3),
+                           delay=0.005, jitter=0.002, reorder_rate=0.02, duplicate_rate=0.02)
+        proxy.start()
+        try:
+            self.assertEqual(asyncio.run(transfer()), payloads)
+        finally:
+            proxy.stop()
+        stats = proxy.stats()
+        self.assertGreater(proxy.dropped, 0)
+        self.assertGreater(stats['downstream']['reordered'], 0)
+        self.assertGreater(stats['downstream']['duplicated'], 0)
+
+class TestConcurrentClients(unittest.TestCase):
+    def test_many_clients_one_server(self):
+        """
+        Test that one server process serves several clients at the same time.
+        """
+        server = QUICServer(port=8896)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        time.sleep(0.5)  # Wait for the server to start
+
+        clients = [QUICClient() for _ in range(4)]
+        def run_client(client):
+            client.connect('127.0.0.1', 8896)
+            client.run(1)
+        client_threads = [threading.Thread(target=run_client, args=(client,), daemon=True) for client in clients]
+        for thread in client_threads:
+            thread.start()
+
+        # All clients are connected at once, each under its own connection ID
+        deadline = time.time() + 5
+        while len(server.connections) < len(clients) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(server.connections), len(clients))
+        self.assertEqual(set(server.connections), {client.socket.get_dest_cid() for client in clients})
+
+        for thread in client_threads:
+            thread.join(timeout=30)
+        for client in clients:
+            self.assertTrue(client.streams[0]['complete'])
+            client.close()
+
+        # Finished connections leave the table
+        deadline = time.time() + 5
+        while server.connections and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(server.connections, {})
+
+        server.shutdown()
+        server_thread.join(timeout=5)
+        server.close()
+
+    def test_handshake_without_request_reaped(self):
+        """
+        Test that connections whose client never sends a request leave the table after the idle timeout.
+        """
+        async def handshakes():
+            server = await Engine.serve('127.0.0.1', 8903)
+            clients = []
+            for _ in range(5):
+                client = QUICSocket()
+                client.create_socket()
+                client.sendto(QUICLongHeader(LONG_HEADER_FLAG, generate_random_hex(), '', 1).encode(), ('127.0.0.1', 8903))
+                clients.append(client)
+            await asyncio.sleep(0.2)
+            opened = len(server.connections)
+            await asyncio.sleep(Connection.idleTimeout + 0.3)
+            reaped = server.connections == {} and server.timer_handles == {}
+            server.close()
+            for client in clients:
+                client.close()
+            return opened, reaped
+
+        opened, reaped = asyncio.run(handshakes())
+        self.assertEqual(opened, 5)
+        self.assertTrue(reaped)
+
+class TestEngine(unittest.TestCase):
+    def test_stream_read_write(self):
+        """
+        Test that data written through stream writers arrives in order through stream readers.
+        """
+        payloads = [os.urandom(200000), b'', os.urandom(5000)]
+
+        async def handler(connection, writers):
+            for writer, payload in zip(writers, payloads):
+                for start in range(0, len(payload), 30000):
+                    writer.write(payload[start:start + 30000])
+                    await writer.drain()
+                writer.write_eof()
+
+        async def transfer():
+            server = await Engine.serve('127.0.0.1', 8897, handler)
+            client = await Engine.connect('127.0.0.1', 8897)
+            readers = client.request(len(payloads))
+            received = [await reader.read() for reader in readers]
+            await client.wait_complete()
+            client.close()
+            server.close()
+            return received, [client.quic_socket.pool, server.quic_socket.pool]
+
+        received, pools = asyncio.run(transfer())
+        self.assertEqual(received, payloads)
+        # Every datagram was read into a buffer released before the next one arrived
+        for pool in pools:
+            self.assertEqual(pool.allocations, 1)
+            self.assertGreater(pool.reuses, 0)
+
+    def test_batch_io_transfer(self):
+        """
+        Test that a transfer with UDP GSO/GRO batching delivers every stream intact.
+        """
+        payloads = [os.urandom(300000), os.urandom(70000)]
+
+        def chunks(payload):
+            for start in range(0, len(payload), 65536):
+                yield payload[start:start + 65536]
+
+        async def handler(connection, writers):
+            for writer, payload in zip(writers, payloads):
+                writer.write_source(chunks(payload))
+
+        async def transfer():
+            server = await Engine.serve('127.0.0.1', 8899, handler, batch_io=True)
+            client = await Engine.connect('127.0.0.1', 8899, batch_io=True)
+            readers = client.request(len(payloads))
+            received = [await reader.read() for reader in readers]
+            await client.wait_complete()
+            client.close()
+            server.close()
+            return received
+
+        self.assertEqual(asyncio.run(transfer()), payloads)
+
+    def test_end_of_stream_in_empty_final_frame(self):
+        """
+        Test that a stream whose final frame carries no data still signals its end to the reader.
+        """
+        events = []
+        connection = Connection.QUICClientConnection('00', ('127.0.0.1', 1), lambda buffers, address: None,
+                                                     lambda stream_id, data, finished: events.append((bytes(data), finished)))
+        connection.src_cid = '01'
+        connection.request(1, 0.0)
+        connection.datagram_received(QUICPacket(0, '01', 0, [QUICStreamPayload(0, 5, 5, 0, b'hello')]), 0.1)
+        connection.datagram_received(QUICPacket(0, '01', 1, [QUICStreamPayload(0, 5, 0, 1, b'')]), 0.2)
+        self.assertEqual(events, [(b'hello', False), (b'', True)])
+        self.assertTrue(connection.complete)
+
+    def test_empty_datagram_ignored(self):
+        """
+        Test that an empty datagram is rejected without stopping the reader from serving the next one.
+        """
+        async def handshake():
+            server = await Engine.serve('127.0.0.1', 8902, batch_io=True)
+            stray = QUICSocket()
+            stray.create_socket()
+            stray.sendto(b'', ('127.0.0.1', 8902))
+            client = await Engine.connect('127.0.0.1', 8902)
+            connected = client.connection.connected
+            client.close()
+            server.close()
+            stray.close()
+            return connected
+
+        self.assertTrue(asyncio.run(handshake()))
+
+    def test_handshake_retransmitted_by_loop_timer(self):
+        """
+        Test that a lost Client Hello is sent again when the loop timer fires.
+        """
+        async def handshake():
+            server = await Engine.serve('127.0.0.1', 8898)
+            quic_socket = LossySocket(lambda packet: isinstance(packet, QUICLongHeader) and quic_socket.dropped == 0)
+            quic_socket.create_socket()
+            quic_socket.set_address(('127.0.0.1', 8898))
+            quic_socket.set_dest_cid(generate_random_hex())
+            client = await Engine.create_client_endpoint(quic_socket)
+            start = time.monotonic()
+            await client.connect()
+            elapsed = time.monotonic() - start
+            client.close()
+            server.close()
+            return quic_socket.dropped, client.connection.attempts, elapsed
+
+        dropped, attempts, elapsed = asyncio.run(handshake())
+        self.assertEqual(dropped, 1)
+        self.assertEqual(attempts, 2)
+        self.assertGreaterEqual(elapsed, Connection.handshakeTimeout)
+
+class TestWorkers(unittest.TestCase):
+    def test_connection_ids_name_worker(self):
+        """
+        Test that connection IDs issued by a worker carry its index.
+        """
+        for worker in [0, 7, MAX_WORKERS - 1]:
+            cid = generate_cid(worker)
+            self.assertEqual(len(cid), 16)
+            self.assertEqual(cid_worker(cid), worker)
+        with self.assertRaises(ValueError):
+            generate_cid(MAX_WORKERS)
+
+    def test_misrouted_datagram_handed_to_owner(self):
+        """
+        Test that a datagram reaching the wrong worker is handed to the worker that owns its connection.
+        """
+        payload = os.urandom(50000)
+
+        async def handler(connection, writers):
+            writers[0].write(payload)
+            writers[0].write_eof()
+
+        async def transfer(directory):
+            workers = [await Engine.serve('127.0.0.1', 8900, handler, reuse_port=True, worker=index,
+                                          handoff=Engine.WorkerHandoff(directory, index)) for index in range(2)]
+            client = await Engine.connect('127.0.0.1', 8900)
+            owner, other = workers if workers[0].connections else workers[::-1]
+            client_address = ('127.0.0.1', client.quic_socket.get_sockfd().getsockname()[1])
+            send = client.connection.send
+
+            def send_request_to_other(buffers, address):
+                # The request arrives at the worker that does not own the connection
+                client.connection.send = send
+                other.datagram_received(b''.join(buffers), client_address)
+            client.connection.send = send_request_to_other
+            readers = client.request(1)
+            received = await readers[0].read()
+            await client.wait_complete()
+            client.close()
+            for worker in workers:
+                worker.close()
+            return received, owner, other, client.connection.src_cid
+
+        with tempfile.TemporaryDirectory() as directory:
+            received, owner, other, issued_cid = asyncio.run(transfer(directory))
+        self.assertEqual(received, payload)
+        self.assertEqual(other.handoff.forwarded, 1)
+        self.assertEqual(owner.handoff.received, 1)
+        self.assertEqual(other.connections, {})
+        self.assertEqual(cid_worker(issued_cid), owner.worker)
+
+    def test_worker_pool_serves_clients(self):
+        """
+        Test that worker processes sharing one port serve clients and issue connection IDs naming a worker.
+        """
+        pool = QUICWorkerPool(port=8901, workers=2)
+        pool.start()
+        try:
+            time.sleep(0.5)  # Wait for the workers to bind
+            self.assertTrue(all(process.is_alive() for process in pool.processes))
+            clients = [QUICClient() for _ in range(4)]
+            def run_client(client):
+                client.connect('127.0.0.1', 8901)
+                client.run(1)
+            client_threads = [threading.Thread(target=run_client, args=(client,), daemon=True) for client in clients]
+            for thread in client_threads:
+                thread.start()
+            for thread in client_threads:
+                thread.join(timeout=30)
+            for client in clients:
+                self.assertTrue(client.streams[0]['complete'])
+                self.assertIn(cid_worker(client.socket.get_src_cid()), range(2))
+                client.close()
+        finally:
+            pool.stop()
+        self.assertEqual(pool.processes, [])
+
+class TestSources(unittest.TestCase):
+    def test_random_and_file_sources(self):
+        """
+        Test that sources produce their data in chunks, reproducibly for a seeded random source.
+        """
+        chunks = list(Sources.RandomSource(100000, seed=7, chunk_size=30000))
+        self.assertEqual([len(chunk) for chunk in chunks], [30000, 30000, 30000, 10000])
+        self.assertEqual(b''.join(chunks), b''.join(Sources.RandomSource(100000, seed=7)))
+        self.assertEqual(list(Sources.RandomSource(0)), [])
+
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(b''.join(chunks))
+            file.flush()
+            source = Sources.FileSource(file.name, chunk_size=40000)
+            self.assertEqual(source.size, 100000)
+            self.assertEqual(b''.join(source), b''.join(chunks))
+            self.assertIsNone(source.file)
+            self.assertEqual(list(source), [])
+
+    def test_source_pulled_as_window_opens(self):
+        """
+        Test that a stream source is only pulled as far as the window lets data out.
+        """
+        sent = []
+        connection = Connection.QUICConnection('00', ('127.0.0.1', 1), lambda buffers, address: sent.append(b''.join(buffers)),
+                                               window=4, pacing=False, on_request=lambda connection, stream_ids: None)
+        connection.handle_request(QUICPacket(0, '00', 1, [QUICStreamPayload(0, 8, 8, 0, b'Request0')]), 0.0)
+        pulls = []
+        def chunks():
+            for index in range(1000):  # 1000 chunks of 10 KB; far more than a window
+                pulls.append(index)
+                yield bytes(10000)
+        connection.set_source(0, chunks())
+        connection.send_pending(0.0)
+        self.assertEqual(len(sent), 4)
+        # Four packets of at most Connection.maxUdpPayload bytes fit in the first chunk; one more waits ready
+        self.assertEqual(pulls, [0, 1])
+        self.assertEqual(connection.unsent_bytes(0), 20000 - connection.stream_index[0]['totalSent'])
+
+    def test_mmap_sources_share_mapping(self):
+        """
+        Test that sources reading one file share a single mapping, released once both are done.
+        """
+        data = os.urandom(300000)
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(data)
+            file.flush()
+            first = Sources.MmapSource(file.name, chunk_size=100000)
+            second = Sources.MmapSource(file.name, chunk_size=70000)
+            chunk = next(first)
+            self.assertIsInstance(chunk, memoryview)
+            self.assertEqual(next(second), data[:70000])
+            self.assertIs(first.mapped, second.mapped)
+            self.assertEqual(first.mapped.users, 2)
+            self.assertEqual(bytes(chunk) + b''.join(first), data)
+            self.assertEqual(len(Sources.mappings), 1)
+            self.assertEqual(data[:70000] + b''.join(second), data)
+            self.assertEqual(Sources.mappings, {})
+        with tempfile.NamedTemporaryFile() as empty:
+            self.assertEqual(list(Sources.MmapSource(empty.name)), [])
+
+    def test_files_served_by_name(self):
+        """
+        Test that a request naming a file under the served directory gets that file, and nothing outside it.
+        """
+        files = {'a.bin': os.urandom(250000), 'nested/b.bin': os.urandom(4000)}
+        with tempfile.TemporaryDirectory() as parent:
+            root = os.path.join(parent, 'root')
+            for name, data in files.items():
+                os.makedirs(os.path.dirname(os.path.join(root, name)), exist_ok=True)
+                with open(os.path.join(root, name), 'wb') as file:
+                    file.write(data)
+            with open(os.path.join(parent, 'secret'), 'wb') as file:
+                file.write(b'secret')
+            names = ['a.bin', '/nested/b.bin', '../secret', 'missing', 'Request4']
+
+            async def transfer():
+                server = await Engine.serve('127.0.0.1', 8904, file_handler(root))
+                client = await Engine.connect('127.0.0.1', 8904)
+                readers = client.request(len(names), names, [os.path.join(parent, 'saved.bin')])
+                received = [await reader.read() for reader in readers]
+                await client.wait_complete()
+                client.close()
+                server.close()
+                return received
+
+            received = asyncio.run(transfer())
+            with open(os.path.join(parent, 'saved.bin'), 'rb') as file:
+                self.assertEqual(file.read(), files['a.bin'])  # Also written straight into its output file
+        self.assertEqual(received[:4], [files['a.bin'], files['nested/b.bin'], b'', b''])
+        self.assertGreaterEqual(len(received[4]), Connection.oneMB)  # A placeholder request still gets random data
+        self.assertEqual(Sources.mappings, {})
+
+class TestCache(unittest.TestCase):
+    def test_lru_eviction_within_budget(self):
+        """
+        Test that responses are reused, and evicted least recently used first once over the byte budget.
+        """
+        cache = Cache.ResponseCache(250)
+        made = []
+        def make(key):
+            def source():
+                made.append(key)
+                return [key.encode() * 50, key.encode() * 50]
+            return source
+        self.assertEqual(b''.join(cache.source('a', make('a'))), b'a' * 100)
+        self.assertEqual(b''.join(cache.source('b', make('b'))), b'b' * 100)
+        self.assertEqual(b''.join(cache.source('a', make('a'))), b'a' * 100)  # Hit; b is now least recently used
+        self.assertEqual(b''.join(cache.source('c', make('c'))), b'c' * 100)
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual(made, ['a', 'b', 'c'])
+        self.assertEqual(cache.stats(), {'hits': 1, 'coalesced': 0, 'misses': 3, 'evictions': 1, 'entries': 2, 'bytes': 200})
+
+        # A response larger than the whole budget is served but not kept
+        self.assertEqual(len(b''.join(cache.source('big', lambda: [bytes(200), bytes(200)]))), 400)
+        self.assertNotIn('big', cache.entries)
+        self.assertLessEqual(cache.size, cache.capacity)
+
+    def test_concurrent_requests_share_producer(self):
+        """
+        Test that requests for a response still being produced join its producer instead of starting another.
+        """
+        cache = Cache.ResponseCache(10 ** 6)
+        pulls = []
+        def make():
+            for index in range(4):
+                pulls.append(index)
+                yield bytes([index]) * 10
+        first = cache.source('key', make)
+        self.assertEqual(next(first), bytes(10))
+        second = cache.source('key', lambda: self.fail("A second producer was started"))
+        self.assertEqual(next(second), bytes(10))
+        self.assertEqual(next(second), b'\x01' * 10)  # The reader ahead pulls the producer for both
+        self.assertEqual(b''.join(first), b''.join(bytes([index]) * 10 for index in range(1, 4)))
+        self.assertEqual(list(second), [b'\x02' * 10, b'\x03' * 10])
+        self.assertEqual(pulls, [0, 1, 2, 3])
+        self.assertEqual(cache.stats()['coalesced'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_connections_share_cached_responses(self):
+        """
+        Test that a server's connections answer the same request with one cached response.
+        """
+        cache = Cache.ResponseCache()
+        sent = []
+        for cid in ('00', '01'):
+            connection = Connection.QUICConnection(cid, ('127.0.0.1', 1), lambda buffers, address: None, pacing=False, cache=cache)
+            connection.handle_request(QUICPacket(0, cid, 1, [QUICStreamPayload(0, 8, 8, 0, b'Request0')]), 0.0)
+            source = connection.stream_index[0]['source']
+            sent.append(b''.join(source))
+        self.assertEqual(sent[0], sent[1])
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+
+    def test_memory_bounded_by_budget(self):
+        """
+        Test that interleaved responses larger in total than the budget hold no more than the budget.
+        """
+        cache = Cache.ResponseCache(80 * 1024)
+        sources = [cache.source(f"Request{i}", lambda: Sources.RandomSource(50 * 1024, chunk_size=1024)) for i in range(20)]
+        received = [0] * len(sources)
+        for _ in range(50):
+            for index, source in enumerate(sources):
+                received[index] += len(next(source))
+                self.assertLessEqual(sum(source.entry.size for source in sources), cache.capacity)
+        self.assertEqual(received, [50 * 1024] * len(sources))
+        self.assertEqual(sum(source.entry.size for source in sources), cache.size)
+
+        # A response that reports a size over the budget is never cached, and passes its chunks through
+        big = cache.source('big', lambda: Sources.RandomSource(100 * 1024, chunk_size=1024))
+        self.assertNotIn('big', cache.entries)
+        self.assertEqual(len(next(big)), 1024)
+        self.assertEqual((big.entry.size, big.entry.chunks), (0, []))
+
+    def test_closed_reader_releases_chunks(self):
+        """
+        Test that an evicted response keeps only the chunks a remaining reader still needs, and closes its producer once none is left.
+        """
+        cache = Cache.ResponseCache(10 ** 6)
+        closed = []
+        def make():
+            try:
+                for index in range(10):
+                    yield bytes([index]) * 10
+            finally:
+                closed.append(True)
+        first = cache.source('key', make)
+        second = cache.source('key', make)
+        for _ in range(4):
+            next(first)
+        cache.discard(first.entry)
+        self.assertEqual(len(first.entry.chunks), 4)  # The second reader has read none yet
+        self.assertEqual(next(second), bytes(10))
+        self.assertEqual((first.entry.start, len(first.entry.chunks)), (1, 3))
+        second.close()
+        self.assertEqual(first.entry.chunks, [])
+        first.close()
+        self.assertEqual(closed, [True])
+
+class TestReassembly(unittest.TestCase):
+    def test_interval_set(self):
+        """
+        Test that ranges merge and that adding a range reports only the bytes it adds.
+        """
+        ranges = Reassembly.IntervalSet()
+        self.assertEqual(ranges.add(10, 20), [(10, 20)])
+        self.assertEqual(ranges.add(30, 40), [(30, 40)])
+        self.assertEqual(ranges.gaps(50), [(0, 10), (20, 30), (40, 50)])
+        self.assertEqual(ranges.add(15, 35), [(20, 30)])
+        self.assertEqual(list(ranges), [(10, 40)])
+        self.assertEqual(ranges.add(12, 18), [])
+        self.assertEqual(ranges.add(0, 10), [(0, 10)])  # Touching ranges merge too
+        self.assertEqual(list(ranges), [(0, 40)])
+        self.assertEqual(ranges.contiguous_end(), 40)
+
+    def test_out_of_order_and_duplicate_frames(self):
+        """
+        Test that frames in any order, repeated or overlapping, are written once and delivered in order.
+        """
+        data = os.urandom(10000)
+        delivered = []
+        def on_data(stream_id, piece, finished):
+            delivered.append((bytes(piece), finished))
+        stream = Reassembly.StreamReassembler(3, on_data, retain=False)
+        frames = [(6000, 10000), (2000, 4000), (2000, 4000), (3000, 7000), (0, 2500), (9000, 10000)]
+        for start, end in frames:
+            stream.receive(start, memoryview(data)[start:end], 10000 if end == 10000 else None)
+            self.assertLessEqual(len(stream.buffer), 10000 - stream.delivered)
+        self.assertEqual(b''.join(piece for piece, finished in delivered), data)
+        self.assertEqual([finished for piece, finished in delivered], [False] * (len(delivered) - 1) + [True])
+        self.assertEqual(stream.unique, 10000)
+        self.assertEqual(stream.duplicates, 2000 + 2000 + 500 + 1000)
+        self.assertEqual(len(stream.buffer), 0)  # Delivered data was not kept a second time
+
+        retained = Reassembly.StreamReassembler(0)
+        retained.receive(500, data[500:1000])
+        self.assertEqual(retained.gaps(), [(0, 500)])
+        with self.assertRaises(ValueError):
+            retained.receive(0, data[:100], final_size=100)  # Ends before data already received
+        retained.receive(0, data[:500])
+        retained.receive(1000, b'', final_size=1000)
+        self.assertTrue(retained.finished)
+        self.assertEqual(retained.data, data[:1000])
+
+    def test_stream_written_to_file(self):
+        """
+        Test that a stream received out of order lands intact in its memory-mapped output file.
+        """
+        data = os.urandom(3 * 1024 * 1024 + 123)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'out.bin')
+            stream = Reassembly.StreamReassembler(0, path=path)
+            starts = list(range(0, len(data), 100000))
+            for start in starts[1::2] + starts[::2]:
+                end = min(start + 100000, len(data))
+                stream.receive(start, data[start:end], len(data) if end == len(data) else None)
+            self.assertTrue(stream.finished)
+            stream.close()
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), data)
+
+    def test_client_ignores_unrequested_stream(self):
+        """
+        Test that a frame for a stream the client never requested is dropped instead of failing.
+        """
+        received = []
+        connection = Connection.QUICClientConnection('00', ('127.0.0.1', 1), lambda buffers, address: None,
+                                                     lambda stream_id, data, finished: received.append((stream_id, bytes(data), finished)))
+        connection.datagram_received(QUICLongHeader(LONG_HEADER_FLAG, '01', '', 1), 0.0)  # Server Hello
+        connection.request(1, 0.0)
+        connection.handle_packet(QUICPacket(0, '00', 1, [QUICStreamPayload(7, 5, 5, 0, b'stray'),
+                                                         QUICStreamPayload(0, 8, 3, 1, b'end'),
+                                                         QUICStreamPayload(0, 5, 5, 0, b'start')]), 1.0)
+        self.assertEqual(received, [(0, b'startend', True)])
+        self.assertTrue(connection.complete)
+
+class TestScheduler(unittest.TestCase):
+    def serve(self, scheduler, rounds, size=100):
+        """
+        Pick streams from a scheduler as a packetizer would and count what each one sent.
+        """
+        sent = {}
+        for _ in range(rounds):
+            stream_id = scheduler.next()
+            sent[stream_id] = sent.get(stream_id, 0) + size
+            scheduler.on_sent(stream_id, size)
+        return sent
+
+    def test_policies(self):
+        """
+        Test that round-robin takes turns, weighted-fair shares by weight and priority serves the most urgent first.
+        """
+        scheduler = Scheduler.create_scheduler('round-robin')
+        for stream_id in range(3):
+            scheduler.push(stream_id)
+        self.assertEqual([self.serve(scheduler, 1).popitem()[0] for _ in range(4)], [0, 1, 2, 0])
+
+        scheduler = Scheduler.create_scheduler('weighted-fair')
+        scheduler.push(0, weight=1)
+        scheduler.push(1, weight=3)
+        self.assertEqual(self.serve(scheduler, 400), {0: 10000, 1: 30000})
+        scheduler.remove(1)
+        self.serve(scheduler, 100)
+        scheduler.push(1, weight=3)  # Comes back without credit for the time it was idle
+        self.assertLessEqual(self.serve(scheduler, 40)[1], 3000 + 100)  # Its share, give or take the frame in progress
+
+        scheduler = Scheduler.create_scheduler('priority')
+        scheduler.push(0, urgency=5)
+        scheduler.push(1, urgency=1)
+        scheduler.push(2, urgency=1)
+        self.assertEqual(self.serve(scheduler, 10), {1: 500, 2: 500})
+        scheduler.remove(1)
+        scheduler.remove(2)
+        self.assertEqual(scheduler.next(), 0)
+        self.assertEqual(len(scheduler), 1)
+
+        with self.assertRaises(ValueError):
+            Scheduler.create_scheduler('fifo')
+
+    def test_packets_filled_to_datagram_size(self):
+        """
+        Test that packets are filled up to the datagram size and that finished streams stop getting frames.
+        """
+        sent = []
+        connection = Connection.QUICConnection('00', ('127.0.0.1', 1), lambda buffers, address: sent.append(b''.join(buffers)),
+                                               window=1000, pacing=False, on_request=lambda connection, stream_ids: None, pmtud=False,
+                                               ack_threshold=Recovery.ackElicitingThreshold)  # Keeps ACK_FREQUENCY frames out of the packets
+        connection.congestion.cwnd = float('inf')
+        connection.handle_request(QUICPacket(0, '00', 1, [QUICStreamPayload(i, 8, 8, 0, b'Request0') for i in range(3)]), 0.0)
+        connection.write(0, bytes(100), end_stream=True)
+        connection.write(1, bytes(50000), end_stream=True)
+        connection.write(2, bytes(3000), end_stream=True)
+        connection.send_pending(0.0)
+        packets = [decode_datagram(data) for data in sent]
+        self.assertTrue(all(len(data) <= Connection.maxUdpPayload for data in sent))
+        self.assertTrue(all(len(data) == Connection.maxUdpPayload for data in sent[:-1]))
+        # The short stream shares the first packet and then leaves the schedule
+        self.assertEqual([frame.stream_id for frame in packets[0].protected_payload], [0, 1])
+        self.assertEqual([frame.stream_id for frame in packets[1].protected_payload], [2])
+        counts = {}
+        for packet in packets:
+            for frame in packet.protected_payload:
+                counts[frame.stream_id] = counts.get(frame.stream_id, 0) + 1
+        self.assertEqual(counts[0], 1)
+        self.assertEqual(sum(len(data) for data in sent), sum(packet.encoded_size() for packet in packets))
+        self.assertEqual(len(connection.scheduler), 0)
+
+class TestPathMtu(unittest.TestCase):
+    def test_search_and_black_hole(self):
+        """
+        Test that probing settles just below the path MTU and falls back when full-size packets vanish.
+        """
+        discovery = PathMtu.PathMtuDiscovery()
+        path_mtu = 1350
+        packet_number = 0
+        while True:
+            size = discovery.next_probe(0.0)
+            if size is None:
+                break
+            discovery.on_probe_sent(packet_number)
+            if size <= path_mtu:
+                discovery.on_packet_acked(packet_number, size)
+            else:
+                discovery.on_packet_lost(packet_number, size)
+            packet_number += 1
+        self.assertLessEqual(discovery.size, path_mtu)
+        self.assertGreater(discovery.size, path_mtu - PathMtu.searchGranularity)
+        self.assertIsNone(discovery.next_probe(PathMtu.raiseInterval - 1))
+
+        # Losses of full-size packets are checked with a probe of the current size before anything changes
+        settled = discovery.size
+        for _ in range(PathMtu.blackHoleLosses):
+            packet_number += 1
+            discovery.on_packet_lost(packet_number, settled)
+        self.assertEqual(discovery.next_probe(0.0), settled)
+        discovery.on_probe_sent(packet_number + 1)
+        discovery.on_packet_acked(packet_number + 1, settled)
+        self.assertEqual((discovery.size, discovery.black_holes), (settled, 0))
+
+        discovery.on_probe_timeout(PathMtu.blackHoleTimeouts)
+        self.assertEqual(discovery.size, PathMtu.basePlpmtu)
+        self.assertEqual(discovery.black_holes, 1)
+        self.assertLess(discovery.next_probe(0.0), discovery.high + 1)
+
+    def test_transfer_adopts_path_mtu(self):
+        """
+        Test that a transfer grows its packets to the path MTU and recovers when the path shrinks mid-transfer.
+        """
+        path_mtu = [1400]
+        sizes = []
+        def drop_large(packet):
+            if not isinstance(packet, QUICPacket):
+                return False
+            sizes.append(packet.encoded_size())
+            if len(sizes) == 1500:
+                path_mtu[0] = 1300  # A route change: full-size packets now vanish
+            return packet.encoded_size() > path_mtu[0]
+
+        server = QUICServer(port=8905)
+        server.socket = LossySocket(drop_large)
+        accepted = []
+        server_thread = threading.Thread(target=serve_one, args=(server, accepted), daemon=True)
+        server_thread.start()
+        time.sleep(0.5)  # Wait for the server to start
+
+        client = QUICClient()
+        client.connect('127.0.0.1', 8905)
+        client.run(3)
+        server_thread.join(timeout=10)
+
+        connection = accepted[0]
+        for stream, sent in zip(client.streams, connection.streams):
+            self.assertTrue(stream['complete'])
+            self.assertEqual(stream['packetReceived'], sent['size'])
+        self.assertGreater(max(sizes[:1500]), 1400 - PathMtu.searchGranularity)  # Grew past the base size first
+        self.assertGreaterEqual(connection.pmtu.black_holes, 1)
+        self.assertLessEqual(connection.pmtu.size, 1300)
+        self.assertGreater(connection.pmtu.size, PathMtu.basePlpmtu)  # And searched up again afterwards
+
+        server.close()
+        client.close()
+
+class LinkedConnections(unittest.TestCase):
+    client_options = {}  # Extra keyword arguments for the client connection
+
+    def setUp(self):
+        """
+        Wire a server and a client connection together through in-memory queues.
+        """
+        self.now = 0.0
+        self.to_server = []
+        self.to_client = []
+        self.acks = 0  # ACK datagrams the client sent
+        self.dropped_updates = 0  # Window update packets from the client still to drop
+        self.blocked_frames = 0  # BLOCKED frames the server sent
+        self.received = {}
+
+        def server_send(buffers, address):
+            datagram = decode_datagram(b''.join(buffers))
+            if isinstance(datagram, QUICPacket):
+                self.blocked_frames += sum(isinstance(frame, (QUICDataBlocked, QUICStreamDataBlocked)) for frame in datagram.protected_payload)
+            self.to_client.append(datagram)
+
+        def client_send(buffers, address):
+            datagram = decode_datagram(b''.join(buffers))
+            self.acks += isinstance(datagram, QUICAck)
+            if isinstance(datagram, QUICPacket) and datagram.packet_number > 1 and self.dropped_updates:
+                self.dropped_updates -= 1
+                return
+            self.to_server.append(datagram)
+
+        def on_data(stream_id, data, finished):
+            self.received[stream_id] = self.received.get(stream_id, 0) + len(data)
+
+        self.server = Connection.QUICConnection('00', ('127.0.0.1', 1), server_send, pacing=False, pmtud=False,
+                                                on_request=lambda connection, stream_ids: None)
+        self.client = Connection.QUICClientConnection('00', ('127.0.0.1', 2), client_send, on_data, stream_window=64 * 1024,
+                                                      **self.client_options)
+
+    def pump(self):
+        """
+        Deliver datagrams both ways, a millisecond per round, and delayed ACKs when they are due,
+        until neither side has anything more to send.
+        """
+        while self.to_server or self.to_client or self.client.acks.ack_at is not None:
+            if not (self.to_server or self.to_client):
+                self.now = max(self.now, self.client.acks.ack_at)
+                self.client.handle_timer(self.now)
+            self.now += 0.001
+            while self.to_server:
+                self.server.datagram_received(self.to_server.pop(0), ('127.0.0.1', 2), self.now)
+            self.server.send_pending(self.now)
+            while self.to_client:
+                self.client.datagram_received(self.to_client.pop(0), self.now)
+
+    def start(self, size):
+        """
+        Connect, request one stream and answer it with size bytes.
+        """
+        self.client.connect(self.now)
+        self.pump()
+        self.client.request(1, self.now)
+        self.pump()
+        self.server.set_source(0, Sources.RandomSource(size, seed=1))
+        self.server.send_pending(self.now)
+        self.pump()
+
+class TestFlowControl(LinkedConnections):
+    def test_flow_control_frames_round_trip(self):
+        """
+        Test that the window and blocked frames survive encoding inside a packet.
+        """
+        frames = [QUICMaxData(3 * 1024 * 1024), QUICMaxStreamData(5, 70000), QUICDataBlocked(64), QUICStreamDataBlocked(5, 70000)]
+        packet = QUICPacket(0, 'ab', 9, frames)
+        encoded = packet.encode()
+        self.assertEqual(len(encoded), packet.encoded_size())
+        self.assertEqual(QUICPacket.decode(encoded).protected_payload, frames)
+
+    def test_server_waits_for_credit(self):
+        """
+        Test that the server sends no further than the stream window until the application consumes data.
+        """
+        self.start(300 * 1024)
+        stream = self.server.stream_index[0]
+        self.assertEqual(stream['totalSent'], 64 * 1024)
+        self.assertEqual(self.received[0], 64 * 1024)
+        self.assertTrue(stream['blocked'])
+        self.assertEqual(self.blocked_frames, 1)
+        self.assertIsNone(self.server.get_timer() if self.server.recovery.sent_packets else None)
+
+        self.client.consume(0, 16 * 1024, self.now)  # Less than half the window: no update yet
+        self.pump()
+        self.assertEqual(stream['totalSent'], 64 * 1024)
+        while not self.client.complete:
+            self.now += 1.0  # Slow reader: the window is not tuned up
+            self.client.consume(0, self.received[0] - self.client.stream_index[0]['consumed'], self.now)
+            self.pump()
+            self.assertLessEqual(stream['totalSent'], self.client.stream_index[0]['consumed'] + 64 * 1024)
+        self.assertEqual(self.received[0], 300 * 1024)
+        self.assertEqual(self.client.stream_index[0]['window'], 64 * 1024)
+        self.assertTrue(self.server.closed)
+
+    def test_lost_window_update_recovered(self):
+        """
+        Test that a lost window update is repeated when the server says it is blocked.
+        """
+        self.start(200 * 1024)
+        self.dropped_updates = 1
+        self.client.consume(0, self.received[0], self.now)
+        self.pump()
+        self.assertEqual(self.server.stream_index[0]['totalSent'], 64 * 1024)  # The update never arrived
+        deadline = self.server.get_timer()
+        self.assertIsNotNone(deadline)
+        self.now = deadline
+        self.server.handle_timer(self.now)
+        self.server.send_pending(self.now)
+        self.pump()
+        # The repeated BLOCKED frame draws the credit again, and the server sends up to it and blocks once more
+        self.assertEqual(self.blocked_frames, 3)
+        self.assertEqual(self.server.stream_index[0]['totalSent'], 128 * 1024)
+
+    def test_windows_tune_to_fast_reader(self):
+        """
+        Test that windows a reader keeps using up within a couple of round trips grow.
+        """
+        self.client.on_stream_data = None  # Data counts as consumed as soon as it arrives
+        self.start(2 * 1024 * 1024)
+        self.assertTrue(self.client.complete)
+        self.assertGreater(self.client.stream_index[0]['window'], 64 * 1024)
+        self.assertGreaterEqual(self.client.connection_window, self.client.stream_index[0]['window'])
+
+    def test_aborted_transfer_closes_source(self):
+        """
+        Test that a connection closed mid-transfer closes its streams' sources, releasing their shared mapping.
+        """
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(os.urandom(300000))
+            file.flush()
+            self.client.connect(self.now)
+            self.pump()
+            self.client.request(1, self.now)
+            self.pump()
+            self.server.set_source(0, Sources.MmapSource(file.name, chunk_size=16 * 1024))
+            self.server.send_pending(self.now)
+            self.assertEqual(len(Sources.mappings), 1)
+            while not self.server.closed:
+                self.to_client.clear()  # The client is gone
+                self.now = max(self.server.get_timer(), self.now + 0.1)
+                self.server.handle_timer(self.now)
+                self.server.send_pending(self.now)
+            self.assertIsNone(self.server.stream_index[0]['source'])
+            self.assertEqual(Sources.mappings, {})
+
+class TestAcknowledgement(LinkedConnections):
+    def test_ack_ranges_round_trip(self):
+        """
+        Test that an ACK with several ranges survives encoding and releases exactly those packets.
+        """
+        ack = decode_datagram(QUICAck(100, 1500, 'ab', [(90, 100), (50, 80), (0, 0)]).encode())
+        self.assertEqual((ack.ack_number, ack.ack_delay, ack.ranges), (100, 1500, [(90, 100), (50, 80), (0, 0)]))
+        with self.assertRaises(ValueError):
+            QUICAck(10, 0, 'ab', [(5, 10), (4, 4)]).encode_into(bytearray(64))  # Ranges must leave a gap
+
+        recovery = Recovery.LossDetection()
+        for packet_number in range(12):
+            recovery.on_packet_sent(Recovery.SentPacket(packet_number, 0.0, 1000, []))
+        acked, lost = recovery.on_ack_ranges([(8, 11), (2, 5)], 0.0, 0.1)
+        self.assertEqual([packet.packet_number for packet in acked], [2, 3, 4, 5, 8, 9, 10, 11])
+        self.assertEqual([packet.packet_number for packet in lost], [0, 1, 6, 7])  # At least packetThreshold behind
+
+    def test_delayed_ack_policy(self):
+        """
+        Test that ACKs wait for the threshold or the delay, but not after reordering, and follow ACK_FREQUENCY.
+        """
+        tracker = Recovery.AckTracker()
+        self.assertFalse(tracker.on_packet_received(0, 0.0))
+        self.assertEqual(tracker.ack_at, Recovery.maxAckDelay)
+        self.assertTrue(tracker.on_packet_received(1, 0.001))  # Second packet: threshold reached
+        self.assertEqual(tracker.ack_delay(0.002), 1000)
+        tracker.on_ack_sent()
+        self.assertIsNone(tracker.ack_at)
+        self.assertTrue(tracker.on_packet_received(3, 0.003))  # Packet 2 is missing
+        self.assertFalse(tracker.on_packet_received(3, 0.003))  # Duplicate
+        tracker.on_ack_sent()
+        self.assertTrue(tracker.on_packet_received(2, 0.004))  # Fills the hole
+        self.assertEqual(tracker.ranges(), [(0, 3)])
+
+        tracker.on_ack_frequency(QUICAckFrequency(0, 10, 5000, 0))
+        tracker.on_ack_frequency(QUICAckFrequency(0, 3, 1000, 1))  # Stale sequence number: ignored
+        self.assertEqual((tracker.threshold, tracker.max_ack_delay, tracker.reorder_threshold), (10, 0.005, 0))
+        tracker.on_ack_sent()
+        results = [tracker.on_packet_received(packet_number, 0.01) for packet_number in range(6, 16)]
+        self.assertEqual(results, [False] * 9 + [True])  # A gap at 4-5 no longer hurries the ACK
+        self.assertEqual(tracker.ranges(), [(6, 15), (0, 3)])
+
+    def test_short_headers_after_handshake(self):
+        """
+        Test that data packets use short headers whose packet numbers the client reconstructs in full.
+        """
+        self.client.on_stream_data = None
+        sent = []
+        send = self.server.send
+        self.server.send = lambda buffers, address: (sent.append(decode_datagram(b''.join(buffers))), send(buffers, address))
+        self.start(2 * 1024 * 1024)
+        self.assertTrue(self.client.complete)
+        self.assertGreater(self.server.next_packet_number, 256)
+        self.assertTrue(all(isinstance(packet, QUICShortHeaderPacket) for packet in sent if isinstance(packet, QUICPacket)))
+        self.assertLessEqual(max(packet.packet_number_length for packet in sent if isinstance(packet, QUICPacket)), 2)
+        self.assertEqual(self.client.acks.ranges(), [(0, self.server.next_packet_number - 1)])
+
+    def test_bulk_transfer_sends_fewer_acks(self):
+        """
+        Test that the server asks for fewer ACKs as its window grows, and the transfer still completes.
+        """
+        self.client.on_stream_data = None
+        self.start(4 * 1024 * 1024)
+        self.assertTrue(self.client.complete)
+        self.assertGreater(self.client.acks.threshold, Recovery.ackElicitingThreshold)
+        self.assertLess(self.acks, self.server.next_packet_number / 4)
+
+class TestResumption(unittest.TestCase):
+    delay = 0.02  # One-way delay of the simulated link, in seconds
+
+    def fetch(self, tokens, token=None, address=('127.0.0.1', 2)):
+        """
+        Fetch one small stream over a link with a fixed delay, requesting as early as the client may.
+
+        Returns:
+            tuple: Seconds from the Client Hello to the first stream byte, and the client connection.
+        """
+        link = []  # (delivery time, to_client, datagram) sent since the link was last drained
+        first_byte = []
+        def server_send(buffers, address):
+            link.append((now + self.delay, True, decode_datagram(b''.join(buffers))))
+        def client_send(buffers, address):
+            link.append((now + self.delay, False, decode_datagram(b''.join(buffers))))
+        def on_data(stream_id, data, finished):
+            if not first_byte:
+                first_byte.append(now)
+        now = 0.0
+        server = Connection.QUICConnection('00', address, server_send, pacing=False, pmtud=False, tokens=tokens,
+                                           on_request=lambda connection, stream_ids: connection.write(0, b'response', end_stream=True))
+        client = Connection.QUICClientConnection('00', ('127.0.0.1', 1), client_send, on_data, token=token)
+        client.connect(now)
+        if client.early_data:
+            client.request(1, now)
+        sequence = 0
+        pending = []  # (delivery time, sequence, to_client, datagram), earliest first
+        while (link or pending) and now < 1.0:
+            for delivery, to_client, datagram in link:
+                heapq.heappush(pending, (delivery, sequence, to_client, datagram))
+                sequence += 1
+            link.clear()
+            now, _, to_client, datagram = heapq.heappop(pending)
+            if to_client:
+                client.datagram_received(datagram, now)
+                if client.connected and client.request_packet is None:
+                    client.request(1, now)
+            else:
+                server.datagram_received(datagram, address, now)
+                server.send_pending(now)
+        return first_byte[0], client
+
+    def test_tokens_are_checked_and_used_once(self):
+        """
+        Test that a token is only good once, from its address, before it expires and untampered.
+        """
+        tokens = Resumption.ResumptionTokens(lifetime=10.0)
+        address = ('127.0.0.1', 5000)
+        token = tokens.issue(address, 1.0)
+        self.assertFalse(tokens.validate(token, ('127.0.0.2', 5000), 2.0))  # Another client
+        self.assertFalse(tokens.validate(token[:-1] + bytes((token[-1] ^ 1,)), address, 2.0))  # Tampered
+        self.assertFalse(tokens.validate(token, address, 11.0))  # Expired
+        self.assertTrue(tokens.validate(token, ('127.0.0.1', 6000), 2.0))  # A new port is the same client
+        self.assertFalse(tokens.validate(token, address, 3.0))  # Replayed
+        self.assertTrue(Resumption.ResumptionTokens(tokens.secret).validate(tokens.issue(address, 4.0), address, 5.0))  # Shared secret
+        self.assertFalse(Resumption.ResumptionTokens().validate(tokens.issue(address, 4.0), address, 5.0))
+        tokens.forget_expired(12.0)
+        self.assertEqual(tokens.stats(), {'accepted': 1, 'rejected': 4, 'remembered': 0})
+
+        hello = decode_datagram(QUICLongHeader(LONG_HEADER_FLAG | EARLY_DATA_FLAG, 'ab', '', 1, token).encode())
+        self.assertEqual((hello.flags, hello.token), (LONG_HEADER_FLAG | EARLY_DATA_FLAG, token))
+        with self.assertRaises(ValueError):
+            QUICLongHeader(1, 'ab', '', 1, bytes(MAX_TOKEN_LENGTH + 1)).encode()
+
+    def test_early_request_saves_a_round_trip(self):
+        """
+        Test that a returning client gets its first byte a round trip sooner, and falls back when its token is refused.
+        """
+        tokens = Resumption.ResumptionTokens()
+        rtt = 2 * self.delay
+        full, client = self.fetch(tokens)
+        self.assertAlmostEqual(full, 2 * rtt)
+        self.assertTrue(client.complete)
+        resumed, resumed_client = self.fetch(tokens, client.token)
+        self.assertAlmostEqual(resumed, rtt)
+        self.assertTrue(resumed_client.complete)
+        self.assertNotEqual(resumed_client.token, client.token)  # A new token for next time
+
+        replayed, replayed_client = self.fetch(tokens, client.token)  # Used up
+        self.assertAlmostEqual(replayed, 2 * rtt)
+        self.assertTrue(replayed_client.complete)
+        _, other_client = self.fetch(tokens, resumed_client.token, address=('127.0.0.9', 2))  # From another address
+        self.assertTrue(other_client.complete)
+        self.assertEqual(tokens.stats()['accepted'], 1)
+
+    def test_early_request_through_engine(self):
+        """
+        Test that the engine sends the request with the Client Hello when given a token.
+        """
+        async def transfer():
+            server = await Engine.serve('127.0.0.1', 8906, tokens=Resumption.ResumptionTokens())
+            sizes = []
+            token = None
+            for _ in range(2):
+                client = await Engine.connect('127.0.0.1', 8906, token=token)
+                early = not client.connection.connected
+                readers = client.request(1)
+                sizes.append((early, len(await readers[0].read())))
+                await client.wait_complete()
+                token = client.connection.token
+                client.close()
+            server.close()
+            return sizes, server.tokens.stats()
+
+        sizes, stats = asyncio.run(transfer())
+        self.assertEqual([early for early, size in sizes], [False, True])
+        self.assertTrue(all(size >= Connection.oneMB for early, size in sizes))
+        self.assertEqual(stats['accepted'], 1)
+
+class TestPersistentConnections(LinkedConnections):
+    client_options = {'persistent': True}
+
+    def answer(self, connection, stream_ids):
+        """
+        Record a request and answer each of its streams with 8 KB.
+        """
+        self.requests.append(stream_ids)
+        for stream_id in stream_ids:
+            connection.write(stream_id, bytes(8 * 1024), end_stream=True)
+
+    def setUp(self):
+        super().setUp()
+        self.requests = []
+        self.server.on_request = self.answer
+
+    def test_requests_served_side_by_side(self):
+        """
+        Test that requests on one connection get new client-allocated streams, served together, until the client goes away.
+        """
+        frame = QUICGoAway(7)
+        self.assertEqual(QUICPacket.decode(QUICPacket(0, 'ab', 2, [QUICKeepAlive(), frame]).encode()).protected_payload, [QUICKeepAlive(), frame])
+
+        self.client.connect(self.now)
+        self.pump()
+        self.assertEqual(self.client.request(2, self.now), [0, 1])
+        self.assertEqual(self.client.request(1, self.now), [2])
+        self.now += 0.001
+        while self.to_server:
+            self.server.datagram_received(self.to_server.pop(0), ('127.0.0.1', 2), self.now)
+        self.server.send_pending(self.now)
+        self.assertEqual(self.requests, [[0, 1], [2]])
+        first_packets = [frame.stream_id for packet in self.to_client[:3] for frame in packet.protected_payload if isinstance(frame, QUICStreamPayload)]
+        self.assertEqual(sorted(first_packets), [0, 1, 2])  # Interleaved, not one request after the other
+        self.pump()
+        self.assertTrue(self.client.complete)
+        self.assertEqual(self.received, {0: 8 * 1024, 1: 8 * 1024, 2: 8 * 1024})
+        self.assertFalse(self.server.closed)  # Kept open for the next request
+        self.assertEqual(self.server.get_timer(), self.server.last_activity + Connection.keepAliveTimeout)
+
+        self.now += 10.0
+        self.assertEqual(self.client.request(1, self.now), [3])
+        self.pump()
+        self.assertEqual(self.requests[-1], [3])
+        self.assertEqual(self.received[3], 8 * 1024)
+        self.assertEqual([stream['id'] for stream in self.server.streams], [3])  # Finished streams were dropped
+        self.client.close(self.now)
+        self.pump()
+        self.assertTrue(self.server.closed)
+        with self.assertRaises(RuntimeError):
+            self.client.request(1, self.now)
+
+    def test_lost_request_sent_again(self):
+        """
+        Test that a lost request is sent again, a duplicate opens nothing, and an idle connection is closed.
+        """
+        self.client.connect(self.now)
+        self.pump()
+        self.client.request(1, self.now)
+        self.pump()
+        self.dropped_updates = 1  # The second request is lost
+        self.client.request(1, self.now)
+        self.pump()
+        self.assertEqual(self.requests, [[0]])
+        self.now = self.client.get_timer()
+        self.client.handle_timer(self.now)
+        self.to_server.append(self.to_server[0])  # And then arrives twice
+        self.pump()
+        self.assertEqual(self.requests, [[0], [1]])
+        self.assertTrue(self.client.complete)
+        self.assertFalse(self.client.pending_requests)
+
+        self.now += Connection.keepAliveTimeout
+        self.server.handle_timer(self.now)
+        self.assertTrue(self.server.closed)
+
+    def test_requests_through_engine(self):
+        """
+        Test that the engine serves requests sent one after another and at once on one connection.
+        """
+        async def echo(connection, writers):
+            for writer in writers:
+                writer.write(writer.name.encode())
+                writer.write_eof()
+
+        async def transfer():
+            server = await Engine.serve('127.0.0.1', 8907, echo)
+            client = await Engine.connect('127.0.0.1', 8907, persistent=True)
+            replies = [await client.request(1)[0].read()]
+            readers = [reader for _ in range(3) for reader in client.request(2, ['a', 'b'])]
+            replies += [await reader.read() for reader in readers]
+            connections = len(server.connections)
+            connection = next(iter(server.connections.values()))
+            client.close()
+            await asyncio.wait_for(server.wait_closed(connection), 5)
+            server.close()
+            return replies, connections
+
+        replies, connections = asyncio.run(transfer())
+        self.assertEqual(replies, [b'Request0'] + [b'a', b'b'] * 3)
+        self.assertEqual(connections, 1)
+
+class TestPerfSuite(unittest.TestCase):
+    def test_point_measured_in_fresh_process(self):
+        """
+        Test that a point's transfer is measured end to end and summarised.
+        """
+        point = {'streams': 2, 'object_size': 64 * 1024, 'window': 32, 'datagram_size': 1200, 'clients': 2, 'mode': 'in-process'}
+        result = PerfSuite.run_point(point, repeat=1, port=8908)
+        self.assertEqual(result['bytes'], 4 * 64 * 1024)
+        self.assertEqual(len(result['completion']), 4)
+        self.assertGreaterEqual(result['packets'], 4 * 64 * 1024 // 1200)
+        self.assertGreater(result['throughput_mib_per_s'], 0)
+        self.assertGreater(result['cpu_seconds'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+        self.assertEqual(PerfSuite.point_key(result), tuple(point.values()))
+
+    def test_regressions_found(self):
+        """
+        Test that a comparison flags metrics that got worse beyond the tolerance, and only those.
+        """
+        point = dict(PerfSuite.SUITE[0])
+        before = dict(point, throughput_mib_per_s=100.0, completion_p50=0.2, completion_max=0.3, cpu_seconds=1.0, peak_rss_mb=40.0)
+        after = dict(before, throughput_mib_per_s=85.0, cpu_seconds=1.05, peak_rss_mb=30.0)
+        other = dict(after, streams=99, throughput_mib_per_s=1.0)  # No baseline to compare with
+        regressions = PerfSuite.compare({'results': [before]}, {'results': [after, other]}, tolerance=0.1)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('throughput_mib_per_s', regressions[0])
+
+class TestTracing(LinkedConnections):
+    def test_ring_buffer_keeps_newest(self):
+        """
+        Test that a full ring buffer overwrites its oldest events and counts those never written as dropped.
+        """
+        tracer = Trace.Tracer(capacity=4)
+        for index in range(10):
+            tracer.record(index * 0.001, 'transport:packet_sent', '00', {'header': {'packet_number': index}})
+        events = tracer.events()
+        self.assertEqual([event['data']['header']['packet_number'] for event in events], [6, 7, 8, 9])
+        self.assertEqual(events[0]['time'], 6.0)
+        self.assertEqual(len(tracer.take()), 4)
+        self.assertEqual(tracer.stats(), {'recorded': 10, 'written': 0, 'dropped': 6})
+
+    def test_transfer_events(self):
+        """
+        Test that both sides record packets, ACKs, metrics and stream states of a transfer, and nothing without a tracer.
+        """
+        self.server.tracer = Trace.Tracer()
+        self.client.tracer = Trace.Tracer(vantage_point='client')
+        self.start(48 * 1024)  # Within the stream window, so no consumption is needed
+        server_events = self.server.tracer.events()
+        names = {event['name'] for event in server_events}
+        self.assertTrue({'transport:packet_received', 'transport:packet_sent', 'recovery:packets_acked',
+                         'recovery:metrics_updated', 'transport:stream_state_updated'} <= names)
+        states = [event['data']['new'] for event in server_events if event['name'] == 'transport:stream_state_updated']
+        self.assertEqual(states, ['open', 'data_sent'])
+        sent = [event for event in server_events if event['name'] == 'transport:packet_sent']
+        self.assertEqual(sum(frame['length'] for event in sent for frame in event['data']['frames'] if frame['frame_type'] == 'stream'), 48 * 1024)
+        self.assertEqual({event['group_id'] for event in server_events}, {self.server.dest_cid})
+        client_states = [event['data']['new'] for event in self.client.tracer.events() if event['name'] == 'transport:stream_state_updated']
+        self.assertEqual(client_states, ['open', 'data_received'])
+
+    def test_qlog_file(self):
+        """
+        Test that an engine server writes a qlog file that is valid JSON once its tracer is closed.
+        """
+        async def handler(connection, writers):
+            for writer in writers:
+                writer.write(bytes(100000))
+                writer.write_eof()
+
+        async def transfer(tracer):
+            server = await Engine.serve('127.0.0.1', 8911, handler, tracer=tracer)
+            client = await Engine.connect('127.0.0.1', 8911)
+            for reader in client.request(2):
+                await reader.read()
+            await client.wait_complete()
+            client.close()
+            await asyncio.sleep(0.05)  # Let the server take the last ACKs
+            server.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'server.qlog')
+            tracer = Trace.Tracer(path, flush_interval=0.01)
+            asyncio.run(transfer(tracer))
+            tracer.close()
+            with open(path) as file:
+                qlog = json.load(file)
+        self.assertEqual(qlog['qlog_version'], Trace.qlogVersion)
+        trace = qlog['traces'][0]
+        self.assertEqual(trace['vantage_point'], {'type': 'server'})
+        times = [event['time'] for event in trace['events']]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(len(trace['events']), tracer.stats()['written'])
+        self.assertEqual(tracer.stats()['dropped'], 0)
+        self.assertIn('transport:packet_sent', {event['name'] for event in trace['events']})
+
+class TestMetrics(LinkedConnections):
+    def test_transfer_counts_agree(self):
+        """
+        Test that both ends count the same packets, wire bytes and stream bytes of a loss-free transfer.
+        """
+        self.start(48 * 1024)
+        server, client = self.server.metrics.snapshot(), self.client.metrics.snapshot()
+        self.assertEqual(server['packets_sent'], client['packets_received'])
+        self.assertEqual(server['bytes_sent'], client['bytes_received'])
+        self.assertEqual(client['packets_sent'], server['packets_received'])
+        self.assertEqual(client['bytes_sent'], server['bytes_received'])
+        self.assertEqual(server['stream_bytes_sent'], 48 * 1024)
+        self.assertEqual(client['stream_bytes_received'], 48 * 1024)
+        self.assertEqual(server['packets_retransmitted'] + client['duplicate_bytes_received'], 0)
+        self.assertEqual(client['streams'][0]['packets'], server['streams'][0]['packets'])
+        self.assertTrue(client['streams'][0]['complete'])
+        self.assertEqual(sum(bits for _, bits in client['throughput']) * Metrics.timelineInterval / 8, 48 * 1024)
+        self.assertGreater(server['rtt_samples'], 0)
+        self.assertGreater(client['goodput'], 0)
+
+    def test_losses_counted(self):
+        """
+        Test that lost data packets show up as losses and retransmissions, and stream bytes still count once.
+        """
+        send = self.server.send
+        sent = [0]
+        def lossy_send(buffers, address):
+            sent[0] += 1
+            if sent[0] in (3, 4, 6):  # Data packets of the first flight
+                return
+            send(buffers, address)
+        self.server.send = lossy_send
+        self.start(48 * 1024)
+        server, client = self.server.metrics.snapshot(), self.client.metrics.snapshot()
+        self.assertEqual(server['packets_sent'] - 3, client['packets_received'])
+        self.assertGreaterEqual(server['packets_lost'], 3)
+        self.assertGreaterEqual(server['packets_retransmitted'], 3)
+        self.assertGreater(server['bytes_retransmitted'], 0)
+        self.assertEqual(server['streams'][0]['retransmitted'], server['bytes_retransmitted'])
+        self.assertEqual(client['stream_bytes_received'], 48 * 1024)
+
+    def test_percentiles_and_history(self):
+        """
+        Test nearest-rank RTT percentiles and that only the newest completed streams are kept.
+        """
+        metrics = Metrics.ConnectionMetrics(stream_history=2)
+        for rtt in range(1, 101):
+            metrics.on_rtt_sample(rtt / 1000)
+        percentiles = metrics.rtt_percentiles()
+        self.assertEqual((percentiles[0.5], percentiles[0.9], percentiles[0.99]), (0.05, 0.09, 0.099))
+        for stream_id in range(4):
+            metrics.open_stream(stream_id, 0.0)
+            metrics.on_stream_sent(stream_id, 1000, 0.5)
+            metrics.close_stream(stream_id, 1.0)
+        self.assertEqual(list(metrics.streams), [2, 3])
+        self.assertEqual(metrics.stream_bytes_sent, 4000)
+        self.assertEqual(metrics.snapshot()['streams'][3]['goodput'], 8000)
+
+    def test_prometheus_endpoint(self):
+        """
+        Test that the engine server's scrape endpoint serves totals that keep closed connections.
+        """
+        async def handler(connection, writers):
+            for writer in writers:
+                writer.write(bytes(50000))
+                writer.write_eof()
+
+        async def scrape():
+            reader, writer = await asyncio.open_connection('127.0.0.1', 8913)
+            writer.write(b"GET /metrics HTTP/1.0\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            return response.decode().split("\r\n\r\n", 1)[1]
+
+        async def transfer():
+            server = await Engine.serve('127.0.0.1', 8912, handler)
+            endpoint = await Metrics.serve_prometheus('127.0.0.1', 8913, server.prometheus)
+            client = await Engine.connect('127.0.0.1', 8912)
+            for reader in client.request(2):
+                await reader.read()
+            await client.wait_complete()
+            while server.connections:
+                await asyncio.sleep(0.01)  # The server closes once its data is acknowledged
+            text = await scrape()
+            client_text = client.prometheus()
+            client.close()
+            endpoint.close()
+            await endpoint.wait_closed()
+            server.close()
+            return text, client_text
+
+        text, client_text = asyncio.run(transfer())
+        samples = dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+        self.assertEqual(samples['quic_connections_opened_total{role="server"}'], '1')
+        self.assertEqual(samples['quic_connections_open{role="server"}'], '0')
+        self.assertEqual(samples['quic_stream_bytes_sent_total{role="server"}'], '100000')
+        self.assertIn('quic_rtt_seconds_count', client_text)
+        self.assertIn('quic_connection_stream_bytes_received_total{role="client",connection=', client_text)
+
 class TestClientServerInteraction(unittest.TestCase):
     def test_client_server_interaction(self):
         """
         Test the interaction between QUIC client and server.
         """
         # Start the QUIC server in a separate thread
-        server_thread = threading.Thread(target=self.start_server)
+        server_thread = threading.Thread(target=self.start_server, daemon=True)
         server_thread.start()
         time.sleep(2)  # Wait for the server to start
 
@@ -124,12 +1944,18 @@ class TestClientServerInteraction(unittest.TestCase):
         # Connect to the server
         client.connect('127.0.0.1', 8888)
 
-        # Run the client
-        client.run()
+        # Run the client with three streams
+        client.run(3)
+        server_thread.join(timeout=10)
+
+        # Every stream was received in full
+        for stream, sent in zip(client.streams, self.connection.streams):
+            self.assertTrue(stream['complete'])
+            self.assertEqual(stream['packetReceived'], sent['size'])
 
         # Close the server and client sockets
-        self.server.socket.close()
-        client.socket.close()
+        self.server.close()
+        client.close()
 
     def start_server(self):
         """
@@ -137,8 +1963,8 @@ class TestClientServerInteraction(unittest.TestCase):
         """
         # Create and start the QUIC server
         self.server = QUICServer()
-        self.server.accept()
-        self.server.handle_client()
+        self.connection = self.server.accept()
+        self.server.handle_client(self.connection)
 
 if __name__ == '__main__':
     unittest.main()